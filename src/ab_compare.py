@@ -0,0 +1,360 @@
+"""
+Sequential A/B comparison of two prompt versions.
+
+Instead of scoring the full dataset for both prompt versions, records are
+drawn in a random order and evaluated in small batches of pairs: the same
+transcript is turned into a note by both versions and both notes are judged.
+After every batch ("look"), a confidence interval is computed for the mean
+per-record difference (candidate minus baseline) of every metric. Differences
+of `LOWER_IS_BETTER` scores are negated, so a positive difference always
+favors the candidate, as in the overall score. The test
+stops as soon as the interval of the decision metric excludes zero (one
+version is better) or lies within `±margin` (they are equivalent), or when the
+budget of pairs is used up.
+
+The intervals are Bonferroni-corrected over the planned number of looks, so
+stopping at the first decided look keeps the overall error rate at `alpha`.
+Each test is written to `data/ab_tests/<test_id>.json`, including the
+interval history of every look.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import math
+import os
+import random
+import statistics
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.checkpoint import new_run_id
+from src.core.config import settings
+from src.core.logging_config import setup_logging
+from src.core.rate_limit import RateLimiter
+from src.data_loader import DATASET_PATH, generate_notes, iter_records, note_cache
+from src.evaluation import (
+    METRIC_FIELDS,
+    get_hyperparameters,
+    get_metrics,
+    run_evaluation,
+)
+from src.prompts.versions import PROMPT_VERSIONS
+from src.schemas.models import ClinicalNote, EvaluationResult, LLMCallStats
+
+AB_TESTS_DIR = os.path.join("data", "ab_tests")
+
+# The per-record scores that are compared
+SCORE_FIELDS = list(METRIC_FIELDS.values()) + ["overall_score"]
+
+
+def look_z(alpha: float, looks: int) -> float:
+    """Returns the two-sided critical value for one of `looks` interim analyses."""
+    return statistics.NormalDist().inv_cdf(1 - alpha / (2 * max(looks, 1)))
+
+
+def paired_interval(differences: List[float], z: float) -> Tuple[float, float, float]:
+    """Returns the mean difference and its confidence interval (low, high).
+
+    The interval is unbounded until there are two differences to estimate the
+    variance from.
+    """
+    mean = statistics.fmean(differences)
+    if len(differences) < 2:
+        return mean, -math.inf, math.inf
+    half_width = z * statistics.stdev(differences) / math.sqrt(len(differences))
+    return mean, mean - half_width, mean + half_width
+
+
+def decide(low: float, high: float, margin: float) -> Optional[str]:
+    """Returns the decision an interval supports, or None if it is undecided.
+
+    Returns:
+        `candidate` or `baseline` if the interval excludes zero in its favor,
+        `equivalent` if it lies within `±margin`, else None.
+    """
+    if low > 0:
+        return "candidate"
+    if high < 0:
+        return "baseline"
+    if -margin < low and high < margin:
+        return "equivalent"
+    return None
+
+
+async def agenerate_pairs(
+    records: List[Tuple[str, Dict[str, str]]],
+    baseline: str,
+    candidate: str,
+    model: Optional[str] = None,
+    limiter: Optional[RateLimiter] = None,
+    use_cache: bool = True,
+    refresh: bool = False,
+) -> Tuple[List[ClinicalNote], List[ClinicalNote]]:
+    """Generates the baseline and candidate note of every record.
+
+    Both versions share one rate limiter. Records for which either note failed
+    are left out of both lists, so the returned notes are always paired.
+    """
+    limiter = limiter or RateLimiter(
+        max_concurrency=settings.GENERATION_MAX_CONCURRENCY,
+        requests_per_minute=settings.GENERATION_RPM,
+        tokens_per_minute=settings.GENERATION_TPM,
+    )
+    cache = note_cache() if use_cache else None
+    transcripts = [record["patient_convo"] for _, record in records]
+    calls: Tuple[Dict[int, List[LLMCallStats]], ...] = ({}, {})
+    generated = await asyncio.gather(
+        *(
+            generate_notes(
+                transcripts,
+                prompt_version=version,
+                model=model,
+                limiter=limiter,
+                cache=cache,
+                refresh=refresh,
+                calls=version_calls,
+            )
+            for version, version_calls in zip((baseline, candidate), calls)
+        )
+    )
+
+    pairs: Tuple[List[ClinicalNote], List[ClinicalNote]] = ([], [])
+    for index, ((note_id, record), *notes) in enumerate(zip(records, *generated)):
+        failed = [note for note in notes if isinstance(note, Exception)]
+        if failed:
+            logging.warning(f"Skipping record {note_id}: {failed[0]}")
+            continue
+        for side, generated_note, side_calls in zip(pairs, notes, calls):
+            side.append(
+                ClinicalNote(
+                    note_id=note_id,
+                    transcript=record["patient_convo"],
+                    note=record["soap_notes"],
+                    generated_note=generated_note,
+                    generation_calls=side_calls.get(index, []),
+                )
+            )
+    return pairs
+
+
+def _differences(
+    baseline: List[EvaluationResult], candidate: List[EvaluationResult]
+) -> Dict[str, List[float]]:
+    by_id = {result.note.note_id: result for result in baseline}
+    differences: Dict[str, List[float]] = {field: [] for field in SCORE_FIELDS}
+    for result in candidate:
+        if result.note.note_id not in by_id:
+            continue
+        for field in SCORE_FIELDS:
+            difference = getattr(result, field) - getattr(
+                by_id[result.note.note_id], field
+            )
+            # Oriented like `overall_scores`: positive favors the candidate
+            if field in settings.LOWER_IS_BETTER:
+                difference = -difference
+            differences[field].append(difference)
+    return differences
+
+
+def run_ab_test(
+    baseline: str,
+    candidate: str,
+    model: Optional[str] = None,
+    budget: Optional[int] = None,
+    batch_size: int = 10,
+    alpha: float = 0.05,
+    margin: float = 0.02,
+    metric: str = "overall_score",
+    seed: int = 0,
+    use_cache: bool = True,
+    refresh: bool = False,
+    root: str = AB_TESTS_DIR,
+) -> Dict[str, Any]:
+    """Compares two prompt versions on randomly ordered pairs until decided.
+
+    Args:
+        baseline: The prompt version to compare against.
+        candidate: The prompt version under test.
+        model: The generation model. If None, `GENERATION_LLM` is used.
+        budget: The maximum number of record pairs. If None, the full dataset.
+        batch_size: The pairs evaluated between two looks.
+        alpha: The overall error rate of the decision.
+        margin: Differences within `±margin` count as equivalent.
+        metric: The score field the stopping decision is based on.
+        seed: Seed of the record order.
+        use_cache: Read and write the generated-note and judgement caches.
+        refresh: Regenerate every note and overwrite the cached entries.
+        root: The directory the report is written to.
+
+    Returns:
+        The report: the decision (None if the budget ran out first), the pairs
+        evaluated, the final interval of every metric and the history of looks.
+
+    Raises:
+        ValueError: If a prompt version or the decision metric is unknown.
+    """
+    unknown = [v for v in (baseline, candidate) if v not in PROMPT_VERSIONS]
+    if unknown:
+        raise ValueError(f"Unknown prompt versions: {', '.join(unknown)}")
+    if metric not in SCORE_FIELDS:
+        raise ValueError(f"Unknown metric '{metric}', expected one of {SCORE_FIELDS}")
+
+    records = [(str(i), record) for i, record in enumerate(iter_records())]
+    random.Random(seed).shuffle(records)
+    budget = min(budget or len(records), len(records))
+    z = look_z(alpha, math.ceil(budget / batch_size))
+
+    report: Dict[str, Any] = {
+        "test_id": new_run_id(),
+        "baseline": baseline,
+        "candidate": candidate,
+        "model": model or settings.GENERATION_LLM,
+        "metric": metric,
+        "alpha": alpha,
+        "margin": margin,
+        "budget": budget,
+        "dataset_size": len(records),
+        "decision": None,
+        "pairs": 0,
+        "looks": [],
+    }
+    differences: Dict[str, List[float]] = {field: [] for field in SCORE_FIELDS}
+    metrics = get_metrics()
+    for start in range(0, budget, batch_size):
+        batch = records[start : min(start + batch_size, budget)]
+        baseline_notes, candidate_notes = asyncio.run(
+            agenerate_pairs(batch, baseline, candidate, model, None, use_cache, refresh)
+        )
+        baseline_results, candidate_results = (
+            run_evaluation(
+                notes,
+                get_hyperparameters(version, model),
+                use_cache=use_cache,
+                metrics=metrics,
+            )
+            for version, notes in (
+                (baseline, baseline_notes),
+                (candidate, candidate_notes),
+            )
+        )
+        for field, values in _differences(baseline_results, candidate_results).items():
+            differences[field].extend(values)
+        if not differences[metric]:
+            continue
+
+        intervals = {}
+        for field, values in differences.items():
+            mean, low, high = paired_interval(values, z)
+            intervals[field] = {"mean": mean, "low": low, "high": high}
+        report["pairs"] = len(differences[metric])
+        report["metrics"] = intervals
+        report["looks"].append({"pairs": report["pairs"], "metrics": intervals})
+        final = intervals[metric]
+        logging.info(
+            f"{report['pairs']} pairs: {metric} difference {final['mean']:+.3f} "
+            f"[{final['low']:+.3f}, {final['high']:+.3f}]"
+        )
+        report["decision"] = decide(final["low"], final["high"], margin)
+        if report["decision"]:
+            break
+
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, f"{report['test_id']}.json"), "w") as f:
+        json.dump(_finite(report), f, indent=4)
+    return report
+
+
+def _finite(value: Any) -> Any:
+    # Unbounded intervals are written as null, since JSON has no infinity
+    if isinstance(value, float) and math.isinf(value):
+        return None
+    if isinstance(value, dict):
+        return {key: _finite(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_finite(item) for item in value]
+    return value
+
+
+def main():
+    """Runs a sequential A/B comparison of two prompt versions."""
+    setup_logging()
+
+    parser = argparse.ArgumentParser(
+        description="Compare two prompt versions, stopping as soon as the result is clear."
+    )
+    parser.add_argument("baseline", help="The prompt version to compare against.")
+    parser.add_argument("candidate", help="The prompt version under test.")
+    parser.add_argument("--model", help="Generation model (default: GENERATION_LLM).")
+    parser.add_argument(
+        "--budget", type=int, help="Maximum number of record pairs (default: all)."
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=10, help="Pairs evaluated between looks."
+    )
+    parser.add_argument(
+        "--alpha", type=float, default=0.05, help="Overall error rate (default: 0.05)."
+    )
+    parser.add_argument(
+        "--margin",
+        type=float,
+        default=0.02,
+        help="Differences within this margin count as equivalent (default: 0.02).",
+    )
+    parser.add_argument(
+        "--metric",
+        default="overall_score",
+        choices=SCORE_FIELDS,
+        help="The score the decision is based on (default: overall_score).",
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the record order.")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the generated-note and judgement caches.",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Regenerate every note and overwrite the cached entries.",
+    )
+    args = parser.parse_args()
+
+    if not os.path.exists(DATASET_PATH):
+        logging.error(
+            f"Dataset file not found at {DATASET_PATH}. Please run 'just setup-data' to download it."
+        )
+        return
+
+    try:
+        report = run_ab_test(
+            args.baseline,
+            args.candidate,
+            model=args.model,
+            budget=args.budget,
+            batch_size=args.batch_size,
+            alpha=args.alpha,
+            margin=args.margin,
+            metric=args.metric,
+            seed=args.seed,
+            use_cache=not args.no_cache,
+            refresh=args.refresh,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    verdict = {
+        "candidate": f"{args.candidate} is better than {args.baseline}",
+        "baseline": f"{args.baseline} is better than {args.candidate}",
+        "equivalent": f"{args.candidate} and {args.baseline} are equivalent",
+        None: "undecided within the budget",
+    }[report["decision"]]
+    logging.info(
+        f"{report['metric']}: {verdict} after {report['pairs']} of "
+        f"{report['dataset_size']} pairs. Report saved to "
+        f"{os.path.join(AB_TESTS_DIR, report['test_id'] + '.json')}"
+    )
+
+
+if __name__ == "__main__":
+    main()
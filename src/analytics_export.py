@@ -0,0 +1,286 @@
+"""
+Columnar export of stored runs for offline analysis.
+
+Runs in the run store are exported to two Parquet datasets under
+`ANALYTICS_DIR`, both partitioned by run (`<dataset>/run_id=<run>/part-0.parquet`):
+
+- `scores`: one row per note with its score fields, whether generation failed,
+  and per stage (`generation`, `judge`) the number of LLM calls, their total
+  wall time, queue wait, prompt and completion tokens, retries and cost.
+- `texts`: the transcript, ground-truth note and generated note of every row.
+
+Scans of the scores therefore never read a note text. Parquet keeps min/max
+statistics per row group, so filters on run or on score ranges skip whole
+partitions and row groups, and `scan_scores` reads only the columns it is
+asked for, through memory-mapped files:
+
+    table = scan_scores(
+        columns=["run_id", "note_id", "clinical_safety_score"],
+        filter=ds.field("clinical_safety_score") < 0.5,
+    )
+    frame = table.to_pandas()
+"""
+
+import argparse
+import logging
+import os
+import shutil
+import tempfile
+from typing import Any, Dict, List, Optional, Sequence
+from urllib.parse import quote
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+
+from src.core.config import settings
+from src.core.logging_config import setup_logging
+from src.result_table import CALL_STAGES
+from src.run_store import TEXT_COLUMNS, RunStore
+from src.schemas.models import NOTE_TEXT_FIELDS, score_fields
+
+SCORES = "scores"
+TEXTS = "texts"
+
+# The per-stage call columns, e.g. `judge_prompt_tokens`
+CALL_COLUMNS = {
+    "calls": pa.int32(),
+    "wall_time": pa.float64(),
+    "queue_wait": pa.float64(),
+    "prompt_tokens": pa.int64(),
+    "completion_tokens": pa.int64(),
+    "retries": pa.int32(),
+    "cost": pa.float64(),
+}
+
+
+def scores_schema() -> pa.Schema:
+    """Returns the schema of a partition of the scores dataset."""
+    fields = [pa.field("note_id", pa.string())]
+    fields += [pa.field(name, pa.float64()) for name in score_fields()]
+    fields.append(pa.field("generation_failed", pa.bool_()))
+    fields += [
+        pa.field(f"{stage}_{column}", column_type)
+        for stage in CALL_STAGES
+        for column, column_type in CALL_COLUMNS.items()
+    ]
+    return pa.schema(fields)
+
+
+def texts_schema() -> pa.Schema:
+    """Returns the schema of a partition of the texts dataset."""
+    return pa.schema(
+        [pa.field("note_id", pa.string())]
+        + [pa.field(name, pa.large_string()) for name in NOTE_TEXT_FIELDS]
+    )
+
+
+def _call_totals(calls: List[Dict[str, Any]]) -> Dict[str, Optional[float]]:
+    costs = [call["cost"] for call in calls]
+    return {
+        "calls": len(calls),
+        "wall_time": sum(call["wall_time"] for call in calls),
+        "queue_wait": sum(call["queue_wait"] for call in calls),
+        "prompt_tokens": sum(call["prompt_tokens"] for call in calls),
+        "completion_tokens": sum(call["completion_tokens"] for call in calls),
+        "retries": sum(call["retries"] for call in calls),
+        # Unknown if any call has no price
+        "cost": None if None in costs else sum(costs),
+    }
+
+
+def scores_table(rows: Sequence[Dict[str, Any]]) -> pa.Table:
+    """Builds the scores of rows of `RunStore.load_scores` as a table."""
+    columns: Dict[str, list] = {name: [] for name in scores_schema().names}
+    for row in rows:
+        note = row["note"]
+        columns["note_id"].append(note["note_id"])
+        for name in score_fields():
+            columns[name].append(row.get(name))
+        columns["generation_failed"].append(note.get("generation_error") is not None)
+        for stage, calls in zip(
+            CALL_STAGES, (note.get("generation_calls", []), row.get("judge_calls", []))
+        ):
+            for column, value in _call_totals(calls).items():
+                columns[f"{stage}_{column}"].append(value)
+    return pa.Table.from_pydict(columns, schema=scores_schema())
+
+
+def texts_table(rows: Sequence[Dict[str, Any]], texts: Dict[str, str]) -> pa.Table:
+    """Builds the note texts of rows of `RunStore.load_scores` as a table.
+
+    Args:
+        rows: The rows, with the hashes of their texts.
+        texts: The texts keyed by hash, as read by `BlobStore.get_many`.
+    """
+    columns: Dict[str, list] = {"note_id": [row["note"]["note_id"] for row in rows]}
+    for name, column in TEXT_COLUMNS.items():
+        columns[name] = [texts[row[column]] for row in rows]
+    return pa.Table.from_pydict(columns, schema=texts_schema())
+
+
+def partition_path(root: str, dataset: str, run_id: str) -> str:
+    """Returns the directory of a run's partition of a dataset."""
+    return os.path.join(root, dataset, f"run_id={quote(run_id, safe='')}")
+
+
+def _write_partition(table: pa.Table, root: str, dataset: str, run_id: str) -> None:
+    # Written next to the partition and then swapped in, so that readers never
+    # see a half-written file
+    directory = partition_path(root, dataset, run_id)
+    os.makedirs(os.path.dirname(directory), exist_ok=True)
+    staging = tempfile.mkdtemp(prefix=".export-", dir=os.path.dirname(directory))
+    pq.write_table(
+        table,
+        os.path.join(staging, "part-0.parquet"),
+        row_group_size=settings.ANALYTICS_ROW_GROUP_SIZE,
+        compression="zstd",
+    )
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(staging, directory)
+
+
+def exported_run_ids(root: Optional[str] = None) -> List[str]:
+    """Returns the runs whose scores have been exported."""
+    root = root or settings.ANALYTICS_DIR
+    dataset = _dataset(root, SCORES)
+    if dataset is None:
+        return []
+    return sorted(
+        ds.get_partition_keys(fragment.partition_expression)["run_id"]
+        for fragment in dataset.get_fragments()
+    )
+
+
+def export_run(store: RunStore, run_id: str, root: Optional[str] = None) -> int:
+    """Exports a stored run, replacing an earlier export of it.
+
+    Returns:
+        The number of exported results.
+    """
+    root = root or settings.ANALYTICS_DIR
+    rows = store.load_scores(run_id)
+    texts = store.blobs.get_many(
+        row[column] for row in rows for column in TEXT_COLUMNS.values()
+    )
+    # Scores last: a run counts as exported once its scores are written
+    _write_partition(texts_table(rows, texts), root, TEXTS, run_id)
+    _write_partition(scores_table(rows), root, SCORES, run_id)
+    return len(rows)
+
+
+def export_runs(
+    store: RunStore,
+    root: Optional[str] = None,
+    run_ids: Optional[Sequence[str]] = None,
+) -> List[str]:
+    """Exports runs of the store.
+
+    Args:
+        store: The run store.
+        root: The export directory. If None, `ANALYTICS_DIR` is used.
+        run_ids: The runs to (re-)export. If None, every run with results that
+            has not been exported yet.
+
+    Returns:
+        The IDs of the exported runs.
+    """
+    root = root or settings.ANALYTICS_DIR
+    if run_ids is None:
+        done = set(exported_run_ids(root))
+        run_ids = [
+            run["run_id"]
+            for run in store.runs()
+            if run["results"] and run["run_id"] not in done
+        ]
+    for run_id in run_ids:
+        count = export_run(store, run_id, root)
+        logging.info(f"Exported {count} results of run {run_id} to {root}")
+    return list(run_ids)
+
+
+def _dataset(root: str, name: str) -> Optional[ds.Dataset]:
+    path = os.path.join(root, name)
+    if not os.path.isdir(path):
+        return None
+    return ds.dataset(
+        path,
+        format="parquet",
+        partitioning=ds.partitioning(
+            pa.schema([("run_id", pa.string())]), flavor="hive"
+        ),
+        # Memory-mapped reads, so pages of unread columns are never loaded
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+        # Skips the staging directories of exports in progress
+        ignore_prefixes=[".", "_"],
+    )
+
+
+def _scan(
+    root: Optional[str],
+    name: str,
+    schema: pa.Schema,
+    columns: Optional[List[str]],
+    filter: Optional[ds.Expression],
+) -> pa.Table:
+    dataset = _dataset(root or settings.ANALYTICS_DIR, name)
+    if dataset is None:
+        empty = schema.append(pa.field("run_id", pa.string())).empty_table()
+        return empty.select(columns or empty.column_names)
+    return dataset.to_table(columns=columns, filter=filter)
+
+
+def scan_scores(
+    columns: Optional[List[str]] = None,
+    filter: Optional[ds.Expression] = None,
+    root: Optional[str] = None,
+) -> pa.Table:
+    """Reads exported scores.
+
+    Args:
+        columns: The columns to read, e.g. `["run_id", "overall_score"]`. If
+            None, every column.
+        filter: Only rows matching this expression, e.g.
+            `ds.field("run_id") == run_id`. Partitions and row groups that
+            cannot match are skipped without being read.
+        root: The export directory. If None, `ANALYTICS_DIR` is used.
+    """
+    return _scan(root, SCORES, scores_schema(), columns, filter)
+
+
+def scan_texts(
+    columns: Optional[List[str]] = None,
+    filter: Optional[ds.Expression] = None,
+    root: Optional[str] = None,
+) -> pa.Table:
+    """Reads exported note texts; see `scan_scores`."""
+    return _scan(root, TEXTS, texts_schema(), columns, filter)
+
+
+def main():
+    """Exports stored runs to Parquet."""
+    parser = argparse.ArgumentParser(
+        description="Export runs from the run store to Parquet datasets of "
+        "scores and note texts, partitioned by run."
+    )
+    parser.add_argument(
+        "--runs",
+        nargs="+",
+        help="The runs to (re-)export (default: every run not exported yet).",
+    )
+    parser.add_argument(
+        "--output",
+        default=settings.ANALYTICS_DIR,
+        help=f"The export directory (default: {settings.ANALYTICS_DIR}).",
+    )
+    args = parser.parse_args()
+    setup_logging()
+
+    exported = export_runs(RunStore(), args.output, args.runs)
+    if not exported:
+        logging.info(f"Every stored run is already exported to {args.output}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,617 @@
+"""
+Offline batch-API mode for note generation and judging.
+
+Instead of live calls, every generation request (and afterwards every judge
+request) of a run is rendered into a JSONL file in the provider's batch format,
+submitted, polled until the batch finishes, and the answers are ingested back
+into `ClinicalNote` / `EvaluationResult` objects in the run's checkpoint.
+
+`OpenAIBatchBackend` talks to the OpenAI batch endpoint; `LocalBatchBackend`
+is a file-based stand-in that answers requests locally so the whole flow can be
+exercised offline.
+
+A batch holds one request per note, so transcripts whose prompt would exceed
+`GENERATION_MAX_PROMPT_TOKENS` are not batched: they are generated map-reduce
+style through the live path of `generate_notes`, with the same cache keys.
+"""
+
+import abc
+import asyncio
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import openai
+from deepeval.metrics import BaseMetric, HallucinationMetric
+from deepeval.test_case import LLMTestCase
+
+from src.checkpoint import RunCheckpoint
+from src.core.cache import DiskCache
+from src.core.config import settings
+from src.core.llm import LLMCallError
+from src.core.tokens import count_tokens
+from src.data_loader import (
+    generate_notes,
+    note_cache,
+    note_cache_key,
+    stored_token_counts,
+)
+from src.evaluation import (
+    METRIC_FIELDS,
+    build_result,
+    get_metrics,
+    judge_cache,
+    known_scores,
+    metric_name,
+    note_test_case,
+)
+from src.pipeline import pending_notes, pending_records
+from src.prompts.judge import (
+    get_geval_judge_messages,
+    get_hallucination_judge_messages,
+    parse_geval_judgement,
+    parse_hallucination_judgement,
+)
+from src.prompts.versions import fits_token_budget, get_prompt_messages
+from src.reference_metrics import reference_scores, score_rows
+from src.result_table import ResultTable
+from src.schemas.metrics import MultiCriteriaJudgeMetric
+from src.schemas.models import ClinicalNote, LLMCallStats
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+
+# Custom ID suffix of the combined request of the multi-criteria judge
+MULTI_CRITERIA_FIELD = "multi_criteria"
+LOCAL_BATCH_DIR = os.path.join("data", "batches")
+FAILED_STATUSES = {"failed", "expired", "cancelled"}
+
+
+def _request(custom_id: str, model: str, messages: List[Dict], **body) -> Dict:
+    return {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": BATCH_ENDPOINT,
+        "body": {"model": model, "temperature": 0, "messages": messages, **body},
+    }
+
+
+def render_generation_requests(
+    records: List[Tuple[str, Dict[str, str]]],
+    prompt_version: Optional[str] = None,
+    model: Optional[str] = None,
+) -> List[Dict]:
+    """Renders one `generate_note` request per (note ID, record) pair."""
+    return [
+        _request(
+            f"generate:{note_id}",
+            model or settings.GENERATION_LLM,
+            get_prompt_messages(
+                version=prompt_version, transcript=record["patient_convo"]
+            ),
+        )
+        for note_id, record in records
+    ]
+
+
+def request_field(metric: BaseMetric) -> str:
+    """Returns the custom ID suffix of a metric's judge requests."""
+    if isinstance(metric, MultiCriteriaJudgeMetric):
+        return MULTI_CRITERIA_FIELD
+    return METRIC_FIELDS[metric_name(metric)]
+
+
+def render_judge_requests(
+    notes: List[ClinicalNote],
+    metrics: Optional[List[BaseMetric]] = None,
+    missing: Optional[List[List[int]]] = None,
+) -> List[Dict]:
+    """Renders one judge request per (note, metric) pair.
+
+    With the multi-criteria judge, the GEval metrics of a note share one request.
+
+    Args:
+        notes: The notes to judge.
+        metrics: The metrics. If None, those of `get_metrics`.
+        missing: Per note, the indices of the metrics to judge it with (see
+            `known_scores`). If None, every metric.
+    """
+    metrics = metrics or get_metrics()
+    requests = []
+    for i, note in enumerate(notes):
+        for j in range(len(metrics)) if missing is None else missing[i]:
+            metric = metrics[j]
+            if isinstance(metric, MultiCriteriaJudgeMetric):
+                messages = metric.judge_messages(
+                    LLMTestCase(
+                        input=note.transcript,
+                        actual_output=note.generated_note,
+                        context=[note.ground_truth_note],
+                    )
+                )
+            elif isinstance(metric, HallucinationMetric):
+                messages = get_hallucination_judge_messages(
+                    note.generated_note, note.ground_truth_note
+                )
+            else:
+                messages = get_geval_judge_messages(
+                    metric.criteria,
+                    metric.evaluation_steps,
+                    note.transcript,
+                    note.generated_note,
+                    note.ground_truth_note,
+                )
+            requests.append(
+                _request(
+                    f"judge:{note.note_id}:{request_field(metric)}",
+                    settings.EVALUATION_LLM,
+                    messages,
+                    response_format={"type": "json_object"},
+                )
+            )
+    return requests
+
+
+def write_requests(requests: List[Dict], path: str) -> None:
+    """Writes batch requests as JSONL."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for request in requests:
+            f.write(json.dumps(request, ensure_ascii=False) + "\n")
+
+
+def parse_output(output: Dict) -> Tuple[str, Optional[str]]:
+    """Returns the custom ID and answer of one batch output line (None if it failed)."""
+    response = output.get("response") or {}
+    if output.get("error") or response.get("status_code") != 200:
+        logging.warning(
+            f"Batch request {output.get('custom_id')} failed: {output.get('error') or response}"
+        )
+        return output.get("custom_id"), None
+    return output["custom_id"], response["body"]["choices"][0]["message"]["content"]
+
+
+def ingest_generation_results(
+    records: List[Tuple[str, Dict[str, str]]], outputs: List[Dict]
+) -> List[ClinicalNote]:
+    """Turns generation batch outputs into ClinicalNote objects."""
+    records_by_id = dict(records)
+    notes = []
+    for output in outputs:
+        custom_id, content = parse_output(output)
+        note_id = custom_id.split(":", 1)[1]
+        if not content or note_id not in records_by_id:
+            continue
+        record = records_by_id[note_id]
+        notes.append(
+            ClinicalNote(
+                note_id=note_id,
+                transcript=record["patient_convo"],
+                note=record["soap_notes"],
+                generated_note=content.strip(),
+            )
+        )
+    return notes
+
+
+def parse_judge_outputs(
+    outputs: List[Dict],
+) -> Dict[Tuple[str, str], Tuple[float, str]]:
+    """Parses judge batch outputs into verdicts.
+
+    Returns:
+        The score and reason of every answered request, keyed by note ID and
+        request field. Multi-criteria verdicts hold the mean score and the
+        per-metric scores and reasons as JSON, like `MultiCriteriaJudgeMetric`.
+    """
+    multi_criteria: Optional[MultiCriteriaJudgeMetric] = None
+    verdicts = {}
+    for output in outputs:
+        custom_id, content = parse_output(output)
+        _, note_id, field = custom_id.split(":", 2)
+        if content is None:
+            continue
+        try:
+            if field == MULTI_CRITERIA_FIELD:
+                if multi_criteria is None:
+                    multi_criteria = get_metrics(multi_criteria=True)[-1]
+                parsed = multi_criteria.parse(content)
+                verdict = (
+                    sum(score for score, _ in parsed.values()) / len(parsed),
+                    json.dumps(
+                        {
+                            name: {"score": score, "reason": reason}
+                            for name, (score, reason) in parsed.items()
+                        }
+                    ),
+                )
+            elif field == "hallucination_score":
+                verdict = parse_hallucination_judgement(content)
+            else:
+                verdict = parse_geval_judgement(content)
+        except (ValueError, KeyError, TypeError) as e:
+            logging.warning(f"Could not parse judgement for {custom_id}: {e}")
+            continue
+        verdicts[note_id, field] = verdict
+    return verdicts
+
+
+def ingest_judge_results(
+    notes: List[ClinicalNote],
+    outputs: List[Dict],
+    scores: Optional[List[Dict[str, float]]] = None,
+    tiers: Optional[List[Dict[str, str]]] = None,
+    references: Optional[List[Optional[Dict[str, Optional[float]]]]] = None,
+) -> ResultTable:
+    """Turns judge batch outputs into evaluation results.
+
+    Notes missing any metric score are left out, so they are judged again when
+    the run is resumed.
+
+    Args:
+        notes: The judged notes.
+        outputs: The batch outputs.
+        scores: Per note, the scores known without the batch, keyed by metric
+            name (see `known_scores`).
+        tiers: Per note, the tiers of those scores.
+        references: Per note, the reference metrics.
+    """
+    names = {field: name for name, field in METRIC_FIELDS.items()}
+    judged: Dict[str, Dict[str, float]] = {}
+    for (note_id, field), (score, reason) in parse_judge_outputs(outputs).items():
+        judged.setdefault(note_id, {}).update(
+            MultiCriteriaJudgeMetric.breakdown(reason)
+            if field == MULTI_CRITERIA_FIELD
+            else {names[field]: score}
+        )
+
+    results = ResultTable(len(notes))
+    for i, note in enumerate(notes):
+        note_scores = {**(scores[i] if scores else {}), **judged.get(note.note_id, {})}
+        if len(note_scores) < len(METRIC_FIELDS):
+            logging.warning(f"Incomplete judgements for note {note.note_id}.")
+            continue
+        results.append(
+            build_result(
+                note,
+                note_scores,
+                tiers[i] if tiers else None,
+                reference=references[i] if references else None,
+            )
+        )
+    return results
+
+
+class BatchBackend(abc.ABC):
+    """A provider of asynchronous batch execution."""
+
+    @abc.abstractmethod
+    def submit(self, path: str) -> str:
+        """Submits a JSONL request file and returns the batch ID."""
+
+    @abc.abstractmethod
+    def status(self, batch_id: str) -> str:
+        """Returns the batch status, e.g. `in_progress` or `completed`."""
+
+    @abc.abstractmethod
+    def results(self, batch_id: str) -> List[Dict]:
+        """Returns the output lines of a completed batch, including failed requests."""
+
+
+class OpenAIBatchBackend(BatchBackend):
+    """The OpenAI batch API."""
+
+    def __init__(self, client: Optional[openai.OpenAI] = None):
+        self.client = client or openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+
+    def submit(self, path: str) -> str:
+        with open(path, "rb") as f:
+            input_file = self.client.files.create(file=f, purpose="batch")
+        batch = self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=BATCH_ENDPOINT,
+            completion_window="24h",
+        )
+        return batch.id
+
+    def status(self, batch_id: str) -> str:
+        return self.client.batches.retrieve(batch_id).status
+
+    def results(self, batch_id: str) -> List[Dict]:
+        batch = self.client.batches.retrieve(batch_id)
+        outputs = []
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if file_id:
+                text = self.client.files.content(file_id).text
+                outputs.extend(json.loads(line) for line in text.splitlines() if line)
+        return outputs
+
+
+def stand_in_responder(body: Dict[str, Any]) -> str:
+    """Default answer of the local backend: a canned note or a passing judgement."""
+    if body.get("response_format"):
+        judgement = {"score": 10, "verdict": "no", "reason": "Local batch stand-in."}
+        # Multi-criteria judge prompts list the keys they expect an answer for
+        keys = re.search(
+            r"exactly the keys (.+?), each in", body["messages"][-1]["content"]
+        )
+        if keys:
+            return json.dumps(
+                {key: judgement for key in re.findall(r'"([^"]+)"', keys.group(1))}
+            )
+        return json.dumps(judgement)
+    return "Subjective: -\nObjective: -\nAssessment: -\nPlan: -"
+
+
+class LocalBatchBackend(BatchBackend):
+    """A file-based stand-in for the batch API.
+
+    Each submitted file is copied to `<directory>/<batch_id>/input.jsonl`. The
+    first status poll answers every request with `responder` and writes the
+    answers to `output.jsonl` in the provider's output format.
+    """
+
+    def __init__(
+        self,
+        directory: str = LOCAL_BATCH_DIR,
+        responder: Callable[[Dict[str, Any]], str] = stand_in_responder,
+    ):
+        self.directory = directory
+        self.responder = responder
+
+    def _path(self, batch_id: str, name: str) -> str:
+        return os.path.join(self.directory, batch_id, name)
+
+    def submit(self, path: str) -> str:
+        batch_id = f"local-batch-{uuid.uuid4().hex[:12]}"
+        os.makedirs(os.path.join(self.directory, batch_id))
+        shutil.copyfile(path, self._path(batch_id, "input.jsonl"))
+        return batch_id
+
+    def _answer(self, request: Dict) -> Dict:
+        try:
+            content = self.responder(request["body"])
+        except Exception as e:
+            return {
+                "custom_id": request["custom_id"],
+                "response": None,
+                "error": {"message": str(e)},
+            }
+        return {
+            "id": f"batch-req-{uuid.uuid4().hex[:12]}",
+            "custom_id": request["custom_id"],
+            "response": {
+                "status_code": 200,
+                "body": {
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {"role": "assistant", "content": content},
+                        }
+                    ]
+                },
+            },
+            "error": None,
+        }
+
+    def status(self, batch_id: str) -> str:
+        output_path = self._path(batch_id, "output.jsonl")
+        if not os.path.exists(output_path):
+            with open(self._path(batch_id, "input.jsonl"), encoding="utf-8") as f:
+                answers = [self._answer(json.loads(line)) for line in f if line.strip()]
+            write_requests(answers, output_path)
+        return "completed"
+
+    def results(self, batch_id: str) -> List[Dict]:
+        with open(self._path(batch_id, "output.jsonl"), encoding="utf-8") as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+
+def wait_for_batch(
+    backend: BatchBackend, batch_id: str, poll_interval: Optional[float] = None
+) -> List[Dict]:
+    """Polls a batch until it finishes and returns its outputs."""
+    poll_interval = poll_interval or settings.BATCH_POLL_INTERVAL
+    while True:
+        status = backend.status(batch_id)
+        if status == "completed":
+            return backend.results(batch_id)
+        if status in FAILED_STATUSES:
+            raise RuntimeError(f"Batch {batch_id} ended with status '{status}'.")
+        logging.info(f"Batch {batch_id} is {status}; polling again in {poll_interval}s")
+        time.sleep(poll_interval)
+
+
+def _run_batch(
+    checkpoint: RunCheckpoint, stage: str, requests: List[Dict], backend: BatchBackend
+) -> List[Dict]:
+    """Submits a stage's requests, or picks up the batch submitted before a crash."""
+    id_path = os.path.join(checkpoint.directory, f"{stage}_batch_id")
+    if os.path.exists(id_path):
+        with open(id_path) as f:
+            batch_id = f.read().strip()
+        logging.info(f"Resuming {stage} batch {batch_id}")
+    else:
+        requests_path = os.path.join(checkpoint.directory, f"{stage}_batch.jsonl")
+        write_requests(requests, requests_path)
+        batch_id = backend.submit(requests_path)
+        with open(id_path, "w") as f:
+            f.write(batch_id)
+        logging.info(f"Submitted {len(requests)} {stage} requests as batch {batch_id}")
+
+    outputs = wait_for_batch(backend, batch_id)
+    # The batch has been ingested; a later resume submits a new one for leftovers
+    os.remove(id_path)
+    return outputs
+
+
+def _generate_oversized(
+    checkpoint: RunCheckpoint,
+    records: List[Tuple[str, Dict[str, str]]],
+    token_counts: List[int],
+    cache: Optional[DiskCache],
+) -> int:
+    """Generates the notes of transcripts too long for one prompt, live and chunked.
+
+    Returns:
+        The number of notes that failed to generate.
+    """
+    logging.info(
+        f"Generating {len(records)} oversized transcripts map-reduce style "
+        "instead of in the batch."
+    )
+    calls: Dict[int, List[LLMCallStats]] = {}
+    generated = asyncio.run(
+        generate_notes(
+            [record["patient_convo"] for _, record in records],
+            prompt_version=checkpoint.metadata.get("prompt_version"),
+            model=checkpoint.metadata.get("generation_model"),
+            cache=cache,
+            token_counts=token_counts,
+            calls=calls,
+        )
+    )
+    notes, failed = [], 0
+    for index, ((note_id, record), note) in enumerate(zip(records, generated)):
+        if isinstance(note, LLMCallError):
+            checkpoint.append_failure(note_id, "generation", str(note))
+            failed += 1
+            continue
+        notes.append(
+            ClinicalNote(
+                note_id=note_id,
+                transcript=record["patient_convo"],
+                note=record["soap_notes"],
+                generated_note=note,
+                generation_calls=calls.get(index, []),
+            )
+        )
+    checkpoint.append_notes(notes)
+    return failed
+
+
+def run_batch_generation_stage(
+    checkpoint: RunCheckpoint, backend: BatchBackend, use_cache: bool = True
+) -> int:
+    """Batch counterpart of `run_generation_stage`.
+
+    Transcripts that do not fit `GENERATION_MAX_PROMPT_TOKENS` are generated
+    chunk by chunk through the live path instead (see `generate_notes`).
+
+    Returns:
+        The number of records that still have no note after this stage.
+    """
+    prompt_version = checkpoint.metadata.get("prompt_version")
+    model = checkpoint.metadata.get("generation_model")
+    cache = note_cache() if use_cache else None
+    token_counts = stored_token_counts(model)
+    pending, cached_notes, oversized, oversized_tokens = [], [], [], []
+    keys: Dict[str, str] = {}
+    for note_id, record in pending_records(checkpoint):
+        transcript = record["patient_convo"]
+        tokens = (
+            token_counts[int(note_id)]
+            if token_counts is not None
+            else count_tokens(transcript, model or settings.GENERATION_LLM)
+        )
+        if not fits_token_budget(prompt_version, tokens, model):
+            oversized.append((note_id, record))
+            oversized_tokens.append(tokens)
+            continue
+        messages = get_prompt_messages(version=prompt_version, transcript=transcript)
+        # Like `generate_notes`, whose keys only add the chunk size for chunked notes
+        keys[note_id] = note_cache_key(messages, model)
+        cached = cache.get(keys[note_id]) if cache else None
+        if cached is None:
+            pending.append((note_id, record))
+            continue
+        cached_notes.append(
+            ClinicalNote(
+                note_id=note_id,
+                transcript=record["patient_convo"],
+                note=record["soap_notes"],
+                generated_note=cached,
+            )
+        )
+    checkpoint.append_notes(cached_notes)
+    failed = (
+        _generate_oversized(checkpoint, oversized, oversized_tokens, cache)
+        if oversized
+        else 0
+    )
+    if not pending:
+        return failed
+
+    outputs = _run_batch(
+        checkpoint,
+        "generation",
+        render_generation_requests(pending, prompt_version, model),
+        backend,
+    )
+    notes = ingest_generation_results(pending, outputs)
+    checkpoint.append_notes(notes)
+    generated = {note.note_id for note in notes}
+    for note_id, _ in pending:
+        if note_id not in generated:
+            checkpoint.append_failure(note_id, "generation", "Batch request failed.")
+    if cache is not None:
+        for note in notes:
+            cache.set(keys[note.note_id], note.generated_note)
+    return failed + len(pending) - len(notes)
+
+
+def run_batch_evaluation_stage(
+    checkpoint: RunCheckpoint,
+    backend: BatchBackend,
+    use_cache: bool = True,
+    pre_metrics: Optional[bool] = None,
+    reference_metrics: Optional[bool] = None,
+) -> ResultTable:
+    """Batch counterpart of `run_evaluation_stage`.
+
+    Like live runs, clear-cut pairs are scored with the local pre-metrics and
+    pairs judged before are taken from the judgement cache; only the remaining
+    pairs are sent in the batch, and their verdicts are cached in turn.
+
+    Args:
+        checkpoint: The run.
+        backend: The batch API.
+        use_cache: Read and write the judgement cache.
+        pre_metrics: As for `run_evaluation`.
+        reference_metrics: As for `run_evaluation`.
+
+    Returns:
+        All evaluation results of the run, including those from earlier attempts.
+    """
+    pending = pending_notes(checkpoint)
+    if not pending:
+        return checkpoint.load_results()
+    if pre_metrics is None:
+        pre_metrics = settings.PRE_METRICS
+    if reference_metrics is None:
+        reference_metrics = settings.REFERENCE_METRICS
+
+    metrics = get_metrics()
+    cache = judge_cache() if use_cache else None
+    keys, scores, tiers, missing = known_scores(
+        pending, [note_test_case(note) for note in pending], metrics, cache, pre_metrics
+    )
+    requests = render_judge_requests(pending, metrics, missing)
+    outputs = _run_batch(checkpoint, "judge", requests, backend) if requests else []
+    if cache is not None:
+        verdicts = parse_judge_outputs(outputs)
+        for i, note in enumerate(pending):
+            for j in missing[i]:
+                verdict = verdicts.get((note.note_id, request_field(metrics[j])))
+                if verdict is not None:
+                    score, reason = verdict
+                    cache.set(keys[i][j], {"score": score, "reason": reason})
+    references = score_rows(reference_scores(pending)) if reference_metrics else None
+    checkpoint.append_results(
+        ingest_judge_results(pending, outputs, scores, tiers, references)
+    )
+    return checkpoint.load_results()
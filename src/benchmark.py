@@ -0,0 +1,260 @@
+"""
+Throughput benchmark of the live path against a local fake endpoint.
+
+For every dataset size, a synthetic dataset is written to a temporary
+directory and `load_data` → `run_evaluation` → `RunStore` runs in a fresh
+worker process whose OpenAI clients point at a `FakeOpenAIServer` (see
+`src/fake_openai.py`). Rate limits are lifted so that the suite itself, not
+the provider budget, is what is measured; the fake endpoint's latency, error
+and 429 rates are configurable.
+
+Per size, the report has the notes per second, the peak RSS of the worker and
+the p50/p95/p99 wall time of the generation and judge calls. It is written to
+`data/benchmarks/<benchmark-id>.json`.
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict
+from typing import Any, Dict, List, Optional
+
+from src.checkpoint import new_run_id
+from src.core.config import settings
+from src.core.logging_config import setup_logging
+from src.data_loader import load_data
+from src.evaluation import run_evaluation
+from src.fake_openai import FakeServerConfig, start_fake_server
+from src.pipeline import call_report
+from src.result_table import ResultTable
+from src.run_store import RunStore
+
+BENCHMARKS_DIR = os.path.join("data", "benchmarks")
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000]
+
+_SYMPTOMS = ["dizziness", "chest pain", "a cough", "headaches", "back pain", "fatigue"]
+_DRUGS = [
+    "ibuprofen 400 mg",
+    "lisinopril 20 mg",
+    "metformin 500 mg",
+    "amoxicillin 500 mg",
+]
+
+
+def write_dataset(path: str, size: int, seed: int = 0) -> None:
+    """Writes a synthetic dataset of `size` conversations in the dataset's format."""
+    rng = random.Random(seed)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for i in range(size):
+            symptom, drug = rng.choice(_SYMPTOMS), rng.choice(_DRUGS)
+            days = rng.randint(1, 14)
+            record = {
+                "patient_convo": (
+                    f"Doctor: What brings you in today?\n"
+                    f"Patient: I have had {symptom} for {days} days.\n"
+                    f"Doctor: Let's start you on {drug} and follow up in two weeks."
+                ),
+                "soap_notes": (
+                    f"S: {symptom.capitalize()} for {days} days.\nO: Vitals stable.\n"
+                    f"A: {symptom.capitalize()}.\nP: {drug}, follow up in two weeks."
+                ),
+            }
+            f.write(("," if i else "") + json.dumps(record))
+        f.write("]")
+
+
+def worker_env(base_url: str, concurrency: int, cache_dir: str) -> Dict[str, str]:
+    """Returns the environment of a worker that talks to the fake endpoint."""
+    env = dict(os.environ)
+    env.update(
+        {
+            "OPENAI_BASE_URL": base_url,
+            "OPENAI_API_KEY": "benchmark",
+            "CONFIDENT_API_KEY": "benchmark",
+            "DEEPEVAL_TELEMETRY_OPT_OUT": "YES",
+            "CACHE_DIR": cache_dir,
+            "GENERATION_MAX_CONCURRENCY": str(concurrency),
+            "EVALUATION_METRIC_CONCURRENCY": str(concurrency),
+            "GENERATION_RPM": str(10**9),
+            "GENERATION_TPM": str(10**12),
+        }
+    )
+    return env
+
+
+def run_worker(size: int, directory: str, batch_size: Optional[int] = None) -> Dict:
+    """Runs the live path on a synthetic dataset and measures it.
+
+    Must run in a process started with the environment from `worker_env`,
+    since the OpenAI clients read the fake endpoint's URL when they are created.
+    """
+    batch_size = batch_size or settings.EVALUATION_BATCH_SIZE
+    path = os.path.join(directory, "dataset.json")
+    write_dataset(path, size)
+
+    start = time.perf_counter()
+    notes = load_data(use_cache=False, path=path)
+    generated = time.perf_counter()
+    results = ResultTable(len(notes))
+    for i in range(0, len(notes), batch_size):
+        results.extend(run_evaluation(notes[i : i + batch_size], use_cache=False))
+    evaluated = time.perf_counter()
+    store = RunStore(os.path.join(directory, "runs.db"))
+    store.create_run("benchmark", {})
+    for i in range(0, len(results), batch_size):
+        store.append_results("benchmark", results[i : i + batch_size])
+    end = time.perf_counter()
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mb = peak_rss / (2**20 if sys.platform == "darwin" else 2**10)
+    return {
+        "notes": size,
+        "results": len(results),
+        "seconds": end - start,
+        "generation_seconds": generated - start,
+        "evaluation_seconds": evaluated - generated,
+        "store_seconds": end - evaluated,
+        "notes_per_second": len(results) / (end - start),
+        "peak_rss_mb": peak_rss_mb,
+        "calls": call_report(results),
+    }
+
+
+def run_benchmark(
+    sizes: List[int],
+    config: Optional[FakeServerConfig] = None,
+    concurrency: int = 64,
+    batch_size: Optional[int] = None,
+    root: str = BENCHMARKS_DIR,
+) -> Dict[str, Any]:
+    """Benchmarks every dataset size in its own worker process.
+
+    Returns:
+        The report: the fake endpoint's configuration and the measurements of
+        every size.
+    """
+    config = config or FakeServerConfig()
+    report: Dict[str, Any] = {
+        "benchmark_id": new_run_id(),
+        "server": asdict(config),
+        "concurrency": concurrency,
+        "batch_size": batch_size,
+        "sizes": [],
+    }
+    server, base_url = start_fake_server(config)
+    try:
+        for size in sizes:
+            with tempfile.TemporaryDirectory() as directory:
+                command = [sys.executable, "-m", "src.benchmark", "--worker"]
+                command += ["--sizes", str(size), "--directory", directory]
+                if batch_size:
+                    command += ["--batch-size", str(batch_size)]
+                output = subprocess.run(
+                    command,
+                    env=worker_env(base_url, concurrency, directory),
+                    capture_output=True,
+                    text=True,
+                    check=True,
+                ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            report["sizes"].append(result)
+            judge = result["calls"].get("judge", {})
+            logging.info(
+                f"{size} notes: {result['notes_per_second']:.1f} notes/s, peak RSS "
+                f"{result['peak_rss_mb']:.0f} MB, judge call p50/p95/p99 "
+                f"{judge.get('wall_time_p50', 0):.3f}/{judge.get('wall_time_p95', 0):.3f}/"
+                f"{judge.get('wall_time_p99', 0):.3f}s"
+            )
+    finally:
+        server.terminate()
+
+    os.makedirs(root, exist_ok=True)
+    with open(os.path.join(root, f"{report['benchmark_id']}.json"), "w") as f:
+        json.dump(report, f, indent=4)
+    return report
+
+
+def main():
+    """Runs the throughput benchmark against a local fake OpenAI endpoint."""
+    parser = argparse.ArgumentParser(
+        description="Measure notes/sec, peak memory and tail latency of the live "
+        "path against a local fake OpenAI endpoint."
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=DEFAULT_SIZES,
+        help="Dataset sizes to benchmark (default: 100 1000 10000 100000).",
+    )
+    parser.add_argument(
+        "--latency-median",
+        type=float,
+        default=0.05,
+        help="Median latency of the fake endpoint in seconds (default: 0.05).",
+    )
+    parser.add_argument(
+        "--latency-sigma",
+        type=float,
+        default=0.5,
+        help="Spread of the lognormal latency; 0 is constant (default: 0.5).",
+    )
+    parser.add_argument(
+        "--error-rate", type=float, default=0.0, help="Share of 500 responses."
+    )
+    parser.add_argument(
+        "--rate-limit-rate", type=float, default=0.0, help="Share of 429 responses."
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=64,
+        help="Generation calls and judge calls per metric in flight (default: 64).",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        help="Notes per run_evaluation call (default: EVALUATION_BATCH_SIZE).",
+    )
+    parser.add_argument(
+        "--seed", type=int, default=0, help="Seed of the fake endpoint."
+    )
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--directory", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        logging.basicConfig(level=logging.WARNING)
+        print(json.dumps(run_worker(args.sizes[0], args.directory, args.batch_size)))
+        return
+
+    setup_logging()
+    report = run_benchmark(
+        args.sizes,
+        FakeServerConfig(
+            latency_median=args.latency_median,
+            latency_sigma=args.latency_sigma,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            seed=args.seed,
+        ),
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+    )
+    logging.info(
+        "Benchmark complete. Report saved to "
+        f"{os.path.join(BENCHMARKS_DIR, report['benchmark_id'] + '.json')}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Calibration of the multi-criteria judge against the per-metric GEval judges.
+
+Judges the notes of a finished run twice, once with one GEval call per metric
+and once with the single multi-criteria call, and reports per metric how far
+the two sets of scores are apart: mean absolute difference, mean bias
+(multi-criteria minus per-metric), Pearson correlation and how often both agree
+on pass/fail at each metric's threshold. Both modes bypass the judgement cache,
+so their wall times compare actual judge calls, and both run only the GEval
+metrics, without local pre-metrics or reference metrics, so that every score
+compared comes from the judge and the timings cover the same work. Run it before switching
+`MULTI_CRITERIA_JUDGE` on for a new judge model or prompt version.
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import time
+from typing import Dict, List, Optional
+
+from src.checkpoint import RunCheckpoint
+from src.core.logging_config import setup_logging
+from src.evaluation import METRIC_FIELDS, get_hyperparameters, run_evaluation
+from src.schemas.models import EvaluationResult
+from src.tiered import metric_thresholds
+
+CALIBRATION_FILE = "calibration.json"
+
+# The metrics the multi-criteria judge replaces
+CRITERIA_METRICS = [name for name in METRIC_FIELDS if "[GEval]" in name]
+CRITERIA_FIELDS = [METRIC_FIELDS[name] for name in CRITERIA_METRICS]
+
+
+def compare_scores(
+    reference: List[EvaluationResult],
+    candidate: List[EvaluationResult],
+    thresholds: Optional[Dict[str, float]] = None,
+) -> Dict[str, Dict[str, Optional[float]]]:
+    """Compares two judgements of the same notes, metric by metric.
+
+    Only notes judged in both sets are compared.
+
+    Args:
+        reference: The per-metric judgements.
+        candidate: The multi-criteria judgements.
+        thresholds: The pass threshold of each field. If None, those of
+            `metric_thresholds`.
+
+    Returns:
+        Per EvaluationResult field: `mean_abs_diff`, `mean_bias` (candidate minus
+        reference), `pearson` (None if either side has no variance) and
+        `pass_agreement` (the share of notes both put on the same side of the
+        field's threshold).
+    """
+    by_id = {r.note.note_id: r for r in candidate}
+    pairs = [(r, by_id[r.note.note_id]) for r in reference if r.note.note_id in by_id]
+    report: Dict[str, Dict[str, Optional[float]]] = {}
+    if not pairs:
+        return report
+    thresholds = thresholds or metric_thresholds()
+    for field in CRITERIA_FIELDS:
+        threshold = thresholds[field]
+        ref = [getattr(r, field) for r, _ in pairs]
+        cand = [getattr(c, field) for _, c in pairs]
+        try:
+            pearson = statistics.correlation(ref, cand)
+        except statistics.StatisticsError:
+            pearson = None
+        report[field] = {
+            "mean_abs_diff": statistics.fmean(abs(c - r) for r, c in zip(ref, cand)),
+            "mean_bias": statistics.fmean(c - r for r, c in zip(ref, cand)),
+            "pearson": pearson,
+            "pass_agreement": statistics.fmean(
+                (r >= threshold) == (c >= threshold) for r, c in zip(ref, cand)
+            ),
+        }
+    return report
+
+
+def calibrate(checkpoint: RunCheckpoint, limit: Optional[int] = None) -> Dict:
+    """Judges a run's notes both ways and writes the comparison to `calibration.json`.
+
+    Cached verdicts would make both modes look instant, so every note is judged
+    again in both, on the GEval metrics only.
+
+    Returns:
+        The report, with the number of notes, the wall time of each judge mode
+        and the per-metric comparison.
+    """
+    notes = checkpoint.load_notes()[:limit]
+    metadata = checkpoint.metadata
+    hyperparameters = get_hyperparameters(
+        metadata.get("prompt_version"), metadata.get("generation_model")
+    )
+    timings = {}
+    judgements = {}
+    for mode, multi_criteria in (("per_metric", False), ("multi_criteria", True)):
+        start = time.monotonic()
+        judgements[mode] = run_evaluation(
+            notes,
+            hyperparameters=hyperparameters,
+            use_cache=False,
+            multi_criteria=multi_criteria,
+            pre_metrics=False,
+            only_metrics=CRITERIA_METRICS,
+            reference_metrics=False,
+        )
+        timings[mode] = time.monotonic() - start
+
+    report = {
+        "run_id": checkpoint.run_id,
+        "notes": len(notes),
+        "seconds": timings,
+        "metrics": compare_scores(
+            judgements["per_metric"], judgements["multi_criteria"]
+        ),
+    }
+    with open(os.path.join(checkpoint.directory, CALIBRATION_FILE), "w") as f:
+        json.dump(report, f, indent=4)
+    return report
+
+
+def main():
+    """Compares the multi-criteria judge with the per-metric judges on a run."""
+    setup_logging()
+
+    parser = argparse.ArgumentParser(
+        description="Calibrate the multi-criteria judge against per-metric GEval."
+    )
+    parser.add_argument("run_id", help="The run whose notes are judged.")
+    parser.add_argument("--limit", type=int, help="Only judge the first N notes.")
+    args = parser.parse_args()
+
+    checkpoint = RunCheckpoint.resume(args.run_id)
+    report = calibrate(checkpoint, limit=args.limit)
+
+    logging.info(
+        f"Judged {report['notes']} notes: per-metric "
+        f"{report['seconds']['per_metric']:.1f}s, multi-criteria "
+        f"{report['seconds']['multi_criteria']:.1f}s"
+    )
+    for field, stats in report["metrics"].items():
+        pearson = stats["pearson"]
+        logging.info(
+            f"{field:<28} |diff|={stats['mean_abs_diff']:.3f} "
+            f"bias={stats['mean_bias']:+.3f} "
+            f"r={'n/a' if pearson is None else f'{pearson:.3f}'} "
+            f"agreement={stats['pass_agreement']:.0%}"
+        )
+    logging.info(
+        f"Report saved to {os.path.join(checkpoint.directory, CALIBRATION_FILE)}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Per-run checkpoints for the generation and evaluation stages.
+
+Every run gets a directory under `data/runs/<run_id>/` holding its settings
+(`run.json`) and one append-only JSONL file per stage. Records are appended as
+soon as they are produced, so a crash loses at most the calls that were in
+flight, and a resumed run only processes the records still missing. A
+checkpoint opened with a `RunStore` also appends every batch of results to
+the run history store.
+"""
+
+import json
+import logging
+import os
+import uuid
+from datetime import datetime, timezone
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional, Set
+
+from src.result_table import ResultTable
+from src.schemas.models import ClinicalNote, EvaluationResult
+
+if TYPE_CHECKING:
+    from src.run_store import RunStore
+
+RUNS_DIR = os.path.join("data", "runs")
+
+GENERATION_FILE = "generation.jsonl"
+EVALUATION_FILE = "evaluation.jsonl"
+FAILURES_FILE = "failures.jsonl"
+METADATA_FILE = "run.json"
+
+
+def new_run_id() -> str:
+    """Returns a sortable, unique run identifier such as `20250801-142233-3fa2c1`."""
+    timestamp = datetime.now(timezone.utc).strftime("%Y%m%d-%H%M%S")
+    return f"{timestamp}-{uuid.uuid4().hex[:6]}"
+
+
+def _note_order(note_id: str) -> Any:
+    # Dataset positions sort numerically; any other identifier sorts after them
+    return (0, int(note_id), "") if note_id.isdigit() else (1, 0, note_id)
+
+
+class RunCheckpoint:
+    """Append-only storage of the outputs of one pipeline run."""
+
+    def __init__(
+        self, run_id: str, root: str = RUNS_DIR, store: Optional["RunStore"] = None
+    ):
+        self.run_id = run_id
+        self.directory = os.path.join(root, run_id)
+        self.store = store
+
+    @classmethod
+    def create(
+        cls,
+        metadata: Dict[str, Any],
+        root: str = RUNS_DIR,
+        store: Optional["RunStore"] = None,
+    ) -> "RunCheckpoint":
+        """Starts a new run and records the settings it was started with."""
+        checkpoint = cls(new_run_id(), root=root, store=store)
+        os.makedirs(checkpoint.directory)
+        with open(checkpoint._path(METADATA_FILE), "w") as f:
+            json.dump({"run_id": checkpoint.run_id, **metadata}, f, indent=4)
+        return checkpoint
+
+    @classmethod
+    def resume(
+        cls, run_id: str, root: str = RUNS_DIR, store: Optional["RunStore"] = None
+    ) -> "RunCheckpoint":
+        """Opens an existing run."""
+        checkpoint = cls(run_id, root=root, store=store)
+        if not os.path.exists(checkpoint._path(METADATA_FILE)):
+            raise FileNotFoundError(f"No checkpoint found for run {run_id}")
+        return checkpoint
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        with open(self._path(METADATA_FILE), "r") as f:
+            return json.load(f)
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _append(self, name: str, records: Iterable[Dict[str, Any]]) -> None:
+        path = self._path(name)
+        payload = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records)
+        with open(path, "ab+") as f:
+            # Terminate a line torn by a crash so the next record stays readable
+            if f.tell() > 0:
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+            f.write(payload.encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _read(self, name: str) -> Iterator[Dict[str, Any]]:
+        path = self._path(name)
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line_number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logging.warning(
+                        f"Skipping unreadable line {line_number} of {path} (interrupted write)."
+                    )
+
+    def append_notes(self, notes: Iterable[ClinicalNote]) -> None:
+        """Records generated notes."""
+        self._append(GENERATION_FILE, (note.model_dump() for note in notes))
+
+    def load_notes(self) -> List[ClinicalNote]:
+        """Returns the generated notes of this run, ordered by note ID."""
+        notes = {}
+        for record in self._read(GENERATION_FILE):
+            note = ClinicalNote.model_validate(record)
+            notes[note.note_id] = note
+        return [notes[note_id] for note_id in sorted(notes, key=_note_order)]
+
+    def append_results(self, results: Iterable[EvaluationResult]) -> None:
+        """Records evaluation results, in the run store too if there is one."""
+        results = list(results)
+        self._append(EVALUATION_FILE, (result.model_dump() for result in results))
+        if self.store is not None:
+            self.store.append_results(self.run_id, results)
+
+    def load_results(self) -> ResultTable:
+        """Returns the evaluation results of this run, ordered by note ID."""
+        results = {}
+        for record in self._read(EVALUATION_FILE):
+            result = EvaluationResult.model_validate(record)
+            results[result.note.note_id] = result
+        return ResultTable.from_results(
+            results[note_id] for note_id in sorted(results, key=_note_order)
+        )
+
+    def append_failure(self, note_id: str, stage: str, error: str) -> None:
+        """Records that a stage failed for a record; it stays pending for a resume."""
+        self._append(
+            FAILURES_FILE, [{"note_id": note_id, "stage": stage, "error": error}]
+        )
+
+    def load_failures(self) -> List[Dict[str, str]]:
+        """Returns every failure recorded for this run, oldest first."""
+        return list(self._read(FAILURES_FILE))
+
+    def completed_note_ids(self) -> Set[str]:
+        """Returns the IDs of records that already have a generated note."""
+        return {record["note_id"] for record in self._read(GENERATION_FILE)}
+
+    def completed_result_ids(self) -> Set[str]:
+        """Returns the IDs of notes that have already been evaluated."""
+        return {record["note"]["note_id"] for record in self._read(EVALUATION_FILE)}
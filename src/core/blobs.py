@@ -0,0 +1,97 @@
+"""
+Content-addressed, compressed storage of note texts.
+
+Transcripts and ground-truth notes are the same in every run over a dataset,
+so results store only the SHA-256 of their texts and the texts themselves live
+once in a `blobs` table, zlib-compressed. A text is written the first time its
+hash is seen; writing it again is a no-op.
+
+The table lives in a SQLite database, by default the run store's own file, so
+a store and the texts it references are kept and copied together.
+"""
+
+import hashlib
+import sqlite3
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional
+
+_SCHEMA = "CREATE TABLE IF NOT EXISTS blobs (hash TEXT PRIMARY KEY, data BLOB NOT NULL)"
+
+
+def text_hash(text: str) -> str:
+    """Returns the SHA-256 hex digest that addresses a text."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def write_blobs(connection: sqlite3.Connection, texts: Iterable[str]) -> List[str]:
+    """Stores texts through an open connection, in its current transaction.
+
+    Returns:
+        The hash of every text, in order.
+    """
+    connection.execute(_SCHEMA)
+    hashes, new = [], {}
+    for text in texts:
+        digest = text_hash(text)
+        hashes.append(digest)
+        new.setdefault(digest, text)
+    connection.executemany(
+        "INSERT OR IGNORE INTO blobs VALUES (?, ?)",
+        ((digest, zlib.compress(text.encode("utf-8"))) for digest, text in new.items()),
+    )
+    return hashes
+
+
+class BlobStore:
+    """Deduplicated texts in a SQLite file, addressed by their hash.
+
+    Reads go through one connection per thread, so loading the texts of many
+    results one by one does not reconnect every time.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30.0)
+            connection.execute(_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def put_many(self, texts: Iterable[str]) -> List[str]:
+        """Stores texts and returns their hashes, in order."""
+        connection = self._connection()
+        with connection:
+            return write_blobs(connection, texts)
+
+    def get_many(self, hashes: Iterable[str]) -> Dict[str, str]:
+        """Returns the stored texts with the given hashes, keyed by hash."""
+        hashes = list(dict.fromkeys(hashes))
+        texts = {}
+        # Stay well below SQLite's limit on query parameters
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start : start + 500]
+            rows = self._connection().execute(
+                f"SELECT hash, data FROM blobs WHERE hash IN "
+                f"({', '.join('?' * len(chunk))})",
+                chunk,
+            )
+            texts.update(
+                (digest, zlib.decompress(data).decode("utf-8")) for digest, data in rows
+            )
+        return texts
+
+    def get(self, digest: str) -> str:
+        """Returns the text with the given hash.
+
+        Raises:
+            KeyError: If no text with the hash is stored.
+        """
+        text: Optional[str] = self.get_many([digest]).get(digest)
+        if text is None:
+            raise KeyError(f"No text with hash {digest} in {self.path}")
+        return text
@@ -0,0 +1,102 @@
+"""
+Content-addressed on-disk cache for LLM outputs.
+
+Entries are JSON files named after the SHA-256 of everything that determines the
+output (model, rendered prompt, sampling parameters), so a changed input simply
+misses the cache instead of returning a stale value. The cache is bounded by total
+size and evicts least-recently-used entries first.
+
+Summing the size of a large cache walks its whole directory, so it is only done
+on the first write, and `shared_cache` hands every caller in a process the same
+instance of a directory's cache.
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from typing import Any, Optional
+
+
+def content_hash(*parts: Any) -> str:
+    """Returns a stable SHA-256 hex digest of JSON-serializable parts."""
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    """A size-bounded key/value store of JSON values in a local directory."""
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+        self._size: Optional[int] = None
+
+    @property
+    def size(self) -> int:
+        """The total size of the entries in bytes, summed on first use."""
+        if self._size is None:
+            self._size = sum(os.path.getsize(path) for path, _ in self._entries())
+        return self._size
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.json")
+
+    def _entries(self):
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith(".json"):
+                    path = os.path.join(root, name)
+                    yield path, os.path.getmtime(path)
+
+    def get(self, key: str) -> Optional[Any]:
+        """Returns the cached value for `key`, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        # Bump the modification time so eviction is least-recently-used
+        os.utime(path)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        """Stores `value` under `key`, evicting old entries if over budget."""
+        path = self._path(key)
+        size = self.size
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            previous = os.path.getsize(path)
+        except FileNotFoundError:
+            previous = 0
+
+        # Write atomically so a crash never leaves a truncated entry behind
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(value, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+        self._size = size + os.path.getsize(path) - previous
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _evict(self) -> None:
+        entries = sorted(self._entries(), key=lambda entry: entry[1])
+        evicted = 0
+        for path, _ in entries:
+            if self._size <= self.max_bytes:
+                break
+            self._size -= os.path.getsize(path)
+            os.remove(path)
+            evicted += 1
+        logging.info(f"Evicted {evicted} entries from cache at {self.directory}")
+
+
+@functools.lru_cache(maxsize=None)
+def shared_cache(directory: str, max_bytes: int) -> DiskCache:
+    """Returns the process-wide cache of a directory."""
+    return DiskCache(directory, max_bytes)
@@ -1,3 +1,5 @@
+from typing import Dict, List
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -12,6 +14,67 @@ class Settings(BaseSettings):
     # Prompt settings
     PROMPT_VERSION: str = "v2"  # version of the prompt to use for generation
 
+    # Generation throughput settings
+    GENERATION_MAX_CONCURRENCY: int = 16  # upper bound for in-flight requests
+    GENERATION_RPM: int = 500  # requests per minute allowed by the provider
+    GENERATION_TPM: int = 200_000  # tokens per minute allowed by the provider
+    GENERATION_MAX_PROMPT_TOKENS: int = 100_000  # longer prompts are map-reduced
+    GENERATION_CHUNK_TOKENS: int = 8_000  # transcript tokens per map-reduce chunk
+
+    # LLM call settings, shared by generation and judging
+    LLM_TIMEOUT: float = 120.0  # seconds before a single call is abandoned
+    LLM_MAX_RETRIES: int = 5  # retries for transient errors (429, 5xx, timeouts)
+    LLM_BACKOFF_BASE: float = 1.0  # seconds; doubled on every retry, with jitter
+    LLM_BACKOFF_MAX: float = 60.0  # upper bound for a single backoff
+    LLM_HEDGING: bool = False  # duplicate calls that run longer than the p95 latency
+    LLM_HEDGE_PERCENTILE: float = 95.0  # latency percentile that triggers a hedge
+    CIRCUIT_FAILURE_THRESHOLD: int = 5  # consecutive failures that open the circuit
+    CIRCUIT_RESET_TIMEOUT: float = 30.0  # seconds before a trial call is allowed
+
+    # Evaluation settings
+    EVALUATION_BATCH_SIZE: int = 25  # notes evaluated between two checkpoints
+    PIPELINE_QUEUE_SIZE: int = 100  # generated notes waiting for evaluation
+    EVALUATION_METRIC_CONCURRENCY: int = 8  # judge calls in flight per metric
+    EVALUATION_RETRY_PASSES: int = 1  # extra passes over failed (note, metric) pairs
+    MULTI_CRITERIA_JUDGE: bool = False  # score all GEval metrics in one judge call
+    PRE_METRICS: bool = False  # score clear-cut cases locally before the judge
+    PRE_METRIC_BAND_LOW: float = 0.2  # local scores from here ...
+    PRE_METRIC_BAND_HIGH: float = 0.8  # ... to here are ambiguous and go to the judge
+    TIERED_JUDGE: bool = False  # score with a cheap judge, escalate close calls
+    CHEAP_EVALUATION_LLM: str = "gpt-4.1-mini"  # first-tier judge model
+    ESCALATION_MARGIN: float = 0.1  # escalate scores this close to the threshold
+    CHEAP_JUDGE_SAMPLES: int = 1  # cheap judge samples per (note, metric) pair
+    CHEAP_JUDGE_TEMPERATURE: float = 0.7  # sampling temperature with several samples
+    CHEAP_JUDGE_MAX_SPREAD: float = 0.2  # escalate if samples differ by more
+    REFERENCE_METRICS: bool = True  # ROUGE-L, token F1 and entity overlap vs. truth
+    REFERENCE_METRICS_WORKERS: int = 0  # processes for large batches; 0 is one per CPU
+    REFERENCE_METRICS_CHUNK_SIZE: int = 2000  # notes per process-pool task
+
+    # Aggregation settings
+    SCORE_WEIGHTS: Dict[str, float] = {  # weight of each score in overall_score
+        "hallucination_score": 1.0,
+        "clinical_accuracy_score": 1.0,
+        "soap_structure_score": 1.0,
+        "clinical_safety_score": 1.0,
+        "medical_terminology_score": 1.0,
+    }
+    LOWER_IS_BETTER: List[str] = ["hallucination_score"]  # scores where 0 is best
+    BOOTSTRAP_RESAMPLES: int = 2000  # resamples for confidence intervals
+    BOOTSTRAP_CONFIDENCE: float = 0.95  # coverage of confidence intervals
+
+    # Batch API settings
+    BATCH_POLL_INTERVAL: float = 60.0  # seconds between two batch status checks
+
+    # Run history settings
+    RUN_STORE_PATH: str = "data/runs.db"  # SQLite store of every run's results
+    ANALYTICS_DIR: str = "data/analytics"  # Parquet exports of the stored runs
+    ANALYTICS_ROW_GROUP_SIZE: int = 10_000  # rows per Parquet row group
+
+    # Cache settings
+    CACHE_DIR: str = ".cache"  # root directory for on-disk caches
+    NOTE_CACHE_MAX_BYTES: int = 512 * 1024 * 1024  # size budget for generated notes
+    JUDGE_CACHE_MAX_BYTES: int = 256 * 1024 * 1024  # size budget for judge verdicts
+
     model_config = SettingsConfigDict(
         env_file=".env", env_file_encoding="utf-8", case_sensitive=False, extra="ignore"
     )
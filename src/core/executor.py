@@ -0,0 +1,134 @@
+"""
+Async executor for judge calls.
+
+Every (test case, metric) pair is an independent job. Jobs run concurrently on
+one event loop, with at most `EVALUATION_METRIC_CONCURRENCY` jobs per metric in
+flight, and each job measures its own copy of the metric so that concurrent
+jobs never share a score. A job that raises only fails itself: its outcome
+carries the error, and the failed jobs, and only those, are run again for up to
+`EVALUATION_RETRY_PASSES` further passes. Jobs and outcomes are keyed by a
+stable test case ID rather than by position, and each outcome carries the
+stats of the judge calls its job made. The time a job waits for its metric's
+concurrency slot counts as queue wait of its first call.
+"""
+
+import asyncio
+import copy
+import logging
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from deepeval.metrics import BaseMetric
+from deepeval.test_case import LLMTestCase
+
+from src.core.config import settings
+from src.core.instrumentation import record_calls
+from src.schemas.models import LLMCallStats
+
+
+class JudgeJob(NamedTuple):
+    """One metric to measure on one test case."""
+
+    test_case_id: str
+    metric_index: int
+
+
+class JudgeOutcome(NamedTuple):
+    """The verdict of a job, or the error that prevented it."""
+
+    job: JudgeJob
+    score: Optional[float]
+    reason: Optional[str]
+    error: Optional[str]
+    calls: Tuple[LLMCallStats, ...] = ()
+
+
+async def _measure(
+    job: JudgeJob, test_case: LLMTestCase, metric: BaseMetric, queue_wait: float = 0.0
+) -> JudgeOutcome:
+    # Metrics keep their verdict on the instance, so every job gets its own copy
+    metric = copy.copy(metric)
+    # GEval's __name__ appends another " [GEval]" to the name, so prefer `name`
+    label = getattr(metric, "name", None) or getattr(
+        metric, "__name__", type(metric).__name__
+    )
+    error = None
+    with record_calls(label) as calls:
+        try:
+            await metric.a_measure(test_case, _show_indicator=False)
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    if calls and queue_wait:
+        # The first call was held back while the job waited for its slot
+        calls[0] = calls[0].model_copy(
+            update={
+                "queue_wait": calls[0].queue_wait + queue_wait,
+                "wall_time": calls[0].wall_time + queue_wait,
+            }
+        )
+    if error is None and metric.score is None:
+        error = getattr(metric, "error", None) or "No score"
+    if error is not None:
+        return JudgeOutcome(job, None, None, error, tuple(calls))
+    return JudgeOutcome(job, metric.score, metric.reason, None, tuple(calls))
+
+
+async def arun_judge_jobs(
+    jobs: List[JudgeJob],
+    test_cases: Dict[str, LLMTestCase],
+    metrics: List[BaseMetric],
+    max_concurrency: Optional[int] = None,
+    retries: Optional[int] = None,
+) -> Dict[JudgeJob, JudgeOutcome]:
+    """Runs judge jobs and retries the failed ones.
+
+    Args:
+        jobs: The jobs to run.
+        test_cases: The test cases, keyed by test case ID.
+        metrics: The metrics the jobs' `metric_index` refers to.
+        max_concurrency: Jobs per metric in flight at once. If None,
+            `EVALUATION_METRIC_CONCURRENCY` is used.
+        retries: Extra passes over the failed jobs. If None,
+            `EVALUATION_RETRY_PASSES` is used.
+
+    Returns:
+        The last outcome of every job.
+    """
+    max_concurrency = max_concurrency or settings.EVALUATION_METRIC_CONCURRENCY
+    retries = settings.EVALUATION_RETRY_PASSES if retries is None else retries
+    limits = [asyncio.Semaphore(max_concurrency) for _ in metrics]
+
+    async def _run(job: JudgeJob) -> JudgeOutcome:
+        queued = time.monotonic()
+        async with limits[job.metric_index]:
+            return await _measure(
+                job,
+                test_cases[job.test_case_id],
+                metrics[job.metric_index],
+                time.monotonic() - queued,
+            )
+
+    outcomes: Dict[JudgeJob, JudgeOutcome] = {}
+    pending = list(jobs)
+    for attempt in range(retries + 1):
+        if attempt:
+            logging.warning(f"Retrying {len(pending)} failed judge calls.")
+        for outcome in await asyncio.gather(*(_run(job) for job in pending)):
+            outcomes[outcome.job] = outcome
+        pending = [job for job in pending if outcomes[job].error]
+        if not pending:
+            break
+    return outcomes
+
+
+def run_judge_jobs(
+    jobs: List[JudgeJob],
+    test_cases: Dict[str, LLMTestCase],
+    metrics: List[BaseMetric],
+    max_concurrency: Optional[int] = None,
+    retries: Optional[int] = None,
+) -> Dict[JudgeJob, JudgeOutcome]:
+    """Synchronous wrapper of `arun_judge_jobs`."""
+    return asyncio.run(
+        arun_judge_jobs(jobs, test_cases, metrics, max_concurrency, retries)
+    )
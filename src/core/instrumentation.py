@@ -0,0 +1,222 @@
+"""
+Per-call instrumentation of LLM requests.
+
+Every call through `ResilientCaller` is metered: wall time from the first
+attempt to the result (retries and backoff included), time spent waiting for
+the rate limiter, the number of retries, and the prompt and completion tokens
+the call sites report with `record_usage`. Tokens are priced with
+`MODEL_PRICES` to estimate the cost.
+
+The finished `LLMCallStats` go to the log opened by the innermost
+`record_calls` block of the current task, so concurrent notes and metrics each
+collect their own calls without passing anything through the call stack.
+Calls made outside such a block are not recorded.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.schemas.models import LLMCallStats
+
+# USD per million prompt and completion tokens
+MODEL_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1-nano": (0.10, 0.40),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+}
+
+# The latency percentiles reported by `summarize_calls`
+PERCENTILES = (50, 95, 99)
+
+# The numeric fields of `LLMCallStats`, in the column order of `call_values`
+CALL_VALUE_FIELDS = (
+    "wall_time",
+    "queue_wait",
+    "prompt_tokens",
+    "completion_tokens",
+    "retries",
+    "cost",
+)
+
+
+def estimate_cost(
+    model: Optional[str], prompt_tokens: int, completion_tokens: int
+) -> Optional[float]:
+    """Prices a call; dated snapshots such as `gpt-4.1-2025-04-14` use their base price.
+
+    Returns:
+        The cost in USD, or None if the model has no price.
+    """
+    if not model:
+        return None
+    matches = [name for name in MODEL_PRICES if model.startswith(name)]
+    if not matches:
+        return None
+    prompt_price, completion_price = MODEL_PRICES[max(matches, key=len)]
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1e6
+
+
+class CallMeter:
+    """Accumulates the measurements of one logical call across its attempts."""
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.start = time.monotonic()
+        self.queue_wait = 0.0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.model: Optional[str] = None
+
+    def add_usage(self, response, model: Optional[str] = None) -> None:
+        usage = getattr(response, "usage", None)
+        for field in ("prompt_tokens", "completion_tokens"):
+            tokens = getattr(usage, field, None)
+            if isinstance(tokens, int):
+                setattr(self, field, getattr(self, field) + tokens)
+        self.model = model or self.model
+
+    def stats(self, metric: Optional[str] = None) -> LLMCallStats:
+        return LLMCallStats(
+            stage=self.stage,
+            metric=metric,
+            model=self.model,
+            wall_time=time.monotonic() - self.start,
+            queue_wait=self.queue_wait,
+            prompt_tokens=self.prompt_tokens,
+            completion_tokens=self.completion_tokens,
+            retries=self.retries,
+            cost=estimate_cost(self.model, self.prompt_tokens, self.completion_tokens),
+        )
+
+
+# The log of the innermost `record_calls` block, with its metric
+_log: ContextVar[Optional[Tuple[List[LLMCallStats], Optional[str]]]] = ContextVar(
+    "llm_call_log", default=None
+)
+# The call in progress
+_meter: ContextVar[Optional[CallMeter]] = ContextVar("llm_call_meter", default=None)
+
+
+@contextmanager
+def record_calls(metric: Optional[str] = None) -> Iterator[List[LLMCallStats]]:
+    """Collects the stats of the LLM calls made inside the block.
+
+    Args:
+        metric: The metric the calls are made for, if they are judge calls.
+
+    Yields:
+        The list the stats are appended to as the calls finish.
+    """
+    calls: List[LLMCallStats] = []
+    token = _log.set((calls, metric))
+    try:
+        yield calls
+    finally:
+        _log.reset(token)
+
+
+@contextmanager
+def metered_call(stage: str) -> Iterator[CallMeter]:
+    """Meters one logical call; its stats are logged when the block exits."""
+    meter = CallMeter(stage)
+    token = _meter.set(meter)
+    try:
+        yield meter
+    finally:
+        _meter.reset(token)
+        log = _log.get()
+        if log is not None:
+            calls, metric = log
+            calls.append(meter.stats(metric))
+
+
+def current_meter() -> Optional[CallMeter]:
+    """Returns the meter of the call in progress, if any."""
+    return _meter.get()
+
+
+def record_usage(response, model: Optional[str] = None) -> None:
+    """Adds the token usage of a provider response to the call in progress."""
+    meter = _meter.get()
+    if meter is not None:
+        meter.add_usage(response, model)
+
+
+def call_values(calls: Sequence[LLMCallStats]) -> np.ndarray:
+    """Returns the `CALL_VALUE_FIELDS` of calls as a (calls × fields) matrix.
+
+    Unknown costs are NaN.
+    """
+    return np.array(
+        [
+            [
+                call.wall_time,
+                call.queue_wait,
+                call.prompt_tokens,
+                call.completion_tokens,
+                call.retries,
+                np.nan if call.cost is None else call.cost,
+            ]
+            for call in calls
+        ],
+        dtype=np.float64,
+    ).reshape(len(calls), len(CALL_VALUE_FIELDS))
+
+
+def summarize_calls(calls: Iterable[LLMCallStats]) -> Dict[str, Dict[str, float]]:
+    """Rolls call stats up per stage and per judge metric.
+
+    Returns:
+        For every group (`generation`, `judge` and `judge/<metric>`): the call
+        count, the wall time and queue wait percentiles (`wall_time_p50`, ...),
+        and the total tokens, retries and estimated cost (None if any call in
+        the group has no price).
+    """
+    calls = list(calls)
+    return summarize_call_values(
+        [call.stage for call in calls],
+        [call.metric for call in calls],
+        call_values(calls),
+    )
+
+
+def summarize_call_values(
+    stages: Sequence[str], metrics: Sequence[Optional[str]], values: np.ndarray
+) -> Dict[str, Dict[str, float]]:
+    """`summarize_calls` over calls stored as columns.
+
+    Args:
+        stages: The stage of every call.
+        metrics: The metric of every call, if it has one.
+        values: The `call_values` of the calls.
+    """
+    stages = np.asarray(stages, dtype=object)
+    metrics = np.asarray(metrics, dtype=object)
+    groups: Dict[str, np.ndarray] = {}
+    for stage, metric in dict.fromkeys(zip(stages.tolist(), metrics.tolist())):
+        in_stage = groups.setdefault(stage, stages == stage)
+        if metric:
+            groups[f"{stage}/{metric}"] = in_stage & (metrics == metric)
+
+    summary = {}
+    for group, members in groups.items():
+        rows = values[members]
+        row = {"calls": len(rows)}
+        for q, (wall_time, queue_wait) in zip(
+            PERCENTILES, np.percentile(rows[:, :2], PERCENTILES, axis=0)
+        ):
+            row[f"wall_time_p{q}"] = float(wall_time)
+            row[f"queue_wait_p{q}"] = float(queue_wait)
+        totals = dict(zip(CALL_VALUE_FIELDS, rows.sum(axis=0).tolist()))
+        for field in ("prompt_tokens", "completion_tokens", "retries"):
+            row[field] = int(totals[field])
+        row["cost"] = None if np.isnan(totals["cost"]) else totals["cost"]
+        summary[group] = row
+    return summary
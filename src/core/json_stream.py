@@ -0,0 +1,137 @@
+"""
+Incremental reader for large JSON array files.
+
+`iter_json_array` reads a top-level array of objects chunk by chunk and yields
+one object at a time. Only the requested fields are decoded; every other value
+(e.g. the large `person_data` blobs in the dataset) is skipped by scanning for
+its closing bracket, without building Python objects for it. Memory use is
+bounded by the chunk size plus the largest single record.
+"""
+
+import json
+import re
+from typing import Any, Dict, Iterable, Iterator, Optional, TextIO, Tuple
+
+DEFAULT_CHUNK_SIZE = 1 << 16
+
+_WHITESPACE = re.compile(r"\s*")
+_STRING = re.compile(r'"[^"\\]*(?:\\.[^"\\]*)*"', re.DOTALL)
+_STRUCTURAL = re.compile(r'[\[\]{}"]')
+_SCALAR = re.compile(r"[^,\]}\s]+")
+_decoder = json.JSONDecoder()
+
+
+class _NeedMore(Exception):
+    """Raised when a value runs past the end of the buffered input."""
+
+
+def _skip_whitespace(buf: str, pos: int) -> int:
+    pos = _WHITESPACE.match(buf, pos).end()
+    if pos >= len(buf):
+        raise _NeedMore
+    return pos
+
+
+def _skip_string(buf: str, pos: int) -> int:
+    match = _STRING.match(buf, pos)
+    if not match:
+        raise _NeedMore
+    return match.end()
+
+
+def _skip_value(buf: str, pos: int) -> int:
+    """Returns the index just past the JSON value starting at `pos`."""
+    char = buf[pos]
+    if char == '"':
+        return _skip_string(buf, pos)
+    if char in "[{":
+        depth = 0
+        while True:
+            match = _STRUCTURAL.search(buf, pos)
+            if not match:
+                raise _NeedMore
+            if match.group() == '"':
+                pos = _skip_string(buf, match.start())
+                continue
+            depth += 1 if match.group() in "[{" else -1
+            pos = match.end()
+            if depth == 0:
+                return pos
+    match = _SCALAR.match(buf, pos)
+    # A number at the end of the buffer may continue in the next chunk
+    if not match or match.end() >= len(buf):
+        raise _NeedMore
+    return match.end()
+
+
+def _parse_object(
+    buf: str, pos: int, fields: Optional[frozenset]
+) -> Tuple[int, Dict[str, Any]]:
+    """Parses the object starting at `pos`, decoding only `fields`."""
+    record = {}
+    pos = _skip_whitespace(buf, pos + 1)
+    if buf[pos] == "}":
+        return pos + 1, record
+    while True:
+        if buf[pos] != '"':
+            raise ValueError(f"Expected an object key at offset {pos}")
+        end = _skip_string(buf, pos)
+        key = json.loads(buf[pos:end])
+        pos = _skip_whitespace(buf, end)
+        if buf[pos] != ":":
+            raise ValueError(f"Expected ':' at offset {pos}")
+        pos = _skip_whitespace(buf, pos + 1)
+        end = _skip_value(buf, pos)
+        if fields is None or key in fields:
+            record[key], _ = _decoder.raw_decode(buf, pos)
+        pos = _skip_whitespace(buf, end)
+        if buf[pos] == "}":
+            return pos + 1, record
+        if buf[pos] != ",":
+            raise ValueError(f"Expected ',' or '}}' at offset {pos}")
+        pos = _skip_whitespace(buf, pos + 1)
+
+
+def iter_json_array(
+    f: TextIO,
+    fields: Optional[Iterable[str]] = None,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[Dict[str, Any]]:
+    """Lazily yields the objects of a top-level JSON array.
+
+    Args:
+        f: A text file object positioned at the start of the array.
+        fields: The keys to decode from each object. If None, all keys are decoded.
+        chunk_size: The number of characters to read from `f` at a time.
+
+    Yields:
+        One dict per array element, restricted to `fields`.
+    """
+    fields = frozenset(fields) if fields is not None else None
+    buf, pos, eof, started = "", 0, False, False
+    while True:
+        try:
+            pos = _skip_whitespace(buf, pos)
+            if not started:
+                if buf[pos] != "[":
+                    raise ValueError("Expected a JSON array")
+                pos, started = pos + 1, True
+                continue
+            if buf[pos] == "]":
+                return
+            if buf[pos] == ",":
+                pos += 1
+                continue
+            if buf[pos] != "{":
+                raise ValueError(f"Expected an object at offset {pos}")
+            end, record = _parse_object(buf, pos, fields)
+        except _NeedMore:
+            if eof:
+                raise ValueError("Unexpected end of JSON input")
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            # Drop everything already consumed so the buffer stays small
+            buf, pos = buf[pos:] + chunk, 0
+            continue
+        pos = end
+        yield record
@@ -0,0 +1,95 @@
+"""
+deepeval judge model backed by the shared LLM call layer.
+
+The metrics are given a `JudgeLLM` instead of a model name so that every judge
+call gets the same retries, timeouts, hedging and circuit breaking as
+generation does. All judges of a process share one pair of OpenAI clients, and
+with them one connection pool.
+"""
+
+from typing import Any, Dict, List, Optional
+
+import openai
+from deepeval.models import DeepEvalBaseLLM
+
+from src.core.config import settings
+from src.core.instrumentation import record_usage
+from src.core.llm import judge_caller
+
+client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+async_client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+
+
+class JudgeLLM(DeepEvalBaseLLM):
+    """An OpenAI judge model whose calls go through `judge_caller`."""
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        temperature: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        super().__init__(model or settings.EVALUATION_LLM)
+        self.model_name = model or settings.EVALUATION_LLM
+        self.temperature = temperature
+        self.seed = seed
+
+    @property
+    def sampling(self) -> Optional[Dict[str, Any]]:
+        """The sampling settings, or None for the default greedy judge."""
+        if not self.temperature and self.seed is None:
+            return None
+        return {"temperature": self.temperature, "seed": self.seed}
+
+    def load_model(self) -> openai.OpenAI:
+        self.async_client = async_client
+        return client
+
+    def _request(self, messages: List[dict], json_output: bool) -> dict:
+        request = {
+            "model": self.model_name,
+            "temperature": self.temperature,
+            "messages": messages,
+            "timeout": settings.LLM_TIMEOUT,
+        }
+        if self.seed is not None:
+            request["seed"] = self.seed
+        # deepeval parses JSON out of the answer whenever it expects a schema
+        if json_output:
+            request["response_format"] = {"type": "json_object"}
+        return request
+
+    def _create(self, request: dict):
+        response = self.model.chat.completions.create(**request)
+        record_usage(response, self.model_name)
+        return response
+
+    async def _acreate(self, request: dict):
+        response = await self.async_client.chat.completions.create(**request)
+        record_usage(response, self.model_name)
+        return response
+
+    def complete(self, messages: List[dict], json_output: bool = True) -> str:
+        """Sends a chat request to the judge and returns its answer."""
+        request = self._request(messages, json_output)
+        response = judge_caller.call_sync(lambda: self._create(request))
+        return response.choices[0].message.content
+
+    async def acomplete(self, messages: List[dict], json_output: bool = True) -> str:
+        """Async counterpart of `complete`."""
+        request = self._request(messages, json_output)
+        response = await judge_caller.call(lambda: self._acreate(request))
+        return response.choices[0].message.content
+
+    def generate(self, prompt: str, schema=None) -> str:
+        return self.complete(
+            [{"role": "user", "content": prompt}], json_output=schema is not None
+        )
+
+    async def a_generate(self, prompt: str, schema=None) -> str:
+        return await self.acomplete(
+            [{"role": "user", "content": prompt}], json_output=schema is not None
+        )
+
+    def get_model_name(self) -> str:
+        return self.model_name
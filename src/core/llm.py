@@ -0,0 +1,266 @@
+"""
+Shared call layer for every LLM request made by the suite.
+
+`ResilientCaller` wraps a single provider call with:
+
+- jittered exponential retries for transient errors (429, 5xx, timeouts,
+  connection errors), honouring the provider's Retry-After hint;
+- a per-call timeout;
+- optional hedging: once a call has been running longer than the observed p95
+  latency, an identical request is started and whichever finishes first wins;
+- a circuit breaker that fails fast while the endpoint is down.
+
+Failures surface as `LLMCallError` instead of empty strings, so callers can
+record them as failures rather than scoring an empty note. Every call is metered
+through `src.core.instrumentation`.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import openai
+
+from src.core.config import settings
+from src.core.instrumentation import current_meter, metered_call
+from src.core.rate_limit import RateLimiter
+
+T = TypeVar("T")
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+)
+
+
+class LLMCallError(Exception):
+    """Raised when an LLM call fails for good."""
+
+
+class CircuitOpenError(LLMCallError):
+    """Raised without calling the endpoint while the circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets a trial call through after a cool-down."""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+
+    def before_call(self) -> None:
+        if self.opened_at is None:
+            return
+        remaining = self.reset_timeout - (time.monotonic() - self.opened_at)
+        if remaining > 0:
+            raise CircuitOpenError(
+                f"Circuit open after {self.failures} consecutive failures; "
+                f"retrying the endpoint in {remaining:.0f}s."
+            )
+
+    def record_success(self) -> None:
+        self.failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+
+
+class LatencyTracker:
+    """Keeps a sliding window of call latencies."""
+
+    def __init__(self, window: int = 500, min_samples: int = 20):
+        self.samples = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Returns the q-th percentile (0-100), or None until enough samples exist."""
+        if len(self.samples) < self.min_samples:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Reads the provider's Retry-After hint from a rate-limit error."""
+    response = getattr(error, "response", None)
+    header = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(header)
+    except (TypeError, ValueError):
+        return None
+
+
+class ResilientCaller:
+    """Runs LLM calls with retries, timeouts, hedging and circuit breaking."""
+
+    def __init__(
+        self,
+        name: str,
+        max_retries: Optional[int] = None,
+        timeout: Optional[float] = None,
+        hedge: Optional[bool] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.name = name
+        self.max_retries = (
+            settings.LLM_MAX_RETRIES if max_retries is None else max_retries
+        )
+        self.timeout = timeout or settings.LLM_TIMEOUT
+        self.hedge = settings.LLM_HEDGING if hedge is None else hedge
+        self.breaker = breaker or CircuitBreaker(
+            settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RESET_TIMEOUT
+        )
+        self.latency = LatencyTracker()
+
+    def backoff(self, attempt: int, error: Optional[Exception] = None) -> float:
+        """Full-jitter exponential backoff, never shorter than a Retry-After hint."""
+        ceiling = min(settings.LLM_BACKOFF_MAX, settings.LLM_BACKOFF_BASE * 2**attempt)
+        delay = random.uniform(0, ceiling)
+        hint = _retry_after(error) if error is not None else None
+        return max(delay, hint or 0.0)
+
+    def _on_error(
+        self, error: Exception, attempt: int, limiter: Optional[RateLimiter]
+    ) -> float:
+        """Books a failed attempt and returns how long to wait before the next one.
+
+        Raises:
+            LLMCallError: If this was the last attempt.
+        """
+        delay = self.backoff(attempt, error)
+        if isinstance(error, openai.RateLimitError):
+            # The endpoint is up, just busy: slow down instead of tripping the breaker
+            if limiter is not None:
+                limiter.record_rate_limited(delay)
+        else:
+            self.breaker.record_failure()
+        if attempt == self.max_retries:
+            raise LLMCallError(f"{self.name} call failed: {error!r}") from error
+        logging.warning(
+            f"{self.name} call failed (attempt {attempt + 1}/{self.max_retries + 1}): "
+            f"{error!r}; retrying in {delay:.1f}s"
+        )
+        return delay
+
+    async def _timed(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        limiter: Optional[RateLimiter],
+        tokens: int,
+    ) -> T:
+        if limiter is None:
+            start = time.monotonic()
+            result = await asyncio.wait_for(fn(), self.timeout)
+        else:
+            queued = time.monotonic()
+            async with limiter.slot(tokens):
+                start = time.monotonic()
+                meter = current_meter()
+                if meter is not None:
+                    meter.queue_wait += start - queued
+                result = await asyncio.wait_for(fn(), self.timeout)
+            limiter.record_success()
+        self.latency.record(time.monotonic() - start)
+        return result
+
+    async def _attempt(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        limiter: Optional[RateLimiter],
+        tokens: int,
+    ) -> T:
+        hedge_after = self.latency.percentile(settings.LLM_HEDGE_PERCENTILE)
+        first = asyncio.ensure_future(self._timed(fn, limiter, tokens))
+        if not self.hedge or hedge_after is None:
+            return await first
+
+        done, _ = await asyncio.wait({first}, timeout=hedge_after)
+        if done:
+            return first.result()
+
+        logging.info(f"Hedging slow {self.name} call after {hedge_after:.1f}s")
+        pending = {first, asyncio.ensure_future(self._timed(fn, limiter, tokens))}
+        error = None
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                if task.exception() is None:
+                    for other in pending:
+                        other.cancel()
+                    return task.result()
+                error = task.exception()
+        raise error
+
+    async def call(
+        self,
+        fn: Callable[[], Awaitable[T]],
+        limiter: Optional[RateLimiter] = None,
+        tokens: int = 1,
+    ) -> T:
+        """Runs an async LLM call.
+
+        Args:
+            fn: Starts one attempt of the call.
+            limiter: Rate limiter each attempt reserves budget from, if any.
+            tokens: Estimated size of the request for the limiter's TPM budget.
+
+        Raises:
+            LLMCallError: If the call fails for good or the circuit is open.
+        """
+        with metered_call(self.name) as meter:
+            for attempt in range(self.max_retries + 1):
+                self.breaker.before_call()
+                try:
+                    result = await self._attempt(fn, limiter, tokens)
+                except RETRYABLE_ERRORS as e:
+                    delay = self._on_error(e, attempt, limiter)
+                    meter.retries += 1
+                    await asyncio.sleep(delay)
+                    continue
+                except openai.OpenAIError as e:
+                    raise LLMCallError(f"{self.name} call failed: {e!r}") from e
+                self.breaker.record_success()
+                return result
+
+    def call_sync(self, fn: Callable[[], T]) -> T:
+        """Runs a blocking LLM call with retries and circuit breaking.
+
+        `fn` is responsible for passing `self.timeout` to the client.
+        """
+        with metered_call(self.name) as meter:
+            for attempt in range(self.max_retries + 1):
+                self.breaker.before_call()
+                try:
+                    start = time.monotonic()
+                    result = fn()
+                except RETRYABLE_ERRORS as e:
+                    delay = self._on_error(e, attempt, None)
+                    meter.retries += 1
+                    time.sleep(delay)
+                    continue
+                except openai.OpenAIError as e:
+                    raise LLMCallError(f"{self.name} call failed: {e!r}") from e
+                self.latency.record(time.monotonic() - start)
+                self.breaker.record_success()
+                return result
+
+
+# Shared so that a broken endpoint trips one breaker for the whole process
+generation_caller = ResilientCaller("generation")
+judge_caller = ResilientCaller("judge")
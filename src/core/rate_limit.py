@@ -0,0 +1,125 @@
+"""
+Client-side rate limiting for LLM calls.
+
+Combines request-per-minute and token-per-minute budgets with an adaptive
+(AIMD) concurrency window: every successful call widens the window a little,
+every 429 halves it and pauses new calls for a short cool-down.
+"""
+
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+
+# Rough characters-per-token ratio for English text with OpenAI tokenizers.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    """Estimates the prompt size of a chat request for TPM budgeting."""
+    return sum(len(m.get("content", "")) for m in messages) // CHARS_PER_TOKEN + 1
+
+
+class TokenBucket:
+    """A token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated) * self.rate
+        )
+        self._updated = now
+
+    async def acquire(self, amount: float = 1) -> None:
+        """Waits until `amount` tokens are available and takes them."""
+        # A single request larger than the bucket would otherwise wait forever
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class AdaptiveConcurrencyLimiter:
+    """An AIMD concurrency window that shrinks on rate-limit errors."""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        min_concurrency: int = 1,
+        initial_concurrency: Optional[int] = None,
+        decrease_factor: float = 0.5,
+    ):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(
+            initial_concurrency or max(min_concurrency, max_concurrency // 2)
+        )
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._resume_at = 0.0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self) -> None:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight < int(self.limit))
+            self.in_flight += 1
+        # Honour any cool-down triggered by a 429 while we were queued
+        delay = self._resume_at - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def release(self) -> None:
+        async with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def on_success(self) -> None:
+        """Additive increase: roughly +1 slot per window of successful calls."""
+        self.limit = min(self.max_concurrency, self.limit + 1.0 / self.limit)
+
+    def on_rate_limited(self, retry_after: float = 1.0) -> None:
+        """Multiplicative decrease plus a cool-down before new calls start."""
+        self.limit = max(self.min_concurrency, self.limit * self.decrease_factor)
+        self._resume_at = max(self._resume_at, time.monotonic() + retry_after)
+
+
+class RateLimiter:
+    """Keeps concurrent LLM calls within RPM/TPM limits and adapts to 429s."""
+
+    def __init__(
+        self,
+        max_concurrency: int,
+        requests_per_minute: int,
+        tokens_per_minute: int,
+    ):
+        self.concurrency = AdaptiveConcurrencyLimiter(max_concurrency)
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 1) -> AsyncIterator[None]:
+        """Reserves budget for one call of roughly `tokens` tokens."""
+        await self.requests.acquire(1)
+        await self.tokens.acquire(tokens)
+        await self.concurrency.acquire()
+        try:
+            yield
+        finally:
+            await self.concurrency.release()
+
+    def record_success(self) -> None:
+        self.concurrency.on_success()
+
+    def record_rate_limited(self, retry_after: float = 1.0) -> None:
+        self.concurrency.on_rate_limited(retry_after)
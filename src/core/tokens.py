@@ -0,0 +1,99 @@
+"""
+Local token counting.
+
+Counts use `tiktoken` when it is installed and fall back to the
+characters-per-token estimate used for rate limiting otherwise (or when the
+model's encoding cannot be loaded, e.g. offline). Counts are only used for
+budgeting, so an estimate is good enough to decide whether a prompt fits.
+"""
+
+import functools
+import logging
+from typing import Dict, List
+
+from src.core.rate_limit import CHARS_PER_TOKEN
+
+try:
+    import tiktoken
+except ImportError:  # optional dependency
+    tiktoken = None
+
+# Encoding used for models tiktoken does not know yet
+DEFAULT_ENCODING = "o200k_base"
+
+# Tokens the chat format adds around every message
+TOKENS_PER_MESSAGE = 4
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(model: str):
+    if tiktoken is None:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model)
+        except KeyError:
+            return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        # Encodings are downloaded on first use, which fails offline
+        logging.warning(
+            f"Could not load a tokenizer for {model} ({e!r}); estimating token counts."
+        )
+        return None
+
+
+def tokenizer_name(model: str) -> str:
+    """Names the tokenizer used for `model`, to tell apart counts made with another."""
+    encoding = _encoding(model)
+    return encoding.name if encoding is not None else f"chars/{CHARS_PER_TOKEN}"
+
+
+def count_tokens(text: str, model: str) -> int:
+    """Counts the tokens of `text` with the tokenizer of `model`."""
+    encoding = _encoding(model)
+    if encoding is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def count_message_tokens(messages: List[Dict[str, str]], model: str) -> int:
+    """Counts the prompt tokens of a chat request."""
+    return sum(
+        count_tokens(m.get("content", ""), model) + TOKENS_PER_MESSAGE for m in messages
+    )
+
+
+def split_by_tokens(text: str, max_tokens: int, model: str) -> List[str]:
+    """Splits `text` into consecutive pieces of at most `max_tokens` tokens.
+
+    Line breaks are preferred as split points, so that speaker turns of a
+    transcript stay whole; only lines longer than `max_tokens` are cut inside.
+    """
+    chunks: List[str] = []
+    current: List[str] = []
+    current_tokens = 0
+    for line in text.splitlines(keepends=True):
+        line_tokens = count_tokens(line, model)
+        if current and current_tokens + line_tokens > max_tokens:
+            chunks.append("".join(current))
+            current, current_tokens = [], 0
+        if line_tokens > max_tokens:
+            chunks.extend(_split_line(line, max_tokens, model))
+            continue
+        current.append(line)
+        current_tokens += line_tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+
+def _split_line(line: str, max_tokens: int, model: str) -> List[str]:
+    encoding = _encoding(model)
+    if encoding is None:
+        size = max(1, (max_tokens - 1) * CHARS_PER_TOKEN)
+        return [line[i : i + size] for i in range(0, len(line), size)]
+    tokens = encoding.encode(line, disallowed_special=())
+    return [
+        encoding.decode(tokens[i : i + max_tokens])
+        for i in range(0, len(tokens), max_tokens)
+    ]
@@ -1,25 +1,44 @@
-import json
+import os
+import sys
 
 import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
 
+# `streamlit run src/dashboard.py` only puts src/ itself on the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.aggregation import bootstrap_intervals
+from src.core.config import settings
+from src.run_store import RunStore
+
 st.set_page_config(page_title="Clinical AI Evaluation Dashboard", layout="wide")
 
 st.title("Clinical AI Evaluation Dashboard")
 
 
 @st.cache_data
-def load_results():
-    try:
-        with open("data/evaluation_results.json", "r") as f:
-            data = json.load(f)
-        return pd.DataFrame(data)
-    except FileNotFoundError:
-        return None
-
-
-df = load_results()
+def load_results(run_id):
+    """Returns the scores of a stored run as a DataFrame, or None if it has none.
+
+    No note text is read; each row holds the hashes `RunStore.note_texts` reads
+    the texts of its note with.
+    """
+    rows = RunStore().load_scores(run_id) if run_id else []
+    return pd.DataFrame(rows) if rows else None
+
+
+runs = [run for run in RunStore().runs() if run["results"]]
+run_id = st.sidebar.selectbox(
+    "Run",
+    [run["run_id"] for run in runs],
+    format_func=lambda run_id: next(
+        f"{run_id} ({run['identifier'] or 'imported'}, {run['results']} notes)"
+        for run in runs
+        if run["run_id"] == run_id
+    ),
+)
+df = load_results(run_id)
 
 if df is not None:
     tab1, tab2 = st.tabs(["📊 Aggregate Analysis", "📄 Individual Note Review"])
@@ -28,18 +47,34 @@ if df is not None:
         st.header("Overall Performance Metrics")
 
         # Calculate all average scores
-        avg_scores = {
-            "Overall Score": df["overall_score"].mean(),
-            "Patient Safety": df["clinical_safety_score"].mean(),
-            "SOAP Compliance": df["soap_structure_score"].mean(),
-            "Clinical Accuracy": df["clinical_accuracy_score"].mean(),
-            "Terminology Accuracy": df["medical_terminology_score"].mean(),
-            "Hallucination": df["hallucination_score"].mean(),
-            "Missing Info": df["missing_info_score"].mean(),
+        score_columns = {
+            "Overall Score": "overall_score",
+            "Patient Safety": "clinical_safety_score",
+            "SOAP Compliance": "soap_structure_score",
+            "Clinical Accuracy": "clinical_accuracy_score",
+            "Terminology Accuracy": "medical_terminology_score",
+            "Hallucination": "hallucination_score",
+            "Missing Info": "missing_info_score",
         }
+        avg_scores = {name: df[column].mean() for name, column in score_columns.items()}
+
+        # Bootstrap confidence intervals of the averages, for the error bars
+        scored = [
+            name
+            for name, column in score_columns.items()
+            if column in df and df[column].notna().all()
+        ]
+        intervals = dict(
+            zip(
+                scored,
+                bootstrap_intervals(
+                    df[[score_columns[name] for name in scored]].to_numpy(float)
+                ),
+            )
+        )
 
         metric_tooltips = {
-            "Overall Score": "A weighted average of all other scores, providing a single measure of the model's performance.",
+            "Overall Score": "A weighted average of all other scores (with the hallucination score inverted, so that higher is better everywhere), providing a single measure of the model's performance.",
             "Patient Safety": "Assesses the clinical safety of the generated note. It penalizes any information that could lead to patient harm. Scores range from 0 to 1, where 1 is the best.",
             "SOAP Compliance": "Checks if the note follows the Subjective, Objective, Assessment, and Plan (SOAP) format. This is a binary score (1 for compliant, 0 for non-compliant).",
             "Clinical Accuracy": "Measures how accurately the generated note reflects the information in the transcript. Scores range from 0 to 1, where 1 is the best.",
@@ -97,6 +132,11 @@ if df is not None:
             list(avg_scores.values())[i] for i in range(1, len(avg_scores))
         ]
 
+        bounds = [
+            intervals.get(name, (value, value))
+            for name, value in zip(metric_names, metric_values)
+        ]
+
         fig = go.Figure(
             data=[
                 go.Bar(
@@ -104,11 +144,22 @@ if df is not None:
                     y=metric_values,
                     text=[f"{v:.2f}" for v in metric_values],
                     textposition="auto",
+                    error_y=dict(
+                        type="data",
+                        symmetric=False,
+                        array=[high - v for (_, high), v in zip(bounds, metric_values)],
+                        arrayminus=[
+                            v - low for (low, _), v in zip(bounds, metric_values)
+                        ],
+                    ),
                 )
             ]
         )
         fig.update_layout(
-            title_text="Average Scores by Metric",
+            title_text=(
+                "Average Scores by Metric "
+                f"({settings.BOOTSTRAP_CONFIDENCE:.0%} bootstrap intervals)"
+            ),
             xaxis_title="Metric",
             yaxis_title="Average Score",
             yaxis=dict(range=[0, 1]),
@@ -158,15 +209,18 @@ if df is not None:
             # )
 
             st.subheader("Note Details")
-            note_details = note_data["note"]
+            # Only the selected note's texts are read from the store
+            texts = RunStore().note_texts(note_data)
 
             with st.expander("Source Transcript"):
-                st.text(note_details["transcript"])
+                st.text(texts["transcript"])
             with st.expander("Ground Truth Note"):
-                st.text(note_details["ground_truth_note"])
+                st.text(texts["ground_truth_note"])
             with st.expander("Generated Note"):
-                st.text(note_details["generated_note"])
+                st.text(texts["generated_note"])
 else:
     st.warning(
-        "Evaluation results not found. Please run the evaluation first using `just run`."
+        "No evaluation results found. Please run the evaluation first using "
+        "`just run`, or import an exported result file with "
+        "`python -m src.run_store import data/evaluation_results.json`."
     )
@@ -1,74 +1,394 @@
+import asyncio
+import inspect
+import itertools
+import json
 import logging
 import os
-from typing import List, Optional
+import tempfile
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import openai
-import pandas as pd
 
+from src.core.cache import DiskCache, content_hash, shared_cache
 from src.core.config import settings
-from src.prompts.versions import get_prompt_messages
-from src.schemas.models import ClinicalNote
+from src.core.instrumentation import record_calls, record_usage
+from src.core.json_stream import iter_json_array
+from src.core.llm import LLMCallError, generation_caller
+from src.core.rate_limit import RateLimiter, estimate_tokens
+from src.core.tokens import count_tokens, split_by_tokens, tokenizer_name
+from src.prompts.map_reduce import get_chunk_messages, get_merge_messages
+from src.prompts.versions import fits_token_budget, get_prompt_messages
+from src.schemas.models import ClinicalNote, LLMCallStats
 
 client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
+async_client = openai.AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATASET_PATH = os.path.join(PROJECT_ROOT, "data", "test.json")
 
-def generate_note(transcript: str, prompt_version: Optional[str] = None) -> str:
+# The only dataset fields the suite uses; everything else is skipped while parsing
+DATASET_FIELDS = ("patient_convo", "soap_notes")
+
+
+def _note_content(response) -> str:
+    content = response.choices[0].message.content
+    if not content or not content.strip():
+        raise LLMCallError("The model returned an empty note.")
+    return content.strip()
+
+
+def generate_note(
+    transcript: str, prompt_version: Optional[str] = None, model: Optional[str] = None
+) -> str:
     """Generates a structured clinical SOAP note using the configured LLM.
 
     Args:
         transcript: The transcript of the conversation between a healthcare provider and a patient.
         prompt_version: The version of the prompt to use. If None, the default version is used.
+        model: The generation model to use. If None, `GENERATION_LLM` is used.
 
     Returns:
         The generated clinical note.
+
+    Raises:
+        LLMCallError: If no note could be generated, even after retries.
     """
-    try:
-        # Get the prompt messages for the specified version
-        messages = get_prompt_messages(version=prompt_version, transcript=transcript)
+    # Get the prompt messages for the specified version
+    messages = get_prompt_messages(version=prompt_version, transcript=transcript)
+
+    model = model or settings.GENERATION_LLM
 
-        # Create the completion
+    def _create():
         response = client.chat.completions.create(
-            model=settings.GENERATION_LLM,
+            model=model,
             temperature=0,
             messages=messages,
+            timeout=settings.LLM_TIMEOUT,
         )
-        return response.choices[0].message.content.strip()
-    except Exception as e:
-        logging.error(f"Error generating note: {e}")
-        return ""
+        record_usage(response, model)
+        return response
+
+    # Create the completion
+    response = generation_caller.call_sync(_create)
+    return _note_content(response)
+
+
+async def agenerate_note(
+    transcript: str, prompt_version: Optional[str] = None, model: Optional[str] = None
+) -> str:
+    """Makes a single async attempt at generating a note.
+
+    Provider errors propagate unchanged so that `generation_caller` can decide
+    whether to retry; `generate_notes` wraps this in the shared call layer.
+    """
+    messages = get_prompt_messages(version=prompt_version, transcript=transcript)
+    return await acomplete(messages, model=model)
+
+
+async def acomplete(messages: List[dict], model: Optional[str] = None) -> str:
+    """Makes a single async attempt at a generation call with the given messages."""
+    model = model or settings.GENERATION_LLM
+    response = await async_client.chat.completions.create(
+        model=model, temperature=0, messages=messages
+    )
+    record_usage(response, model)
+    return _note_content(response)
+
+
+def note_cache() -> DiskCache:
+    """Returns the process-wide on-disk cache of generated notes."""
+    return shared_cache(
+        os.path.join(settings.CACHE_DIR, "notes"), settings.NOTE_CACHE_MAX_BYTES
+    )
+
 
+def note_cache_key(
+    messages: List[dict],
+    model: Optional[str] = None,
+    chunk_tokens: Optional[int] = None,
+) -> str:
+    """Hashes everything that determines a generated note.
 
-def load_data(limit: int = None) -> List[ClinicalNote]:
-    """Loads the dataset from the local data directory and returns a list of ClinicalNote objects."""
+    The rendered messages already contain the prompt version's text and the
+    transcript, so editing either one produces a new key. Notes generated chunk
+    by chunk also depend on the chunk size.
+    """
+    if chunk_tokens is None:
+        return content_hash(model or settings.GENERATION_LLM, 0, messages)
+    return content_hash(model or settings.GENERATION_LLM, 0, messages, chunk_tokens)
+
+
+async def generate_notes(
+    transcripts: List[str],
+    prompt_version: Optional[str] = None,
+    model: Optional[str] = None,
+    limiter: Optional[RateLimiter] = None,
+    cache: Optional[DiskCache] = None,
+    refresh: bool = False,
+    on_result: Optional[
+        Callable[[int, Union[str, LLMCallError]], Optional[Awaitable[None]]]
+    ] = None,
+    token_counts: Optional[List[int]] = None,
+    calls: Optional[Dict[int, List[LLMCallStats]]] = None,
+) -> List[Union[str, LLMCallError]]:
+    """Generates notes for many transcripts concurrently.
+
+    Calls are bounded by an adaptive rate limiter that stays within the configured
+    RPM/TPM budget and shrinks its concurrency window whenever the provider answers
+    with a 429, and go through the shared generation call layer for retries,
+    timeouts, hedging and circuit breaking. The returned notes are in the same
+    order as `transcripts`; a transcript whose note could not be generated gets
+    the `LLMCallError` in its place, like `asyncio.gather(return_exceptions=True)`.
+
+    Transcripts whose prompt would exceed `GENERATION_MAX_PROMPT_TOKENS` are
+    generated map-reduce style: a partial note per chunk of
+    `GENERATION_CHUNK_TOKENS` tokens, then one call merging the partial notes.
+
+    Args:
+        transcripts: The transcripts to generate notes for.
+        prompt_version: The version of the prompt to use.
+        model: The generation model to use. If None, `GENERATION_LLM` is used.
+        limiter: The rate limiter to use. If None, one is built from settings.
+            Pass the same limiter to concurrent calls to share one budget.
+        cache: Cache of previously generated notes. If None, caching is disabled.
+        refresh: Regenerate every note and overwrite the cached entries.
+        on_result: Called with the index and note (or error) of each transcript as
+            soon as it is ready, e.g. to checkpoint progress. If it returns an
+            awaitable, it is awaited.
+        token_counts: The token count of each transcript, e.g. from
+            `load_token_counts`. If None, they are counted here.
+        calls: If given, filled with the stats of the LLM calls made for each
+            transcript, keyed by index, before `on_result` is called.
+    """
+    model = model or settings.GENERATION_LLM
+    limiter = limiter or RateLimiter(
+        max_concurrency=settings.GENERATION_MAX_CONCURRENCY,
+        requests_per_minute=settings.GENERATION_RPM,
+        tokens_per_minute=settings.GENERATION_TPM,
+    )
+
+    async def _complete(messages: List[dict]) -> str:
+        return await generation_caller.call(
+            lambda: acomplete(messages, model=model),
+            limiter=limiter,
+            tokens=estimate_tokens(messages),
+        )
+
+    async def _map_reduce(transcript: str) -> str:
+        chunks = split_by_tokens(transcript, settings.GENERATION_CHUNK_TOKENS, model)
+        logging.info(
+            f"Transcript exceeds the prompt budget; generating from {len(chunks)} chunks."
+        )
+        partial_notes = await asyncio.gather(
+            *(
+                _complete(get_chunk_messages(prompt_version, chunk, i, len(chunks)))
+                for i, chunk in enumerate(chunks, 1)
+            )
+        )
+        return await _complete(get_merge_messages(prompt_version, partial_notes))
+
+    async def _generate_one(
+        transcript: str, transcript_tokens: Optional[int]
+    ) -> Union[str, LLMCallError]:
+        messages = get_prompt_messages(version=prompt_version, transcript=transcript)
+        if transcript_tokens is None:
+            transcript_tokens = count_tokens(transcript, model)
+        chunked = not fits_token_budget(prompt_version, transcript_tokens, model)
+        key = note_cache_key(
+            messages, model, settings.GENERATION_CHUNK_TOKENS if chunked else None
+        )
+        if cache is not None and not refresh:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+
+        try:
+            if chunked:
+                note = await _map_reduce(transcript)
+            else:
+                note = await generation_caller.call(
+                    lambda: agenerate_note(
+                        transcript, prompt_version=prompt_version, model=model
+                    ),
+                    limiter=limiter,
+                    tokens=estimate_tokens(messages),
+                )
+        except LLMCallError as e:
+            logging.error(f"Error generating note: {e}")
+            return e
+        if cache is not None:
+            cache.set(key, note)
+        return note
+
+    async def _generate(index: int, transcript: str) -> Union[str, LLMCallError]:
+        with record_calls() as note_calls:
+            note = await _generate_one(
+                transcript, token_counts[index] if token_counts is not None else None
+            )
+        if calls is not None:
+            calls[index] = note_calls
+        if on_result is not None:
+            handled = on_result(index, note)
+            if inspect.isawaitable(handled):
+                await handled
+        return note
+
+    return await asyncio.gather(*(_generate(i, t) for i, t in enumerate(transcripts)))
+
+
+def iter_records(
+    limit: Optional[int] = None, path: Optional[str] = None
+) -> Iterator[Dict[str, str]]:
+    """Lazily yields dataset records with only the `DATASET_FIELDS` decoded.
+
+    The file is read incrementally and closed as soon as `limit` records have been
+    yielded, so small runs never parse the rest of the dataset.
+
+    Args:
+        limit: The maximum number of records to yield. If None, all records are yielded.
+        path: The dataset file to read. If None, `DATASET_PATH` is used.
+    """
+    with open(path or DATASET_PATH, "r", encoding="utf-8") as f:
+        yield from itertools.islice(iter_json_array(f, fields=DATASET_FIELDS), limit)
+
+
+def token_counts_path(path: Optional[str] = None) -> str:
+    """Returns where the token counts of a dataset file are stored."""
+    return os.path.splitext(path or DATASET_PATH)[0] + ".tokens.json"
+
+
+def _read_token_counts(
+    model: Optional[str], path: Optional[str]
+) -> Tuple[Dict[str, Any], str, str]:
+    path = path or DATASET_PATH
+    stat = os.stat(path)
+    fingerprint = f"{stat.st_size}:{stat.st_mtime_ns}"
     try:
-        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-        dataset_path = os.path.join(project_root, "data", "test.json")
+        with open(token_counts_path(path), "r", encoding="utf-8") as f:
+            stored = json.load(f)
+    except (OSError, ValueError):
+        stored = {}
+    if stored.get("dataset") != fingerprint:
+        stored = {"dataset": fingerprint, "counts": {}}
+    return stored, tokenizer_name(model or settings.GENERATION_LLM), path
+
+
+def stored_token_counts(
+    model: Optional[str] = None, path: Optional[str] = None
+) -> Optional[List[int]]:
+    """Returns the token counts `load_token_counts` stored, without counting any.
 
+    Args:
+        model: As for `load_token_counts`.
+        path: As for `load_token_counts`.
+
+    Returns:
+        The transcript token count of every dataset record, or None if they
+        have not been counted for this tokenizer and version of the dataset.
+    """
+    stored, tokenizer, _ = _read_token_counts(model, path)
+    return stored["counts"].get(tokenizer)
+
+
+def load_token_counts(
+    model: Optional[str] = None, path: Optional[str] = None
+) -> List[int]:
+    """Returns the transcript token count of every dataset record.
+
+    Counts are computed once per tokenizer and stored next to the dataset in
+    `<name>.tokens.json`; they are recomputed when the dataset file changes.
+    `just setup-data` computes them right after the download.
+
+    Args:
+        model: The model whose tokenizer to count with. If None, `GENERATION_LLM` is used.
+        path: The dataset file. If None, `DATASET_PATH` is used.
+    """
+    model = model or settings.GENERATION_LLM
+    stored, tokenizer, path = _read_token_counts(model, path)
+    if tokenizer in stored["counts"]:
+        return stored["counts"][tokenizer]
+
+    logging.info(f"Counting transcript tokens with {tokenizer}...")
+    counts = [
+        count_tokens(record["patient_convo"], model)
+        for record in iter_records(path=path)
+    ]
+    stored["counts"][tokenizer] = counts
+    counts_path = token_counts_path(path)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(counts_path) or ".")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(stored, f)
+    os.replace(tmp_path, counts_path)
+    return counts
+
+
+def load_data(
+    limit: int = None,
+    use_cache: bool = True,
+    refresh: bool = False,
+    path: Optional[str] = None,
+) -> List[ClinicalNote]:
+    """Loads the dataset from the local data directory and returns a list of ClinicalNote objects.
+
+    Args:
+        limit: The maximum number of records to load. If None, the full dataset is loaded.
+        use_cache: Reuse previously generated notes from the on-disk cache.
+        refresh: Regenerate every note and overwrite the cached entries.
+        path: The dataset file to read. If None, `DATASET_PATH` is used.
+    """
+    try:
+        dataset_path = path or DATASET_PATH
         if not os.path.exists(dataset_path):
             logging.error(
                 f"Dataset file not found at {dataset_path}. Please run 'just setup-data' to download it."
             )
             return []
 
-        df = pd.read_json(dataset_path)
+        records = list(iter_records(limit=limit or None, path=dataset_path))
 
-        if limit:
-            df = df.head(limit)
+        # Use the prompt version from settings
+        calls: Dict[int, List[LLMCallStats]] = {}
+        generated_notes = asyncio.run(
+            generate_notes(
+                [record["patient_convo"] for record in records],
+                prompt_version=settings.PROMPT_VERSION,
+                cache=note_cache() if use_cache else None,
+                refresh=refresh,
+                # Transcripts without a stored count are counted as they are generated
+                token_counts=stored_token_counts(path=dataset_path),
+                calls=calls,
+            )
+        )
 
         notes = []
-        for _, row in df.iterrows():
-            # Use the prompt version from settings
-            generated = generate_note(
-                row["patient_convo"], prompt_version=settings.PROMPT_VERSION
-            )
+        for index, (record, generated) in enumerate(zip(records, generated_notes)):
+            failed = isinstance(generated, LLMCallError)
             notes.append(
                 ClinicalNote(
-                    transcript=row["patient_convo"],
-                    note=row["soap_notes"],
-                    generated_note=generated,
+                    note_id=str(index),
+                    transcript=record["patient_convo"],
+                    note=record["soap_notes"],
+                    generated_note="" if failed else generated,
+                    generation_error=str(generated) if failed else None,
+                    generation_calls=calls.get(index, []),
                 )
             )
         return notes
     except Exception as e:
         logging.error(f"Error loading data: {e}")
         return []
+
+
+if __name__ == "__main__":
+    # Precompute the transcript token counts, e.g. right after downloading the dataset
+    load_token_counts()
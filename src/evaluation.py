@@ -1,106 +1,454 @@
-from typing import List, Dict, Union
+import logging
+import os
+from typing import Any, Collection, List, Dict, Optional, Tuple, Union
 
-from deepeval import evaluate
-from deepeval.metrics import HallucinationMetric
+import deepeval
+import numpy as np
+from deepeval.metrics import BaseMetric, HallucinationMetric
 from deepeval.test_case import LLMTestCase
 
+from src.aggregation import SCORE_FIELDS, overall_score, overall_scores, summarize
+from src.core.cache import DiskCache, content_hash, shared_cache
 from src.core.config import settings
+from src.core.executor import JudgeJob, run_judge_jobs
+from src.core.judge_model import JudgeLLM
+from src.local_metrics import JUDGE_TIER, LOCAL_TIER, local_score
+from src.reference_metrics import reference_scores, score_rows
+from src.result_table import ResultTable
 from src.schemas.metrics import (
     ClinicalAccuracyMetric,
     ClinicalSafetyMetric,
     MedicalTerminologyMetric,
+    MultiCriteriaJudgeMetric,
     SOAPStructureMetric,
 )
-from src.schemas.models import ClinicalNote, EvaluationResult
+from src.schemas.models import ClinicalNote, EvaluationResult, LLMCallStats
 
+# Maps each metric's name to the EvaluationResult field that holds its score
+METRIC_FIELDS: Dict[str, str] = {
+    "Hallucination": "hallucination_score",
+    # "Contextual Recall": "missing_info_score",
+    "Clinical Accuracy [GEval]": "clinical_accuracy_score",
+    "SOAP Structure Compliance [GEval]": "soap_structure_score",
+    "Clinical Safety Assessment [GEval]": "clinical_safety_score",
+    "Medical Terminology Accuracy [GEval]": "medical_terminology_score",
+}
 
-def run_evaluation(notes: List[ClinicalNote]) -> List[EvaluationResult]:
-    """Runs the DeepEval evaluation on a list of clinical notes."""
 
-    # Create a list of test cases from the clinical notes
-    test_cases = [
-        LLMTestCase(
-            input=note.transcript,
-            actual_output=note.generated_note,
-            expected_output=note.ground_truth_note,
-            context=[note.ground_truth_note],
-            retrieval_context=[note.transcript],
-        )
-        for note in notes
+def get_metrics(
+    multi_criteria: Optional[bool] = None, judge: Optional[JudgeLLM] = None
+) -> List[BaseMetric]:
+    """Returns the metrics every note is evaluated with.
+
+    Args:
+        multi_criteria: Score the GEval metrics with one combined judge call per
+            note instead of one call per metric. If None, `MULTI_CRITERIA_JUDGE`
+            decides.
+        judge: The judge model of every metric. If None, each metric gets an
+            `EVALUATION_LLM` judge.
+    """
+    model = (lambda: judge) if judge is not None else JudgeLLM
+    geval_metrics = [
+        ClinicalAccuracyMetric(threshold=0.7, model=model()),
+        SOAPStructureMetric(threshold=0.7, model=model()),
+        ClinicalSafetyMetric(threshold=0.7, model=model()),
+        MedicalTerminologyMetric(threshold=0.7, model=model()),
     ]
-    # Define the metrics to run
-    metrics_to_run = [
-        HallucinationMetric(threshold=0.3),
+    if multi_criteria is None:
+        multi_criteria = settings.MULTI_CRITERIA_JUDGE
+    return [
+        HallucinationMetric(threshold=0.3, model=model()),
         # ContextualRecallMetric(threshold=0.8),
-        ClinicalAccuracyMetric(threshold=0.7),
-        SOAPStructureMetric(threshold=0.7),
-        ClinicalSafetyMetric(threshold=0.7),
-        MedicalTerminologyMetric(threshold=0.7),
+        *(
+            [MultiCriteriaJudgeMetric(geval_metrics, threshold=0.7, model=model())]
+            if multi_criteria
+            else geval_metrics
+        ),
     ]
 
-    # Define hyperparameters to track with this evaluation run
-    hyperparameters: Dict[str, Union[str, int, float]] = {
-        "prompt_version": settings.PROMPT_VERSION,
-        "generation_model": settings.GENERATION_LLM,
+
+def metric_name(metric: BaseMetric) -> str:
+    """Returns the name a metric is registered under in `METRIC_FIELDS`."""
+    # GEval's __name__ appends another " [GEval]" to the name, so prefer `name`
+    return getattr(metric, "name", None) or metric.__name__
+
+
+def covered_metrics(metric: BaseMetric) -> List[str]:
+    """Returns the names of the metrics whose scores a metric's verdict holds."""
+    if isinstance(metric, MultiCriteriaJudgeMetric):
+        return [metric_name(m) for m in metric.criteria_metrics]
+    return [metric_name(metric)]
+
+
+def verdict_scores(
+    metric: BaseMetric, score: float, reason: Optional[str]
+) -> Dict[str, float]:
+    """Returns the scores, keyed by `METRIC_FIELDS` name, that a verdict stands for."""
+    if isinstance(metric, MultiCriteriaJudgeMetric):
+        return MultiCriteriaJudgeMetric.breakdown(reason)
+    return {metric_name(metric): score}
+
+
+def result_fields(
+    scores: Dict[str, float], tiers: Optional[Dict[str, str]] = None
+) -> Tuple[Dict[str, float], Dict[str, str]]:
+    """Maps metric scores keyed by metric name to EvaluationResult fields.
+
+    Args:
+        scores: The metric scores, keyed by metric name.
+        tiers: The tier that produced each score, keyed by metric name. Scores
+            without an entry come from the judge.
+
+    Returns:
+        The score field of every metric (0 if it was not scored) and the tier
+        of each scored field.
+    """
+    fields = {field: scores.get(name, 0.0) for name, field in METRIC_FIELDS.items()}
+    score_tiers = {
+        field: (tiers or {}).get(name, JUDGE_TIER)
+        for name, field in METRIC_FIELDS.items()
+        if name in scores
+    }
+    return fields, score_tiers
+
+
+def build_result(
+    note: ClinicalNote,
+    scores: Dict[str, float],
+    tiers: Optional[Dict[str, str]] = None,
+    calls: Optional[List[LLMCallStats]] = None,
+    reference: Optional[Dict[str, Optional[float]]] = None,
+) -> EvaluationResult:
+    """Builds an EvaluationResult from metric scores keyed by metric name.
+
+    Args:
+        note: The evaluated note.
+        scores: The metric scores, keyed by metric name.
+        tiers: As for `result_fields`.
+        calls: The stats of the judge calls made for the note.
+        reference: The reference metrics of the note, keyed by field (see
+            `src.reference_metrics`).
+
+    The overall score is the weighted mean of `src.aggregation.overall_score`.
+    """
+    fields, score_tiers = result_fields(scores, tiers)
+    return EvaluationResult(
+        note=note,
+        **fields,
+        **(reference or {}),
+        overall_score=overall_score(fields),
+        score_tiers=score_tiers,
+        judge_calls=calls or [],
+    )
+
+
+def aggregate_results(results: List[EvaluationResult]) -> Dict[str, float]:
+    """Returns the mean of every score over a set of results, plus their count.
+
+    Aggregates are always computed from the per-note results, so results merged
+    from several runs are weighted by note rather than by run. Every mean comes
+    with its bootstrap confidence interval (`<field>_ci_low`, `<field>_ci_high`).
+    """
+    return summarize(results)
+
+
+def judge_cache() -> DiskCache:
+    """Returns the process-wide on-disk cache of judge scores and reasons."""
+    return shared_cache(
+        os.path.join(settings.CACHE_DIR, "judgements"), settings.JUDGE_CACHE_MAX_BYTES
+    )
+
+
+def metric_definition(metric: BaseMetric) -> Dict[str, Any]:
+    """Returns everything about a metric that determines its verdicts."""
+    definition = _metric_definition(metric)
+    # Sampled judges (temperature, seed) give other verdicts than the greedy one
+    sampling = getattr(getattr(metric, "model", None), "sampling", None)
+    if sampling:
+        definition["sampling"] = sampling
+    return definition
+
+
+def _metric_definition(metric: BaseMetric) -> Dict[str, Any]:
+    if isinstance(metric, MultiCriteriaJudgeMetric):
+        return {
+            "metric": type(metric).__name__,
+            "criteria_metrics": [
+                _metric_definition(m) for m in metric.criteria_metrics
+            ],
+            "prompt": metric.judge_messages(
+                LLMTestCase(input="", actual_output="", context=[])
+            ),
+            "model": metric.evaluation_model,
+        }
+    return {
+        "metric": type(metric).__name__,
+        "name": metric_name(metric),
+        "criteria": getattr(metric, "criteria", None),
+        "evaluation_steps": getattr(metric, "evaluation_steps", None),
+        "evaluation_params": [
+            str(param) for param in getattr(metric, "evaluation_params", None) or []
+        ],
+        "threshold": metric.threshold,
+        "model": getattr(metric, "evaluation_model", None) or settings.EVALUATION_LLM,
+        # deepeval's own prompt templates change between releases
+        "deepeval": deepeval.__version__,
+    }
+
+
+def judgement_key(metric: BaseMetric, test_case: LLMTestCase) -> str:
+    """Hashes a metric definition together with the test case it judges."""
+    return content_hash(
+        metric_definition(metric),
+        test_case.input,
+        test_case.actual_output,
+        test_case.expected_output,
+        test_case.context,
+        test_case.retrieval_context,
+    )
+
+
+def get_hyperparameters(
+    prompt_version: Optional[str] = None, generation_model: Optional[str] = None
+) -> Dict[str, Union[str, int, float]]:
+    """Returns the hyperparameters tracked with each evaluation run.
+
+    Args:
+        prompt_version: The prompt version the notes were generated with. If None,
+            `PROMPT_VERSION` is used.
+        generation_model: The model the notes were generated with. If None,
+            `GENERATION_LLM` is used.
+    """
+    return {
+        "prompt_version": prompt_version or settings.PROMPT_VERSION,
+        "generation_model": generation_model or settings.GENERATION_LLM,
         "evaluation_model": settings.EVALUATION_LLM,
     }
 
+
+def run_identifier(hyperparameters: Dict[str, Union[str, int, float]]) -> str:
+    """Returns a descriptive label for the prompt version and model of a run."""
+    model = str(hyperparameters["generation_model"]).replace(".", "-")
+    return f"prompt-{hyperparameters['prompt_version']}_gen-{model}"
+
+
+def note_case_id(note: ClinicalNote) -> str:
+    """Returns an ID of a note's test case that is stable across runs and batches."""
+    return content_hash(
+        note.note_id, note.transcript, note.generated_note, note.ground_truth_note
+    )
+
+
+def note_test_case(note: ClinicalNote) -> LLMTestCase:
+    """Returns the test case every metric judges a note with."""
+    return LLMTestCase(
+        input=note.transcript,
+        actual_output=note.generated_note,
+        expected_output=note.ground_truth_note,
+        context=[note.ground_truth_note],
+        retrieval_context=[note.transcript],
+    )
+
+
+def known_scores(
+    notes: List[ClinicalNote],
+    test_cases: List[LLMTestCase],
+    metrics: List[BaseMetric],
+    cache: Optional[DiskCache],
+    pre_metrics: bool,
+) -> Tuple[
+    List[List[str]], List[Dict[str, float]], List[Dict[str, str]], List[List[int]]
+]:
+    """Scores (note, metric) pairs locally or from the judgement cache.
+
+    Args:
+        notes: The notes.
+        test_cases: The test case of every note.
+        metrics: The metrics to score.
+        cache: The judgement cache, or None to judge every pair.
+        pre_metrics: Score clear-cut cases with the local pre-metrics.
+
+    Returns:
+        Per note: the judgement key of every metric, the scores and tiers known
+        so far keyed by metric name, and the indices of the metrics that still
+        need the judge.
+    """
+    keys = [[judgement_key(metric, case) for metric in metrics] for case in test_cases]
+    scores: List[Dict[str, float]] = [{} for _ in notes]
+    tiers: List[Dict[str, str]] = [{} for _ in notes]
+    missing: List[List[int]] = [[] for _ in notes]
+    local = reused = 0
+    for i, note_keys in enumerate(keys):
+        for j, key in enumerate(note_keys):
+            name = metric_name(metrics[j])
+            score = local_score(name, notes[i]) if pre_metrics else None
+            if score is not None:
+                scores[i][name] = score
+                tiers[i][name] = LOCAL_TIER
+                local += 1
+                continue
+            cached = cache.get(key) if cache is not None else None
+            if cached is None:
+                missing[i].append(j)
+            else:
+                scores[i].update(
+                    verdict_scores(metrics[j], cached["score"], cached["reason"])
+                )
+                reused += 1
+    if local:
+        logging.info(f"Scored {local} (note, metric) pairs with local pre-metrics.")
+    if reused:
+        logging.info(f"Reusing {reused} cached judgements.")
+    return keys, scores, tiers, missing
+
+
+def run_evaluation(
+    notes: List[ClinicalNote],
+    hyperparameters: Optional[Dict[str, Union[str, int, float]]] = None,
+    identifier: Optional[str] = None,
+    use_cache: bool = True,
+    multi_criteria: Optional[bool] = None,
+    pre_metrics: Optional[bool] = None,
+    judge: Optional[JudgeLLM] = None,
+    only_metrics: Optional[Collection[str]] = None,
+    reference_metrics: Optional[bool] = None,
+    metrics: Optional[List[BaseMetric]] = None,
+) -> ResultTable:
+    """Runs the DeepEval metrics on a list of clinical notes.
+
+    Every (note, metric) pair is judged as a separate job by the async executor
+    in `src.core.executor`. Notes whose generation failed are not judged, and
+    notes with a pair that still fails after the retry passes are left out;
+    neither has a result. Scores
+    of (note, metric) pairs judged before with the same inputs and metric
+    definition are taken from the judgement cache, so only new or changed pairs
+    are sent to the judge. With pre-metrics, metrics that have a local scorer
+    are only judged when the local score is ambiguous; `score_tiers` of each
+    result records which scores were produced locally. The lexical reference
+    metrics are computed for the whole batch at once, without API calls.
+
+    Args:
+        notes: The notes to evaluate.
+        hyperparameters: The hyperparameters the notes were generated with. If
+            None, they are taken from the settings.
+        identifier: The label of the evaluation run. If None, it is derived from
+            the prompt version and generation model.
+        use_cache: Read and write the judgement cache.
+        multi_criteria: Score the GEval metrics in one judge call per note. If
+            None, `MULTI_CRITERIA_JUDGE` decides.
+        pre_metrics: Score clear-cut cases with the local pre-metrics. If None,
+            `PRE_METRICS` decides.
+        judge: The judge model of every metric. If None, `EVALUATION_LLM` judges.
+        only_metrics: Only run the metrics with these names (a multi-criteria
+            judge runs if it covers any of them). If None, all metrics run.
+        reference_metrics: Score the notes against the ground truth with
+            ROUGE-L, token F1 and entity overlap. If None, `REFERENCE_METRICS`
+            decides.
+        metrics: The metrics, e.g. built once per stage with `get_metrics`.
+            If None, they are built from `multi_criteria` and `judge`.
+
+    Returns:
+        The results, in the order of the notes, as a `ResultTable` that holds
+        the scores in arrays and references the notes.
+    """
+    failed = [note for note in notes if note.generation_error]
+    if failed:
+        logging.warning(f"Skipping {len(failed)} notes that failed to generate.")
+        notes = [note for note in notes if not note.generation_error]
+        if not notes:
+            return ResultTable(0)
+
+    # Create the test cases from the clinical notes, keyed by a stable ID
+    ids = [note_case_id(note) for note in notes]
+    test_cases = {case_id: note_test_case(note) for case_id, note in zip(ids, notes)}
+    # Define the metrics to run
+    metrics_to_run = [
+        metric
+        for metric in metrics or get_metrics(multi_criteria, judge=judge)
+        if only_metrics is None or set(covered_metrics(metric)) & set(only_metrics)
+    ]
+
+    if pre_metrics is None:
+        pre_metrics = settings.PRE_METRICS
+    if reference_metrics is None:
+        reference_metrics = settings.REFERENCE_METRICS
+    references = (
+        score_rows(reference_scores(notes))
+        if reference_metrics
+        else [None] * len(notes)
+    )
+
+    # Define hyperparameters to track with this evaluation run
+    hyperparameters = hyperparameters or get_hyperparameters()
+
     # Create a descriptive identifier for the run
-    identifier = f"prompt-{settings.PROMPT_VERSION}_gen-{settings.GENERATION_LLM.replace('.', '-')}"
-
-    # Run the evaluation in parallel
-    evaluation_output = evaluate(
-        test_cases=test_cases,
-        metrics=metrics_to_run,
-        hyperparameters=hyperparameters,
-        identifier=identifier,
+    identifier = identifier or run_identifier(hyperparameters)
+
+    # Score clear-cut cases locally, reuse cached judgements and collect the
+    # (note, metric) pairs that still need the judge
+    cache = judge_cache() if use_cache else None
+    keys, scores, tiers, missing = known_scores(
+        notes,
+        [test_cases[case_id] for case_id in ids],
+        metrics_to_run,
+        cache,
+        pre_metrics,
     )
-    if not evaluation_output.test_results:
-        raise ValueError("Evaluation failed to return results.")
-
-    # Process the results
-    results = []
-    for i, test_result in enumerate(evaluation_output.test_results):
-        note = notes[i]
-        # Add a check to handle cases where the evaluation returns None.
-        if not test_result.metrics_data:
-            print(f"Warning: Evaluation failed for note {i}, skipping.")
-            continue
-        scores_dict = {m.name: m.score for m in test_result.metrics_data}
-
-        hallucination_score = scores_dict.get("Hallucination", 0.0)
-        # recall_score = scores_dict.get("Contextual Recall", 0.0)
-        accuracy_score = scores_dict.get("Clinical Accuracy [GEval]", 0.0)
-        soap_score = scores_dict.get("SOAP Structure Compliance [GEval]", 0.0)
-        safety_score = scores_dict.get("Clinical Safety Assessment [GEval]", 0.0)
-        terminology_score = scores_dict.get("Medical Terminology Accuracy [GEval]", 0.0)
-
-        # TODO: This could require more sophistication
-        overall_score = (
-            sum(
-                [
-                    hallucination_score,
-                    # recall_score,
-                    accuracy_score,
-                    soap_score,
-                    safety_score,
-                    terminology_score,
-                ]
-            )
-            / 5
-        )
+    jobs = [
+        [JudgeJob(case_id, j) for j in note_missing]
+        for case_id, note_missing in zip(ids, missing)
+    ]
+
+    # Judge the remaining pairs; identical notes share their jobs
+    pending = list(dict.fromkeys(job for note_jobs in jobs for job in note_jobs))
+    outcomes = run_judge_jobs(pending, test_cases, metrics_to_run) if pending else {}
+    if pending:
+        logging.info(f"Judged {len(pending)} (note, metric) pairs for {identifier}.")
 
-        results.append(
-            EvaluationResult(
-                note=note,
-                hallucination_score=hallucination_score,
-                # missing_info_score=recall_score,
-                clinical_accuracy_score=accuracy_score,
-                soap_structure_score=soap_score,
-                clinical_safety_score=safety_score,
-                medical_terminology_score=terminology_score,
-                overall_score=overall_score,
+    rows = []
+    for i, note in enumerate(notes):
+        errors = []
+        calls = []
+        for job in jobs[i]:
+            outcome = outcomes[job]
+            calls.extend(outcome.calls)
+            if outcome.error:
+                errors.append(
+                    f"{metric_name(metrics_to_run[job.metric_index])}: {outcome.error}"
+                )
+                continue
+            scores[i].update(
+                verdict_scores(
+                    metrics_to_run[job.metric_index], outcome.score, outcome.reason
+                )
             )
-        )
+            if cache is not None:
+                cache.set(
+                    keys[i][job.metric_index],
+                    {"score": outcome.score, "reason": outcome.reason},
+                )
+        # A note with a failed pair has no result; its other pairs stay cached
+        # so that evaluating it again only re-judges the failed ones
+        if errors:
+            logging.warning(
+                f"Evaluation failed for note {note.note_id or i}, skipping: "
+                + "; ".join(errors)
+            )
+            continue
+        rows.append((note, *result_fields(scores[i], tiers[i]), calls, references[i]))
 
+    # The overall scores of the whole batch at once
+    matrix = np.array(
+        [[fields[field] for field in SCORE_FIELDS] for _, fields, _, _, _ in rows]
+    ).reshape(len(rows), len(SCORE_FIELDS))
+    results = ResultTable(len(rows))
+    for (note, fields, score_tiers, calls, reference), overall in zip(
+        rows, overall_scores(matrix).tolist()
+    ):
+        results.add(
+            note,
+            {**fields, **(reference or {}), "overall_score": overall},
+            score_tiers,
+            calls,
+        )
     return results
@@ -0,0 +1,191 @@
+"""
+Local stand-in for the OpenAI chat completions API.
+
+`FakeOpenAIServer` answers `POST /v1/chat/completions` like the provider does,
+so the suite can be driven end to end without network access or cost: point
+the clients at it with `OPENAI_BASE_URL`. Every response is delayed by a
+latency drawn from a lognormal distribution, and a configurable share of
+requests is answered with a 429 (with a Retry-After header) or a 500 instead.
+
+Answers come from a responder, by default the same stand-in the local batch
+backend uses: a canned SOAP note for generation requests and a passing verdict
+for JSON (judge) requests.
+
+The server is a small asyncio HTTP/1.1 implementation with keep-alive, so it
+can hold thousands of concurrent requests in one thread.
+"""
+
+import asyncio
+import json
+import math
+import multiprocessing
+import random
+import socket
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.batch import stand_in_responder
+
+Responder = Callable[[Dict[str, Any]], str]
+
+
+@dataclass
+class FakeServerConfig:
+    """How the fake endpoint behaves."""
+
+    latency_median: float = 0.05  # seconds
+    latency_sigma: float = 0.5  # spread of the lognormal latency; 0 is constant
+    error_rate: float = 0.0  # share of requests answered with a 500
+    rate_limit_rate: float = 0.0  # share of requests answered with a 429
+    retry_after: float = 0.1  # seconds, sent with every 429
+    seed: Optional[int] = None
+
+
+def _usage(body: Dict[str, Any], content: str) -> Dict[str, int]:
+    # Roughly four characters per token, like `estimate_tokens`
+    prompt = sum(len(str(m.get("content", ""))) for m in body.get("messages", []))
+    prompt_tokens, completion_tokens = prompt // 4 + 1, len(content) // 4 + 1
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+class FakeOpenAIServer:
+    """Serves fake chat completions on a local port."""
+
+    def __init__(
+        self,
+        config: Optional[FakeServerConfig] = None,
+        responder: Responder = stand_in_responder,
+    ):
+        self.config = config or FakeServerConfig()
+        self.responder = responder
+        self.random = random.Random(self.config.seed)
+        self.requests = 0
+
+    def latency(self) -> float:
+        """Draws the delay of one response."""
+        config = self.config
+        if config.latency_median <= 0:
+            return 0.0
+        return config.latency_median * math.exp(
+            self.random.gauss(0, config.latency_sigma)
+        )
+
+    def answer(self, body: Dict[str, Any]) -> Tuple[int, Dict[str, str], Dict]:
+        """Returns the status, extra headers and JSON payload for a request body."""
+        self.requests += 1
+        draw = self.random.random()
+        if draw < self.config.rate_limit_rate:
+            error = {"message": "Rate limit reached.", "type": "requests"}
+            headers = {"retry-after": str(self.config.retry_after)}
+            return 429, headers, {"error": {**error, "code": "rate_limit_exceeded"}}
+        if draw < self.config.rate_limit_rate + self.config.error_rate:
+            return (
+                500,
+                {},
+                {"error": {"message": "Injected failure.", "type": "server_error"}},
+            )
+
+        content = self.responder(body)
+        return (
+            200,
+            {},
+            {
+                "id": f"chatcmpl-fake-{self.requests}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": content},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": _usage(body, content),
+            },
+        )
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length", 0))
+                raw = await reader.readexactly(length) if length else b""
+
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                if method == "POST" and path.rstrip("/").endswith("/chat/completions"):
+                    await asyncio.sleep(self.latency())
+                    status, extra, payload = self.answer(json.loads(raw or b"{}"))
+                else:
+                    status, extra, payload = (
+                        404,
+                        {},
+                        {"error": {"message": "Not found."}},
+                    )
+
+                data = json.dumps(payload).encode("utf-8")
+                head = [
+                    f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}",
+                    "Content-Type: application/json",
+                    f"Content-Length: {len(data)}",
+                    *(f"{name}: {value}" for name, value in extra.items()),
+                ]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + data)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, sock: socket.socket) -> None:
+        """Serves requests on a bound socket until cancelled."""
+        server = await asyncio.start_server(self._handle, sock=sock, backlog=4096)
+        async with server:
+            await server.serve_forever()
+
+
+def _serve(config: FakeServerConfig, host: str, ports: multiprocessing.Queue) -> None:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, 0))
+    sock.listen(4096)
+    ports.put(sock.getsockname()[1])
+    asyncio.run(FakeOpenAIServer(config).serve(sock))
+
+
+def start_fake_server(
+    config: Optional[FakeServerConfig] = None, host: str = "127.0.0.1"
+) -> Tuple[multiprocessing.Process, str]:
+    """Starts the fake server in a separate process.
+
+    The server gets its own process so that its work does not count towards
+    the CPU time and memory of the process being measured.
+
+    Returns:
+        The server process (terminate it when done) and the base URL to use as
+        `OPENAI_BASE_URL`.
+    """
+    ports = multiprocessing.Queue()
+    process = multiprocessing.Process(
+        target=_serve, args=(config or FakeServerConfig(), host, ports), daemon=True
+    )
+    process.start()
+    return process, f"http://{host}:{ports.get(timeout=30)}/v1"
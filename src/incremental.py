@@ -0,0 +1,311 @@
+"""
+Incremental runs that carry unchanged work forward from an earlier run.
+
+Before a run started with `python -m src.main --incremental` generates or
+judges anything, it is compared with an earlier run from the run store (by
+default the latest one):
+
+- A record keeps the earlier run's generated note if its transcript and
+  ground-truth note are unchanged and both runs use the same prompt version
+  and generation model.
+- A (note, metric) cell of a kept note keeps the earlier score if the metric's
+  definition (criteria, steps, threshold, judge model, ...) and the settings
+  that decide how it is scored (multi-criteria judging, the pre-metric band,
+  the cheap judge tier) are unchanged. Every run records a fingerprint of
+  both for each metric, `metric_versions`, in its metadata; cells of metrics
+  the earlier run did not record, or did not score, are stale.
+
+The stale cells of kept notes are judged right away by the evaluator of the
+evaluation stage, grouped by the metrics they need, and merged with the
+carried ones. Records that are new or changed
+are left to the usual pipeline stages. Every result records in `carried_from`
+which score fields were carried forward and from which run.
+"""
+
+import logging
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+from src.checkpoint import RunCheckpoint
+from src.core.cache import content_hash
+from src.core.config import settings
+from src.data_loader import iter_records
+from src.evaluation import (
+    METRIC_FIELDS,
+    build_result,
+    covered_metrics,
+    get_hyperparameters,
+    get_metrics,
+    metric_definition,
+)
+from src.local_metrics import LOCAL_SCORERS
+from src.pipeline import stage_evaluator
+from src.reference_metrics import reference_scores, score_rows
+from src.result_table import ResultTable
+from src.run_store import RunStore
+from src.schemas.models import ClinicalNote, EvaluationResult
+from src.sharding import in_shard
+
+
+def scoring_setup(
+    multi_criteria: Optional[bool] = None,
+    pre_metrics: Optional[bool] = None,
+    tiered: Optional[bool] = None,
+) -> Dict[str, Any]:
+    """Returns the settings besides the metric definitions that decide a score.
+
+    Only settings that differ from a plain strong-judge run are included, so
+    such runs keep the fingerprints of plain metric definitions.
+
+    Args:
+        multi_criteria: As for `get_metrics`.
+        pre_metrics: Whether local pre-metrics run. If None, `PRE_METRICS`.
+        tiered: Whether the cheap judge runs first. If None, `TIERED_JUDGE`.
+
+    Returns:
+        `multi_criteria`, the `pre_metric_band` and the `tiering` settings,
+        where they apply.
+    """
+    if multi_criteria is None:
+        multi_criteria = settings.MULTI_CRITERIA_JUDGE
+    pre_metrics = settings.PRE_METRICS if pre_metrics is None else pre_metrics
+    tiered = settings.TIERED_JUDGE if tiered is None else tiered
+    setup: Dict[str, Any] = {}
+    if multi_criteria:
+        setup["multi_criteria"] = True
+    if pre_metrics:
+        setup["pre_metric_band"] = [
+            settings.PRE_METRIC_BAND_LOW,
+            settings.PRE_METRIC_BAND_HIGH,
+        ]
+    if tiered:
+        setup["tiering"] = {
+            "cheap_model": settings.CHEAP_EVALUATION_LLM,
+            "samples": settings.CHEAP_JUDGE_SAMPLES,
+            "temperature": settings.CHEAP_JUDGE_TEMPERATURE,
+            "max_spread": settings.CHEAP_JUDGE_MAX_SPREAD,
+            "escalation_margin": settings.ESCALATION_MARGIN,
+        }
+    return setup
+
+
+def metric_versions(
+    multi_criteria: Optional[bool] = None,
+    pre_metrics: Optional[bool] = None,
+    tiered: Optional[bool] = None,
+) -> Dict[str, str]:
+    """Fingerprints how every score field is scored.
+
+    A field's fingerprint covers the definition of its metric and the
+    `scoring_setup`. The pre-metric band only counts for fields with a local
+    scorer.
+
+    Args:
+        multi_criteria: As for `scoring_setup`.
+        pre_metrics: As for `scoring_setup`.
+        tiered: As for `scoring_setup`.
+
+    Returns:
+        A hash of how each field is scored, keyed by `EvaluationResult` field.
+    """
+    setup = scoring_setup(multi_criteria, pre_metrics, tiered)
+    versions = {}
+    for metric in get_metrics(setup.get("multi_criteria", False)):
+        definition = metric_definition(metric)
+        for name in covered_metrics(metric):
+            if name not in METRIC_FIELDS:
+                continue
+            field_setup = {
+                key: value
+                for key, value in setup.items()
+                if key != "pre_metric_band" or name in LOCAL_SCORERS
+            }
+            versions[METRIC_FIELDS[name]] = (
+                content_hash(definition, field_setup)
+                if field_setup
+                else content_hash(definition)
+            )
+    return versions
+
+
+def same_inputs(note: ClinicalNote, record: Dict[str, str]) -> bool:
+    """Returns whether a note was generated from a dataset record as it is now."""
+    return (
+        note.transcript == record["patient_convo"]
+        and note.ground_truth_note == record["soap_notes"]
+    )
+
+
+def stale_fields(
+    previous: EvaluationResult, before: Dict[str, str], now: Dict[str, str]
+) -> FrozenSet[str]:
+    """Returns the score fields of an earlier result that must be judged again.
+
+    Args:
+        previous: The earlier result.
+        before: The `metric_versions` of the earlier run.
+        now: The `metric_versions` of the current run.
+    """
+    return frozenset(
+        field
+        for field, version in now.items()
+        if before.get(field) != version or field not in previous.score_tiers
+    )
+
+
+def merge_cells(
+    note: ClinicalNote,
+    previous: EvaluationResult,
+    previous_run_id: str,
+    fields: Dict[str, str],
+    judged: Optional[EvaluationResult] = None,
+    reference: Optional[Dict[str, Optional[float]]] = None,
+) -> EvaluationResult:
+    """Combines the carried and the newly judged scores of a note.
+
+    Args:
+        note: The note, as reused by the current run.
+        previous: Its result in the earlier run.
+        previous_run_id: The earlier run.
+        fields: The score fields of the current run (see `metric_versions`).
+        judged: The result of judging the stale fields, if any were.
+        reference: The reference metrics of the note.
+    """
+    names = {field: name for name, field in METRIC_FIELDS.items()}
+    scores, tiers, carried_from = {}, {}, {}
+    for field in fields:
+        if judged is not None and field in judged.score_tiers:
+            source = judged
+        elif field in previous.score_tiers:
+            source = previous
+            # Cells carried over several runs keep the run that scored them
+            carried_from[field] = previous.carried_from.get(field, previous_run_id)
+        else:
+            continue
+        scores[names[field]] = getattr(source, field)
+        tiers[names[field]] = source.score_tiers[field]
+    result = build_result(
+        note, scores, tiers, judged.judge_calls if judged else [], reference
+    )
+    return result.model_copy(
+        update={
+            "carried_from": carried_from,
+            "cheap_judge_scores": {
+                field: score
+                for field, score in previous.cheap_judge_scores.items()
+                if field in carried_from
+            },
+        }
+    )
+
+
+def carry_forward(
+    checkpoint: RunCheckpoint,
+    store: RunStore,
+    previous_run_id: str,
+    records: Optional[List[Dict[str, str]]] = None,
+    use_cache: bool = True,
+) -> Dict[str, int]:
+    """Seeds a new run with the unchanged notes and scores of an earlier run.
+
+    Reused notes are appended to the checkpoint, and their results once the
+    stale cells are judged. A note whose stale cells fail to be judged gets no
+    result here, so the evaluation stage judges it as usual.
+
+    Args:
+        checkpoint: The new run. Its metadata should hold the current
+            `metric_versions`; they are computed if it does not.
+        store: The run store holding the earlier run.
+        previous_run_id: The earlier run.
+        records: The run's dataset records, if they are already loaded.
+        use_cache: Read and write the judgement cache.
+
+    Returns:
+        The number of `notes` reused, `carried` cells and `judged` cells.
+
+    Raises:
+        ValueError: If the earlier run is not in the store.
+    """
+    counts = {"notes": 0, "carried": 0, "judged": 0}
+    previous_run = next(
+        (run for run in store.runs() if run["run_id"] == previous_run_id), None
+    )
+    if previous_run is None:
+        raise ValueError(f"Run {previous_run_id} is not in {store.path}")
+    metadata = checkpoint.metadata
+    before = previous_run["metadata"]
+    if any(
+        before.get(key) != metadata.get(key)
+        for key in ("prompt_version", "generation_model")
+    ):
+        logging.info(
+            f"Run {previous_run_id} used another prompt version or generation "
+            "model; nothing to carry forward."
+        )
+        return counts
+
+    now = metadata.get("metric_versions") or metric_versions()
+    versions_before = before.get("metric_versions", {})
+    previous = store.load_results(previous_run_id)
+    if records is None:
+        records = iter_records(limit=metadata.get("limit"))
+    shard = metadata.get("shard")
+    reused: List[Tuple[ClinicalNote, EvaluationResult]] = []
+    for index, record in enumerate(records):
+        result = previous.get(str(index))
+        if shard is not None and not in_shard(record, shard):
+            continue
+        if result is not None and same_inputs(result.note, record):
+            # No calls were made for the note in this run
+            reused.append(
+                (result.note.model_copy(update={"generation_calls": []}), result)
+            )
+    if not reused:
+        return counts
+    checkpoint.append_notes(note for note, _ in reused)
+
+    # Judge the stale cells, grouping notes that need the same metrics
+    stale = [stale_fields(result, versions_before, now) for _, result in reused]
+    groups: Dict[FrozenSet[str], List[ClinicalNote]] = {}
+    for (note, _), fields in zip(reused, stale):
+        if fields:
+            groups.setdefault(fields, []).append(note)
+    names = {field: name for name, field in METRIC_FIELDS.items()}
+    hyperparameters = get_hyperparameters(
+        metadata.get("prompt_version"), metadata.get("generation_model")
+    )
+    judged = ResultTable(sum(len(notes) for notes in groups.values()))
+    evaluate = stage_evaluator() if groups else None
+    for fields, notes in groups.items():
+        judged.extend(
+            evaluate(
+                notes,
+                hyperparameters,
+                use_cache=use_cache,
+                only_metrics=[names[field] for field in fields],
+            )
+        )
+
+    references = (
+        score_rows(reference_scores([note for note, _ in reused]))
+        if settings.REFERENCE_METRICS
+        else [None] * len(reused)
+    )
+    results = ResultTable(len(reused))
+    for (note, result), fields, reference in zip(reused, stale, references):
+        judged_result = judged.get(note.note_id)
+        if fields and judged_result is None:
+            continue
+        merged = merge_cells(
+            note, result, previous_run_id, now, judged_result, reference
+        )
+        results.append(merged)
+        counts["carried"] += len(merged.carried_from)
+        counts["judged"] += len(merged.score_tiers) - len(merged.carried_from)
+    checkpoint.append_results(results)
+    counts["notes"] = len(reused)
+    logging.info(
+        f"Reused {counts['notes']} notes of run {previous_run_id}: carried "
+        f"{counts['carried']} (note, metric) cells forward and judged "
+        f"{counts['judged']} stale ones."
+    )
+    return counts
@@ -0,0 +1,206 @@
+"""
+Deterministic local pre-metrics.
+
+Cheap scorers that run before the LLM judge: SOAP section detection for
+structure, a medication/dose extractor for safety and a lexicon check for
+terminology. A local score is only kept when it is clear-cut, i.e. outside the
+ambiguity band `[PRE_METRIC_BAND_LOW, PRE_METRIC_BAND_HIGH]`; scores inside the
+band, and notes a scorer has no signal for, are sent to the GEval judge.
+
+The dose and lexicon checks can only find problems: a note whose doses all
+match the sources, or without a do-not-use abbreviation, may still be unsafe
+or badly worded in ways they cannot see. They therefore score a note only when
+they find a problem and leave every other note to the judge.
+"""
+
+import re
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from src.core.config import settings
+from src.schemas.models import ClinicalNote
+
+# Which tier produced a score
+LOCAL_TIER = "local"
+JUDGE_TIER = "judge"
+
+SOAP_SECTIONS = ("subjective", "objective", "assessment", "plan")
+
+# A section header on its own line, e.g. "Subjective:", "## Plan" or "**S:**"
+_HEADER = re.compile(
+    r"^[\s#*_>-]*(subjective|objective|assessment(?:\s*(?:and|&)\s*plan)?|plan|[soap])"
+    r"\s*[*_]*\s*(?::|$|\n)",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+_UNITS = {
+    "mg": "mg",
+    "milligram": "mg",
+    "milligrams": "mg",
+    "mcg": "mcg",
+    "µg": "mcg",
+    "microgram": "mcg",
+    "micrograms": "mcg",
+    "g": "g",
+    "gram": "g",
+    "grams": "g",
+    "ml": "ml",
+    "milliliter": "ml",
+    "milliliters": "ml",
+    "unit": "units",
+    "units": "units",
+    "meq": "meq",
+}
+
+_DOSE = re.compile(
+    r"(?:\b([a-z][a-z-]{2,})\s+)?(\d+(?:,\d{3})*(?:\.\d+)?)\s*("
+    + "|".join(sorted((re.escape(unit) for unit in _UNITS), key=len, reverse=True))
+    # Concentrations such as "178 mg/dL" are lab values, not doses
+    + r")\b(?!\s*/)(?:\s+of\s+([a-z][a-z-]{2,}))?",
+    re.IGNORECASE,
+)
+
+# Abbreviations on the Joint Commission "Do Not Use" list and dose notations
+# that are easily misread by a factor of ten
+DO_NOT_USE = {
+    "U (write 'unit')": re.compile(r"\b\d+\s*U\b"),
+    "IU (write 'international unit')": re.compile(r"\bIU\b"),
+    "Q.D. (write 'daily')": re.compile(r"\bq\.?d\.?(?![a-z])", re.IGNORECASE),
+    "Q.O.D. (write 'every other day')": re.compile(
+        r"\bq\.?o\.?d\.?(?![a-z])", re.IGNORECASE
+    ),
+    "MS/MSO4/MgSO4 (write the drug name)": re.compile(r"\b(?:MSO4|MgSO4|MS)\b"),
+    "trailing zero": re.compile(r"\b\d+\.0\s*(?:mg|mcg|g|ml)\b", re.IGNORECASE),
+    "missing leading zero": re.compile(
+        r"(?<![\d.])\.\d+\s*(?:mg|mcg|g|ml)\b", re.IGNORECASE
+    ),
+}
+
+# Common misspellings of clinical terms
+MISSPELLINGS = {
+    "abdominal": re.compile(r"\babdomnal\b", re.IGNORECASE),
+    "asthma": re.compile(r"\basthama\b", re.IGNORECASE),
+    "diabetes": re.compile(r"\bdiabet(?:is|ees)\b", re.IGNORECASE),
+    "diarrhea": re.compile(r"\b(?:diarhea|diarrea|diahrrea)\b", re.IGNORECASE),
+    "hypertension": re.compile(r"\bhypertention\b", re.IGNORECASE),
+    "ibuprofen": re.compile(r"\bibuprophen\b", re.IGNORECASE),
+    "nausea": re.compile(r"\bnausia\b", re.IGNORECASE),
+    "pneumonia": re.compile(r"\bpnuemonia\b", re.IGNORECASE),
+    "prescription": re.compile(r"\bperscription\b", re.IGNORECASE),
+    "tachycardia": re.compile(r"\btachicardia\b", re.IGNORECASE),
+}
+
+# Score lost per terminology problem found
+TERMINOLOGY_PENALTY = 0.25
+
+
+class Dose(NamedTuple):
+    """A medication dose mentioned in a text."""
+
+    drug: Optional[str]
+    amount: float
+    unit: str
+
+
+def soap_sections(text: str) -> List[str]:
+    """Returns the SOAP sections that have a header in `text`, in SOAP order."""
+    found = set()
+    for match in _HEADER.finditer(text):
+        header = match.group(1).lower()
+        if header.startswith("assessment") and "plan" in header:
+            found.update(("assessment", "plan"))
+            continue
+        for section in SOAP_SECTIONS:
+            if section.startswith(header):
+                found.add(section)
+    return [section for section in SOAP_SECTIONS if section in found]
+
+
+def soap_structure_score(note: ClinicalNote) -> Optional[float]:
+    """Scores structure by the share of the four SOAP headers the note has."""
+    return len(soap_sections(note.generated_note)) / len(SOAP_SECTIONS)
+
+
+def extract_doses(text: str) -> List[Dose]:
+    """Extracts medication doses such as `ibuprofen 400 mg` or `5 milligrams of X`."""
+    doses = []
+    for before, amount, unit, after in _DOSE.findall(text):
+        drug = after or before
+        doses.append(
+            Dose(
+                drug=drug.lower() if drug else None,
+                amount=float(amount.replace(",", "")),
+                unit=_UNITS[unit.lower()],
+            )
+        )
+    return doses
+
+
+def medication_safety_score(note: ClinicalNote) -> Optional[float]:
+    """Scores the note by the doses it gives that the sources do not support.
+
+    Returns the share of the note's (amount, unit) pairs that the transcript or
+    the ground-truth note mention, so 0.0 if every dose is made up. None if the
+    note mentions no unsupported dose: matching doses say nothing about the
+    rest of the note, and a missed dose alone is too weak a signal to fail it.
+    """
+    noted = {(d.amount, d.unit) for d in extract_doses(note.generated_note)}
+    spoken = {(d.amount, d.unit) for d in extract_doses(note.transcript)}
+    documented = {(d.amount, d.unit) for d in extract_doses(note.ground_truth_note)}
+    supported = noted & (spoken | documented)
+    if supported == noted:
+        return None
+    return len(supported) / len(noted)
+
+
+def terminology_problems(text: str) -> List[str]:
+    """Lists the do-not-use abbreviations and misspellings found in `text`."""
+    problems = [
+        f"{name}: {match}"
+        for name, pattern in DO_NOT_USE.items()
+        for match in pattern.findall(text)
+    ]
+    problems += [
+        f"misspelled {term}: {match}"
+        for term, pattern in MISSPELLINGS.items()
+        for match in pattern.findall(text)
+    ]
+    return problems
+
+
+def terminology_score(note: ClinicalNote) -> Optional[float]:
+    """Scores terminology by the number of lexicon problems in the note.
+
+    None if the lexicon finds none, since the judge may still find others.
+    """
+    problems = terminology_problems(note.generated_note)
+    if not problems:
+        return None
+    return max(0.0, 1.0 - TERMINOLOGY_PENALTY * len(problems))
+
+
+# Local scorer of each GEval metric that has one, keyed by metric name
+LOCAL_SCORERS: Dict[str, Callable[[ClinicalNote], Optional[float]]] = {
+    "SOAP Structure Compliance [GEval]": soap_structure_score,
+    "Clinical Safety Assessment [GEval]": medication_safety_score,
+    "Medical Terminology Accuracy [GEval]": terminology_score,
+}
+
+
+def is_ambiguous(
+    score: float, low: Optional[float] = None, high: Optional[float] = None
+) -> bool:
+    """Returns whether a local score falls in the band that needs the judge."""
+    low = settings.PRE_METRIC_BAND_LOW if low is None else low
+    high = settings.PRE_METRIC_BAND_HIGH if high is None else high
+    return low <= score <= high
+
+
+def local_score(metric_name: str, note: ClinicalNote) -> Optional[float]:
+    """Returns the local score of a metric if it is clear-cut enough to skip the judge."""
+    scorer = LOCAL_SCORERS.get(metric_name)
+    if scorer is None:
+        return None
+    score = scorer(note)
+    if score is None or is_ambiguous(score):
+        return None
+    return score
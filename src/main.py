@@ -1,17 +1,39 @@
 import argparse
-import json
 import logging
 import os
 
+from src.batch import (
+    LocalBatchBackend,
+    OpenAIBatchBackend,
+    run_batch_evaluation_stage,
+    run_batch_generation_stage,
+)
+from src.checkpoint import RunCheckpoint
 from src.core.config import settings
 from src.core.logging_config import setup_logging
-from src.data_loader import load_data
-from src.evaluation import run_evaluation
+from src.evaluation import get_hyperparameters, run_identifier
+from src.incremental import carry_forward, metric_versions
+from src.pipeline import (
+    RESULTS_PATH,
+    log_call_report,
+    run_evaluation_stage,
+    run_generation_stage,
+    run_pipelined_stages,
+)
+from src.run_store import RunStore
+from src.sharding import parse_shard
 
 os.environ["OPENAI_API_KEY"] = settings.OPENAI_API_KEY
 os.environ["CONFIDENT_API_KEY"] = settings.CONFIDENT_API_KEY
 
 
+def _shard_arg(spec: str):
+    try:
+        return parse_shard(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
 def main():
     """Main function to run the evaluation suite."""
     setup_logging()
@@ -22,29 +44,158 @@ def main():
     parser.add_argument(
         "--full", action="store_true", help="Run evaluation on the full dataset."
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the generated-note and judgement caches.",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Regenerate every note and overwrite the cached entries.",
+    )
+    parser.add_argument(
+        "--stage",
+        choices=["all", "generate", "evaluate"],
+        default="all",
+        help="Run only note generation, only evaluation, or both (default).",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="RUN_ID",
+        help="Continue a previous run, processing only the records still missing.",
+    )
+    parser.add_argument(
+        "--shard",
+        type=_shard_arg,
+        metavar="INDEX/COUNT",
+        help="Only process shard INDEX (0-based) of COUNT, e.g. 0/4. Combine the "
+        "shard runs with `python -m src.merge`.",
+    )
+    parser.add_argument(
+        "--group",
+        help="Tag the run with a group name, e.g. to merge its shards by group.",
+    )
+    parser.add_argument(
+        "--batch",
+        choices=["openai", "local"],
+        help="Generate and judge through a batch API instead of live calls "
+        "('local' is an offline stand-in).",
+    )
+    parser.add_argument(
+        "--incremental",
+        nargs="?",
+        const="",
+        metavar="RUN_ID",
+        help="Start from a stored run (default: the latest): reuse its notes of "
+        "unchanged records and its scores of unchanged metrics, and only "
+        "generate and judge the rest.",
+    )
     args = parser.parse_args()
+    if args.stage == "evaluate" and not args.resume:
+        parser.error("--stage evaluate requires --resume RUN_ID")
+    if args.incremental is not None and args.resume:
+        parser.error("--incremental starts a new run and cannot --resume one")
 
-    limit = None if args.full else 2
-    logging.info(
-        f"Loading data... (limit: {'full dataset' if limit is None else limit})"
+    # Results are appended to the run store batch by batch, through the checkpoint
+    store = RunStore()
+    previous_run_id = None
+    if args.incremental is not None:
+        previous_run_id = args.incremental or store.latest_run_id()
+        if previous_run_id is None:
+            parser.error(f"--incremental needs a run in {store.path}; there is none")
+    if args.resume:
+        checkpoint = RunCheckpoint.resume(args.resume, store=store)
+        limit = checkpoint.metadata.get("limit")
+        logging.info(f"Resuming run {checkpoint.run_id}")
+        if checkpoint.metadata.get("generation_model") != settings.GENERATION_LLM:
+            logging.warning(
+                f"Run {checkpoint.run_id} was started with GENERATION_LLM="
+                f"{checkpoint.metadata.get('generation_model')}; continuing with it "
+                f"instead of {settings.GENERATION_LLM}."
+            )
+    else:
+        limit = None if args.full else 2
+        checkpoint = RunCheckpoint.create(
+            {
+                "limit": limit,
+                "prompt_version": settings.PROMPT_VERSION,
+                "generation_model": settings.GENERATION_LLM,
+                "evaluation_model": settings.EVALUATION_LLM,
+                "shard": list(args.shard) if args.shard else None,
+                "group": args.group,
+                # Lets a later --incremental run tell which scores are stale
+                "metric_versions": metric_versions(),
+                "incremental_from": previous_run_id,
+            },
+            store=store,
+        )
+        logging.info(f"Started run {checkpoint.run_id}")
+    metadata = checkpoint.metadata
+    hyperparameters = get_hyperparameters(
+        metadata.get("prompt_version"), metadata.get("generation_model")
     )
-    notes = load_data(limit=limit)
+    if store.create_run(
+        checkpoint.run_id, hyperparameters, metadata, run_identifier(hyperparameters)
+    ):
+        # A resumed run from before the store existed brings its earlier results
+        store.append_results(checkpoint.run_id, checkpoint.load_results())
+    shard = metadata.get("shard")
+    if previous_run_id is not None:
+        carry_forward(checkpoint, store, previous_run_id, use_cache=not args.no_cache)
+
+    backend = None
+    if args.batch == "openai":
+        backend = OpenAIBatchBackend()
+    elif args.batch == "local":
+        backend = LocalBatchBackend()
 
-    if not notes:
+    if args.stage in ("all", "generate"):
+        logging.info(
+            f"Generating notes... (limit: {'full dataset' if limit is None else limit})"
+        )
+
+    if backend is not None:
+        if args.stage in ("all", "generate"):
+            run_batch_generation_stage(checkpoint, backend, use_cache=not args.no_cache)
+        if args.stage == "generate":
+            return
+        evaluation_results = run_batch_evaluation_stage(
+            checkpoint, backend, use_cache=not args.no_cache
+        )
+    elif args.stage == "generate":
+        run_generation_stage(
+            checkpoint, use_cache=not args.no_cache, refresh=args.refresh
+        )
+        return
+    elif args.stage == "all":
+        # Notes are evaluated while the remaining ones are still being generated
+        evaluation_results = run_pipelined_stages(
+            checkpoint, use_cache=not args.no_cache, refresh=args.refresh
+        )
+    else:
+        evaluation_results = run_evaluation_stage(
+            checkpoint, use_cache=not args.no_cache
+        )
+
+    if not evaluation_results:
         logging.warning("No data found. Exiting.")
         return
 
-    logging.info(f"Loaded {len(notes)} notes. Running evaluations...")
-    evaluation_results = run_evaluation(notes)
+    log_call_report(evaluation_results)
 
-    # Save results to a file for the dashboard - this would be replaced by a database if we'd run a daily pipeline or inference service
-    output_path = "data/evaluation_results.json"
-    os.makedirs(os.path.dirname(output_path), exist_ok=True)
-    with open(output_path, "w") as f:
-        # Pydantic models need to be converted to dicts for JSON serialization
-        json.dump([result.model_dump() for result in evaluation_results], f, indent=4)
+    if shard:
+        logging.info(
+            f"Shard {shard[0]}/{shard[1]} complete ({len(evaluation_results)} notes). "
+            f"Merge the shards with `python -m src.merge {checkpoint.run_id} ...`."
+        )
+        return
 
-    logging.info(f"Evaluation complete. Results saved to {output_path}")
+    logging.info(
+        f"Evaluation complete. Results of run {checkpoint.run_id} are in "
+        f"{store.path}; export them with "
+        f"`python -m src.run_store export {checkpoint.run_id} {RESULTS_PATH}`."
+    )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,187 @@
+"""
+Merging of shard runs.
+
+Combines the runs started with `python -m src.main --shard INDEX/COUNT` into a
+single run that holds every note, result and outstanding failure, and adds it
+to the run store for the dashboard. Aggregate scores are recomputed from the
+merged per-note results, so each note counts once regardless of how the
+records were split.
+"""
+
+import argparse
+import json
+import logging
+import os
+from typing import Dict, List, Optional
+
+from src.checkpoint import METADATA_FILE, RUNS_DIR, RunCheckpoint
+from src.core.logging_config import setup_logging
+from src.evaluation import aggregate_results, get_hyperparameters, run_identifier
+from src.run_store import RunStore
+
+SUMMARY_FILE = "summary.json"
+
+# Settings that must be the same for every shard of a run
+SHARED_SETTINGS = (
+    "limit",
+    "prompt_version",
+    "generation_model",
+    "evaluation_model",
+    "metric_versions",
+)
+
+
+def find_group_runs(group: str, root: str = RUNS_DIR) -> List[RunCheckpoint]:
+    """Returns the shard runs tagged with `group`."""
+    checkpoints = []
+    for run_id in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        if not os.path.exists(os.path.join(root, run_id, METADATA_FILE)):
+            continue
+        checkpoint = RunCheckpoint(run_id, root=root)
+        metadata = checkpoint.metadata
+        if metadata.get("group") == group and metadata.get("shard"):
+            checkpoints.append(checkpoint)
+    return checkpoints
+
+
+def check_shards(checkpoints: List[RunCheckpoint], allow_partial: bool = False) -> None:
+    """Checks that the runs are distinct shards of one split with the same settings.
+
+    Raises:
+        ValueError: If a run is not a shard, the runs disagree on their settings or
+            shard count, a shard appears twice, or (unless `allow_partial`) a shard
+            is missing.
+    """
+    if not checkpoints:
+        raise ValueError("No shard runs to merge.")
+    metadata = [c.metadata for c in checkpoints]
+    unsharded = [m["run_id"] for m in metadata if not m.get("shard")]
+    if unsharded:
+        raise ValueError(f"Runs were not started with --shard: {', '.join(unsharded)}")
+    for key in SHARED_SETTINGS + ("shard_count",):
+        values = {
+            json.dumps(m["shard"][1] if key == "shard_count" else m.get(key))
+            for m in metadata
+        }
+        if len(values) > 1:
+            raise ValueError(
+                f"Shard runs disagree on {key}: {', '.join(sorted(values))}"
+            )
+
+    indices = [m["shard"][0] for m in metadata]
+    duplicates = sorted({i for i in indices if indices.count(i) > 1})
+    if duplicates:
+        raise ValueError(f"Shards appear more than once: {duplicates}")
+    missing = sorted(set(range(metadata[0]["shard"][1])) - set(indices))
+    if missing and not allow_partial:
+        raise ValueError(f"Shards are missing: {missing}")
+    if missing:
+        logging.warning(f"Merging without shards {missing}.")
+
+
+def merge_runs(
+    checkpoints: List[RunCheckpoint],
+    root: str = RUNS_DIR,
+    allow_partial: bool = False,
+    store: Optional[RunStore] = None,
+) -> RunCheckpoint:
+    """Combines shard runs into a new run.
+
+    Failures are only carried over for records that have no note in their
+    shard, i.e. those a resume of the shard would still retry. With a `store`,
+    the merged run and its results are added to the run store as well.
+
+    Returns:
+        The merged run.
+
+    Raises:
+        ValueError: If the runs are not a complete set of matching shards.
+    """
+    check_shards(checkpoints, allow_partial=allow_partial)
+    first = checkpoints[0].metadata
+    merged = RunCheckpoint.create(
+        {
+            **{key: first.get(key) for key in SHARED_SETTINGS},
+            "shard": None,
+            "group": first.get("group"),
+            "merged_from": [c.run_id for c in checkpoints],
+        },
+        root=root,
+        store=store,
+    )
+    if store is not None:
+        hyperparameters = get_hyperparameters(
+            first.get("prompt_version"), first.get("generation_model")
+        )
+        store.create_run(
+            merged.run_id,
+            hyperparameters,
+            merged.metadata,
+            run_identifier(hyperparameters),
+        )
+    for checkpoint in checkpoints:
+        merged.append_notes(checkpoint.load_notes())
+        merged.append_results(checkpoint.load_results())
+        generated = checkpoint.completed_note_ids()
+        for failure in checkpoint.load_failures():
+            if failure["note_id"] not in generated:
+                merged.append_failure(
+                    failure["note_id"], failure["stage"], failure["error"]
+                )
+    return merged
+
+
+def write_summary(checkpoint: RunCheckpoint) -> Dict[str, float]:
+    """Writes the aggregate scores of a run to its `summary.json` and returns them."""
+    summary = aggregate_results(checkpoint.load_results())
+    with open(os.path.join(checkpoint.directory, SUMMARY_FILE), "w") as f:
+        json.dump(summary, f, indent=4)
+    return summary
+
+
+def main():
+    """Merges shard runs into one result set."""
+    setup_logging()
+
+    parser = argparse.ArgumentParser(
+        description="Combine the shard runs of a split evaluation into one run."
+    )
+    parser.add_argument("run_ids", nargs="*", help="The shard runs to merge.")
+    parser.add_argument(
+        "--group", help="Merge every shard run tagged with this group instead."
+    )
+    parser.add_argument(
+        "--allow-partial",
+        action="store_true",
+        help="Merge even if some shards have no run.",
+    )
+    args = parser.parse_args()
+    if bool(args.run_ids) == bool(args.group):
+        parser.error("pass either shard run IDs or --group")
+
+    if args.group:
+        checkpoints = find_group_runs(args.group)
+    else:
+        checkpoints = [RunCheckpoint.resume(run_id) for run_id in args.run_ids]
+    try:
+        merged = merge_runs(
+            checkpoints, allow_partial=args.allow_partial, store=RunStore()
+        )
+    except ValueError as e:
+        parser.error(str(e))
+
+    summary = write_summary(merged)
+    logging.info(
+        f"Merged {len(checkpoints)} shards into run {merged.run_id}: "
+        + ", ".join(
+            f"{key}={value:.3f}" for key, value in summary.items() if key != "count"
+        )
+        + f" over {summary['count']} notes. Results added to the run store."
+    )
+    failures = merged.load_failures()
+    if failures:
+        logging.warning(f"{len(failures)} records have no result; resume their shards.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,359 @@
+"""
+Resumable pipeline stages.
+
+Generation and evaluation run as separate stages that read their inputs from,
+and append their outputs to, a `RunCheckpoint`. Each stage only processes the
+records that have no checkpointed output yet, so rerunning a stage on the same
+run resumes where it stopped. `run_pipelined_stages` runs both at once, feeding
+each note to evaluation as soon as it is generated.
+"""
+
+import asyncio
+import functools
+import json
+import logging
+import os
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from src.checkpoint import RunCheckpoint
+from src.core.config import settings
+from src.core.instrumentation import summarize_call_values
+from src.core.llm import LLMCallError
+from src.core.rate_limit import RateLimiter
+from src.data_loader import (
+    DATASET_PATH,
+    generate_notes,
+    iter_records,
+    note_cache,
+    stored_token_counts,
+)
+from src.evaluation import get_hyperparameters, get_metrics, run_evaluation
+from src.result_table import ResultTable
+from src.schemas.models import ClinicalNote, EvaluationResult, LLMCallStats
+from src.sharding import in_shard
+from src.tiered import cheap_metrics, run_tiered_evaluation, tiering_report
+
+# The default JSON file results are exported to; the dashboard reads the run store
+RESULTS_PATH = os.path.join("data", "evaluation_results.json")
+
+
+def pending_records(
+    checkpoint: RunCheckpoint, records: Optional[List[Dict[str, str]]] = None
+) -> List[Tuple[str, Dict[str, str]]]:
+    """Returns the (note ID, record) pairs of the run that have no note yet.
+
+    Records outside the run's shard, if it has one, are never pending.
+
+    Args:
+        checkpoint: The run.
+        records: The run's dataset records, if they are already loaded. If None,
+            they are read from the dataset file.
+    """
+    done = checkpoint.completed_note_ids()
+    metadata = checkpoint.metadata
+    if records is None:
+        records = iter_records(limit=metadata.get("limit"))
+    shard = metadata.get("shard")
+    pending = [
+        (str(index), record)
+        for index, record in enumerate(records)
+        if str(index) not in done and (shard is None or in_shard(record, shard))
+    ]
+    logging.info(
+        f"Generating {len(pending)} notes ({len(done)} already checkpointed)..."
+    )
+    return pending
+
+
+def pending_notes(checkpoint: RunCheckpoint) -> List[ClinicalNote]:
+    """Returns the generated notes of the run that have no evaluation result yet."""
+    done = checkpoint.completed_result_ids()
+    pending = [note for note in checkpoint.load_notes() if note.note_id not in done]
+    logging.info(
+        f"Evaluating {len(pending)} notes ({len(done)} already checkpointed)..."
+    )
+    return pending
+
+
+def run_generation_stage(
+    checkpoint: RunCheckpoint, use_cache: bool = True, refresh: bool = False
+) -> int:
+    """Generates the notes that are missing from the checkpoint.
+
+    Each note is appended to the checkpoint as soon as it is generated. Failed
+    generations are recorded as failures instead of notes, so they are never
+    evaluated and are retried when the run is resumed.
+
+    Returns:
+        The number of records that still have no note after this stage.
+    """
+    if not os.path.exists(DATASET_PATH):
+        logging.error(
+            f"Dataset file not found at {DATASET_PATH}. Please run 'just setup-data' to download it."
+        )
+        return 0
+
+    return asyncio.run(
+        arun_generation_stage(checkpoint, use_cache=use_cache, refresh=refresh)
+    )
+
+
+async def arun_generation_stage(
+    checkpoint: RunCheckpoint,
+    records: Optional[List[Dict[str, str]]] = None,
+    limiter: Optional[RateLimiter] = None,
+    use_cache: bool = True,
+    refresh: bool = False,
+    token_counts: Optional[List[int]] = None,
+    sink: Optional["asyncio.Queue[ClinicalNote]"] = None,
+) -> int:
+    """Async counterpart of `run_generation_stage`, for running several stages at once.
+
+    Args:
+        checkpoint: The run.
+        records: The run's dataset records, if they are already loaded.
+        limiter: The rate limiter to share with other stages. If None, the stage
+            gets its own.
+        use_cache: Reuse previously generated notes from the on-disk cache.
+        refresh: Regenerate every note and overwrite the cached entries.
+        token_counts: The transcript token count of every dataset record. If
+            None, the counts stored by `just setup-data` are used; without
+            them, only the pending transcripts are counted.
+        sink: A queue every checkpointed note is also put on, e.g. to evaluate
+            it right away. If it is full, the note waits for room.
+
+    Returns:
+        The number of records that still have no note after this stage.
+    """
+    metadata = checkpoint.metadata
+    pending = pending_records(checkpoint, records)
+    if token_counts is None:
+        token_counts = stored_token_counts(metadata.get("generation_model"))
+
+    failed = []
+    calls: Dict[int, List[LLMCallStats]] = {}
+
+    async def _checkpoint_note(index: int, generated: Union[str, LLMCallError]) -> None:
+        note_id, record = pending[index]
+        if isinstance(generated, LLMCallError):
+            failed.append(note_id)
+            checkpoint.append_failure(note_id, "generation", str(generated))
+            return
+        note = ClinicalNote(
+            note_id=note_id,
+            transcript=record["patient_convo"],
+            note=record["soap_notes"],
+            generated_note=generated,
+            generation_calls=calls.get(index, []),
+        )
+        checkpoint.append_notes([note])
+        if sink is not None:
+            await sink.put(note)
+
+    await generate_notes(
+        [record["patient_convo"] for _, record in pending],
+        prompt_version=metadata.get("prompt_version"),
+        model=metadata.get("generation_model"),
+        limiter=limiter,
+        cache=note_cache() if use_cache else None,
+        refresh=refresh,
+        on_result=_checkpoint_note,
+        token_counts=(
+            [token_counts[int(note_id)] for note_id, _ in pending]
+            if token_counts is not None
+            else None
+        ),
+        calls=calls,
+    )
+    if failed:
+        logging.warning(
+            f"{len(failed)} notes failed to generate; resume run {checkpoint.run_id} to retry them."
+        )
+    return len(failed)
+
+
+def stage_evaluator() -> Callable[..., ResultTable]:
+    """Returns the evaluation function of a stage, with its metrics built once.
+
+    The judges and metrics are reused by every batch of the stage.
+    """
+    if settings.TIERED_JUDGE:
+        return functools.partial(
+            run_tiered_evaluation, metrics=get_metrics(), sample_metrics=cheap_metrics()
+        )
+    return functools.partial(run_evaluation, metrics=get_metrics())
+
+
+def run_evaluation_stage(
+    checkpoint: RunCheckpoint, batch_size: int = None, use_cache: bool = True
+) -> ResultTable:
+    """Evaluates the checkpointed notes that have no result yet.
+
+    Notes are evaluated in batches and each batch's results are appended to the
+    checkpoint before the next batch starts. With `use_cache`, pairs judged
+    before are taken from the judgement cache.
+
+    Returns:
+        All evaluation results of the run, including those from earlier attempts.
+    """
+    batch_size = batch_size or settings.EVALUATION_BATCH_SIZE
+    evaluate = stage_evaluator()
+    pending = pending_notes(checkpoint)
+    hyperparameters = get_hyperparameters(
+        checkpoint.metadata.get("prompt_version"),
+        checkpoint.metadata.get("generation_model"),
+    )
+
+    for start in range(0, len(pending), batch_size):
+        batch = pending[start : start + batch_size]
+        checkpoint.append_results(evaluate(batch, hyperparameters, use_cache=use_cache))
+        logging.info(
+            f"Evaluated {min(start + batch_size, len(pending))}/{len(pending)} notes."
+        )
+
+    results = checkpoint.load_results()
+    _log_tiering(results)
+    return results
+
+
+def run_pipelined_stages(
+    checkpoint: RunCheckpoint,
+    batch_size: Optional[int] = None,
+    use_cache: bool = True,
+    refresh: bool = False,
+) -> ResultTable:
+    """Generates the missing notes and evaluates them while generation goes on.
+
+    Unlike running `run_generation_stage` and then `run_evaluation_stage`, each
+    note is handed to evaluation as soon as it is generated, so the generation
+    and judge endpoints are busy at the same time and the run takes about as
+    long as the slower of the two. Notes and results are checkpointed as they
+    come in, exactly like the separate stages do.
+
+    Returns:
+        All evaluation results of the run, including those from earlier attempts.
+    """
+    if not os.path.exists(DATASET_PATH):
+        logging.error(
+            f"Dataset file not found at {DATASET_PATH}. Please run 'just setup-data' to download it."
+        )
+        return checkpoint.load_results()
+
+    return asyncio.run(
+        arun_pipelined_stages(
+            checkpoint, batch_size=batch_size, use_cache=use_cache, refresh=refresh
+        )
+    )
+
+
+async def arun_pipelined_stages(
+    checkpoint: RunCheckpoint,
+    batch_size: Optional[int] = None,
+    use_cache: bool = True,
+    refresh: bool = False,
+    queue_size: Optional[int] = None,
+) -> ResultTable:
+    """Async counterpart of `run_pipelined_stages`.
+
+    Generated notes go through a queue of at most `queue_size` notes (default
+    `PIPELINE_QUEUE_SIZE`) to a single evaluation worker. The worker takes up to
+    `batch_size` notes at a time, whatever has arrived since its last batch,
+    and evaluates them in a thread so that generation keeps running. Notes of
+    earlier attempts that were generated but not evaluated are queued first.
+    """
+    batch_size = batch_size or settings.EVALUATION_BATCH_SIZE
+    evaluate = stage_evaluator()
+    hyperparameters = get_hyperparameters(
+        checkpoint.metadata.get("prompt_version"),
+        checkpoint.metadata.get("generation_model"),
+    )
+    queue: "asyncio.Queue[Optional[ClinicalNote]]" = asyncio.Queue(
+        maxsize=queue_size or settings.PIPELINE_QUEUE_SIZE
+    )
+
+    async def _evaluate_notes() -> None:
+        evaluated = 0
+        finished = False
+        while not finished:
+            batch = [await queue.get()]
+            while len(batch) < batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            # None marks the end of generation and is always the last item
+            if batch[-1] is None:
+                batch.pop()
+                finished = True
+            if not batch:
+                continue
+            checkpoint.append_results(
+                await asyncio.to_thread(
+                    evaluate, batch, hyperparameters, use_cache=use_cache
+                )
+            )
+            evaluated += len(batch)
+            logging.info(f"Evaluated {evaluated} notes, {queue.qsize()} queued.")
+
+    async def _generate_notes() -> None:
+        for note in pending_notes(checkpoint):
+            await queue.put(note)
+        await arun_generation_stage(
+            checkpoint, use_cache=use_cache, refresh=refresh, sink=queue
+        )
+        await queue.put(None)
+
+    # A failing evaluation must not leave generation blocked on a full queue
+    tasks = [
+        asyncio.create_task(_generate_notes()),
+        asyncio.create_task(_evaluate_notes()),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+
+    results = checkpoint.load_results()
+    _log_tiering(results)
+    return results
+
+
+def _log_tiering(results: ResultTable) -> None:
+    if not settings.TIERED_JUDGE:
+        return
+    report = tiering_report(results)
+    agreement = report["agreement"]
+    logging.info(
+        f"Escalated {report['escalated']}/{report['pairs']} judged pairs "
+        f"({report['escalated_fraction']:.0%}) to the strong judge; the cheap "
+        "judge agreed on pass/fail for "
+        + ("none" if agreement is None else f"{agreement:.0%}")
+        + " of them."
+    )
+
+
+def call_report(results: ResultTable) -> Dict[str, Dict[str, float]]:
+    """Rolls up the generation and judge calls behind a run's results."""
+    return summarize_call_values(*results.call_columns())
+
+
+def log_call_report(results: ResultTable) -> None:
+    """Logs latency percentiles, tokens and estimated cost per stage and metric."""
+    for group, row in call_report(results).items():
+        cost = "n/a" if row["cost"] is None else f"${row['cost']:.4f}"
+        logging.info(
+            f"{group}: {row['calls']} calls, wall time "
+            f"p50/p95/p99 {row['wall_time_p50']:.2f}/{row['wall_time_p95']:.2f}/"
+            f"{row['wall_time_p99']:.2f}s, queue wait p95 "
+            f"{row['queue_wait_p95']:.2f}s, {row['prompt_tokens']}+"
+            f"{row['completion_tokens']} tokens, {row['retries']} retries, "
+            f"cost {cost}"
+        )
+
+
+def export_results(
+    results: Sequence[EvaluationResult], path: str = RESULTS_PATH
+) -> None:
+    """Writes evaluation results to the JSON file the dashboard reads."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        # Pydantic models need to be converted to dicts for JSON serialization
+        json.dump([result.model_dump() for result in results], f, indent=4)
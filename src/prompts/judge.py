@@ -0,0 +1,167 @@
+"""
+Judge prompts for scoring clinical notes outside of deepeval's own call path.
+
+These mirror the G-Eval form used by the metrics in `src/schemas/metrics.py`
+(criteria plus evaluation steps, scored 0-10 and normalized to 0-1) and the
+single-context case of deepeval's `HallucinationMetric` (a contradiction
+verdict against the ground-truth note). They are used wherever a judge call has
+to be rendered ahead of time, e.g. for the batch API.
+"""
+
+import json
+from typing import Dict, List, Tuple
+
+JUDGE_SYSTEM_PROMPT = (
+    "You are a meticulous clinical documentation reviewer. You grade AI-generated "
+    "clinical notes strictly according to the criteria you are given and always "
+    "answer with a single JSON object."
+)
+
+
+def get_geval_judge_messages(
+    criteria: str,
+    evaluation_steps: List[str],
+    transcript: str,
+    generated_note: str,
+    context: str,
+) -> List[Dict[str, str]]:
+    """
+    Get the messages for a G-Eval style judge call.
+
+    Args:
+        criteria: The metric's evaluation criteria.
+        evaluation_steps: The metric's evaluation steps.
+        transcript: The source transcript (the test case input).
+        generated_note: The generated note (the test case actual output).
+        context: The ground-truth note (the test case context).
+
+    Returns:
+        The list of messages asking for `{"score": 0-10, "reason": "..."}`.
+    """
+    steps = "\n".join(f"{i}. {step}" for i, step in enumerate(evaluation_steps, 1))
+    return [
+        {"role": "system", "content": JUDGE_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": (
+                f"Evaluation criteria:\n{criteria.strip()}\n\n"
+                f"Evaluation steps:\n{steps}\n\n"
+                f"Input (transcript):\n{transcript}\n\n"
+                f"Actual Output (generated note):\n{generated_note}\n\n"
+                f"Context (ground-truth note):\n{context}\n\n"
+                "Follow the evaluation steps and give a score from 0 (worst) to 10 "
+                "(best). Answer with JSON only, in the form "
+                '{"score": <integer 0-10>, "reason": "<one or two sentences>"}.'
+            ),
+        },
+    ]
+
+
+def get_multi_criteria_judge_messages(
+    criteria: List[Tuple[str, str, List[str]]],
+    transcript: str,
+    generated_note: str,
+    context: str,
+) -> List[Dict[str, str]]:
+    """
+    Get the messages for a judge call that scores several G-Eval criteria at once.
+
+    Args:
+        criteria: (key, criteria, evaluation steps) for every metric to score.
+        transcript: The source transcript (the test case input).
+        generated_note: The generated note (the test case actual output).
+        context: The ground-truth note (the test case context).
+
+    Returns:
+        The list of messages asking for
+        `{"<key>": {"score": 0-10, "reason": "..."}, ...}` with one entry per key.
+    """
+    sections = []
+    for key, text, evaluation_steps in criteria:
+        steps = "\n".join(f"{i}. {step}" for i, step in enumerate(evaluation_steps, 1))
+        sections.append(
+            f"### {key}\nEvaluation criteria:\n{text.strip()}\n\n"
+            f"Evaluation steps:\n{steps}"
+        )
+    keys = ", ".join(f'"{key}"' for key, _, _ in criteria)
+    return [
+        {"role": "system", "content": JUDGE_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": (
+                f"Input (transcript):\n{transcript}\n\n"
+                f"Actual Output (generated note):\n{generated_note}\n\n"
+                f"Context (ground-truth note):\n{context}\n\n"
+                "Grade the actual output on each of the following criteria "
+                "independently, following its evaluation steps.\n\n"
+                + "\n\n".join(sections)
+                + "\n\nFor every criterion give a score from 0 (worst) to 10 (best). "
+                f"Answer with JSON only, with exactly the keys {keys}, each in the form "
+                '{"score": <integer 0-10>, "reason": "<one or two sentences>"}.'
+            ),
+        },
+    ]
+
+
+def get_hallucination_judge_messages(
+    generated_note: str, context: str
+) -> List[Dict[str, str]]:
+    """
+    Get the messages for a hallucination judge call.
+
+    Args:
+        generated_note: The generated note (the test case actual output).
+        context: The ground-truth note (the test case context).
+
+    Returns:
+        The list of messages asking for `{"verdict": "yes"|"no", "reason": "..."}`.
+    """
+    return [
+        {"role": "system", "content": JUDGE_SYSTEM_PROMPT},
+        {
+            "role": "user",
+            "content": (
+                f"Context (ground-truth note):\n{context}\n\n"
+                f"Actual Output (generated note):\n{generated_note}\n\n"
+                "Does the actual output contradict the context? Missing details are "
+                "not contradictions. Answer with JSON only, in the form "
+                '{"verdict": "yes" or "no", "reason": "<one or two sentences>"}.'
+            ),
+        },
+    ]
+
+
+def _parse_score(data: Dict) -> Tuple[float, str]:
+    score = min(max(float(data["score"]), 0.0), 10.0) / 10
+    return score, data.get("reason", "")
+
+
+def parse_geval_judgement(content: str) -> Tuple[float, str]:
+    """Parses a G-Eval judge answer into a 0-1 score and a reason."""
+    return _parse_score(json.loads(content))
+
+
+def parse_multi_criteria_judgement(
+    content: str, keys: List[str]
+) -> Dict[str, Tuple[float, str]]:
+    """Parses a multi-criteria judge answer into a 0-1 score and a reason per key.
+
+    Raises:
+        ValueError: If the answer has no valid score for one of the keys.
+    """
+    data = json.loads(content)
+    judgements = {}
+    for key in keys:
+        if not isinstance(data.get(key), dict):
+            raise ValueError(f"Missing judgement for '{key}'")
+        judgements[key] = _parse_score(data[key])
+    return judgements
+
+
+def parse_hallucination_judgement(content: str) -> Tuple[float, str]:
+    """Parses a hallucination judge answer; a contradiction scores 1.0 (lower is better)."""
+    data = json.loads(content)
+    verdict = str(data["verdict"]).strip().lower()
+    if verdict not in ("yes", "no"):
+        raise ValueError(f"Unexpected hallucination verdict: {verdict}")
+    return (1.0 if verdict == "yes" else 0.0), data.get("reason", "")
@@ -0,0 +1,81 @@
+"""
+Prompts for generating a note from a transcript that is too long for one prompt.
+
+The transcript is split into consecutive chunks. Each chunk is first reduced to
+a partial SOAP note (map), and the partial notes are then merged into the final
+note (reduce). Both steps keep the system message of the selected prompt
+version, so chunked notes follow the same instructions as regular ones.
+"""
+
+from typing import Dict, List, Optional
+
+from src.prompts.versions import get_prompt_version
+
+
+def _system_messages(version: Optional[str]) -> List[Dict[str, str]]:
+    return [
+        message
+        for message in get_prompt_version(version).get_messages("")
+        if message["role"] == "system"
+    ]
+
+
+def get_chunk_messages(
+    version: Optional[str], chunk: str, index: int, total: int
+) -> List[Dict[str, str]]:
+    """
+    Get the messages for extracting a partial SOAP note from one transcript chunk.
+
+    Args:
+        version: The prompt version. If None, the default version is used.
+        chunk: The part of the transcript.
+        index: The 1-based position of the chunk.
+        total: The number of chunks of the transcript.
+
+    Returns:
+        The list of messages for the chunk.
+    """
+    return _system_messages(version) + [
+        {
+            "role": "user",
+            "content": (
+                f"Here is part {index} of {total} of a transcript of a conversation "
+                "between a healthcare provider and a patient. Extract every clinically "
+                "relevant finding from this part only into Subjective, Objective, "
+                "Assessment and Plan sections. Write 'None' for a section this part "
+                "says nothing about, and do not guess what other parts contain. "
+                f"Transcript part {index}/{total}:\n\n{chunk}"
+            ),
+        }
+    ]
+
+
+def get_merge_messages(
+    version: Optional[str], partial_notes: List[str]
+) -> List[Dict[str, str]]:
+    """
+    Get the messages for merging partial SOAP notes into the final note.
+
+    Args:
+        version: The prompt version. If None, the default version is used.
+        partial_notes: The partial notes, in transcript order.
+
+    Returns:
+        The list of messages for the merge.
+    """
+    parts = "\n\n".join(
+        f"Partial note {i}:\n{note}" for i, note in enumerate(partial_notes, 1)
+    )
+    return _system_messages(version) + [
+        {
+            "role": "user",
+            "content": (
+                "The following partial SOAP notes were extracted, in order, from "
+                "consecutive parts of one long encounter. Merge them into a single "
+                "structured clinical note in proper SOAP format. Remove duplicates, "
+                "keep later information where it updates earlier information, and "
+                "only include what the partial notes state.\n\n"
+                f"{parts}"
+            ),
+        }
+    ]
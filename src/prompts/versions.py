@@ -6,6 +6,9 @@ clinical SOAP notes from patient-provider conversations.
 
 from typing import Dict, List, Optional
 
+from src.core.config import settings
+from src.core.tokens import count_message_tokens
+
 
 class PromptVersion:
     """A class representing a prompt version with its messages."""
@@ -42,6 +45,20 @@ class PromptVersion:
             messages_copy.append(message_copy)
         return messages_copy
 
+    def prompt_tokens(self, transcript_tokens: int, model: str) -> int:
+        """
+        Count the prompt tokens of this version without rendering the transcript.
+
+        Args:
+            transcript_tokens: The token count of the transcript, e.g. precomputed
+                for the dataset.
+            model: The model whose tokenizer to count with.
+
+        Returns:
+            The token count of the messages with the transcript inserted.
+        """
+        return count_message_tokens(self.get_messages(""), model) + transcript_tokens
+
 
 # Default prompt version (v1)
 DEFAULT_VERSION = "v1"
@@ -112,8 +129,44 @@ def get_prompt_messages(
     Returns:
         The list of messages for the specified version with the transcript inserted.
     """
+    return get_prompt_version(version).get_messages(transcript)
+
+
+def get_prompt_version(version: Optional[str] = None) -> PromptVersion:
+    """
+    Get the specified prompt version.
+
+    Args:
+        version: The version to get. If None, the default version is used.
+
+    Returns:
+        The prompt version.
+    """
     version = version or DEFAULT_VERSION
     if version not in PROMPT_VERSIONS:
         raise ValueError(f"Unknown prompt version: {version}")
+    return PROMPT_VERSIONS[version]
+
 
-    return PROMPT_VERSIONS[version].get_messages(transcript)
+def fits_token_budget(
+    version: Optional[str],
+    transcript_tokens: int,
+    model: Optional[str] = None,
+    budget: Optional[int] = None,
+) -> bool:
+    """
+    Check whether a transcript fits into a single prompt of the specified version.
+
+    Args:
+        version: The prompt version. If None, the default version is used.
+        transcript_tokens: The token count of the transcript.
+        model: The generation model. If None, `GENERATION_LLM` is used.
+        budget: The maximum number of prompt tokens. If None,
+            `GENERATION_MAX_PROMPT_TOKENS` is used.
+
+    Returns:
+        True if the rendered prompt stays within the budget.
+    """
+    model = model or settings.GENERATION_LLM
+    budget = budget or settings.GENERATION_MAX_PROMPT_TOKENS
+    return get_prompt_version(version).prompt_tokens(transcript_tokens, model) <= budget
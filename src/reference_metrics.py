@@ -0,0 +1,287 @@
+"""
+Lexical metrics of generated notes against the ground-truth note.
+
+Three scores compare `generated_note` with `ground_truth_note` without any API
+call: ROUGE-L (the F-measure of the longest common token subsequence), token
+F1 (the F-measure of the bag-of-tokens overlap) and entity overlap (the F1 of
+the clinical entities both notes mention: quantities such as doses, vital
+signs and lab values, blood pressure readings and drug names). They are a cheap regression signal next to the judge scores.
+
+Scoring is done a batch at a time. Per pair, only integer counts are computed
+(token lengths, LCS length, overlaps); the LCS uses the bit-parallel algorithm
+of Hyyrö, which advances over a whole row of the dynamic programming table
+with a few big-integer operations per token. Batches larger than
+`REFERENCE_METRICS_CHUNK_SIZE` are counted chunk by chunk in a process pool,
+and the F-measures of the whole batch are then computed at once with numpy.
+"""
+
+import argparse
+import json
+import logging
+import os
+import re
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+
+from src.aggregation import REFERENCE_FIELDS
+from src.core.config import settings
+from src.core.logging_config import setup_logging
+from src.schemas.models import ClinicalNote, EvaluationResult
+
+_TOKEN = re.compile(r"\w+")
+
+# Units of doses, vital signs and lab values, with their normal form
+QUANTITY_UNITS = {
+    "mg": "mg",
+    "milligram": "mg",
+    "milligrams": "mg",
+    "mcg": "mcg",
+    "µg": "mcg",
+    "g": "g",
+    "grams": "g",
+    "ml": "ml",
+    "unit": "units",
+    "units": "units",
+    "meq": "meq",
+    "mmhg": "mmhg",
+    "bpm": "bpm",
+    "mg/dl": "mg/dl",
+    "mmol/l": "mmol/l",
+    "%": "%",
+    "kg": "kg",
+    "lb": "lb",
+    "lbs": "lb",
+    "°f": "°f",
+    "°c": "°c",
+}
+
+# A number and its unit, e.g. "400 mg", "72 bpm" or "7.2 mg/dL". Anchored on
+# the digit so the scan skips plain words quickly
+_QUANTITY = re.compile(
+    r"(\d+(?:,\d{3})*(?:\.\d+)?)\s*("
+    + "|".join(
+        sorted((re.escape(unit) for unit in QUANTITY_UNITS), key=len, reverse=True)
+    )
+    + r")(?![\w/])",
+    re.IGNORECASE,
+)
+
+# A blood pressure reading, e.g. "120/80"
+_BLOOD_PRESSURE = re.compile(r"\b(\d{2,3}/\d{2,3})\b")
+
+# Endings of common generic drug names, e.g. lisinopril, atorvastatin or amoxicillin
+DRUG_SUFFIXES = (
+    "pril",
+    "sartan",
+    "olol",
+    "dipine",
+    "statin",
+    "formin",
+    "gliptin",
+    "cillin",
+    "mycin",
+    "cycline",
+    "floxacin",
+    "azole",
+    "tidine",
+    "triptan",
+    "oxetine",
+    "azepam",
+    "azolam",
+    "isone",
+    "isolone",
+    "profen",
+    "codone",
+    "morphone",
+    "parin",
+    "xaban",
+    "semide",
+    "thiazide",
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Splits a text into lowercase word tokens."""
+    return _TOKEN.findall(text.lower())
+
+
+def clinical_entities(text: str, tokens: Optional[Iterable[str]] = None) -> Set[str]:
+    """Returns the normalized clinical entities a text mentions.
+
+    Args:
+        text: The text.
+        tokens: The (distinct) tokens of `text`, if they are already known.
+    """
+    entities = {
+        f"{float(amount.replace(',', '')):g} {QUANTITY_UNITS[unit.lower()]}"
+        for amount, unit in _QUANTITY.findall(text)
+    }
+    entities.update(_BLOOD_PRESSURE.findall(text))
+    entities.update(
+        token
+        for token in (tokenize(text) if tokens is None else tokens)
+        if len(token) > 6 and token.endswith(DRUG_SUFFIXES)
+    )
+    return entities
+
+
+def lcs_length(a: Sequence[str], b: Sequence[str]) -> int:
+    """Returns the length of the longest common subsequence of two token lists."""
+    if not a or not b:
+        return 0
+    masks: Dict[str, int] = {}
+    for i, token in enumerate(a):
+        masks[token] = masks.get(token, 0) | (1 << i)
+    full = (1 << len(a)) - 1
+    row = full
+    # Tokens that do not occur in `a` leave the row unchanged
+    for mask in filter(None, map(masks.get, b)):
+        matches = row & mask
+        row = ((row + matches) | (row - matches)) & full
+    return len(a) - row.bit_count()
+
+
+def pair_counts(pairs: Sequence[Tuple[str, str]]) -> np.ndarray:
+    """Counts what the reference metrics of (generated, reference) pairs need.
+
+    Returns:
+        An (n × 7) integer array with, per pair: the generated and reference
+        token counts, the LCS length, the token overlap, and the generated,
+        reference and shared entity counts.
+    """
+    counts = np.zeros((len(pairs), 7), dtype=np.int64)
+    for i, (generated, reference) in enumerate(pairs):
+        generated_tokens, reference_tokens = tokenize(generated), tokenize(reference)
+        generated_bag = Counter(generated_tokens)
+        reference_bag = Counter(reference_tokens)
+        overlap = generated_bag & reference_bag
+        generated_entities = clinical_entities(generated, generated_bag)
+        reference_entities = clinical_entities(reference, reference_bag)
+        counts[i] = (
+            len(generated_tokens),
+            len(reference_tokens),
+            lcs_length(generated_tokens, reference_tokens),
+            sum(overlap.values()),
+            len(generated_entities),
+            len(reference_entities),
+            len(generated_entities & reference_entities),
+        )
+    return counts
+
+
+def _f_measure(
+    matched: np.ndarray, predicted: np.ndarray, expected: np.ndarray
+) -> np.ndarray:
+    """Returns 2·matched / (predicted + expected), or NaN where both are empty."""
+    total = (predicted + expected).astype(float)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(total > 0, 2 * matched / total, np.nan)
+
+
+def reference_scores(
+    notes: Sequence[ClinicalNote],
+    workers: Optional[int] = None,
+    chunk_size: Optional[int] = None,
+) -> np.ndarray:
+    """Scores notes against their ground truth with the reference metrics.
+
+    Args:
+        notes: The notes to score.
+        workers: The processes counting large batches. If None,
+            `REFERENCE_METRICS_WORKERS` is used; 0 is one per CPU.
+        chunk_size: The pairs counted per process-pool task. If None,
+            `REFERENCE_METRICS_CHUNK_SIZE` is used.
+
+    Returns:
+        An (n × 3) array with the columns of `REFERENCE_FIELDS`, in order. A
+        score is NaN where neither note has anything to compare, e.g. no
+        entities.
+    """
+    workers = settings.REFERENCE_METRICS_WORKERS if workers is None else workers
+    chunk_size = chunk_size or settings.REFERENCE_METRICS_CHUNK_SIZE
+    workers = workers or os.cpu_count() or 1
+    pairs = [(note.generated_note, note.ground_truth_note) for note in notes]
+    if not pairs:
+        return np.empty((0, len(REFERENCE_FIELDS)))
+
+    chunks = [pairs[i : i + chunk_size] for i in range(0, len(pairs), chunk_size)]
+    if workers > 1 and len(chunks) > 1:
+        with ProcessPoolExecutor(min(workers, len(chunks))) as pool:
+            counts = np.concatenate(list(pool.map(pair_counts, chunks)))
+    else:
+        counts = pair_counts(pairs)
+
+    generated, reference, lcs, overlap = counts[:, :4].T
+    generated_entities, reference_entities, shared_entities = counts[:, 4:].T
+    # With β = 1, the F-measure of precision m/p and recall m/r is 2m / (p + r)
+    return np.column_stack(
+        [
+            _f_measure(lcs, generated, reference),
+            _f_measure(overlap, generated, reference),
+            _f_measure(shared_entities, generated_entities, reference_entities),
+        ]
+    )
+
+
+def score_rows(scores: np.ndarray) -> List[Dict[str, Optional[float]]]:
+    """Turns `reference_scores` into one dict of EvaluationResult fields per note."""
+    return [
+        {
+            field: None if np.isnan(value) else float(value)
+            for field, value in zip(REFERENCE_FIELDS, row)
+        }
+        for row in scores
+    ]
+
+
+def add_reference_scores(
+    results: List[EvaluationResult],
+) -> List[EvaluationResult]:
+    """Returns copies of the results with their reference metrics filled in."""
+    rows = score_rows(reference_scores([result.note for result in results]))
+    return [result.model_copy(update=row) for result, row in zip(results, rows)]
+
+
+def main():
+    """Scores an exported result set with the reference metrics."""
+    # Imported here since the pipeline imports this module through evaluation
+    from src.pipeline import RESULTS_PATH, export_results
+
+    parser = argparse.ArgumentParser(
+        description="Add ROUGE-L, token F1 and entity overlap against the "
+        "ground truth to exported evaluation results, without API calls."
+    )
+    parser.add_argument(
+        "path",
+        nargs="?",
+        default=RESULTS_PATH,
+        help=f"The results file to score in place (default: {RESULTS_PATH}).",
+    )
+    args = parser.parse_args()
+    setup_logging()
+
+    with open(args.path) as f:
+        results = [EvaluationResult.model_validate(result) for result in json.load(f)]
+    results = add_reference_scores(results)
+    export_results(results, args.path)
+
+    means = np.nanmean(
+        np.array(
+            [[getattr(r, field) for field in REFERENCE_FIELDS] for r in results],
+            dtype=float,
+        ),
+        axis=0,
+    )
+    logging.info(
+        f"Scored {len(results)} results: "
+        + ", ".join(
+            f"{field} {mean:.3f}" for field, mean in zip(REFERENCE_FIELDS, means)
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
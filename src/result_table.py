@@ -0,0 +1,370 @@
+"""
+Compact, array-backed storage of evaluation results.
+
+An `EvaluationResult` is a pydantic model with a dict of score tiers, lists
+of call stats and its own copy of every score, which adds up to kilobytes per
+note before counting the note texts. A `ResultTable` keeps the same data in
+columns instead:
+
+- every score field of `EvaluationResult` in one float64 array with a row per
+  result (NaN for optional scores that are not set),
+- the tier of each score as a small integer code,
+- the LLM calls of each stage (`generation`, `judge`) in per-call arrays of
+  their `CALL_VALUE_FIELDS`, with the offset of each row's calls,
+- a reference to each result's `ClinicalNote`. The note is not copied unless
+  it carries generation calls, which move into the call arrays.
+
+Rows can be looked up by position or by note ID, and score columns are read as
+arrays without building any model. `EvaluationResult` models are only built
+when a row is read, so a table can be passed wherever a sequence of results is
+expected. Tables are meant to be built once per run and grown with `add` and
+`extend`, rather than turned into lists of models between stages.
+"""
+
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+from src.core.instrumentation import CALL_VALUE_FIELDS, call_values
+from src.schemas.models import (
+    ClinicalNote,
+    EvaluationResult,
+    LLMCallStats,
+    score_fields,
+)
+
+# Rows allocated by an empty table; capacity doubles whenever it runs out
+INITIAL_CAPACITY = 64
+
+# The stages whose calls a table keeps
+CALL_STAGES = ("generation", "judge")
+
+_INTEGER_CALL_FIELDS = {"prompt_tokens", "completion_tokens", "retries"}
+
+
+def _grown(array: np.ndarray, size: int, fill: float = 0) -> np.ndarray:
+    # Doubles the first axis until it holds `size` entries
+    capacity = len(array)
+    if size <= capacity:
+        return array
+    while capacity < size:
+        capacity = max(capacity * 2, 1)
+    grown = np.full((capacity, *array.shape[1:]), fill, dtype=array.dtype)
+    grown[: len(array)] = array
+    return grown
+
+
+class CallColumns:
+    """The LLM calls of one stage of every row of a table, as per-call arrays.
+
+    The calls of row `r` are the entries from `ends[r - 1]` (0 for the first
+    row) up to `ends[r]`.
+    """
+
+    def __init__(self, rows: int):
+        self.values = np.empty((0, len(CALL_VALUE_FIELDS)))
+        # Codes of the (stage, metric, model) of every call
+        self.labels = np.empty(0, dtype=np.int32)
+        self.label_names: List[Tuple[str, Optional[str], Optional[str]]] = []
+        self._label_codes: Dict[Tuple[str, Optional[str], Optional[str]], int] = {}
+        self.ends = np.zeros(rows, dtype=np.int64)
+        self.count = 0
+
+    def _label_code(self, label: Tuple[str, Optional[str], Optional[str]]) -> int:
+        code = self._label_codes.get(label)
+        if code is None:
+            code = self._label_codes[label] = len(self.label_names)
+            self.label_names.append(label)
+        return code
+
+    def _reserve(self, calls: int) -> None:
+        self.values = _grown(self.values, calls)
+        self.labels = _grown(self.labels, calls)
+
+    def add(self, row: int, calls: Sequence[LLMCallStats]) -> None:
+        """Records the calls of a new row."""
+        self.ends = _grown(self.ends, row + 1)
+        if calls:
+            end = self.count + len(calls)
+            self._reserve(end)
+            self.values[self.count : end] = call_values(calls)
+            self.labels[self.count : end] = [
+                self._label_code((call.stage, call.metric, call.model))
+                for call in calls
+            ]
+            self.count = end
+        self.ends[row] = self.count
+
+    def extend(self, other: "CallColumns", first_row: int, rows: int) -> None:
+        """Records the calls of `rows` rows of another table, from row `first_row` on."""
+        self.ends = _grown(self.ends, first_row + rows)
+        end = self.count + other.count
+        self._reserve(end)
+        self.values[self.count : end] = other.values[: other.count]
+        codes = np.array(
+            [self._label_code(label) for label in other.label_names] or [0],
+            dtype=np.int32,
+        )
+        self.labels[self.count : end] = codes[other.labels[: other.count]]
+        self.ends[first_row : first_row + rows] = other.ends[:rows] + self.count
+        self.count = end
+
+    def calls(self, row: int) -> List[LLMCallStats]:
+        """Returns the calls of a row as models."""
+        start = self.ends[row - 1] if row else 0
+        calls = []
+        for code, values in zip(
+            self.labels[start : self.ends[row]].tolist(),
+            self.values[start : self.ends[row]].tolist(),
+        ):
+            stage, metric, model = self.label_names[code]
+            fields = dict(zip(CALL_VALUE_FIELDS, values))
+            for field in _INTEGER_CALL_FIELDS:
+                fields[field] = int(fields[field])
+            if fields["cost"] != fields["cost"]:
+                fields["cost"] = None
+            calls.append(
+                LLMCallStats.model_construct(
+                    stage=stage, metric=metric, model=model, **fields
+                )
+            )
+        return calls
+
+    def columns(self) -> Tuple[List[str], List[Optional[str]], np.ndarray]:
+        """Returns the stage, metric and `call_values` of every call."""
+        labels = [self.label_names[code] for code in self.labels[: self.count].tolist()]
+        return (
+            [stage for stage, _, _ in labels],
+            [metric for _, metric, _ in labels],
+            self.values[: self.count],
+        )
+
+
+class ResultTable(Sequence[EvaluationResult]):
+    """A sequence of evaluation results stored as score and call arrays.
+
+    Args:
+        capacity: The number of rows to allocate up front, e.g. the number of
+            notes about to be evaluated.
+    """
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self.fields = score_fields()
+        self._columns = {field: i for i, field in enumerate(self.fields)}
+        self._optional = np.array(
+            [
+                not EvaluationResult.model_fields[field].is_required()
+                for field in self.fields
+            ]
+        )
+        capacity = max(capacity, 1)
+        self._scores = np.full((capacity, len(self.fields)), np.nan)
+        # 0 is "no tier"; other codes index `_tier_names`
+        self._tiers = np.zeros((capacity, len(self.fields)), dtype=np.int8)
+        self._tier_names: List[Optional[str]] = [None]
+        self._notes: List[ClinicalNote] = []
+        self._calls = {stage: CallColumns(capacity) for stage in CALL_STAGES}
+        # Rarely set, so kept by row instead of as columns
+        self._cheap_judge_scores: Dict[int, Dict[str, float]] = {}
+        self._carried_from: Dict[int, Dict[str, str]] = {}
+        self._rows_by_note_id: Optional[Dict[Optional[str], int]] = None
+
+    @classmethod
+    def from_results(cls, results: Iterable[EvaluationResult]) -> "ResultTable":
+        """Builds a table holding the given results."""
+        results = results if isinstance(results, Sequence) else list(results)
+        table = cls(len(results))
+        table.extend(results)
+        return table
+
+    def _reserve(self, rows: int) -> None:
+        self._scores = _grown(self._scores, rows, np.nan)
+        self._tiers = _grown(self._tiers, rows)
+
+    def _tier_code(self, tier: str) -> int:
+        try:
+            return self._tier_names.index(tier)
+        except ValueError:
+            self._tier_names.append(tier)
+            return len(self._tier_names) - 1
+
+    def add(
+        self,
+        note: ClinicalNote,
+        scores: Dict[str, Optional[float]],
+        tiers: Optional[Dict[str, str]] = None,
+        calls: Optional[List[LLMCallStats]] = None,
+        cheap_judge_scores: Optional[Dict[str, float]] = None,
+        carried_from: Optional[Dict[str, str]] = None,
+    ) -> None:
+        """Adds a result without building its model.
+
+        Args:
+            note: The evaluated note; the table keeps a reference to it, or to
+                a copy without its generation calls if it has any.
+            scores: The score of each `EvaluationResult` score field that is set.
+            tiers: The tier that produced each score, keyed by field.
+            calls: The judge calls made for the note.
+            cheap_judge_scores: As in `EvaluationResult`.
+            carried_from: As in `EvaluationResult`.
+
+        Raises:
+            ValueError: If a required score field is missing.
+        """
+        missing = [
+            field
+            for field, optional in zip(self.fields, self._optional)
+            if not optional and scores.get(field) is None
+        ]
+        if missing:
+            raise ValueError(f"Missing scores for {', '.join(missing)}")
+        row = len(self._notes)
+        self._reserve(row + 1)
+        for field, score in scores.items():
+            if score is not None:
+                self._scores[row, self._columns[field]] = score
+        for field, tier in (tiers or {}).items():
+            self._tiers[row, self._columns[field]] = self._tier_code(tier)
+        self._calls["generation"].add(row, note.generation_calls)
+        self._calls["judge"].add(row, calls or [])
+        if note.generation_calls:
+            note = note.model_copy(update={"generation_calls": []})
+        self._notes.append(note)
+        if cheap_judge_scores:
+            self._cheap_judge_scores[row] = cheap_judge_scores
+        if carried_from:
+            self._carried_from[row] = carried_from
+        if self._rows_by_note_id is not None:
+            self._rows_by_note_id.setdefault(note.note_id, row)
+
+    def append(self, result: EvaluationResult) -> None:
+        """Adds a result model."""
+        self.add(
+            result.note,
+            {field: getattr(result, field) for field in self.fields},
+            result.score_tiers,
+            result.judge_calls,
+            result.cheap_judge_scores,
+            result.carried_from,
+        )
+
+    def extend(self, results: Iterable[EvaluationResult]) -> None:
+        """Adds results; the rows of another table are copied column by column."""
+        if not isinstance(results, ResultTable):
+            for result in results:
+                self.append(result)
+            return
+        first, rows = len(self), len(results)
+        self._reserve(first + rows)
+        self._scores[first : first + rows] = results._scores[:rows]
+        codes = np.array(
+            [0] + [self._tier_code(name) for name in results._tier_names[1:]],
+            dtype=np.int8,
+        )
+        self._tiers[first : first + rows] = codes[results._tiers[:rows]]
+        for stage, calls in self._calls.items():
+            calls.extend(results._calls[stage], first, rows)
+        self._notes.extend(results._notes)
+        for row, scores in results._cheap_judge_scores.items():
+            self._cheap_judge_scores[first + row] = scores
+        for row, carried_from in results._carried_from.items():
+            self._carried_from[first + row] = carried_from
+        if self._rows_by_note_id is not None:
+            for row in range(first, first + rows):
+                self._rows_by_note_id.setdefault(self._notes[row].note_id, row)
+
+    def __len__(self) -> int:
+        return len(self._notes)
+
+    def _note(self, row: int) -> ClinicalNote:
+        note = self._notes[row]
+        calls = self._calls["generation"].calls(row)
+        return note.model_copy(update={"generation_calls": calls}) if calls else note
+
+    def _result(self, row: int) -> EvaluationResult:
+        scores = self._scores[row].tolist()
+        tiers = self._tiers[row]
+        # The values were validated when they were added
+        return EvaluationResult.model_construct(
+            note=self._note(row),
+            **{
+                field: None if optional and score != score else score
+                for field, score, optional in zip(self.fields, scores, self._optional)
+            },
+            score_tiers={
+                field: self._tier_names[code]
+                for field, code in zip(self.fields, tiers.tolist())
+                if code
+            },
+            cheap_judge_scores=dict(self._cheap_judge_scores.get(row, {})),
+            carried_from=dict(self._carried_from.get(row, {})),
+            judge_calls=self._calls["judge"].calls(row),
+        )
+
+    def __getitem__(
+        self, index: Union[int, slice]
+    ) -> Union[EvaluationResult, List[EvaluationResult]]:
+        if isinstance(index, slice):
+            return [self._result(row) for row in range(len(self))[index]]
+        return self._result(range(len(self))[index])
+
+    def __iter__(self) -> Iterator[EvaluationResult]:
+        return (self._result(row) for row in range(len(self)))
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Sequence) or isinstance(other, str):
+            return NotImplemented
+        return len(self) == len(other) and all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f"ResultTable({len(self)} results)"
+
+    @property
+    def notes(self) -> List[ClinicalNote]:
+        """The note of every row, with its generation calls."""
+        return [self._note(row) for row in range(len(self))]
+
+    def column(self, field: str) -> np.ndarray:
+        """Returns a read-only view of a field's scores; unset scores are NaN."""
+        view = self._scores[: len(self), self._columns[field]]
+        view.flags.writeable = False
+        return view
+
+    def score_matrix(self, fields: Sequence[str]) -> np.ndarray:
+        """Returns the scores of the fields as a (rows × fields) matrix."""
+        return self._scores[: len(self), [self._columns[field] for field in fields]]
+
+    def call_columns(self) -> Tuple[List[str], List[Optional[str]], np.ndarray]:
+        """Returns the stage, metric and `call_values` of every call of every row.
+
+        The result can be passed to `summarize_call_values`.
+        """
+        stages, metrics, values = [], [], []
+        for calls in self._calls.values():
+            stage_stages, stage_metrics, stage_values = calls.columns()
+            stages += stage_stages
+            metrics += stage_metrics
+            values.append(stage_values)
+        return stages, metrics, np.concatenate(values)
+
+    def row_of(self, note_id: Optional[str]) -> Optional[int]:
+        """Returns the first row of a note ID, or None if no row has it."""
+        if self._rows_by_note_id is None:
+            self._rows_by_note_id = {}
+            for row, note in enumerate(self._notes):
+                self._rows_by_note_id.setdefault(note.note_id, row)
+        return self._rows_by_note_id.get(note_id)
+
+    def get(self, note_id: Optional[str]) -> Optional[EvaluationResult]:
+        """Returns the result of a note ID, or None if no row has it."""
+        row = self.row_of(note_id)
+        return None if row is None else self._result(row)
@@ -0,0 +1,372 @@
+"""
+SQLite store of the evaluation history.
+
+Every run keeps its results in `data/runs.db` (`RUN_STORE_PATH`) instead of
+overwriting a single JSON file, so earlier runs stay available and readers
+query only what they need. The store has three tables:
+
+- `runs`: one row per run, with the hyperparameters from `run_evaluation`
+  and the run's checkpoint metadata.
+- `notes`: one row per evaluated note, with the hashes of its texts and the
+  rest of its `EvaluationResult` as JSON. The texts themselves are kept once,
+  compressed, in the `blobs` table of `src.core.blobs`, so the transcripts and
+  ground truth shared by every run over a dataset are not stored again, and
+  loading a run reads and decompresses each distinct text once.
+- `scores`: one row per (note, score field), indexed by run, metric and score
+  so that e.g. "notes of run X with a safety score below 0.5" is an index
+  range scan.
+
+Rows are only ever appended. Results are written a batch at a time in one
+transaction, as the run's checkpoint records them. Result sets exported to
+JSON before the store existed can be imported with
+`python -m src.run_store import data/evaluation_results.json`.
+"""
+
+import argparse
+import json
+import logging
+import os
+import sqlite3
+from contextlib import closing
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Mapping, Optional
+
+from src.checkpoint import new_run_id
+from src.core.blobs import BlobStore, write_blobs
+from src.core.config import settings
+from src.core.logging_config import setup_logging
+from src.result_table import ResultTable
+from src.schemas.models import (
+    NOTE_TEXT_FIELDS,
+    ClinicalNote,
+    EvaluationResult,
+    LLMCallStats,
+    score_fields,
+)
+
+# Bumped whenever the schema changes; `_migrate` brings older stores up to date
+SCHEMA_VERSION = 1
+
+# The hash column of each note text
+TEXT_COLUMNS = {
+    "transcript": "transcript_hash",
+    "ground_truth_note": "ground_truth_hash",
+    "generated_note": "generated_hash",
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    identifier TEXT,
+    hyperparameters TEXT NOT NULL,
+    metadata TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    run_id TEXT NOT NULL REFERENCES runs (run_id),
+    note_id TEXT,
+    transcript_hash TEXT NOT NULL,
+    ground_truth_hash TEXT NOT NULL,
+    generated_hash TEXT NOT NULL,
+    result TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notes_by_run ON notes (run_id, note_id);
+CREATE TABLE IF NOT EXISTS scores (
+    note INTEGER NOT NULL REFERENCES notes (id),
+    run_id TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    score REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scores_by_run ON scores (run_id, metric, score);
+CREATE INDEX IF NOT EXISTS scores_by_metric ON scores (metric, score);
+"""
+
+
+class RunStore:
+    """Append-only SQLite storage of runs and their per-note results.
+
+    Every operation opens its own connection, so a store can be shared by the
+    threads a pipeline evaluates in.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.RUN_STORE_PATH
+        self.blobs = BlobStore(self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=30.0)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode = WAL")
+        connection.execute("PRAGMA synchronous = NORMAL")
+        self._migrate(connection)
+        return connection
+
+    def _migrate(self, connection: sqlite3.Connection) -> None:
+        (version,) = connection.execute("PRAGMA user_version").fetchone()
+        if version >= SCHEMA_VERSION:
+            return
+        # One transaction, so that a concurrent or interrupted setup cannot
+        # leave the schema half-created
+        connection.execute("BEGIN IMMEDIATE")
+        with connection:
+            # Unlike executescript, single statements do not commit the transaction
+            for statement in _SCHEMA.split(";"):
+                if statement.strip():
+                    connection.execute(statement)
+            connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def _read(self, query: str, parameters: Iterable[Any] = ()) -> List[sqlite3.Row]:
+        # Reading an empty store must not create the database file
+        if not os.path.exists(self.path):
+            return []
+        with closing(self._connect()) as connection:
+            return connection.execute(query, tuple(parameters)).fetchall()
+
+    def create_run(
+        self,
+        run_id: str,
+        hyperparameters: Dict[str, Any],
+        metadata: Optional[Dict[str, Any]] = None,
+        identifier: Optional[str] = None,
+    ) -> bool:
+        """Registers a run; registering an existing run again changes nothing.
+
+        Returns:
+            Whether the run was new.
+        """
+        with closing(self._connect()) as connection, connection:
+            cursor = connection.execute(
+                "INSERT OR IGNORE INTO runs VALUES (?, ?, ?, ?, ?)",
+                (
+                    run_id,
+                    datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    identifier,
+                    json.dumps(hyperparameters),
+                    json.dumps(metadata or {}),
+                ),
+            )
+            return cursor.rowcount == 1
+
+    def append_results(self, run_id: str, results: Iterable[EvaluationResult]) -> None:
+        """Appends a batch of results of a run in one transaction."""
+        fields = score_fields()
+        results = list(results)
+        notes, scores, texts = [], [], []
+        for result in results:
+            texts.extend(getattr(result.note, name) for name in NOTE_TEXT_FIELDS)
+            payload = result.model_dump(exclude={"note": set(NOTE_TEXT_FIELDS)})
+            notes.append([run_id, result.note.note_id, json.dumps(payload)])
+            scores.append(
+                [
+                    (field, getattr(result, field))
+                    for field in fields
+                    if getattr(result, field) is not None
+                ]
+            )
+        if not notes:
+            return
+
+        with closing(self._connect()) as connection, connection:
+            # Take the write lock before reading the next ID so that concurrent
+            # writers cannot hand out the same IDs
+            connection.execute("BEGIN IMMEDIATE")
+            (first,) = connection.execute(
+                "SELECT COALESCE(MAX(id), 0) + 1 FROM notes"
+            ).fetchone()
+            hashes = write_blobs(connection, texts)
+            rows = [
+                (first + i, run, note_id, *hashes[3 * i : 3 * i + 3], payload)
+                for i, (run, note_id, payload) in enumerate(notes)
+            ]
+            connection.executemany(
+                "INSERT INTO notes VALUES (?, ?, ?, ?, ?, ?, ?)", rows
+            )
+            connection.executemany(
+                "INSERT INTO scores VALUES (?, ?, ?, ?)",
+                (
+                    (first + i, run_id, field, score)
+                    for i, note_scores in enumerate(scores)
+                    for field, score in note_scores
+                ),
+            )
+
+    def runs(self) -> List[Dict[str, Any]]:
+        """Returns every run, newest first, with its number of results."""
+        rows = self._read(
+            "SELECT runs.*, COUNT(notes.id) AS results FROM runs "
+            "LEFT JOIN notes USING (run_id) GROUP BY runs.run_id "
+            "ORDER BY runs.created_at DESC, runs.run_id DESC"
+        )
+        return [
+            {
+                **dict(row),
+                "hyperparameters": json.loads(row["hyperparameters"]),
+                "metadata": json.loads(row["metadata"]),
+            }
+            for row in rows
+        ]
+
+    def latest_run_id(self) -> Optional[str]:
+        """Returns the most recent run that has results, if any."""
+        return next((run["run_id"] for run in self.runs() if run["results"]), None)
+
+    def load_scores(self, run_id: str) -> List[Dict[str, Any]]:
+        """Returns the results of a run without reading any note text.
+
+        Each row is a result as `append_results` stored it, as a dict whose note
+        has no text fields, plus the hash of each note text under its column in
+        `TEXT_COLUMNS`; `note_texts` reads the texts of a row.
+        """
+        rows = self._read("SELECT * FROM notes WHERE run_id = ? ORDER BY id", [run_id])
+        return [
+            {
+                **json.loads(row["result"]),
+                **{column: row[column] for column in TEXT_COLUMNS.values()},
+            }
+            for row in rows
+        ]
+
+    def note_texts(self, row: Mapping[str, Any]) -> Dict[str, str]:
+        """Returns the note texts of a row of `load_scores`, keyed by note field."""
+        texts = self.blobs.get_many([row[column] for column in TEXT_COLUMNS.values()])
+        return {name: texts[row[column]] for name, column in TEXT_COLUMNS.items()}
+
+    def load_results(self, run_id: str) -> ResultTable:
+        """Returns the results of a run in the order they were stored.
+
+        The note texts are read from the blob table in one go; notes with the
+        same text share one string. The rows go straight into the table,
+        without building an `EvaluationResult` for each.
+        """
+        rows = self.load_scores(run_id)
+        texts = self.blobs.get_many(
+            row[column] for row in rows for column in TEXT_COLUMNS.values()
+        )
+        results = ResultTable(len(rows))
+        for row in rows:
+            note = ClinicalNote(
+                **row["note"],
+                **{name: texts[row[column]] for name, column in TEXT_COLUMNS.items()},
+            )
+            results.add(
+                note,
+                {field: row.get(field) for field in results.fields},
+                row.get("score_tiers"),
+                [LLMCallStats(**call) for call in row.get("judge_calls", [])],
+                row.get("cheap_judge_scores"),
+                row.get("carried_from"),
+            )
+        return results
+
+    def query_scores(
+        self,
+        run_id: Optional[str] = None,
+        metric: Optional[str] = None,
+        min_score: Optional[float] = None,
+        max_score: Optional[float] = None,
+        limit: Optional[int] = None,
+    ) -> List[Dict[str, Any]]:
+        """Returns the scores matching every given filter.
+
+        Args:
+            run_id: Only scores of this run.
+            metric: Only scores of this field, e.g. `clinical_safety_score`.
+            min_score: Only scores of at least this value.
+            max_score: Only scores of at most this value.
+            limit: Return at most this many scores.
+
+        Returns:
+            Dicts with the `run_id`, `note_id`, `metric` and `score`, ordered by
+            run, metric and score.
+        """
+        conditions, parameters = [], []
+        for condition, value in (
+            ("scores.run_id = ?", run_id),
+            ("scores.metric = ?", metric),
+            ("scores.score >= ?", min_score),
+            ("scores.score <= ?", max_score),
+        ):
+            if value is not None:
+                conditions.append(condition)
+                parameters.append(value)
+        query = (
+            "SELECT scores.run_id, notes.note_id, scores.metric, scores.score "
+            "FROM scores JOIN notes ON notes.id = scores.note"
+        )
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        query += " ORDER BY scores.run_id, scores.metric, scores.score"
+        if limit is not None:
+            query += " LIMIT ?"
+            parameters.append(limit)
+        return [dict(row) for row in self._read(query, parameters)]
+
+    def import_json(self, path: str, run_id: Optional[str] = None) -> str:
+        """Imports a result set exported to JSON (e.g. by `export_results`) as a run.
+
+        Returns:
+            The ID of the imported run, a new run ID unless given.
+        """
+        with open(path, "r") as f:
+            results = [
+                EvaluationResult.model_validate(record) for record in json.load(f)
+            ]
+        run_id = run_id or new_run_id()
+        self.create_run(run_id, {}, {"imported_from": path})
+        self.append_results(run_id, results)
+        return run_id
+
+
+def main():
+    """Imports, lists, queries and exports stored runs."""
+    # Imported here so that the dashboard can use the store without the pipeline
+    from src.pipeline import export_results
+
+    parser = argparse.ArgumentParser(description="Work with the run history store.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    importer = commands.add_parser(
+        "import", help="Import result files exported to JSON as runs."
+    )
+    importer.add_argument("paths", nargs="+", help="The JSON result files.")
+    commands.add_parser("runs", help="List the stored runs.")
+    query = commands.add_parser("query", help="List scores by run, metric and range.")
+    query.add_argument("--run", help="Only scores of this run.")
+    query.add_argument("--metric", help="Only this score field.")
+    query.add_argument("--min", type=float, help="Only scores of at least this.")
+    query.add_argument("--max", type=float, help="Only scores of at most this.")
+    query.add_argument("--limit", type=int, default=100, help="At most this many.")
+    exporter = commands.add_parser("export", help="Export a run's results to JSON.")
+    exporter.add_argument("run_id", help="The run to export.")
+    exporter.add_argument("path", help="The JSON file to write.")
+    args = parser.parse_args()
+    setup_logging()
+
+    store = RunStore()
+    if args.command == "import":
+        for path in args.paths:
+            logging.info(f"Imported {path} as run {store.import_json(path)}")
+    elif args.command == "runs":
+        for run in store.runs():
+            logging.info(
+                f"{run['run_id']}: {run['results']} results, "
+                f"{run['identifier'] or run['hyperparameters'] or run['metadata']}"
+            )
+    elif args.command == "query":
+        for row in store.query_scores(
+            args.run, args.metric, args.min, args.max, args.limit
+        ):
+            logging.info(
+                f"{row['run_id']} note {row['note_id']}: "
+                f"{row['metric']} = {row['score']:.3f}"
+            )
+    else:
+        export_results(store.load_results(args.run_id), args.path)
+        logging.info(f"Exported run {args.run_id} to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
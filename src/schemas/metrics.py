@@ -1,7 +1,15 @@
-from deepeval.metrics import GEval
-from deepeval.test_case import LLMTestCaseParams
+import json
+from typing import Dict, List, Optional, Tuple
 
-from src.core.config import settings
+from deepeval.metrics import BaseMetric, GEval
+from deepeval.models import DeepEvalBaseLLM
+from deepeval.test_case import LLMTestCase, LLMTestCaseParams
+
+from src.core.judge_model import JudgeLLM
+from src.prompts.judge import (
+    get_multi_criteria_judge_messages,
+    parse_multi_criteria_judgement,
+)
 
 
 class SOAPStructureMetric(GEval):
@@ -10,7 +18,7 @@ class SOAPStructureMetric(GEval):
     def __init__(self, threshold: float = 0.7, **kwargs):
         params = {
             "name": "SOAP Structure Compliance [GEval]",
-            "model": settings.EVALUATION_LLM,
+            "model": JudgeLLM(),
             "criteria": """
             Evaluate if the clinical note follows proper SOAP format:
             1. Subjective: Patient-reported symptoms, chief complaint, history
@@ -41,7 +49,7 @@ class ClinicalSafetyMetric(GEval):
     def __init__(self, threshold: float = 0.7, **kwargs):
         params = {
             "name": "Clinical Safety Assessment [GEval]",
-            "model": settings.EVALUATION_LLM,
+            "model": JudgeLLM(),
             "criteria": """
             Evaluate potential patient safety risks in the generated note:
             1. Medication errors (e.g., incorrect dosage, wrong medication).
@@ -72,7 +80,7 @@ class ClinicalAccuracyMetric(GEval):
     def __init__(self, threshold: float = 0.8, **kwargs):
         params = {
             "name": "Clinical Accuracy [GEval]",
-            "model": settings.EVALUATION_LLM,
+            "model": JudgeLLM(),
             "criteria": """
             Evaluate the clinical accuracy of the generated note. It should be medically sound and not contain misleading information.
             """,
@@ -97,7 +105,7 @@ class MedicalTerminologyMetric(GEval):
     def __init__(self, threshold: float = 0.8, **kwargs):
         params = {
             "name": "Medical Terminology Accuracy [GEval]",
-            "model": settings.EVALUATION_LLM,
+            "model": JudgeLLM(),
             "criteria": """
             Evaluate the use of medical terminology in the clinical note for accuracy, context, and standard usage:
             1. Correctness: Are the terms spelled correctly and used in the proper medical context?
@@ -119,3 +127,88 @@ class MedicalTerminologyMetric(GEval):
         }
         params.update(kwargs)
         super().__init__(**params)
+
+
+class MultiCriteriaJudgeMetric(BaseMetric):
+    """Scores the criteria of several GEval metrics in a single judge call.
+
+    The transcript, note and context are sent once instead of once per metric.
+    The per-metric scores are kept in `score_breakdown`, keyed by metric name;
+    `reason` holds the scores and reasons as JSON, since that is the part of a
+    metric that deepeval passes on in its results.
+    """
+
+    def __init__(
+        self,
+        metrics: List[GEval],
+        threshold: float = 0.7,
+        model: Optional[DeepEvalBaseLLM] = None,
+    ):
+        self.criteria_metrics = metrics
+        self.threshold = threshold
+        self.model = model or JudgeLLM()
+        self.evaluation_model = self.model.get_model_name()
+        self.name = "Multi-Criteria Judge"
+        self.include_reason = True
+        self.async_mode = True
+        self.strict_mode = False
+        self.verbose_mode = False
+
+    @property
+    def __name__(self):
+        return self.name
+
+    def _keys(self) -> List[str]:
+        # Names without deepeval's " [GEval]" suffix read better in the prompt
+        return [m.name.replace(" [GEval]", "") for m in self.criteria_metrics]
+
+    def judge_messages(self, test_case: LLMTestCase) -> List[Dict[str, str]]:
+        """Returns the messages of the judge call for a test case."""
+        return get_multi_criteria_judge_messages(
+            [
+                (key, metric.criteria, metric.evaluation_steps)
+                for key, metric in zip(self._keys(), self.criteria_metrics)
+            ],
+            test_case.input,
+            test_case.actual_output,
+            "\n".join(test_case.context or []),
+        )
+
+    def parse(self, content: str) -> Dict[str, Tuple[float, str]]:
+        """Parses a judge answer into a score and reason per metric name.
+
+        Raises:
+            ValueError: If the answer has no valid score for one of the metrics.
+        """
+        judgements = parse_multi_criteria_judgement(content, self._keys())
+        return {
+            metric.name: judgements[key]
+            for key, metric in zip(self._keys(), self.criteria_metrics)
+        }
+
+    def _apply(self, content: str) -> float:
+        self.score_breakdown = {}
+        reasons = {}
+        for name, (score, reason) in self.parse(content).items():
+            self.score_breakdown[name] = score
+            reasons[name] = {"score": score, "reason": reason}
+        self.score = sum(self.score_breakdown.values()) / len(self.score_breakdown)
+        self.reason = json.dumps(reasons)
+        self.success = all(
+            self.score_breakdown[m.name] >= m.threshold for m in self.criteria_metrics
+        )
+        return self.score
+
+    def measure(self, test_case: LLMTestCase, *args, **kwargs) -> float:
+        return self._apply(self.model.complete(self.judge_messages(test_case)))
+
+    async def a_measure(self, test_case: LLMTestCase, *args, **kwargs) -> float:
+        return self._apply(await self.model.acomplete(self.judge_messages(test_case)))
+
+    def is_successful(self) -> bool:
+        return bool(self.success) and self.error is None
+
+    @staticmethod
+    def breakdown(reason: str) -> Dict[str, float]:
+        """Recovers the per-metric scores from the `reason` of a verdict."""
+        return {name: item["score"] for name, item in json.loads(reason).items()}
@@ -1,8 +1,34 @@
-from pydantic import BaseModel, Field
-from typing import Optional
+from pydantic import BaseModel, ConfigDict, Field
+from typing import Dict, List, Optional
+
+# The text fields of a ClinicalNote
+NOTE_TEXT_FIELDS = ("transcript", "ground_truth_note", "generated_note")
+
+
+class LLMCallStats(BaseModel):
+    stage: str = Field(..., description="The call layer, 'generation' or 'judge'.")
+    metric: Optional[str] = Field(
+        None, description="The metric a judge call was made for."
+    )
+    model: Optional[str] = Field(None, description="The model that answered.")
+    wall_time: float = Field(
+        ...,
+        description="Seconds from the first attempt to the result, retries included.",
+    )
+    queue_wait: float = Field(
+        0.0, description="Seconds spent waiting for the rate limiter."
+    )
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    retries: int = Field(0, description="Attempts that failed before the last one.")
+    cost: Optional[float] = Field(
+        None, description="Estimated cost in USD; None for models without a price."
+    )
 
 
 class ClinicalNote(BaseModel):
+    model_config = ConfigDict(populate_by_name=True)
+
     transcript: str = Field(
         ..., description="The source transcript of the patient encounter."
     )
@@ -10,6 +36,15 @@ class ClinicalNote(BaseModel):
         ..., alias="note", description="The ground-truth, clinician-edited SOAP note."
     )
     generated_note: str = Field(..., description="The AI-generated SOAP note.")
+    note_id: Optional[str] = Field(
+        None, description="Stable identifier of the source record in the dataset."
+    )
+    generation_error: Optional[str] = Field(
+        None, description="Why the note could not be generated, if it failed."
+    )
+    generation_calls: List[LLMCallStats] = Field(
+        default_factory=list, description="The LLM calls that generated the note."
+    )
 
 
 class EvaluationResult(BaseModel):
@@ -21,3 +56,46 @@ class EvaluationResult(BaseModel):
     clinical_safety_score: float
     medical_terminology_score: float
     overall_score: float
+    rouge_l_score: Optional[float] = Field(
+        None, description="ROUGE-L F-measure of the note against the ground truth."
+    )
+    token_f1_score: Optional[float] = Field(
+        None, description="Token overlap F1 of the note against the ground truth."
+    )
+    entity_overlap_score: Optional[float] = Field(
+        None,
+        description=(
+            "F1 of the clinical entities (doses, measurements, drugs) of the note "
+            "and the ground truth; None if neither mentions any."
+        ),
+    )
+    score_tiers: Dict[str, str] = Field(
+        default_factory=dict,
+        description=(
+            "Which tier ('local', 'cheap_judge' or 'judge') produced each score field."
+        ),
+    )
+    cheap_judge_scores: Dict[str, float] = Field(
+        default_factory=dict,
+        description="Scores of the cheap judge for fields escalated to the strong judge.",
+    )
+    judge_calls: List[LLMCallStats] = Field(
+        default_factory=list,
+        description="The judge calls made for this note; cached verdicts make none.",
+    )
+    carried_from: Dict[str, str] = Field(
+        default_factory=dict,
+        description=(
+            "Score fields carried forward unchanged from an earlier run, with the "
+            "ID of the run that scored them."
+        ),
+    )
+
+
+def score_fields() -> List[str]:
+    """Returns the numeric score fields of `EvaluationResult`, in field order."""
+    return [
+        name
+        for name, field in EvaluationResult.model_fields.items()
+        if name.endswith("_score") and field.annotation in (float, Optional[float])
+    ]
@@ -0,0 +1,39 @@
+"""
+Deterministic dataset sharding.
+
+A run started with `--shard i/N` only processes the records whose transcript
+hashes into shard `i` of `N`. The split depends only on the record's content,
+so every worker computes the same shards without coordination, and reordering
+or appending records does not move existing records to another shard.
+Shard runs are combined with `python -m src.merge`.
+"""
+
+from typing import Dict, Tuple
+
+from src.core.cache import content_hash
+
+
+def parse_shard(spec: str) -> Tuple[int, int]:
+    """Parses a shard spec such as `3/8` into (index, count).
+
+    Raises:
+        ValueError: If the spec is malformed or the index is out of range.
+    """
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected INDEX/COUNT such as 0/4")
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f"Invalid shard '{spec}', INDEX must be in 0..COUNT-1")
+    return index, count
+
+
+def shard_of(record: Dict[str, str], count: int) -> int:
+    """Returns the shard a dataset record belongs to."""
+    return int(content_hash(record["patient_convo"]), 16) % count
+
+
+def in_shard(record: Dict[str, str], shard: Tuple[int, int]) -> bool:
+    """Returns whether a dataset record belongs to the given (index, count) shard."""
+    index, count = shard
+    return shard_of(record, count) == index
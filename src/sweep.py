@@ -0,0 +1,412 @@
+"""
+Matrix sweeps over prompt versions and generation models.
+
+A sweep runs every (prompt version, model) cell of a grid as its own
+checkpointed run, labeled like `prompt-v2_gen-gpt-4-1`. The dataset is read
+once for the whole grid. All cells generate at the same time through one shared
+rate limiter, and their notes are judged together in shared evaluation batches
+while generation goes on. A grid therefore takes about as long as a single run
+over the same number of notes, instead of one full run per cell.
+
+Each sweep is described by a manifest in `data/sweeps/<sweep_id>/sweep.json`,
+and each cell's results are written next to it as `<label>.json`. Every cell
+is also registered in the run store, with the `metric_versions` it was judged
+with, so its results can be queried and built on like those of any other run.
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import logging
+import os
+from typing import Any, Callable, Dict, List, Optional
+
+from src.checkpoint import RUNS_DIR, RunCheckpoint, new_run_id
+from src.core.config import settings
+from src.core.logging_config import setup_logging
+from src.core.rate_limit import RateLimiter
+from src.data_loader import DATASET_PATH, iter_records
+from src.evaluation import get_hyperparameters, run_identifier
+from src.incremental import metric_versions
+from src.pipeline import arun_generation_stage, pending_notes, stage_evaluator
+from src.prompts.versions import PROMPT_VERSIONS
+from src.result_table import ResultTable
+from src.run_store import RunStore
+from src.schemas.models import ClinicalNote
+
+SWEEPS_DIR = os.path.join("data", "sweeps")
+MANIFEST_FILE = "sweep.json"
+
+
+def _manifest_path(sweep_id: str, root: str) -> str:
+    return os.path.join(root, sweep_id, MANIFEST_FILE)
+
+
+def create_sweep(
+    prompt_versions: List[str],
+    models: List[str],
+    limit: Optional[int],
+    root: str = SWEEPS_DIR,
+    runs_root: str = RUNS_DIR,
+    store: Optional[RunStore] = None,
+) -> Dict[str, Any]:
+    """Starts a run for every cell of the grid and writes the sweep manifest.
+
+    Args:
+        prompt_versions: The prompt versions to compare.
+        models: The generation models to compare.
+        limit: The maximum number of records per cell. If None, the full dataset is used.
+        root: The directory sweep manifests and results are written to.
+        runs_root: The directory the cells' checkpoints are written to.
+        store: The run store every cell is registered in.
+
+    Returns:
+        The sweep manifest.
+
+    Raises:
+        ValueError: If a prompt version does not exist.
+    """
+    unknown = [v for v in prompt_versions if v not in PROMPT_VERSIONS]
+    if unknown:
+        raise ValueError(f"Unknown prompt versions: {', '.join(unknown)}")
+
+    sweep_id = new_run_id()
+    versions = metric_versions()
+    cells = []
+    for prompt_version, model in itertools.product(prompt_versions, models):
+        label = run_identifier(get_hyperparameters(prompt_version, model))
+        checkpoint = RunCheckpoint.create(
+            {
+                "limit": limit,
+                "prompt_version": prompt_version,
+                "generation_model": model,
+                "evaluation_model": settings.EVALUATION_LLM,
+                "sweep_id": sweep_id,
+                "label": label,
+                # Lets a later --incremental run tell which scores are stale
+                "metric_versions": versions,
+            },
+            root=runs_root,
+            store=store,
+        )
+        if store is not None:
+            store.create_run(
+                checkpoint.run_id,
+                get_hyperparameters(prompt_version, model),
+                checkpoint.metadata,
+                label,
+            )
+        cells.append(
+            {
+                "label": label,
+                "prompt_version": prompt_version,
+                "generation_model": model,
+                "run_id": checkpoint.run_id,
+            }
+        )
+
+    manifest = {"sweep_id": sweep_id, "limit": limit, "cells": cells}
+    path = _manifest_path(sweep_id, root)
+    os.makedirs(os.path.dirname(path))
+    with open(path, "w") as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+
+def load_sweep(sweep_id: str, root: str = SWEEPS_DIR) -> Dict[str, Any]:
+    """Reads the manifest of an existing sweep."""
+    path = _manifest_path(sweep_id, root)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No sweep found with ID {sweep_id}")
+    with open(path) as f:
+        return json.load(f)
+
+
+class _CellSink:
+    """Puts a cell's generated notes on the sweep's shared evaluation queue.
+
+    Note IDs are only unique within a cell, so they are tagged with the cell's
+    index on the way, like `1:7`.
+    """
+
+    def __init__(self, queue: "asyncio.Queue[Optional[ClinicalNote]]", index: int):
+        self.queue = queue
+        self.index = index
+
+    async def put(self, note: ClinicalNote) -> None:
+        await self.queue.put(_tag(note, self.index))
+
+
+def _tag(note: ClinicalNote, index: int) -> ClinicalNote:
+    return note.model_copy(update={"note_id": f"{index}:{note.note_id}"})
+
+
+def evaluate_sweep_batch(
+    checkpoints: List[RunCheckpoint],
+    batch: List[ClinicalNote],
+    sweep_id: str,
+    use_cache: bool = True,
+    evaluate: Optional[Callable[..., ResultTable]] = None,
+) -> None:
+    """Evaluates a batch of tagged notes from any cells in one evaluator call.
+
+    Each result is routed back to, and checkpointed in, its own cell.
+
+    Args:
+        evaluate: The evaluation function, e.g. built once per sweep with
+            `stage_evaluator`. If None, it is built here.
+    """
+    hyperparameters = {
+        "sweep_id": sweep_id,
+        "prompt_versions": ",".join(
+            sorted({c.metadata["prompt_version"] for c in checkpoints})
+        ),
+        "generation_models": ",".join(
+            sorted({c.metadata["generation_model"] for c in checkpoints})
+        ),
+        "evaluation_model": settings.EVALUATION_LLM,
+    }
+    evaluate = evaluate or stage_evaluator()
+    results = evaluate(
+        batch, hyperparameters, identifier=f"sweep-{sweep_id}", use_cache=use_cache
+    )
+    by_cell: Dict[int, ResultTable] = {}
+    for result in results:
+        index, note_id = result.note.note_id.split(":", 1)
+        result.note.note_id = note_id
+        if int(index) not in by_cell:
+            by_cell[int(index)] = ResultTable()
+        by_cell[int(index)].append(result)
+    for index, cell_results in by_cell.items():
+        checkpoints[index].append_results(cell_results)
+
+
+async def arun_sweep_stages(
+    checkpoints: List[RunCheckpoint],
+    records: List[Dict[str, str]],
+    sweep_id: str,
+    batch_size: Optional[int] = None,
+    use_cache: bool = True,
+    refresh: bool = False,
+    queue_size: Optional[int] = None,
+) -> int:
+    """Generates the missing notes of every cell and evaluates them as they come in.
+
+    All cells generate concurrently under one rate limiter and put their notes
+    on one queue of at most `queue_size` notes (default `PIPELINE_QUEUE_SIZE`),
+    like `arun_pipelined_stages` does for a single run. A single evaluation
+    worker takes up to `batch_size` notes at a time, from whichever cells they
+    came from, and evaluates them in a thread while generation goes on. Notes
+    from all cells share batches, so the judge executor sees as many pairs at
+    once as a single run would and the cells need no evaluation worker each.
+    The batches are evaluated like those of the evaluation stage, see
+    `stage_evaluator`. Notes of earlier attempts that were generated but not
+    evaluated are queued first.
+
+    Returns:
+        The number of notes that still failed to generate, over all cells.
+    """
+    batch_size = batch_size or settings.EVALUATION_BATCH_SIZE
+    limiter = RateLimiter(
+        max_concurrency=settings.GENERATION_MAX_CONCURRENCY,
+        requests_per_minute=settings.GENERATION_RPM,
+        tokens_per_minute=settings.GENERATION_TPM,
+    )
+    queue: "asyncio.Queue[Optional[ClinicalNote]]" = asyncio.Queue(
+        maxsize=queue_size or settings.PIPELINE_QUEUE_SIZE
+    )
+    evaluate = stage_evaluator()
+    missing = 0
+
+    async def _evaluate_notes() -> None:
+        evaluated = 0
+        finished = False
+        while not finished:
+            batch = [await queue.get()]
+            while len(batch) < batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+            # None marks the end of generation and is always the last item
+            if batch[-1] is None:
+                batch.pop()
+                finished = True
+            if not batch:
+                continue
+            await asyncio.to_thread(
+                evaluate_sweep_batch,
+                checkpoints,
+                batch,
+                sweep_id,
+                use_cache=use_cache,
+                evaluate=evaluate,
+            )
+            evaluated += len(batch)
+            logging.info(f"Evaluated {evaluated} notes, {queue.qsize()} queued.")
+
+    async def _generate_notes() -> None:
+        nonlocal missing
+        for index, checkpoint in enumerate(checkpoints):
+            for note in pending_notes(checkpoint):
+                await queue.put(_tag(note, index))
+        failed = await asyncio.gather(
+            *(
+                arun_generation_stage(
+                    checkpoint,
+                    records,
+                    limiter,
+                    use_cache=use_cache,
+                    refresh=refresh,
+                    sink=_CellSink(queue, index),
+                )
+                for index, checkpoint in enumerate(checkpoints)
+            )
+        )
+        missing = sum(failed)
+        await queue.put(None)
+
+    # A failing evaluation must not leave generation blocked on a full queue
+    tasks = [
+        asyncio.create_task(_generate_notes()),
+        asyncio.create_task(_evaluate_notes()),
+    ]
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    return missing
+
+
+def run_sweep(
+    manifest: Dict[str, Any],
+    root: str = SWEEPS_DIR,
+    runs_root: str = RUNS_DIR,
+    use_cache: bool = True,
+    refresh: bool = False,
+    store: Optional[RunStore] = None,
+) -> Dict[str, ResultTable]:
+    """Generates and evaluates every cell of a sweep, skipping checkpointed work.
+
+    Args:
+        store: The run store the cells' results are appended to, as they come in.
+
+    Returns:
+        The evaluation results of each cell, keyed by label.
+    """
+    checkpoints = []
+    for cell in manifest["cells"]:
+        checkpoint = RunCheckpoint.resume(cell["run_id"], root=runs_root, store=store)
+        if store is not None and store.create_run(
+            checkpoint.run_id,
+            get_hyperparameters(cell["prompt_version"], cell["generation_model"]),
+            checkpoint.metadata,
+            cell["label"],
+        ):
+            # A sweep started before the store existed brings its earlier results
+            store.append_results(checkpoint.run_id, checkpoint.load_results())
+        checkpoints.append(checkpoint)
+    records = list(iter_records(limit=manifest["limit"]))
+
+    missing = asyncio.run(
+        arun_sweep_stages(
+            checkpoints,
+            records,
+            manifest["sweep_id"],
+            use_cache=use_cache,
+            refresh=refresh,
+        )
+    )
+    if missing:
+        logging.warning(
+            f"{missing} notes failed to generate; resume sweep {manifest['sweep_id']} to retry them."
+        )
+
+    results = {}
+    for cell, checkpoint in zip(manifest["cells"], checkpoints):
+        cell_results = checkpoint.load_results()
+        path = os.path.join(root, manifest["sweep_id"], f"{cell['label']}.json")
+        with open(path, "w") as f:
+            json.dump([r.model_dump() for r in cell_results], f, indent=4)
+        results[cell["label"]] = cell_results
+    return results
+
+
+def main():
+    """Runs a sweep over a grid of prompt versions and generation models."""
+    setup_logging()
+
+    parser = argparse.ArgumentParser(
+        description="Compare prompt versions and generation models in one run."
+    )
+    parser.add_argument(
+        "--prompt-versions",
+        nargs="+",
+        default=sorted(PROMPT_VERSIONS),
+        help="Prompt versions to compare (default: all).",
+    )
+    parser.add_argument(
+        "--models",
+        nargs="+",
+        default=[settings.GENERATION_LLM],
+        help="Generation models to compare (default: GENERATION_LLM).",
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="Run the sweep on the full dataset."
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not read or write the generated-note and judgement caches.",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Regenerate every note and overwrite the cached entries.",
+    )
+    parser.add_argument(
+        "--resume",
+        metavar="SWEEP_ID",
+        help="Continue a previous sweep, processing only the records still missing.",
+    )
+    args = parser.parse_args()
+
+    if not os.path.exists(DATASET_PATH):
+        logging.error(
+            f"Dataset file not found at {DATASET_PATH}. Please run 'just setup-data' to download it."
+        )
+        return
+
+    store = RunStore()
+    if args.resume:
+        manifest = load_sweep(args.resume)
+        logging.info(f"Resuming sweep {manifest['sweep_id']}")
+    else:
+        try:
+            manifest = create_sweep(
+                args.prompt_versions,
+                args.models,
+                None if args.full else 2,
+                store=store,
+            )
+        except ValueError as e:
+            parser.error(str(e))
+        logging.info(
+            f"Started sweep {manifest['sweep_id']} with {len(manifest['cells'])} cells"
+        )
+
+    results = run_sweep(
+        manifest, use_cache=not args.no_cache, refresh=args.refresh, store=store
+    )
+    for label, cell_results in results.items():
+        if cell_results:
+            mean = cell_results.column("overall_score").mean()
+            logging.info(f"{label}: {len(cell_results)} notes, overall {mean:.3f}")
+        else:
+            logging.warning(f"{label}: no results")
+    logging.info(
+        f"Sweep complete. Results saved to {os.path.join(SWEEPS_DIR, manifest['sweep_id'])}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Tiered judging with escalation of close calls.
+
+A cheap judge model (`CHEAP_EVALUATION_LLM`) scores every (note, metric) pair
+first. Only pairs whose cheap score lies within `ESCALATION_MARGIN` of the
+metric's threshold, or whose repeated cheap samples differ by more than
+`CHEAP_JUDGE_MAX_SPREAD`, are judged again by the strong `EVALUATION_LLM`.
+Each result records in `score_tiers` which judge produced a score and, for
+escalated fields, the cheap score that was replaced, so `tiering_report` can
+be computed from the results of a run at any time.
+"""
+
+import statistics
+from typing import Collection, Dict, FrozenSet, List, Optional, Sequence, Union
+
+from deepeval.metrics import BaseMetric
+
+from src.core.config import settings
+from src.core.judge_model import JudgeLLM
+from src.evaluation import (
+    METRIC_FIELDS,
+    build_result,
+    get_metrics,
+    metric_name,
+    run_evaluation,
+)
+from src.local_metrics import JUDGE_TIER, LOCAL_TIER
+from src.reference_metrics import REFERENCE_FIELDS
+from src.result_table import ResultTable
+from src.schemas.models import ClinicalNote, EvaluationResult
+
+CHEAP_TIER = "cheap_judge"
+
+
+def metric_thresholds() -> Dict[str, float]:
+    """Returns the pass threshold of every metric, keyed by EvaluationResult field."""
+    return {
+        METRIC_FIELDS[metric_name(metric)]: metric.threshold
+        for metric in get_metrics(multi_criteria=False)
+    }
+
+
+def needs_escalation(
+    samples: List[float],
+    threshold: float,
+    margin: Optional[float] = None,
+    max_spread: Optional[float] = None,
+) -> bool:
+    """Returns whether cheap judge samples are too close or too unsure to keep."""
+    margin = settings.ESCALATION_MARGIN if margin is None else margin
+    max_spread = settings.CHEAP_JUDGE_MAX_SPREAD if max_spread is None else max_spread
+    close = abs(statistics.fmean(samples) - threshold) <= margin
+    return close or max(samples) - min(samples) > max_spread
+
+
+def cheap_judges(
+    model: Optional[str] = None, samples: Optional[int] = None
+) -> List[JudgeLLM]:
+    """Returns one cheap judge per sample; several samples are drawn with seeds."""
+    model = model or settings.CHEAP_EVALUATION_LLM
+    samples = samples or settings.CHEAP_JUDGE_SAMPLES
+    if samples == 1:
+        return [JudgeLLM(model)]
+    return [
+        JudgeLLM(model, temperature=settings.CHEAP_JUDGE_TEMPERATURE, seed=seed)
+        for seed in range(samples)
+    ]
+
+
+def cheap_metrics(
+    model: Optional[str] = None, samples: Optional[int] = None
+) -> List[List[BaseMetric]]:
+    """Returns the metrics of every cheap judge of `cheap_judges`."""
+    return [get_metrics(judge=judge) for judge in cheap_judges(model, samples)]
+
+
+def run_tiered_evaluation(
+    notes: List[ClinicalNote],
+    hyperparameters: Optional[Dict[str, Union[str, int, float]]] = None,
+    identifier: Optional[str] = None,
+    use_cache: bool = True,
+    cheap_model: Optional[str] = None,
+    samples: Optional[int] = None,
+    metrics: Optional[List[BaseMetric]] = None,
+    sample_metrics: Optional[List[List[BaseMetric]]] = None,
+    only_metrics: Optional[Collection[str]] = None,
+) -> ResultTable:
+    """Evaluates notes with the cheap judge and escalates close calls.
+
+    Notes are matched across judges by `note_id`. A note the cheap judge could
+    not score is judged entirely by the strong judge.
+
+    Args:
+        notes: The notes to evaluate.
+        hyperparameters: As for `run_evaluation`.
+        identifier: As for `run_evaluation`.
+        use_cache: Read and write the judgement cache, for both tiers.
+        cheap_model: The first-tier judge model. If None, `CHEAP_EVALUATION_LLM`.
+        samples: Cheap judge samples per pair. If None, `CHEAP_JUDGE_SAMPLES`.
+        metrics: The strong judge's metrics, e.g. built once per stage with
+            `get_metrics`. If None, they are built here.
+        sample_metrics: The metrics of every cheap judge sample, e.g. built
+            once per stage with `cheap_metrics`. If None, they are built here
+            from `cheap_model` and `samples`.
+        only_metrics: As for `run_evaluation`; only these metrics are judged by
+            either tier.
+    """
+    sampled = [
+        run_evaluation(
+            notes,
+            hyperparameters,
+            identifier,
+            use_cache=use_cache,
+            only_metrics=only_metrics,
+            metrics=judged_by,
+        )
+        for judged_by in sample_metrics or cheap_metrics(cheap_model, samples)
+    ]
+    thresholds = metric_thresholds()
+    names = {field: name for name, field in METRIC_FIELDS.items()}
+
+    cheap: Dict[str, List[EvaluationResult]] = {}
+    escalated: Dict[str, FrozenSet[str]] = {}
+    for note in notes:
+        results = [sample.get(note.note_id) for sample in sampled]
+        if note.generation_error:
+            continue
+        if any(result is None for result in results):
+            escalated[note.note_id] = frozenset(
+                field
+                for name, field in METRIC_FIELDS.items()
+                if only_metrics is None or name in only_metrics
+            )
+            continue
+        cheap[note.note_id] = results
+        escalated[note.note_id] = frozenset(
+            field
+            for field, tier in results[0].score_tiers.items()
+            if tier != LOCAL_TIER
+            and needs_escalation(
+                [getattr(result, field) for result in results], thresholds[field]
+            )
+        )
+
+    # Judge the escalated pairs, grouping notes that need the same metrics
+    groups: Dict[FrozenSet[str], List[ClinicalNote]] = {}
+    for note in notes:
+        if escalated.get(note.note_id):
+            groups.setdefault(escalated[note.note_id], []).append(note)
+    strong = ResultTable(sum(len(group) for group in groups.values()))
+    for fields, group in groups.items():
+        strong.extend(
+            run_evaluation(
+                group,
+                hyperparameters,
+                identifier,
+                use_cache=use_cache,
+                only_metrics=[names[field] for field in fields],
+                metrics=metrics,
+            )
+        )
+
+    combined = ResultTable(len(notes))
+    for note in notes:
+        judged = strong.get(note.note_id)
+        if note.note_id not in cheap:
+            if judged is not None:
+                combined.append(judged)
+            continue
+        results = cheap[note.note_id]
+        scores, tiers, replaced = {}, {}, {}
+        for field, tier in results[0].score_tiers.items():
+            name = names[field]
+            score = statistics.fmean(getattr(result, field) for result in results)
+            if (
+                field in escalated[note.note_id]
+                and judged
+                and field in judged.score_tiers
+            ):
+                scores[name], tiers[name] = getattr(judged, field), JUDGE_TIER
+                replaced[field] = score
+            else:
+                scores[name] = score
+                tiers[name] = tier if tier == LOCAL_TIER else CHEAP_TIER
+        calls = [call for result in results for call in result.judge_calls]
+        if judged is not None:
+            calls += judged.judge_calls
+        reference = {field: getattr(results[0], field) for field in REFERENCE_FIELDS}
+        combined.append(
+            build_result(note, scores, tiers, calls, reference).model_copy(
+                update={"cheap_judge_scores": replaced}
+            )
+        )
+    return combined
+
+
+def tiering_report(
+    results: Sequence[EvaluationResult], thresholds: Optional[Dict[str, float]] = None
+) -> Dict[str, Optional[float]]:
+    """Summarizes how often the cheap judge was escalated and how often it was right.
+
+    Returns:
+        `pairs` scored by a judge tier, `escalated` pairs and their fraction, and
+        `agreement`, the share of escalated pairs where the cheap and strong
+        judge agree on pass/fail (None if nothing was escalated).
+    """
+    thresholds = thresholds or metric_thresholds()
+    pairs = escalated = agreed = 0
+    for result in results:
+        for field, tier in result.score_tiers.items():
+            if tier == CHEAP_TIER:
+                pairs += 1
+            elif field in result.cheap_judge_scores:
+                pairs += 1
+                escalated += 1
+                threshold = thresholds[field]
+                agreed += (result.cheap_judge_scores[field] >= threshold) == (
+                    getattr(result, field) >= threshold
+                )
+    return {
+        "pairs": pairs,
+        "escalated": escalated,
+        "escalated_fraction": escalated / pairs if pairs else 0.0,
+        "agreement": agreed / escalated if escalated else None,
+    }
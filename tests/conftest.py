@@ -10,6 +10,24 @@ def mock_env_variables():
         yield
 
 
+# Keep on-disk caches out of the working tree
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path):
+    from src.core.config import settings
+
+    with patch.object(settings, "CACHE_DIR", str(tmp_path / "cache")):
+        yield
+
+
+# Keep the run history store out of the working tree
+@pytest.fixture(autouse=True)
+def isolated_run_store(tmp_path):
+    from src.core.config import settings
+
+    with patch.object(settings, "RUN_STORE_PATH", str(tmp_path / "runs.db")):
+        yield
+
+
 # Mock the OpenAI client for all tests
 @pytest.fixture(autouse=True)
 def mock_openai():
@@ -21,20 +39,3 @@ def mock_openai():
 
     with patch("openai.OpenAI", return_value=mock_client):
         yield mock_client
-
-
-# Mock deepeval's evaluate function
-@pytest.fixture(autouse=True)
-def mock_deepeval_evaluate():
-    mock_metric = MagicMock()
-    mock_metric.name = "Mocked Metric"
-    mock_metric.score = 0.9
-
-    mock_test_result = MagicMock()
-    mock_test_result.metrics_data = [mock_metric]
-
-    mock_evaluation_output = MagicMock()
-    mock_evaluation_output.test_results = [mock_test_result]
-
-    with patch("deepeval.evaluate", return_value=mock_evaluation_output):
-        yield mock_evaluation_output
@@ -0,0 +1,48 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src.benchmark import run_benchmark, write_dataset
+from src.data_loader import iter_records
+from src.fake_openai import FakeServerConfig
+
+
+class TestBenchmark(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_write_dataset(self):
+        # Arrange
+        path = os.path.join(self.tmp_dir.name, "dataset.json")
+
+        # Act
+        write_dataset(path, 3)
+
+        # Assert
+        records = list(iter_records(path=path))
+        self.assertEqual(len(records), 3)
+        self.assertIn("Patient:", records[0]["patient_convo"])
+
+    def test_benchmark_drives_the_live_path_against_the_fake_endpoint(self):
+        # Act
+        report = run_benchmark(
+            [4], FakeServerConfig(latency_median=0.0), root=self.tmp_dir.name
+        )
+
+        # Assert: every note was generated, judged and written
+        (size,) = report["sizes"]
+        self.assertEqual((size["notes"], size["results"]), (4, 4))
+        self.assertGreater(size["notes_per_second"], 0)
+        self.assertGreater(size["peak_rss_mb"], 0)
+        self.assertEqual(size["calls"]["generation"]["calls"], 4)
+        self.assertIn("wall_time_p99", size["calls"]["judge"])
+        path = os.path.join(self.tmp_dir.name, f"{report['benchmark_id']}.json")
+        with open(path) as f:
+            self.assertEqual(json.load(f)["sizes"], report["sizes"])
+
+
+if __name__ == "__main__":
+    unittest.main()
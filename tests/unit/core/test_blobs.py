@@ -0,0 +1,43 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+
+from src.core.blobs import BlobStore, text_hash
+
+
+class TestBlobStore(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.store = BlobStore(os.path.join(self.root, "blobs.db"))
+
+    def test_texts_are_stored_once_and_compressed(self):
+        # Arrange
+        transcript = "Doctor: How are you feeling today? " * 200
+
+        # Act
+        hashes = self.store.put_many([transcript, "note", transcript])
+        self.store.put_many([transcript])
+
+        # Assert
+        self.assertEqual(hashes, [text_hash(transcript), text_hash("note"), hashes[0]])
+        self.assertEqual(self.store.get(hashes[0]), transcript)
+        self.assertEqual(
+            self.store.get_many(hashes), {hashes[0]: transcript, hashes[1]: "note"}
+        )
+        with sqlite3.connect(self.store.path) as connection:
+            rows = connection.execute("SELECT data FROM blobs").fetchall()
+        self.assertEqual(len(rows), 2)
+        self.assertLess(sum(len(data) for (data,) in rows), len(transcript) / 10)
+
+    def test_missing_text(self):
+        # Act & Assert
+        with self.assertRaises(KeyError):
+            self.store.get(text_hash("never stored"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import os
+import tempfile
+import unittest
+
+from src.core.cache import DiskCache, content_hash, shared_cache
+
+
+class TestCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_content_hash_is_stable_and_sensitive(self):
+        # Act
+        first = content_hash("gpt-4.1", [{"role": "user", "content": "a"}])
+        second = content_hash("gpt-4.1", [{"role": "user", "content": "a"}])
+        changed = content_hash("gpt-4.1", [{"role": "user", "content": "b"}])
+
+        # Assert
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, changed)
+
+    def test_get_set_roundtrip(self):
+        # Arrange
+        cache = DiskCache(self.tmp_dir.name, max_bytes=1024 * 1024)
+        key = content_hash("note")
+
+        # Act
+        cache.set(key, "S: headache")
+
+        # Assert
+        self.assertEqual(cache.get(key), "S: headache")
+        self.assertIsNone(cache.get(content_hash("missing")))
+
+    def test_size_based_eviction_keeps_recent_entries(self):
+        # Arrange
+        cache = DiskCache(self.tmp_dir.name, max_bytes=250)
+        keys = [content_hash(i) for i in range(4)]
+
+        # Act
+        for i, key in enumerate(keys):
+            cache.set(key, "x" * 100)
+            # Make modification times strictly increasing
+            os.utime(cache._path(key), (i, i))
+
+        # Assert
+        self.assertIsNone(cache.get(keys[0]))
+        self.assertEqual(cache.get(keys[-1]), "x" * 100)
+        self.assertLessEqual(cache.size, 250)
+
+    def test_size_is_restored_from_disk(self):
+        # Arrange
+        cache = DiskCache(self.tmp_dir.name, max_bytes=1024)
+        cache.set(content_hash("a"), "value")
+
+        # Act
+        reopened = DiskCache(self.tmp_dir.name, max_bytes=1024)
+
+        # Assert
+        self.assertEqual(reopened.size, cache.size)
+
+    def test_shared_cache_is_opened_once_per_directory(self):
+        # Arrange
+        other = os.path.join(self.tmp_dir.name, "other")
+
+        # Act
+        first = shared_cache(self.tmp_dir.name, 1024)
+        second = shared_cache(self.tmp_dir.name, 1024)
+
+        # Assert: opening a cache does not walk it
+        self.assertIs(first, second)
+        self.assertIsNot(shared_cache(other, 1024), first)
+        self.assertIsNone(first._size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import asyncio
+import unittest
+
+from src.core.executor import JudgeJob, run_judge_jobs
+from src.core.instrumentation import metered_call
+
+
+class FakeMetric:
+    """Scores a test case by its length; fails once for each case in `failing`."""
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.calls = []
+        self.in_flight = 0
+        self.peak = 0
+        self.score = None
+        self.reason = None
+
+    async def a_measure(self, test_case, *args, **kwargs):
+        self.calls.append(test_case)
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(0.01)
+        self.in_flight -= 1
+        if test_case in self.failing:
+            self.failing.discard(test_case)
+            raise TimeoutError("judge timed out")
+        self.score = len(test_case) / 10
+        self.reason = f"{test_case} is fine."
+
+    def __copy__(self):
+        # Jobs share the call log, so the test sees every job's calls
+        return self
+
+
+class MeteredMetric(FakeMetric):
+    """A FakeMetric whose measurement is one metered judge call."""
+
+    async def a_measure(self, test_case, *args, **kwargs):
+        with metered_call("judge"):
+            await super().a_measure(test_case, *args, **kwargs)
+
+
+class TestExecutor(unittest.TestCase):
+
+    def test_jobs_are_matched_by_test_case_id(self):
+        # Arrange
+        metrics = [FakeMetric(), FakeMetric()]
+        test_cases = {"a": "x", "b": "xxx"}
+        jobs = [JudgeJob("b", 1), JudgeJob("a", 0), JudgeJob("b", 0)]
+
+        # Act
+        outcomes = run_judge_jobs(jobs, test_cases, metrics)
+
+        # Assert
+        self.assertEqual(outcomes[JudgeJob("a", 0)].score, 0.1)
+        self.assertEqual(outcomes[JudgeJob("b", 1)].score, 0.3)
+        self.assertEqual(outcomes[JudgeJob("b", 1)].reason, "xxx is fine.")
+
+    def test_concurrency_is_limited_per_metric(self):
+        # Arrange
+        metric = FakeMetric()
+        test_cases = {str(i): "x" for i in range(10)}
+        jobs = [JudgeJob(case_id, 0) for case_id in test_cases]
+
+        # Act
+        run_judge_jobs(jobs, test_cases, [metric], max_concurrency=3)
+
+        # Assert
+        self.assertEqual(metric.peak, 3)
+
+    def test_waiting_for_a_slot_counts_as_queue_wait(self):
+        # Arrange
+        test_cases = {str(i): "x" for i in range(3)}
+        jobs = [JudgeJob(case_id, 0) for case_id in test_cases]
+
+        # Act
+        outcomes = run_judge_jobs(
+            jobs, test_cases, [MeteredMetric()], max_concurrency=1
+        )
+
+        # Assert: the last job waited for both others
+        (first,) = outcomes[JudgeJob("0", 0)].calls
+        (last,) = outcomes[JudgeJob("2", 0)].calls
+        self.assertLess(first.queue_wait, 0.01)
+        self.assertGreaterEqual(last.queue_wait, 0.02)
+        self.assertGreaterEqual(last.wall_time, last.queue_wait)
+
+    def test_failures_are_isolated_and_only_failed_jobs_retried(self):
+        # Arrange
+        metric = FakeMetric(failing={"b"})
+        test_cases = {"a": "a", "b": "b"}
+        jobs = [JudgeJob("a", 0), JudgeJob("b", 0)]
+
+        # Act
+        outcomes = run_judge_jobs(jobs, test_cases, [metric], retries=1)
+
+        # Assert: the retry pass only runs the failed job
+        self.assertEqual(metric.calls, ["a", "b", "b"])
+        self.assertIsNone(outcomes[JudgeJob("b", 0)].error)
+
+    def test_errors_are_reported_after_the_last_pass(self):
+        # Arrange
+        metric = FakeMetric(failing={"b"})
+        jobs = [JudgeJob("a", 0), JudgeJob("b", 0)]
+
+        # Act
+        outcomes = run_judge_jobs(jobs, {"a": "a", "b": "b"}, [metric], retries=0)
+
+        # Assert
+        self.assertEqual(outcomes[JudgeJob("a", 0)].score, 0.1)
+        self.assertEqual(
+            outcomes[JudgeJob("b", 0)].error, "TimeoutError: judge timed out"
+        )
+        self.assertIsNone(outcomes[JudgeJob("b", 0)].score)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+import asyncio
+import unittest
+from types import SimpleNamespace
+from unittest.mock import MagicMock, patch
+
+import openai
+
+from src.core.instrumentation import (
+    estimate_cost,
+    record_calls,
+    record_usage,
+    summarize_calls,
+)
+from src.core.llm import LLMCallError, ResilientCaller
+from src.core.rate_limit import RateLimiter
+from src.schemas.models import LLMCallStats
+
+
+def response(prompt_tokens, completion_tokens):
+    return SimpleNamespace(
+        usage=SimpleNamespace(
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens
+        )
+    )
+
+
+@patch("src.core.llm.settings.LLM_BACKOFF_BASE", 0.0)
+class TestInstrumentation(unittest.TestCase):
+
+    def test_estimate_cost(self):
+        # Act & Assert: dated snapshots use the price of the longest matching model
+        self.assertAlmostEqual(estimate_cost("gpt-4.1", 1_000_000, 0), 2.0)
+        self.assertAlmostEqual(
+            estimate_cost("gpt-4.1-mini-2025-04-14", 1_000_000, 1_000_000), 2.0
+        )
+        self.assertIsNone(estimate_cost("local-model", 10, 10))
+        self.assertIsNone(estimate_cost(None, 10, 10))
+
+    def test_calls_are_metered_across_retries(self):
+        # Arrange
+        caller = ResilientCaller("judge", max_retries=2, hedge=False)
+        outcomes = [openai.APIConnectionError(request=MagicMock()), "ok"]
+
+        async def fn():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            record_usage(response(100, 20), "gpt-4.1")
+            return outcome
+
+        async def run():
+            limiter = RateLimiter(1, requests_per_minute=6000, tokens_per_minute=10**6)
+            with record_calls("Hallucination") as calls:
+                await caller.call(fn, limiter=limiter)
+            return calls
+
+        # Act
+        calls = asyncio.run(run())
+
+        # Assert
+        self.assertEqual(len(calls), 1)
+        stats = calls[0]
+        self.assertEqual((stats.stage, stats.metric), ("judge", "Hallucination"))
+        self.assertEqual((stats.prompt_tokens, stats.completion_tokens), (100, 20))
+        self.assertEqual(stats.retries, 1)
+        self.assertAlmostEqual(stats.cost, (100 * 2.0 + 20 * 8.0) / 1e6)
+        self.assertGreaterEqual(stats.wall_time, stats.queue_wait)
+
+    def test_failed_calls_are_recorded_and_unlogged_calls_are_not(self):
+        # Arrange
+        caller = ResilientCaller("generation", max_retries=1, hedge=False)
+        fn = MagicMock(side_effect=openai.APIConnectionError(request=MagicMock()))
+
+        # Act
+        with record_calls() as calls:
+            with self.assertRaises(LLMCallError):
+                caller.call_sync(fn)
+        caller.call_sync(lambda: "outside")
+
+        # Assert
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(calls[0].retries, 1)
+        self.assertIsNone(calls[0].cost)
+
+    def test_summarize_calls(self):
+        # Arrange
+        calls = [
+            LLMCallStats(
+                stage="judge",
+                metric="Hallucination",
+                wall_time=float(i),
+                prompt_tokens=10,
+                cost=0.5,
+            )
+            for i in range(1, 101)
+        ] + [LLMCallStats(stage="generation", wall_time=2.0)]
+
+        # Act
+        summary = summarize_calls(calls)
+
+        # Assert
+        self.assertEqual(set(summary), {"judge", "judge/Hallucination", "generation"})
+        judge = summary["judge/Hallucination"]
+        self.assertEqual(judge["calls"], 100)
+        self.assertAlmostEqual(judge["wall_time_p50"], 50.5)
+        self.assertAlmostEqual(judge["wall_time_p99"], 99.01)
+        self.assertEqual(judge["prompt_tokens"], 1000)
+        self.assertAlmostEqual(judge["cost"], 50.0)
+        self.assertIsNone(summary["generation"]["cost"])
+
+
+if __name__ == "__main__":
+    unittest.main()
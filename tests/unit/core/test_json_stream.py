@@ -0,0 +1,76 @@
+import io
+import json
+import unittest
+
+from src.core.json_stream import iter_json_array
+
+
+class TestJsonStream(unittest.TestCase):
+
+    def setUp(self):
+        self.records = [
+            {
+                "person_data": {"results": [{"name": "Ivan", "tags": ["]", "}"]}]},
+                "patient_convo": 'Patient: "It hurts."\nPhysician: Where?',
+                "soap_notes": "S: Ear pain \\ left side",
+                "score": -1.5e3,
+            },
+            {"patient_convo": "t2", "soap_notes": "s2", "extra": None},
+            {},
+        ]
+        self.text = json.dumps(self.records, indent=2)
+
+    def test_matches_json_load_for_any_chunk_size(self):
+        for chunk_size in (1, 7, 64, 4096):
+            with self.subTest(chunk_size=chunk_size):
+                # Act
+                result = list(
+                    iter_json_array(io.StringIO(self.text), chunk_size=chunk_size)
+                )
+
+                # Assert
+                self.assertEqual(result, self.records)
+
+    def test_projects_requested_fields(self):
+        # Act
+        result = list(
+            iter_json_array(
+                io.StringIO(self.text),
+                fields=["patient_convo", "soap_notes"],
+                chunk_size=16,
+            )
+        )
+
+        # Assert
+        self.assertEqual(
+            result,
+            [
+                {k: r[k] for k in ("patient_convo", "soap_notes") if k in r}
+                for r in self.records
+            ],
+        )
+
+    def test_is_lazy(self):
+        # Arrange
+        stream = io.StringIO(self.text + " " * 100_000)
+        records = iter_json_array(stream, chunk_size=128)
+
+        # Act
+        next(records)
+
+        # Assert
+        self.assertLess(stream.tell(), len(self.text))
+
+    def test_truncated_input_raises(self):
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO(self.text[:-10])))
+
+    def test_rejects_non_array(self):
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            list(iter_json_array(io.StringIO('{"a": 1}')))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,18 @@
+import unittest
+
+from src.core.judge_model import JudgeLLM
+
+
+class TestJudgeModel(unittest.TestCase):
+
+    def test_judges_share_one_pair_of_clients(self):
+        # Act
+        judges = [JudgeLLM(), JudgeLLM("gpt-4.1-mini", temperature=0.7, seed=1)]
+
+        # Assert
+        self.assertIs(judges[0].model, judges[1].model)
+        self.assertIs(judges[0].async_client, judges[1].async_client)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+import asyncio
+import unittest
+from unittest.mock import MagicMock, patch
+
+import openai
+
+from src.core.llm import (
+    CircuitBreaker,
+    CircuitOpenError,
+    LLMCallError,
+    ResilientCaller,
+)
+
+
+def connection_error():
+    return openai.APIConnectionError(request=MagicMock())
+
+
+@patch("src.core.llm.settings.LLM_BACKOFF_BASE", 0.0)
+class TestResilientCaller(unittest.TestCase):
+
+    def test_retries_transient_errors(self):
+        # Arrange
+        caller = ResilientCaller("test", max_retries=2, hedge=False)
+        outcomes = [connection_error(), "ok"]
+
+        async def fn():
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        # Act
+        result = asyncio.run(caller.call(fn))
+
+        # Assert
+        self.assertEqual(result, "ok")
+        self.assertEqual(caller.breaker.failures, 0)
+
+    def test_gives_up_with_llm_call_error(self):
+        # Arrange
+        caller = ResilientCaller("test", max_retries=1, hedge=False)
+        fn = MagicMock(side_effect=connection_error())
+
+        # Act & Assert
+        with self.assertRaises(LLMCallError):
+            caller.call_sync(fn)
+        self.assertEqual(fn.call_count, 2)
+
+    def test_does_not_retry_client_errors(self):
+        # Arrange
+        caller = ResilientCaller("test", max_retries=3, hedge=False)
+        fn = MagicMock(
+            side_effect=openai.BadRequestError("400", response=MagicMock(), body=None)
+        )
+
+        # Act & Assert
+        with self.assertRaises(LLMCallError):
+            caller.call_sync(fn)
+        self.assertEqual(fn.call_count, 1)
+
+    def test_times_out_slow_calls(self):
+        # Arrange
+        caller = ResilientCaller("test", max_retries=0, timeout=0.01, hedge=False)
+
+        async def slow():
+            await asyncio.sleep(1)
+
+        # Act & Assert
+        with self.assertRaises(LLMCallError):
+            asyncio.run(caller.call(slow))
+
+    def test_hedges_calls_slower_than_p95(self):
+        # Arrange: the first attempt hangs, the hedged one returns at once
+        caller = ResilientCaller("test", max_retries=0, timeout=5, hedge=True)
+        for _ in range(caller.latency.min_samples):
+            caller.latency.record(0.01)
+        calls = []
+
+        async def fn():
+            calls.append(None)
+            if len(calls) == 1:
+                await asyncio.sleep(5)
+            return len(calls)
+
+        # Act
+        result = asyncio.run(asyncio.wait_for(caller.call(fn), timeout=1))
+
+        # Assert
+        self.assertEqual(result, 2)
+
+    def test_circuit_breaker_fails_fast_once_open(self):
+        # Arrange
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        caller = ResilientCaller("test", max_retries=1, hedge=False, breaker=breaker)
+        fn = MagicMock(side_effect=connection_error())
+        with self.assertRaises(LLMCallError):
+            caller.call_sync(fn)
+
+        # Act & Assert: the endpoint is not called while the circuit is open
+        with self.assertRaises(CircuitOpenError):
+            caller.call_sync(fn)
+        self.assertEqual(fn.call_count, 2)
+
+    def test_circuit_breaker_lets_trial_call_through_after_reset(self):
+        # Arrange
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        # Act
+        breaker.before_call()
+        breaker.record_success()
+
+        # Assert
+        self.assertIsNone(breaker.opened_at)
+        self.assertEqual(breaker.failures, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import asyncio
+import unittest
+
+from src.core.rate_limit import (
+    AdaptiveConcurrencyLimiter,
+    RateLimiter,
+    TokenBucket,
+    estimate_tokens,
+)
+
+
+class TestRateLimit(unittest.TestCase):
+
+    def test_estimate_tokens(self):
+        # Arrange
+        messages = [{"role": "user", "content": "x" * 400}]
+
+        # Act & Assert
+        self.assertEqual(estimate_tokens(messages), 101)
+
+    def test_token_bucket_caps_oversized_requests(self):
+        # Arrange
+        bucket = TokenBucket(rate_per_minute=60)
+
+        # Act: a request larger than capacity must not block forever
+        asyncio.run(asyncio.wait_for(bucket.acquire(1000), timeout=1))
+
+        # Assert
+        self.assertLess(bucket.tokens, 1)
+
+    def test_concurrency_limiter_aimd(self):
+        # Arrange
+        limiter = AdaptiveConcurrencyLimiter(max_concurrency=8, initial_concurrency=4)
+
+        # Act
+        limiter.on_rate_limited(retry_after=0)
+        after_decrease = limiter.limit
+        for _ in range(100):
+            limiter.on_success()
+
+        # Assert
+        self.assertEqual(after_decrease, 2)
+        self.assertEqual(limiter.limit, 8)
+
+    def test_rate_limiter_bounds_in_flight_calls(self):
+        # Arrange
+        limiter = RateLimiter(
+            max_concurrency=2, requests_per_minute=10_000, tokens_per_minute=10_000
+        )
+        limiter.concurrency.limit = 2
+        peak = 0
+
+        async def call():
+            nonlocal peak
+            async with limiter.slot(tokens=1):
+                peak = max(peak, limiter.concurrency.in_flight)
+                await asyncio.sleep(0.01)
+
+        async def run():
+            await asyncio.gather(*(call() for _ in range(6)))
+
+        # Act
+        asyncio.run(run())
+
+        # Assert
+        self.assertEqual(peak, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+from unittest.mock import patch
+
+from src.core.tokens import count_message_tokens, count_tokens, split_by_tokens
+
+
+@patch("src.core.tokens._encoding", return_value=None)
+class TestTokens(unittest.TestCase):
+
+    def test_count_tokens_falls_back_to_estimate(self, _):
+        # Act & Assert
+        self.assertEqual(count_tokens("x" * 400, "gpt-4.1"), 101)
+
+    def test_count_message_tokens_adds_per_message_overhead(self, _):
+        # Arrange
+        messages = [
+            {"role": "system", "content": "x" * 40},
+            {"role": "user", "content": "x" * 40},
+        ]
+
+        # Act & Assert
+        self.assertEqual(count_message_tokens(messages, "gpt-4.1"), 2 * (11 + 4))
+
+    def test_split_by_tokens_keeps_lines_whole(self, _):
+        # Arrange: every line is 11 tokens
+        lines = [f"Patient: {i:02d}" + "x" * 28 + "\n" for i in range(6)]
+
+        # Act
+        chunks = split_by_tokens("".join(lines), max_tokens=25, model="gpt-4.1")
+
+        # Assert
+        self.assertEqual(chunks, ["".join(lines[i : i + 2]) for i in range(0, 6, 2)])
+
+    def test_split_by_tokens_cuts_oversized_lines(self, _):
+        # Arrange
+        text = "short\n" + "x" * 200 + "\nshort"
+
+        # Act
+        chunks = split_by_tokens(text, max_tokens=11, model="gpt-4.1")
+
+        # Assert
+        self.assertEqual("".join(chunks), text)
+        self.assertTrue(all(count_tokens(c, "gpt-4.1") <= 11 for c in chunks))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,43 @@
+import unittest
+from unittest.mock import patch
+
+from src.core.tokens import count_message_tokens
+from src.prompts.map_reduce import get_chunk_messages, get_merge_messages
+from src.prompts.versions import fits_token_budget, get_prompt_messages
+
+
+@patch("src.core.tokens._encoding", return_value=None)
+class TestPromptVersions(unittest.TestCase):
+
+    def test_prompt_tokens_match_rendered_prompt(self, _):
+        # Arrange
+        transcript = "Patient: my head hurts. " * 100
+        messages = get_prompt_messages("v1", transcript)
+        rendered = count_message_tokens(messages, "gpt-4.1")
+
+        # Act & Assert: the budget check agrees with the rendered prompt, up to rounding
+        transcript_tokens = len(transcript) // 4
+        self.assertTrue(
+            fits_token_budget("v1", transcript_tokens, "gpt-4.1", budget=rendered + 2)
+        )
+        self.assertFalse(
+            fits_token_budget("v1", transcript_tokens, "gpt-4.1", budget=rendered - 2)
+        )
+
+    def test_map_reduce_messages_keep_the_version_system_prompt(self, _):
+        # Arrange
+        system = get_prompt_messages("v2", "")[0]
+
+        # Act
+        chunk_messages = get_chunk_messages("v2", "Patient: dizzy.", 2, 3)
+        merge_messages = get_merge_messages("v2", ["S: dizzy", "P: rest"])
+
+        # Assert
+        self.assertEqual(chunk_messages[0], system)
+        self.assertIn("part 2 of 3", chunk_messages[-1]["content"])
+        self.assertEqual(merge_messages[0], system)
+        self.assertIn("Partial note 2:\nP: rest", merge_messages[-1]["content"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,7 +1,10 @@
+import json
 import unittest
 import sys
 import os
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
+
+from deepeval.test_case import LLMTestCase
 
 sys.path.insert(
     0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../src"))
@@ -11,6 +14,7 @@ from src.schemas.metrics import (
     SOAPStructureMetric,
     ClinicalSafetyMetric,
     MedicalTerminologyMetric,
+    MultiCriteriaJudgeMetric,
 )
 
 
@@ -48,6 +52,52 @@ class TestMetrics(unittest.TestCase):
         self.assertIn("Evaluate the use of medical terminology", metric.criteria)
         self.assertEqual(metric.threshold, 0.8)
 
+    @patch("openai.OpenAI")
+    def test_multi_criteria_judge_scores_every_metric_in_one_call(self, mock_openai):
+        # Arrange
+        model = MagicMock()
+        model.get_model_name.return_value = "judge"
+        model.complete.return_value = json.dumps(
+            {
+                "SOAP Structure Compliance": {"score": 9, "reason": "Well formed."},
+                "Medical Terminology Accuracy": {"score": 7, "reason": "Vague."},
+            }
+        )
+        metric = MultiCriteriaJudgeMetric(
+            [SOAPStructureMetric(), MedicalTerminologyMetric()], model=model
+        )
+        test_case = LLMTestCase(input="t", actual_output="note", context=["gt"])
+
+        # Act
+        score = metric.measure(test_case)
+
+        # Assert: terminology misses its own 0.8 threshold
+        model.complete.assert_called_once()
+        self.assertAlmostEqual(score, 0.8)
+        self.assertFalse(metric.is_successful())
+        self.assertEqual(
+            MultiCriteriaJudgeMetric.breakdown(metric.reason),
+            {
+                "SOAP Structure Compliance [GEval]": 0.9,
+                "Medical Terminology Accuracy [GEval]": 0.7,
+            },
+        )
+
+    @patch("openai.OpenAI")
+    def test_multi_criteria_judge_rejects_missing_criteria(self, mock_openai):
+        # Arrange
+        model = MagicMock()
+        model.complete.return_value = json.dumps(
+            {"SOAP Structure Compliance": {"score": 9, "reason": "Well formed."}}
+        )
+        metric = MultiCriteriaJudgeMetric(
+            [SOAPStructureMetric(), MedicalTerminologyMetric()], model=model
+        )
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            metric.measure(LLMTestCase(input="t", actual_output="note", context=["gt"]))
+
 
 if __name__ == "__main__":
     unittest.main()
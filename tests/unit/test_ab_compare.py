@@ -0,0 +1,127 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from src.ab_compare import decide, paired_interval, run_ab_test
+from src.schemas.models import EvaluationResult
+
+
+def fake_evaluation(notes, hyperparameters=None, **kwargs):
+    # v2 notes score 0.1 higher than v1 notes, give or take per-record noise
+    lift = 0.1 if hyperparameters["prompt_version"] == "v2" else 0.0
+    results = []
+    for note in notes:
+        score = 0.6 + lift + (int(note.note_id) % 3) * 0.01
+        results.append(
+            EvaluationResult(
+                note=note,
+                hallucination_score=score,
+                clinical_accuracy_score=score,
+                soap_structure_score=score,
+                clinical_safety_score=score,
+                medical_terminology_score=score,
+                overall_score=score,
+            )
+        )
+    return results
+
+
+class TestABTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        dataset_path = os.path.join(self.tmp_dir.name, "test.json")
+        with open(dataset_path, "w") as f:
+            json.dump(
+                [{"patient_convo": f"t{i}", "soap_notes": f"s{i}"} for i in range(60)],
+                f,
+            )
+        patcher = patch("src.data_loader.DATASET_PATH", dataset_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.root = os.path.join(self.tmp_dir.name, "ab_tests")
+
+    def test_paired_interval(self):
+        # Act
+        mean, low, high = paired_interval([0.1, 0.2, 0.3], z=1.96)
+
+        # Assert
+        self.assertAlmostEqual(mean, 0.2)
+        self.assertAlmostEqual(high - mean, 1.96 * 0.1 / 3**0.5)
+        self.assertEqual(paired_interval([0.1], z=1.96)[1], float("-inf"))
+
+    def test_decide(self):
+        # Act & Assert
+        self.assertEqual(decide(0.01, 0.2, margin=0.02), "candidate")
+        self.assertEqual(decide(-0.2, -0.01, margin=0.02), "baseline")
+        self.assertEqual(decide(-0.01, 0.01, margin=0.02), "equivalent")
+        self.assertIsNone(decide(-0.1, 0.1, margin=0.02))
+
+    @patch("src.ab_compare.run_evaluation", side_effect=fake_evaluation)
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_clear_difference_stops_early(self, mock_agenerate_note, mock_evaluation):
+        # Arrange
+        mock_agenerate_note.return_value = "note"
+
+        # Act
+        report = run_ab_test("v1", "v2", batch_size=5, use_cache=False, root=self.root)
+
+        # Assert: decided at the first look, long before the 60 pairs
+        self.assertEqual(report["decision"], "candidate")
+        self.assertEqual(report["pairs"], 5)
+        self.assertEqual(mock_agenerate_note.call_count, 10)
+        self.assertAlmostEqual(report["metrics"]["overall_score"]["mean"], 0.1)
+        with open(os.path.join(self.root, f"{report['test_id']}.json")) as f:
+            self.assertEqual(json.load(f)["decision"], "candidate")
+
+    @patch("src.ab_compare.run_evaluation", side_effect=fake_evaluation)
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_lower_is_better_scores_favor_the_lower_version(
+        self, mock_agenerate_note, mock_evaluation
+    ):
+        # Arrange
+        mock_agenerate_note.return_value = "note"
+
+        # Act
+        report = run_ab_test(
+            "v1",
+            "v2",
+            batch_size=5,
+            metric="hallucination_score",
+            use_cache=False,
+            root=self.root,
+        )
+
+        # Assert: v2 hallucinates more, so the baseline wins
+        self.assertEqual(report["decision"], "baseline")
+        self.assertAlmostEqual(report["metrics"]["hallucination_score"]["mean"], -0.1)
+
+    @patch("src.ab_compare.run_evaluation", side_effect=fake_evaluation)
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_identical_versions_are_undecided_within_a_small_budget(
+        self, mock_agenerate_note, mock_evaluation
+    ):
+        # Arrange
+        mock_agenerate_note.return_value = "note"
+
+        # Act
+        report = run_ab_test(
+            "v2", "v2", budget=1, batch_size=5, use_cache=False, root=self.root
+        )
+
+        # Assert: one pair cannot bound the variance
+        self.assertIsNone(report["decision"])
+        self.assertEqual(report["pairs"], 1)
+        self.assertEqual(len(report["looks"]), 1)
+
+    def test_unknown_versions_are_rejected(self):
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            run_ab_test("v1", "v99", root=self.root)
+
+
+if __name__ == "__main__":
+    unittest.main()
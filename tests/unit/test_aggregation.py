@@ -0,0 +1,105 @@
+import time
+import unittest
+
+import numpy as np
+
+from src.aggregation import (
+    SCORE_FIELDS,
+    bootstrap_intervals,
+    overall_score,
+    overall_scores,
+    summarize,
+)
+from tests.unit.test_checkpoint import make_note, make_result
+
+
+class TestAggregation(unittest.TestCase):
+
+    def test_overall_scores_apply_weights_and_polarity(self):
+        # Arrange
+        matrix = np.array([[0.2, 0.8], [0.0, 0.5]])
+        fields = ["hallucination_score", "clinical_accuracy_score"]
+
+        # Act
+        scores = overall_scores(
+            matrix,
+            fields,
+            weights={"hallucination_score": 1.0, "clinical_accuracy_score": 3.0},
+            lower_is_better=["hallucination_score"],
+        )
+
+        # Assert: hallucination counts as 1 - score
+        np.testing.assert_allclose(scores, [(0.8 + 3 * 0.8) / 4, (1.0 + 3 * 0.5) / 4])
+
+    def test_overall_score_needs_a_positive_weight(self):
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            overall_scores(np.ones((1, 1)), ["soap_structure_score"], weights={})
+        self.assertEqual(overall_score({"soap_structure_score": 0.5}), 0.5)
+
+    def test_bootstrap_intervals_cover_the_mean(self):
+        # Arrange
+        rng = np.random.default_rng(1)
+        matrix = np.column_stack(
+            [rng.integers(0, 2, 500).astype(float), np.full(500, 0.7)]
+        )
+
+        # Act
+        intervals = bootstrap_intervals(matrix, resamples=1000, confidence=0.95)
+
+        # Assert: roughly ±1.96 standard errors, none for a constant column
+        low, high = intervals[0]
+        self.assertLess(low, matrix[:, 0].mean())
+        self.assertGreater(high, matrix[:, 0].mean())
+        self.assertAlmostEqual(high - low, 2 * 1.96 * 0.5 / np.sqrt(500), delta=0.015)
+        np.testing.assert_allclose(intervals[1], [0.7, 0.7])
+
+    def test_bootstrap_intervals_are_fast_for_large_runs(self):
+        # Arrange
+        rng = np.random.default_rng(0)
+        matrix = rng.random((100_000, len(SCORE_FIELDS) + 1))
+
+        # Act
+        start = time.perf_counter()
+        bootstrap_intervals(matrix, resamples=2000)
+
+        # Assert
+        self.assertLess(time.perf_counter() - start, 1.0)
+
+    def test_summarize(self):
+        # Arrange
+        results = [
+            make_result(make_note(str(i))).model_copy(update={"overall_score": score})
+            for i, score in enumerate([0.0, 1.0, 1.0, 1.0])
+        ]
+
+        # Act
+        summary = summarize(results)
+
+        # Assert
+        self.assertEqual(summary["count"], 4)
+        self.assertAlmostEqual(summary["overall_score"], 0.75)
+        self.assertLessEqual(summary["overall_score_ci_low"], 0.75)
+        self.assertGreaterEqual(summary["overall_score_ci_high"], 0.75)
+        self.assertEqual(summarize([]), {"count": 0})
+
+    def test_summarize_averages_reference_metrics_where_present(self):
+        # Arrange
+        results = [
+            make_result(make_note(str(i))).model_copy(
+                update={"token_f1_score": score, "entity_overlap_score": None}
+            )
+            for i, score in enumerate([0.2, None, 0.4])
+        ]
+
+        # Act
+        summary = summarize(results)
+
+        # Assert
+        self.assertAlmostEqual(summary["token_f1_score"], 0.3)
+        self.assertLessEqual(summary["token_f1_score_ci_low"], 0.3)
+        self.assertNotIn("entity_overlap_score", summary)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,119 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import pyarrow.dataset as ds
+
+from src.analytics_export import (
+    export_runs,
+    exported_run_ids,
+    partition_path,
+    scan_scores,
+    scan_texts,
+)
+from src.run_store import RunStore
+from src.schemas.models import LLMCallStats
+from tests.unit.test_run_store import scored_result
+
+
+class TestAnalyticsExport(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.store = RunStore(os.path.join(self.root, "runs.db"))
+        self.output = os.path.join(self.root, "analytics")
+        judge_calls = [
+            LLMCallStats(stage="judge", wall_time=1.5, prompt_tokens=100, cost=0.01),
+            LLMCallStats(stage="judge", wall_time=0.5, completion_tokens=20, retries=2),
+        ]
+        for run_id, count in (("run/1", 3), ("run-2", 2)):
+            self.store.create_run(run_id, {})
+            self.store.append_results(
+                run_id,
+                [
+                    scored_result(str(i), i / 10).model_copy(
+                        update={"judge_calls": judge_calls}
+                    )
+                    for i in range(count)
+                ],
+            )
+
+    def test_runs_are_exported_once_per_partition(self):
+        # Act
+        exported = export_runs(self.store, self.output)
+        again = export_runs(self.store, self.output)
+
+        # Assert
+        self.assertEqual(sorted(exported), ["run-2", "run/1"])
+        self.assertEqual(again, [])
+        self.assertEqual(exported_run_ids(self.output), ["run-2", "run/1"])
+        self.assertTrue(
+            os.path.exists(
+                os.path.join(
+                    partition_path(self.output, "scores", "run/1"), "part-0.parquet"
+                )
+            )
+        )
+
+    def test_scores_are_scanned_without_the_texts(self):
+        # Arrange
+        export_runs(self.store, self.output)
+
+        # Act
+        table = scan_scores(
+            columns=["run_id", "note_id", "clinical_safety_score", "judge_cost"],
+            filter=(ds.field("run_id") == "run/1")
+            & (ds.field("clinical_safety_score") >= 0.1),
+            root=self.output,
+        )
+
+        # Assert
+        full = scan_scores(root=self.output)
+        self.assertNotIn("transcript", full.column_names)
+        self.assertEqual(
+            table.sort_by("note_id").to_pylist(),
+            [
+                {
+                    "run_id": "run/1",
+                    "note_id": note_id,
+                    "clinical_safety_score": score,
+                    "judge_cost": None,
+                }
+                for note_id, score in (("1", 0.1), ("2", 0.2))
+            ],
+        )
+        row = full.to_pylist()[0]
+        self.assertEqual((row["judge_calls"], row["judge_wall_time"]), (2, 2.0))
+        self.assertEqual((row["judge_prompt_tokens"], row["judge_retries"]), (100, 2))
+        self.assertIsNone(row["rouge_l_score"])
+        self.assertFalse(row["generation_failed"])
+
+    def test_texts_are_exported_separately(self):
+        # Arrange
+        export_runs(self.store, self.output, ["run-2"])
+
+        # Act
+        texts = scan_texts(filter=ds.field("note_id") == "1", root=self.output)
+
+        # Assert
+        (row,) = texts.to_pylist()
+        self.assertEqual(
+            row["generated_note"], scored_result("1", 0).note.generated_note
+        )
+        self.assertEqual(row["transcript"], scored_result("1", 0).note.transcript)
+
+    def test_scanning_an_empty_export(self):
+        # Act
+        table = scan_scores(columns=["run_id", "overall_score"], root=self.output)
+
+        # Assert
+        self.assertEqual(
+            (table.num_rows, table.column_names), (0, ["run_id", "overall_score"])
+        )
+        self.assertEqual(exported_run_ids(self.output), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,53 +1,47 @@
 import unittest
-from unittest.mock import patch, mock_open
+from unittest.mock import patch
+
 import pandas as pd
 
 from src import dashboard
+from src.core.blobs import BlobStore
+from src.run_store import RunStore
+from tests.unit.test_checkpoint import make_note, make_result
 
 
 class TestApp(unittest.TestCase):
 
-    @patch("src.dashboard.open", new_callable=mock_open)
-    def test_load_results_file_not_found(self, mocked_file):
-        # Arrange
-        mocked_file.side_effect = FileNotFoundError
-
+    def test_load_results_without_runs(self):
         # Act
         # We test the wrapped function to bypass the @st.cache_data decorator
-        result = dashboard.load_results.__wrapped__()
+        result = dashboard.load_results.__wrapped__(None)
 
         # Assert
         self.assertIsNone(result)
 
-    @patch("src.dashboard.open")
-    @patch("src.dashboard.json.load")
-    def test_load_results_success(self, mock_json_load, mock_open):
+    def test_load_results_success(self):
         # Arrange
-        mock_data = [
-            {
-                "overall_score": 0.8,
-                "clinical_safety_score": 0.9,
-                "soap_structure_score": 1,
-                "clinical_accuracy_score": 0.85,
-                "medical_terminology_score": 0.95,
-                "hallucination_score": 0.1,
-                "missing_info_score": 0.05,
-                "note": {
-                    "transcript": "a",
-                    "ground_truth_note": "b",
-                    "generated_note": "c",
-                },
-            }
-        ]
-        mock_json_load.return_value = mock_data
+        store = RunStore()
+        store.create_run("run-1", {"prompt_version": "v2"})
+        store.append_results("run-1", [make_result(make_note("0"))])
 
         # Act
-        df = dashboard.load_results.__wrapped__()
-
-        # Assert
+        with patch.object(
+            BlobStore, "get_many", autospec=True, side_effect=BlobStore.get_many
+        ) as get_many:
+            df = dashboard.load_results.__wrapped__("run-1")
+            reads_for_scores = get_many.call_count
+            texts = store.note_texts(df.iloc[0])
+
+        # Assert: the table holds the scores, only an opened note's texts are read
         self.assertIsInstance(df, pd.DataFrame)
         self.assertEqual(len(df), 1)
-        self.assertEqual(df.iloc[0]["overall_score"], 0.8)
+        self.assertEqual(df.iloc[0]["overall_score"], 0.69)
+        self.assertNotIn("generated_note", df.iloc[0]["note"])
+        self.assertEqual(reads_for_scores, 0)
+        get_many.assert_called_once()
+        self.assertEqual(len(list(get_many.call_args.args[1])), 3)
+        self.assertEqual(texts["generated_note"], "generated 0")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,279 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+from src.batch import (
+    LocalBatchBackend,
+    OpenAIBatchBackend,
+    ingest_judge_results,
+    render_generation_requests,
+    render_judge_requests,
+    run_batch_evaluation_stage,
+    run_batch_generation_stage,
+    stand_in_responder,
+)
+from src.checkpoint import RunCheckpoint
+from src.data_loader import note_cache, note_cache_key
+from src.evaluation import METRIC_FIELDS
+from src.prompts.versions import get_prompt_messages
+from src.schemas.models import ClinicalNote
+
+
+def judge_responder(body):
+    if "verdict" in body["messages"][-1]["content"]:
+        return json.dumps({"verdict": "no", "reason": "Consistent."})
+    return json.dumps({"score": 8, "reason": "Good."})
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        dataset_path = os.path.join(self.tmp_dir.name, "test.json")
+        with open(dataset_path, "w") as f:
+            json.dump(
+                [{"patient_convo": f"t{i}", "soap_notes": f"s{i}"} for i in range(2)],
+                f,
+            )
+        patcher = patch("src.data_loader.DATASET_PATH", dataset_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.checkpoint = RunCheckpoint.create(
+            {"limit": None, "prompt_version": "v1"},
+            root=os.path.join(self.tmp_dir.name, "runs"),
+        )
+        self.batch_dir = os.path.join(self.tmp_dir.name, "batches")
+
+    def test_render_generation_requests(self):
+        # Act
+        requests = render_generation_requests(
+            [("7", {"patient_convo": "Patient feels dizzy."})], prompt_version="v1"
+        )
+
+        # Assert
+        self.assertEqual(requests[0]["custom_id"], "generate:7")
+        self.assertEqual(requests[0]["url"], "/v1/chat/completions")
+        self.assertEqual(requests[0]["body"]["temperature"], 0)
+        self.assertIn(
+            "Patient feels dizzy.", requests[0]["body"]["messages"][-1]["content"]
+        )
+
+    def test_render_judge_requests_covers_every_metric(self):
+        # Arrange
+        note = ClinicalNote(note_id="3", transcript="t", note="gt", generated_note="g")
+
+        # Act
+        requests = render_judge_requests([note])
+
+        # Assert
+        self.assertEqual(
+            sorted(r["custom_id"] for r in requests),
+            sorted(f"judge:3:{field}" for field in METRIC_FIELDS.values()),
+        )
+
+    def test_multi_criteria_judge_shares_one_request_per_note(self):
+        # Arrange
+        note = ClinicalNote(note_id="3", transcript="t", note="gt", generated_note="g")
+
+        # Act
+        with patch("src.evaluation.settings.MULTI_CRITERIA_JUDGE", True):
+            requests = render_judge_requests([note])
+        outputs = [
+            {
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {
+                        "choices": [
+                            {
+                                "message": {
+                                    "content": stand_in_responder(request["body"])
+                                }
+                            }
+                        ]
+                    },
+                },
+            }
+            for request in requests
+        ]
+        results = ingest_judge_results([note], outputs)
+
+        # Assert
+        self.assertEqual(
+            sorted(r["custom_id"] for r in requests),
+            ["judge:3:hallucination_score", "judge:3:multi_criteria"],
+        )
+        self.assertEqual(results[0].clinical_safety_score, 1.0)
+        self.assertEqual(results[0].soap_structure_score, 1.0)
+
+    def test_ingest_judge_results_skips_incomplete_notes(self):
+        # Arrange
+        notes = [
+            ClinicalNote(note_id=i, transcript="t", note="gt", generated_note="g")
+            for i in ("0", "1")
+        ]
+        outputs = [
+            {
+                "custom_id": request["custom_id"],
+                "response": {
+                    "status_code": 200,
+                    "body": {
+                        "choices": [
+                            {"message": {"content": judge_responder(request["body"])}}
+                        ]
+                    },
+                },
+            }
+            for request in render_judge_requests(notes[:1])
+        ]
+        outputs.append(
+            {"custom_id": "judge:1:hallucination_score", "error": {"message": "x"}}
+        )
+
+        # Act
+        results = ingest_judge_results(notes, outputs)
+
+        # Assert
+        self.assertEqual([r.note.note_id for r in results], ["0"])
+
+    def test_local_backend_end_to_end(self):
+        # Arrange
+        def responder(body):
+            if body.get("response_format"):
+                return judge_responder(body)
+            return "Subjective: dizzy\nObjective: -\nAssessment: -\nPlan: -"
+
+        backend = LocalBatchBackend(self.batch_dir, responder=responder)
+
+        # Act
+        missing = run_batch_generation_stage(self.checkpoint, backend)
+        results = run_batch_evaluation_stage(self.checkpoint, backend)
+
+        # Assert
+        self.assertEqual(missing, 0)
+        self.assertEqual([r.note.note_id for r in results], ["0", "1"])
+        self.assertEqual(results[0].hallucination_score, 0.0)
+        self.assertAlmostEqual(results[0].clinical_safety_score, 0.8)
+        self.assertTrue(results[0].note.generated_note.startswith("Subjective"))
+
+    def test_evaluation_reuses_cached_judgements(self):
+        # Arrange
+        def responder(body):
+            if body.get("response_format"):
+                return judge_responder(body)
+            return "Subjective: dizzy\nObjective: -\nAssessment: -\nPlan: -"
+
+        run_batch_generation_stage(
+            self.checkpoint, LocalBatchBackend(self.batch_dir, responder)
+        )
+        run_batch_evaluation_stage(
+            self.checkpoint, LocalBatchBackend(self.batch_dir, responder)
+        )
+        rerun = RunCheckpoint.create(
+            {"limit": None, "prompt_version": "v1"},
+            root=os.path.join(self.tmp_dir.name, "runs"),
+        )
+        rerun.append_notes(self.checkpoint.load_notes())
+        judge = MagicMock(side_effect=responder)
+
+        # Act
+        results = run_batch_evaluation_stage(
+            rerun, LocalBatchBackend(os.path.join(self.tmp_dir.name, "rerun"), judge)
+        )
+
+        # Assert: every judgement came from the cache, so no batch was sent
+        judge.assert_not_called()
+        self.assertEqual([r.note.note_id for r in results], ["0", "1"])
+        self.assertAlmostEqual(results[0].clinical_safety_score, 0.8)
+        self.assertEqual(results[0].score_tiers["clinical_safety_score"], "judge")
+        self.assertIsNotNone(results[0].rouge_l_score)
+
+    def test_failed_requests_are_retried_on_resume(self):
+        # Arrange
+        def flaky_responder(body):
+            if "t1" in body["messages"][-1]["content"]:
+                raise RuntimeError("request failed")
+            return "note"
+
+        # Act
+        missing = run_batch_generation_stage(
+            self.checkpoint, LocalBatchBackend(self.batch_dir, flaky_responder)
+        )
+        missing_after_resume = run_batch_generation_stage(
+            self.checkpoint, LocalBatchBackend(self.batch_dir)
+        )
+
+        # Assert
+        self.assertEqual(missing, 1)
+        self.assertEqual(missing_after_resume, 0)
+        self.assertEqual(self.checkpoint.completed_note_ids(), {"0", "1"})
+
+    @patch("src.batch.settings.GENERATION_CHUNK_TOKENS", 30)
+    @patch("src.batch.settings.GENERATION_MAX_PROMPT_TOKENS", 200)
+    @patch("src.data_loader.acomplete", new_callable=AsyncMock)
+    def test_oversized_transcripts_are_map_reduced_instead_of_batched(
+        self, mock_acomplete
+    ):
+        # Arrange
+        long_transcript = "".join(
+            f"Patient: symptom {i} " + "x" * 80 + "\n" for i in range(4)
+        )
+        with open(os.path.join(self.tmp_dir.name, "test.json"), "w") as f:
+            json.dump(
+                [
+                    {"patient_convo": "t0", "soap_notes": "s0"},
+                    {"patient_convo": long_transcript, "soap_notes": "s1"},
+                ],
+                f,
+            )
+        mock_acomplete.return_value = "Merged note."
+        batched = MagicMock(return_value="Batched note.")
+
+        # Act
+        with patch("src.core.tokens._encoding", return_value=None):
+            missing = run_batch_generation_stage(
+                self.checkpoint, LocalBatchBackend(self.batch_dir, batched)
+            )
+
+        # Assert: only the short transcript went into the batch
+        self.assertEqual(missing, 0)
+        batched.assert_called_once()
+        self.assertIn("t0", batched.call_args.args[0]["messages"][-1]["content"])
+        self.assertEqual(mock_acomplete.call_count, 5)
+        notes = {note.note_id: note for note in self.checkpoint.load_notes()}
+        self.assertEqual(notes["0"].generated_note, "Batched note.")
+        self.assertEqual(notes["1"].generated_note, "Merged note.")
+        self.assertEqual(len(notes["1"].generation_calls), 5)
+        # Chunked notes are cached under a key with the chunk size
+        messages = get_prompt_messages(version="v1", transcript=long_transcript)
+        self.assertEqual(
+            note_cache().get(note_cache_key(messages, None, 30)), "Merged note."
+        )
+        self.assertIsNone(note_cache().get(note_cache_key(messages)))
+
+    def test_openai_backend_submits_batch_file(self):
+        # Arrange
+        client = MagicMock()
+        client.files.create.return_value = MagicMock(id="file-1")
+        client.batches.create.return_value = MagicMock(id="batch-1")
+        path = os.path.join(self.tmp_dir.name, "requests.jsonl")
+        with open(path, "w") as f:
+            f.write("{}\n")
+
+        # Act
+        batch_id = OpenAIBatchBackend(client).submit(path)
+
+        # Assert
+        self.assertEqual(batch_id, "batch-1")
+        client.batches.create.assert_called_once_with(
+            input_file_id="file-1",
+            endpoint="/v1/chat/completions",
+            completion_window="24h",
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.calibration import CALIBRATION_FILE, calibrate, compare_scores
+from src.checkpoint import RunCheckpoint
+from src.tiered import metric_thresholds
+from tests.unit.test_checkpoint import make_note, make_result
+
+
+def with_accuracy(result, score):
+    return result.model_copy(update={"clinical_accuracy_score": score})
+
+
+class TestCalibration(unittest.TestCase):
+
+    def test_compare_scores(self):
+        # Arrange
+        notes = [make_note(str(i)) for i in range(3)]
+        reference = [
+            with_accuracy(make_result(n), s) for n, s in zip(notes, (0.5, 0.7, 0.9))
+        ]
+        candidate = [
+            with_accuracy(make_result(n), s) for n, s in zip(notes, (0.6, 0.6, 1.0))
+        ]
+
+        # Act
+        report = compare_scores(reference, candidate)
+
+        # Assert
+        accuracy = report["clinical_accuracy_score"]
+        self.assertAlmostEqual(accuracy["mean_abs_diff"], 0.1)
+        self.assertAlmostEqual(accuracy["mean_bias"], 1 / 30)
+        self.assertGreater(accuracy["pearson"], 0.8)
+        self.assertAlmostEqual(accuracy["pass_agreement"], 2 / 3)
+        # Identical constant scores have no correlation to report
+        self.assertIsNone(report["soap_structure_score"]["pearson"])
+        self.assertEqual(report["soap_structure_score"]["pass_agreement"], 1.0)
+
+    def test_compare_scores_uses_each_metrics_threshold(self):
+        # Arrange
+        notes = [make_note(str(i)) for i in range(2)]
+        reference = [with_accuracy(make_result(n), 0.5) for n in notes]
+        candidate = [with_accuracy(make_result(n), 0.65) for n in notes]
+        thresholds = {**metric_thresholds(), "clinical_accuracy_score": 0.6}
+
+        # Act
+        report = compare_scores(reference, candidate, thresholds)
+
+        # Assert
+        self.assertEqual(metric_thresholds()["clinical_accuracy_score"], 0.7)
+        self.assertEqual(report["clinical_accuracy_score"]["pass_agreement"], 0.0)
+
+    def test_compare_scores_only_pairs_notes_judged_both_ways(self):
+        # Arrange
+        notes = [make_note(str(i)) for i in range(2)]
+
+        # Act
+        report = compare_scores(
+            [make_result(n) for n in notes], [make_result(notes[1])]
+        )
+
+        # Assert
+        self.assertEqual(report["clinical_accuracy_score"]["mean_abs_diff"], 0.0)
+        self.assertEqual(compare_scores([], [make_result(notes[0])]), {})
+
+    @patch("src.calibration.run_evaluation")
+    def test_calibrate_judges_both_ways_and_writes_report(self, mock_run_evaluation):
+        # Arrange
+        with tempfile.TemporaryDirectory() as root:
+            checkpoint = RunCheckpoint.create({"prompt_version": "v1"}, root=root)
+            notes = [make_note(str(i)) for i in range(3)]
+            checkpoint.append_notes(notes)
+            mock_run_evaluation.side_effect = lambda notes, **kwargs: [
+                make_result(note) for note in notes
+            ]
+
+            # Act
+            report = calibrate(checkpoint, limit=2)
+
+            # Assert
+            self.assertEqual(
+                [
+                    c.kwargs["multi_criteria"]
+                    for c in mock_run_evaluation.call_args_list
+                ],
+                [False, True],
+            )
+            for c in mock_run_evaluation.call_args_list:
+                self.assertFalse(c.kwargs["use_cache"])
+                # Only judge scores are compared
+                self.assertFalse(c.kwargs["pre_metrics"])
+                self.assertFalse(c.kwargs["reference_metrics"])
+                self.assertEqual(
+                    c.kwargs["only_metrics"],
+                    [
+                        "Clinical Accuracy [GEval]",
+                        "SOAP Structure Compliance [GEval]",
+                        "Clinical Safety Assessment [GEval]",
+                        "Medical Terminology Accuracy [GEval]",
+                    ],
+                )
+            self.assertEqual(report["notes"], 2)
+            with open(os.path.join(checkpoint.directory, CALIBRATION_FILE)) as f:
+                self.assertEqual(json.load(f)["metrics"], report["metrics"])
+
+
+if __name__ == "__main__":
+    unittest.main()
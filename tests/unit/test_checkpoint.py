@@ -0,0 +1,93 @@
+import os
+import tempfile
+import unittest
+
+from src.checkpoint import GENERATION_FILE, RunCheckpoint
+from src.schemas.models import ClinicalNote, EvaluationResult
+
+
+def make_note(note_id: str) -> ClinicalNote:
+    return ClinicalNote(
+        note_id=note_id,
+        transcript=f"transcript {note_id}",
+        note=f"ground truth {note_id}",
+        generated_note=f"generated {note_id}",
+    )
+
+
+def make_result(note: ClinicalNote) -> EvaluationResult:
+    return EvaluationResult(
+        note=note,
+        hallucination_score=0.1,
+        clinical_accuracy_score=0.8,
+        soap_structure_score=1.0,
+        clinical_safety_score=0.7,
+        medical_terminology_score=0.85,
+        overall_score=0.69,
+    )
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.checkpoint = RunCheckpoint.create(
+            {"limit": 3, "prompt_version": "v2"}, root=self.tmp_dir.name
+        )
+
+    def test_create_and_resume(self):
+        # Act
+        resumed = RunCheckpoint.resume(self.checkpoint.run_id, root=self.tmp_dir.name)
+
+        # Assert
+        self.assertEqual(resumed.metadata["limit"], 3)
+        self.assertEqual(resumed.metadata["run_id"], self.checkpoint.run_id)
+
+    def test_resume_unknown_run(self):
+        # Act & Assert
+        with self.assertRaises(FileNotFoundError):
+            RunCheckpoint.resume("missing", root=self.tmp_dir.name)
+
+    def test_notes_roundtrip_in_dataset_order(self):
+        # Arrange
+        self.checkpoint.append_notes([make_note("10")])
+        self.checkpoint.append_notes([make_note("2"), make_note("0")])
+
+        # Act
+        notes = self.checkpoint.load_notes()
+
+        # Assert
+        self.assertEqual([n.note_id for n in notes], ["0", "2", "10"])
+        self.assertEqual(notes[0].ground_truth_note, "ground truth 0")
+        self.assertEqual(self.checkpoint.completed_note_ids(), {"0", "2", "10"})
+
+    def test_results_roundtrip(self):
+        # Arrange
+        note = make_note("1")
+        self.checkpoint.append_results([make_result(note)])
+
+        # Act
+        results = self.checkpoint.load_results()
+
+        # Assert
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].note, note)
+        self.assertEqual(self.checkpoint.completed_result_ids(), {"1"})
+
+    def test_torn_line_is_skipped_and_next_append_survives(self):
+        # Arrange: simulate a crash in the middle of a write
+        self.checkpoint.append_notes([make_note("0")])
+        path = os.path.join(self.checkpoint.directory, GENERATION_FILE)
+        with open(path, "a") as f:
+            f.write('{"note_id": "1", "transcr')
+
+        # Act
+        self.checkpoint.append_notes([make_note("2")])
+
+        # Assert
+        self.assertEqual(self.checkpoint.completed_note_ids(), {"0", "2"})
+
+
+if __name__ == "__main__":
+    unittest.main()
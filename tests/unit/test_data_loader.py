@@ -1,8 +1,24 @@
+import asyncio
+import json
+import os
+import tempfile
 import unittest
-from unittest.mock import patch, MagicMock
-import pandas as pd
+from unittest.mock import AsyncMock, patch, MagicMock
 
-from src.data_loader import generate_note, load_data
+import openai
+
+from src.core.llm import LLMCallError, generation_caller
+from src.core.tokens import count_tokens
+from src.data_loader import (
+    generate_note,
+    generate_notes,
+    iter_records,
+    load_data,
+    load_token_counts,
+    note_cache,
+    stored_token_counts,
+    token_counts_path,
+)
 from src.schemas.models import ClinicalNote
 
 
@@ -26,31 +42,39 @@ class TestDataLoader(unittest.TestCase):
     @patch("src.data_loader.client.chat.completions.create")
     def test_generate_note_api_error(self, mock_create):
         # Arrange
-        mock_create.side_effect = Exception("API Error")
+        mock_create.side_effect = openai.APIConnectionError(request=MagicMock())
         transcript = "Patient complains of a headache."
 
-        # Act
-        result = generate_note(transcript)
+        # Act / Assert
+        with patch.object(generation_caller, "max_retries", 0):
+            with self.assertRaises(LLMCallError):
+                generate_note(transcript)
 
-        # Assert
-        self.assertEqual(result, "")
+    def write_dataset(self, records):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        path = os.path.join(tmp_dir.name, "test.json")
+        with open(path, "w") as f:
+            json.dump(records, f)
+        return path
 
-    @patch("src.data_loader.pd.read_json")
-    @patch("src.data_loader.generate_note")
-    @patch("src.data_loader.os.path.exists")
-    def test_load_data_success(self, mock_exists, mock_generate_note, mock_read_json):
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_load_data_success(self, mock_generate_note):
         # Arrange
-        mock_exists.return_value = True
-        mock_data = {
-            "patient_convo": ["Test transcript"],
-            "soap_notes": ["Test SOAP note"],
-        }
-        mock_df = pd.DataFrame(mock_data)
-        mock_read_json.return_value = mock_df
+        path = self.write_dataset(
+            [
+                {
+                    "person_data": {"results": [{"name": {"first": "Ivan"}}]},
+                    "patient_convo": "Test transcript",
+                    "soap_notes": "Test SOAP note",
+                }
+            ]
+        )
         mock_generate_note.return_value = "Generated note."
 
         # Act
-        result = load_data()
+        with patch("src.data_loader.DATASET_PATH", path):
+            result = load_data()
 
         # Assert
         self.assertEqual(len(result), 1)
@@ -59,25 +83,49 @@ class TestDataLoader(unittest.TestCase):
         self.assertEqual(result[0].ground_truth_note, "Test SOAP note")
         self.assertEqual(result[0].generated_note, "Generated note.")
 
-    @patch("src.data_loader.pd.read_json")
-    @patch("src.data_loader.generate_note")
-    @patch("src.data_loader.os.path.exists")
-    def test_load_data_limit(self, mock_exists, mock_generate_note, mock_read_json):
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_load_data_limit(self, mock_generate_note):
         # Arrange
-        mock_exists.return_value = True
-        mock_data = {
-            "patient_convo": ["t1", "t2", "t3"],
-            "soap_notes": ["s1", "s2", "s3"],
-        }
-        mock_df = pd.DataFrame(mock_data)
-        mock_read_json.return_value = mock_df
+        path = self.write_dataset(
+            [
+                {"patient_convo": t, "soap_notes": s}
+                for t, s in [("t1", "s1"), ("t2", "s2"), ("t3", "s3")]
+            ]
+        )
         mock_generate_note.return_value = "Generated note."
 
         # Act
-        result = load_data(limit=2)
+        with patch("src.data_loader.DATASET_PATH", path):
+            with patch(
+                "src.data_loader.count_tokens", wraps=count_tokens
+            ) as mock_count:
+                result = load_data(limit=2)
 
-        # Assert
+        # Assert: only the loaded transcripts are counted
         self.assertEqual(len(result), 2)
+        self.assertEqual(mock_count.call_count, 2)
+        self.assertFalse(os.path.exists(token_counts_path(path)))
+
+    def test_iter_records_projects_fields_and_stops_at_limit(self):
+        # Arrange: the record after the limit is malformed and must never be parsed
+        path = self.write_dataset([])
+        with open(path, "w") as f:
+            f.write(
+                '[{"person_data": {"a": [1, 2]}, "patient_convo": "t1", "soap_notes": "s1"},'
+                ' {"patient_convo": "t2", "soap_notes": "s2"}, {"broken": '
+            )
+
+        # Act
+        records = list(iter_records(limit=2, path=path))
+
+        # Assert
+        self.assertEqual(
+            records,
+            [
+                {"patient_convo": "t1", "soap_notes": "s1"},
+                {"patient_convo": "t2", "soap_notes": "s2"},
+            ],
+        )
 
     @patch("src.data_loader.os.path.exists")
     def test_load_data_file_not_found(self, mock_exists):
@@ -90,6 +138,146 @@ class TestDataLoader(unittest.TestCase):
         # Assert
         self.assertEqual(result, [])
 
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_generate_notes_preserves_order(self, mock_agenerate_note):
+        # Arrange: later transcripts finish first
+        async def fake_generate(transcript, **kwargs):
+            await asyncio.sleep(0.01 / int(transcript))
+            return f"note {transcript}"
+
+        mock_agenerate_note.side_effect = fake_generate
+
+        # Act
+        result = asyncio.run(generate_notes(["1", "2", "3", "4"]))
+
+        # Assert
+        self.assertEqual(result, ["note 1", "note 2", "note 3", "note 4"])
+
+    @patch("src.core.llm.settings.LLM_BACKOFF_BASE", 0.0)
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_generate_notes_retries_rate_limited_calls(self, mock_agenerate_note):
+        # Arrange
+        response = MagicMock(status_code=429, headers={"retry-after": "0"})
+        rate_limited = openai.RateLimitError("429", response=response, body=None)
+        mock_agenerate_note.side_effect = [rate_limited, "Generated note."]
+
+        calls = {}
+
+        # Act
+        result = asyncio.run(generate_notes(["Test transcript"], calls=calls))
+
+        # Assert
+        self.assertEqual(result, ["Generated note."])
+        self.assertEqual(mock_agenerate_note.call_count, 2)
+        self.assertEqual([(c.stage, c.retries) for c in calls[0]], [("generation", 1)])
+
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_generate_notes_uses_cache(self, mock_agenerate_note):
+        # Arrange
+        mock_agenerate_note.return_value = "Generated note."
+        cache = note_cache()
+
+        # Act
+        first = asyncio.run(generate_notes(["Test transcript"], cache=cache))
+        second = asyncio.run(generate_notes(["Test transcript"], cache=cache))
+        refreshed = asyncio.run(
+            generate_notes(["Test transcript"], cache=cache, refresh=True)
+        )
+
+        # Assert
+        self.assertEqual(first, second)
+        self.assertEqual(refreshed, ["Generated note."])
+        self.assertEqual(mock_agenerate_note.call_count, 2)
+
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_generate_notes_does_not_cache_failures(self, mock_agenerate_note):
+        # Arrange
+        mock_agenerate_note.side_effect = [
+            openai.BadRequestError("400", response=MagicMock(), body=None),
+            "Generated note.",
+        ]
+        cache = note_cache()
+
+        # Act
+        failed = asyncio.run(generate_notes(["Test transcript"], cache=cache))
+        result = asyncio.run(generate_notes(["Test transcript"], cache=cache))
+
+        # Assert
+        self.assertIsInstance(failed[0], LLMCallError)
+        self.assertEqual(result, ["Generated note."])
+
+    @patch("src.data_loader.settings.GENERATION_CHUNK_TOKENS", 30)
+    @patch("src.data_loader.settings.GENERATION_MAX_PROMPT_TOKENS", 200)
+    @patch("src.data_loader.acomplete", new_callable=AsyncMock)
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_generate_notes_map_reduces_oversized_transcripts(
+        self, mock_agenerate_note, mock_acomplete
+    ):
+        # Arrange
+        mock_agenerate_note.return_value = "Short note."
+        transcript = "".join(
+            f"Patient: symptom {i} " + "x" * 80 + "\n" for i in range(4)
+        )
+
+        async def fake_complete(messages, model=None):
+            content = messages[-1]["content"]
+            if content.startswith("Here is part"):
+                return f"partial {content.split()[3]}"
+            return "Merged note."
+
+        mock_acomplete.side_effect = fake_complete
+
+        # Act
+        with patch("src.core.tokens._encoding", return_value=None):
+            result = asyncio.run(generate_notes(["Short transcript", transcript]))
+
+        # Assert
+        self.assertEqual(result, ["Short note.", "Merged note."])
+        mock_agenerate_note.assert_called_once()
+        self.assertEqual(mock_acomplete.call_count, 5)
+        merge_prompt = mock_acomplete.call_args.args[0][-1]["content"]
+        self.assertIn("partial 1", merge_prompt)
+        self.assertIn("partial 4", merge_prompt)
+
+    def test_load_token_counts_are_computed_once(self):
+        # Arrange
+        path = self.write_dataset(
+            [
+                {"patient_convo": "x" * 40, "soap_notes": "s"},
+                {"patient_convo": "x" * 80, "soap_notes": "s"},
+            ]
+        )
+        self.assertIsNone(stored_token_counts(path=path))
+
+        # Act
+        with patch("src.core.tokens._encoding", return_value=None):
+            with patch(
+                "src.data_loader.count_tokens", wraps=count_tokens
+            ) as mock_count:
+                first = load_token_counts(path=path)
+                second = load_token_counts(path=path)
+
+        # Assert
+        self.assertEqual(first, [11, 21])
+        self.assertEqual(second, first)
+        self.assertEqual(stored_token_counts(path=path), first)
+        self.assertEqual(mock_count.call_count, 2)
+        self.assertTrue(os.path.exists(token_counts_path(path)))
+
+    def test_load_token_counts_recounts_changed_datasets(self):
+        # Arrange
+        path = self.write_dataset([{"patient_convo": "x" * 40, "soap_notes": "s"}])
+        with patch("src.core.tokens._encoding", return_value=None):
+            load_token_counts(path=path)
+            with open(path, "w") as f:
+                json.dump([{"patient_convo": "x" * 400, "soap_notes": "s"}] * 2, f)
+
+            # Act
+            counts = load_token_counts(path=path)
+
+        # Assert
+        self.assertEqual(counts, [101, 101])
+
 
 if __name__ == "__main__":
     unittest.main()
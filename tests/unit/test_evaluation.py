@@ -1,5 +1,6 @@
+import json
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
 import sys
 import os
 
@@ -7,15 +8,46 @@ sys.path.insert(
     0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../src"))
 )
 
-from src.evaluation import run_evaluation
+from src.core.executor import JudgeOutcome
+from src.evaluation import get_metrics, metric_name, run_evaluation
+from src.schemas.metrics import MultiCriteriaJudgeMetric
 from src.schemas.models import ClinicalNote, EvaluationResult
 
 
+def judge_with(scores, failing=()):
+    """Returns a fake job runner that scores each metric by name.
+
+    Jobs whose (test case index, metric name) is in `failing` fail instead.
+    """
+
+    def run_judge_jobs(jobs, test_cases, metrics, *args, **kwargs):
+        positions = {case_id: i for i, case_id in enumerate(test_cases)}
+        outcomes = {}
+        for job in jobs:
+            name = metric_name(metrics[job.metric_index])
+            if (positions[job.test_case_id], name) in failing:
+                outcomes[job] = JudgeOutcome(job, None, None, "RateLimitError: 429")
+            else:
+                outcomes[job] = JudgeOutcome(job, scores[name], "Because.", None)
+        return outcomes
+
+    return run_judge_jobs
+
+
+SCORES = {
+    "Hallucination": 0.1,
+    "Clinical Accuracy [GEval]": 0.8,
+    "SOAP Structure Compliance [GEval]": 1.0,
+    "Clinical Safety Assessment [GEval]": 0.7,
+    "Medical Terminology Accuracy [GEval]": 0.85,
+}
+
+
 class TestEvaluation(unittest.TestCase):
 
     @patch("openai.OpenAI")
-    @patch("src.evaluation.evaluate")
-    def test_run_evaluation_success(self, mock_evaluate, mock_openai):
+    @patch("src.evaluation.run_judge_jobs")
+    def test_run_evaluation_success(self, mock_run_judge_jobs, mock_openai):
         # Arrange
         notes = [
             ClinicalNote(
@@ -24,38 +56,7 @@ class TestEvaluation(unittest.TestCase):
                 generated_note="generated1",
             )
         ]
-
-        # Create mock metrics with exact names that match what run_evaluation looks for
-        mock_hallucination = MagicMock()
-        mock_hallucination.name = "Hallucination"
-        mock_hallucination.score = 0.1
-
-        mock_accuracy = MagicMock()
-        mock_accuracy.name = "Clinical Accuracy [GEval]"
-        mock_accuracy.score = 0.8
-
-        mock_soap = MagicMock()
-        mock_soap.name = "SOAP Structure Compliance [GEval]"
-        mock_soap.score = 1.0
-
-        mock_safety = MagicMock()
-        mock_safety.name = "Clinical Safety Assessment [GEval]"
-        mock_safety.score = 0.7
-
-        mock_terminology = MagicMock()
-        mock_terminology.name = "Medical Terminology Accuracy [GEval]"
-        mock_terminology.score = 0.85
-
-        mock_metric_data = [
-            mock_hallucination,
-            mock_accuracy,
-            mock_soap,
-            mock_safety,
-            mock_terminology,
-        ]
-        mock_test_result = MagicMock(metrics_data=mock_metric_data)
-        mock_evaluation_output = MagicMock(test_results=[mock_test_result])
-        mock_evaluate.return_value = mock_evaluation_output
+        mock_run_judge_jobs.side_effect = judge_with(SCORES)
 
         # Act
         results = run_evaluation(notes)
@@ -65,35 +66,211 @@ class TestEvaluation(unittest.TestCase):
         self.assertIsInstance(results[0], EvaluationResult)
         self.assertEqual(results[0].hallucination_score, 0.1)
         self.assertAlmostEqual(
-            results[0].overall_score, (0.1 + 0.8 + 1.0 + 0.7 + 0.85) / 5
+            results[0].overall_score, (0.9 + 0.8 + 1.0 + 0.7 + 0.85) / 5
+        )
+
+    @patch("src.evaluation.run_judge_jobs")
+    def test_run_evaluation_adds_reference_metrics(self, mock_run_judge_jobs):
+        # Arrange
+        notes = [
+            ClinicalNote(
+                transcript="transcript",
+                note="Start lisinopril 20 mg daily.",
+                generated_note="Start lisinopril 20 mg daily.",
+            )
+        ]
+        mock_run_judge_jobs.side_effect = judge_with(SCORES)
+
+        # Act
+        (scored,) = run_evaluation(notes, use_cache=False)
+        (unscored,) = run_evaluation(notes, use_cache=False, reference_metrics=False)
+
+        # Assert: the reference metrics do not change the overall score
+        self.assertEqual(
+            (scored.rouge_l_score, scored.token_f1_score, scored.entity_overlap_score),
+            (1.0, 1.0, 1.0),
         )
+        self.assertIsNone(unscored.rouge_l_score)
+        self.assertEqual(scored.overall_score, unscored.overall_score)
 
     @patch("openai.OpenAI")
-    @patch("src.evaluation.evaluate")
-    def test_run_evaluation_no_results(self, mock_evaluate, mock_openai):
+    @patch("src.evaluation.run_judge_jobs")
+    def test_run_evaluation_isolates_failed_pairs(
+        self, mock_run_judge_jobs, mock_openai
+    ):
         # Arrange
-        notes = [ClinicalNote(transcript="t", note="gt", generated_note="g")]
-        mock_evaluation_output = MagicMock(test_results=[])
-        mock_evaluate.return_value = mock_evaluation_output
+        notes = [
+            ClinicalNote(note_id=str(i), transcript="t", note="gt", generated_note="g")
+            for i in range(2)
+        ]
+        mock_run_judge_jobs.side_effect = judge_with(
+            SCORES, failing={(1, "SOAP Structure Compliance [GEval]")}
+        )
 
-        # Act & Assert
-        with self.assertRaises(ValueError):
-            run_evaluation(notes)
+        # Act
+        results = run_evaluation(notes)
+
+        # Assert: only the note with the failed pair is left out
+        self.assertEqual([result.note.note_id for result in results], ["0"])
+        self.assertEqual(results[0].soap_structure_score, 1.0)
 
     @patch("openai.OpenAI")
-    @patch("src.evaluation.evaluate")
-    def test_run_evaluation_missing_metrics(self, mock_evaluate, mock_openai):
+    @patch("src.evaluation.run_judge_jobs")
+    def test_run_evaluation_rejudges_only_failed_pairs(
+        self, mock_run_judge_jobs, mock_openai
+    ):
         # Arrange
         notes = [ClinicalNote(transcript="t", note="gt", generated_note="g")]
-        mock_test_result = MagicMock(metrics_data=None)
-        mock_evaluation_output = MagicMock(test_results=[mock_test_result])
-        mock_evaluate.return_value = mock_evaluation_output
+        mock_run_judge_jobs.side_effect = judge_with(
+            SCORES, failing={(0, "Hallucination")}
+        )
+        self.assertEqual(run_evaluation(notes), [])
+        mock_run_judge_jobs.side_effect = judge_with(SCORES)
 
         # Act
         results = run_evaluation(notes)
 
         # Assert
-        self.assertEqual(len(results), 0)
+        jobs, _, metrics = mock_run_judge_jobs.call_args.args
+        self.assertEqual(
+            [metric_name(metrics[job.metric_index]) for job in jobs], ["Hallucination"]
+        )
+        self.assertEqual(len(results), 1)
+
+
+class TestJudgementCache(unittest.TestCase):
+
+    def setUp(self):
+        self.note = ClinicalNote(
+            note_id="0", transcript="t", note="gt", generated_note="generated"
+        )
+
+    def fake_judge(self, jobs, test_cases, metrics, *args, **kwargs):
+        return {job: JudgeOutcome(job, 0.5, "Because.", None) for job in jobs}
+
+    @patch("src.evaluation.run_judge_jobs")
+    def test_unchanged_pairs_are_not_judged_again(self, mock_run_judge_jobs):
+        # Arrange
+        mock_run_judge_jobs.side_effect = self.fake_judge
+
+        # Act
+        first = run_evaluation([self.note])
+        second = run_evaluation([self.note])
+
+        # Assert
+        self.assertEqual(mock_run_judge_jobs.call_count, 1)
+        self.assertEqual(first[0].clinical_accuracy_score, 0.5)
+        self.assertEqual(second[0].model_dump(), first[0].model_dump())
+
+    @patch("src.evaluation.run_judge_jobs")
+    def test_changed_notes_are_judged_again(self, mock_run_judge_jobs):
+        # Arrange
+        mock_run_judge_jobs.side_effect = self.fake_judge
+        run_evaluation([self.note])
+        changed = self.note.model_copy(update={"generated_note": "regenerated"})
+
+        # Act
+        run_evaluation([self.note, changed])
+
+        # Assert
+        self.assertEqual(mock_run_judge_jobs.call_count, 2)
+        jobs = mock_run_judge_jobs.call_args.args[0]
+        self.assertEqual(len({job.test_case_id for job in jobs}), 1)
+
+    @patch("src.evaluation.run_judge_jobs")
+    def test_only_changed_metrics_are_judged_again(self, mock_run_judge_jobs):
+        # Arrange
+        mock_run_judge_jobs.side_effect = self.fake_judge
+        run_evaluation([self.note])
+
+        def stricter_metrics(*args, **kwargs):
+            metrics = get_metrics(*args, **kwargs)
+            metrics[1].threshold = 0.9
+            return metrics
+
+        # Act
+        with patch("src.evaluation.get_metrics", side_effect=stricter_metrics):
+            run_evaluation([self.note])
+
+        # Assert
+        jobs, _, metrics = mock_run_judge_jobs.call_args.args
+        self.assertEqual(
+            [metric_name(metrics[job.metric_index]) for job in jobs],
+            ["Clinical Accuracy [GEval]"],
+        )
+
+    @patch("src.evaluation.run_judge_jobs")
+    def test_multi_criteria_verdicts_fill_every_geval_field(self, mock_run_judge_jobs):
+        # Arrange
+        def fake_judge(jobs, test_cases, metrics, *args, **kwargs):
+            outcomes = {}
+            for job in jobs:
+                metric = metrics[job.metric_index]
+                reason = "Because."
+                if isinstance(metric, MultiCriteriaJudgeMetric):
+                    reason = json.dumps(
+                        {
+                            m.name: {"score": 0.6, "reason": "Because."}
+                            for m in metric.criteria_metrics
+                        }
+                    )
+                outcomes[job] = JudgeOutcome(job, 0.9, reason, None)
+            return outcomes
+
+        mock_run_judge_jobs.side_effect = fake_judge
+
+        # Act
+        results = run_evaluation([self.note], multi_criteria=True)
+
+        # Assert: one judge call covers the four GEval metrics
+        self.assertEqual(len(mock_run_judge_jobs.call_args.args[0]), 2)
+        self.assertEqual(results[0].hallucination_score, 0.9)
+        self.assertEqual(results[0].clinical_accuracy_score, 0.6)
+        self.assertEqual(results[0].medical_terminology_score, 0.6)
+
+    @patch("src.evaluation.run_judge_jobs")
+    def test_pre_metrics_skip_the_judge_for_clear_cut_scores(self, mock_run_judge_jobs):
+        # Arrange
+        mock_run_judge_jobs.side_effect = self.fake_judge
+        note = self.note.model_copy(
+            update={
+                "generated_note": (
+                    "Subjective: -\nObjective: -\nAssessment: -\n"
+                    "Plan: treat diabetis, hypertention, asthama and pnuemonia"
+                )
+            }
+        )
+
+        # Act
+        results = run_evaluation([note], pre_metrics=True)
+
+        # Assert: structure and the misspellings are clear-cut, the note has no doses
+        jobs, _, metrics = mock_run_judge_jobs.call_args.args
+        self.assertEqual(
+            [metric_name(metrics[job.metric_index]) for job in jobs],
+            [
+                "Hallucination",
+                "Clinical Accuracy [GEval]",
+                "Clinical Safety Assessment [GEval]",
+            ],
+        )
+        self.assertEqual(results[0].soap_structure_score, 1.0)
+        self.assertEqual(results[0].score_tiers["soap_structure_score"], "local")
+        self.assertEqual(results[0].medical_terminology_score, 0.0)
+        self.assertEqual(results[0].score_tiers["medical_terminology_score"], "local")
+        self.assertEqual(results[0].score_tiers["clinical_safety_score"], "judge")
+
+    @patch("src.evaluation.run_judge_jobs")
+    def test_cache_can_be_bypassed(self, mock_run_judge_jobs):
+        # Arrange
+        mock_run_judge_jobs.side_effect = self.fake_judge
+
+        # Act
+        run_evaluation([self.note])
+        run_evaluation([self.note], use_cache=False)
+
+        # Assert
+        self.assertEqual(mock_run_judge_jobs.call_count, 2)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,92 @@
+import asyncio
+import json
+import unittest
+
+import openai
+
+from src.fake_openai import FakeOpenAIServer, FakeServerConfig, start_fake_server
+
+
+class TestFakeOpenAI(unittest.TestCase):
+
+    def test_answers_generation_and_judge_requests(self):
+        # Arrange
+        server = FakeOpenAIServer(FakeServerConfig(seed=0))
+        messages = [{"role": "user", "content": "x" * 40}]
+
+        # Act
+        _, _, note = server.answer({"model": "gpt-4.1", "messages": messages})
+        _, _, judgement = server.answer(
+            {"messages": messages, "response_format": {"type": "json_object"}}
+        )
+
+        # Assert
+        self.assertIn("Subjective", note["choices"][0]["message"]["content"])
+        self.assertEqual(note["model"], "gpt-4.1")
+        self.assertEqual(note["usage"]["prompt_tokens"], 11)
+        content = json.loads(judgement["choices"][0]["message"]["content"])
+        self.assertEqual(content["verdict"], "no")
+
+    def test_injects_rate_limits_and_errors(self):
+        # Arrange
+        limited = FakeOpenAIServer(FakeServerConfig(rate_limit_rate=1.0))
+        failing = FakeOpenAIServer(FakeServerConfig(error_rate=1.0))
+
+        # Act
+        status, headers, _ = limited.answer({"messages": []})
+        error_status, _, _ = failing.answer({"messages": []})
+
+        # Assert
+        self.assertEqual(status, 429)
+        self.assertEqual(headers["retry-after"], "0.1")
+        self.assertEqual(error_status, 500)
+
+    def test_latency_follows_the_configured_median(self):
+        # Arrange
+        server = FakeOpenAIServer(
+            FakeServerConfig(latency_median=0.1, latency_sigma=0.5, seed=1)
+        )
+
+        # Act
+        latencies = sorted(server.latency() for _ in range(2001))
+
+        # Assert
+        self.assertAlmostEqual(latencies[1000], 0.1, delta=0.01)
+        self.assertEqual(
+            FakeOpenAIServer(FakeServerConfig(latency_sigma=0)).latency(), 0.05
+        )
+
+    def test_serves_the_openai_client(self):
+        # Arrange
+        process, base_url = start_fake_server(
+            FakeServerConfig(latency_median=0, rate_limit_rate=0.5, seed=0)
+        )
+        self.addCleanup(process.terminate)
+
+        async def complete(n):
+            client = openai.AsyncOpenAI(api_key="x", base_url=base_url, max_retries=0)
+            answers = await asyncio.gather(
+                *(
+                    client.chat.completions.create(
+                        model="gpt-4.1", messages=[{"role": "user", "content": "hi"}]
+                    )
+                    for _ in range(n)
+                ),
+                return_exceptions=True,
+            )
+            await client.close()
+            return answers
+
+        # Act
+        answers = asyncio.run(complete(20))
+
+        # Assert: about half are rate limited
+        limited = [a for a in answers if isinstance(a, openai.RateLimitError)]
+        completed = [a for a in answers if not isinstance(a, Exception)]
+        self.assertEqual(len(limited) + len(completed), 20)
+        self.assertTrue(limited and completed)
+        self.assertGreater(completed[0].usage.completion_tokens, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
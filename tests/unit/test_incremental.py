@@ -0,0 +1,171 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.checkpoint import RunCheckpoint
+from src.core.executor import JudgeOutcome
+from src.evaluation import METRIC_FIELDS, build_result
+from src.incremental import carry_forward, metric_versions
+from src.result_table import ResultTable
+from src.run_store import RunStore
+from src.schemas.models import ClinicalNote
+
+
+def fake_judge(jobs, test_cases, metrics, *args, **kwargs):
+    return {job: JudgeOutcome(job, 0.9, "Because.", None) for job in jobs}
+
+
+def record(i, transcript=None):
+    return {"patient_convo": transcript or f"transcript {i}", "soap_notes": f"gt {i}"}
+
+
+class TestIncremental(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.store = RunStore(os.path.join(self.root, "runs.db"))
+        self.versions = metric_versions(multi_criteria=False)
+        self.metadata = {
+            "limit": None,
+            "prompt_version": "v1",
+            "generation_model": "gpt-4.1",
+            "shard": None,
+            "metric_versions": self.versions,
+        }
+        self.store.create_run("run-1", {}, self.metadata)
+        previous = []
+        for i in range(3):
+            note = ClinicalNote(
+                note_id=str(i),
+                transcript=f"transcript {i}",
+                note=f"gt {i}",
+                generated_note=f"generated {i}",
+            )
+            previous.append(build_result(note, {name: 0.5 for name in METRIC_FIELDS}))
+        # Note 2 carried its hallucination score from an even earlier run
+        previous[2] = previous[2].model_copy(
+            update={"carried_from": {"hallucination_score": "run-0"}}
+        )
+        self.store.append_results("run-1", previous)
+
+    def start_run(self, **metadata):
+        return RunCheckpoint.create(
+            {**self.metadata, **metadata},
+            root=os.path.join(self.root, "runs"),
+            store=self.store,
+        )
+
+    @patch("src.evaluation.run_judge_jobs", side_effect=fake_judge)
+    def test_only_changed_records_and_metrics_are_redone(self, mock_run_judge_jobs):
+        # Arrange: record 1 changed, record 3 is new and the safety metric changed
+        records = [record(0), record(1, "edited"), record(2), record(3)]
+        checkpoint = self.start_run(
+            metric_versions={**self.versions, "clinical_safety_score": "changed"}
+        )
+        self.store.create_run(checkpoint.run_id, {}, checkpoint.metadata)
+
+        # Act
+        counts = carry_forward(
+            checkpoint, self.store, "run-1", records, use_cache=False
+        )
+
+        # Assert: one judge call per reused note, for the changed metric only
+        jobs, _, metrics = mock_run_judge_jobs.call_args.args
+        self.assertEqual(
+            [metrics[job.metric_index].name for job in jobs],
+            ["Clinical Safety Assessment [GEval]"] * 2,
+        )
+        self.assertEqual(counts, {"notes": 2, "carried": 8, "judged": 2})
+        self.assertEqual(checkpoint.completed_note_ids(), {"0", "2"})
+        first, second = checkpoint.load_results()
+        self.assertEqual(first.clinical_safety_score, 0.9)
+        self.assertEqual(first.clinical_accuracy_score, 0.5)
+        self.assertNotIn("clinical_safety_score", first.carried_from)
+        self.assertEqual(first.carried_from["clinical_accuracy_score"], "run-1")
+        self.assertEqual(second.carried_from["hallucination_score"], "run-0")
+        self.assertIsNotNone(first.rouge_l_score)
+        # The results are in the run store too, with their provenance
+        stored, _ = self.store.load_results(checkpoint.run_id)
+        self.assertEqual(stored, first)
+
+    @patch("src.evaluation.run_judge_jobs", side_effect=fake_judge)
+    def test_another_prompt_carries_nothing_forward(self, mock_run_judge_jobs):
+        # Arrange
+        checkpoint = self.start_run(prompt_version="v2")
+
+        # Act
+        counts = carry_forward(checkpoint, self.store, "run-1", [record(0)])
+
+        # Assert
+        self.assertEqual(counts, {"notes": 0, "carried": 0, "judged": 0})
+        self.assertEqual(checkpoint.completed_note_ids(), set())
+        mock_run_judge_jobs.assert_not_called()
+
+    @patch("src.pipeline.run_tiered_evaluation", return_value=ResultTable())
+    @patch("src.pipeline.settings.TIERED_JUDGE", True)
+    def test_stale_cells_use_the_stage_evaluator(self, mock_tiered):
+        # Arrange
+        checkpoint = self.start_run(
+            metric_versions={**self.versions, "clinical_safety_score": "changed"}
+        )
+
+        # Act
+        carry_forward(checkpoint, self.store, "run-1", [record(0)], use_cache=False)
+
+        # Assert
+        mock_tiered.assert_called_once()
+        self.assertEqual(
+            mock_tiered.call_args.kwargs["only_metrics"],
+            ["Clinical Safety Assessment [GEval]"],
+        )
+
+    def test_versions_follow_the_scoring_setup(self):
+        # Arrange
+        plain = metric_versions(multi_criteria=False, pre_metrics=False, tiered=False)
+
+        # Act
+        pre_metrics = metric_versions(
+            multi_criteria=False, pre_metrics=True, tiered=False
+        )
+        with patch("src.incremental.settings.PRE_METRIC_BAND_HIGH", 0.9):
+            wider_band = metric_versions(
+                multi_criteria=False, pre_metrics=True, tiered=False
+            )
+        tiered = metric_versions(multi_criteria=False, pre_metrics=False, tiered=True)
+        with patch("src.incremental.settings.CHEAP_EVALUATION_LLM", "gpt-4.1-nano"):
+            cheaper = metric_versions(
+                multi_criteria=False, pre_metrics=False, tiered=True
+            )
+        multi_criteria = metric_versions(
+            multi_criteria=True, pre_metrics=False, tiered=False
+        )
+
+        # Assert: the band only matters for metrics with a local scorer
+        self.assertEqual(
+            pre_metrics["hallucination_score"], plain["hallucination_score"]
+        )
+        self.assertNotEqual(
+            pre_metrics["clinical_safety_score"], plain["clinical_safety_score"]
+        )
+        self.assertNotEqual(
+            wider_band["clinical_safety_score"], pre_metrics["clinical_safety_score"]
+        )
+        for changed in (tiered, cheaper, multi_criteria):
+            self.assertNotEqual(
+                changed["clinical_accuracy_score"], plain["clinical_accuracy_score"]
+            )
+        self.assertNotEqual(
+            cheaper["clinical_accuracy_score"], tiered["clinical_accuracy_score"]
+        )
+
+    def test_unknown_run(self):
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            carry_forward(self.start_run(), self.store, "missing", [])
+
+
+if __name__ == "__main__":
+    unittest.main()
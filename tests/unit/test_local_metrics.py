@@ -0,0 +1,103 @@
+import unittest
+
+from src.local_metrics import (
+    Dose,
+    extract_doses,
+    local_score,
+    medication_safety_score,
+    soap_sections,
+    terminology_problems,
+    terminology_score,
+)
+from src.schemas.models import ClinicalNote
+
+
+def make_note(generated_note, transcript="t", ground_truth_note="gt"):
+    return ClinicalNote(
+        transcript=transcript, note=ground_truth_note, generated_note=generated_note
+    )
+
+
+class TestLocalMetrics(unittest.TestCase):
+
+    def test_soap_sections_accepts_common_header_styles(self):
+        # Arrange
+        note = (
+            "**Subjective:** dizzy\n## Objective\nBP 120/80\nA: vertigo\nPlan to rest"
+        )
+
+        # Act & Assert: "Plan to rest" is prose, not a header
+        self.assertEqual(soap_sections(note), ["subjective", "objective", "assessment"])
+        self.assertEqual(
+            soap_sections("S: -\nO: -\nAssessment and Plan: rest"),
+            ["subjective", "objective", "assessment", "plan"],
+        )
+
+    def test_extract_doses(self):
+        # Act
+        doses = extract_doses(
+            "Start Lisinopril 20 mg daily and take 400 milligrams of ibuprofen. "
+            "Glucose 178 mg/dL."
+        )
+
+        # Assert: the lab value is not a dose
+        self.assertEqual(
+            doses,
+            [Dose("lisinopril", 20.0, "mg"), Dose("ibuprofen", 400.0, "mg")],
+        )
+
+    def test_medication_safety_score(self):
+        # Arrange
+        transcript = "Take 400 milligrams of ibuprofen twice a day."
+
+        # Act & Assert: only unsupported doses are scored
+        self.assertEqual(
+            medication_safety_score(make_note("Ibuprofen 800 mg BID", transcript)), 0.0
+        )
+        self.assertEqual(
+            medication_safety_score(
+                make_note("Ibuprofen 400 mg BID, then 800 mg", transcript)
+            ),
+            0.5,
+        )
+        # Matching doses are no evidence that the note is safe
+        self.assertIsNone(
+            medication_safety_score(make_note("Ibuprofen 400 mg BID", transcript))
+        )
+        # Doses from the patient's chart in the ground truth are not errors
+        self.assertIsNone(
+            medication_safety_score(
+                make_note("Lisinopril 20 mg", "t", ground_truth_note="Lisinopril 20 mg")
+            )
+        )
+        self.assertIsNone(medication_safety_score(make_note("Rest.", transcript)))
+
+    def test_terminology_problems(self):
+        # Act
+        problems = terminology_problems("Insulin 10 U qd for diabetis, then 1.0 mg.")
+
+        # Assert
+        self.assertEqual(len(problems), 4)
+        # A note without lexicon problems is left to the judge
+        self.assertIsNone(terminology_score(make_note("Insulin 10 units daily.")))
+        self.assertEqual(terminology_score(make_note("Insulin 10 units qd.")), 0.75)
+        self.assertEqual(
+            terminology_score(make_note("Insulin 10 U qd for diabetis, then 1.0 mg.")),
+            0.0,
+        )
+
+    def test_local_score_defers_ambiguous_cases_to_the_judge(self):
+        # Arrange
+        structured = make_note("Subjective: -\nObjective: -\nAssessment: -\nPlan: -")
+        partial = make_note("Subjective: -\nPlan: -")
+
+        # Act & Assert
+        name = "SOAP Structure Compliance [GEval]"
+        self.assertEqual(local_score(name, structured), 1.0)
+        self.assertEqual(local_score(name, make_note("Patient is dizzy.")), 0.0)
+        self.assertIsNone(local_score(name, partial))
+        self.assertIsNone(local_score("Clinical Accuracy [GEval]", structured))
+
+
+if __name__ == "__main__":
+    unittest.main()
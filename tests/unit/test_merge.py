@@ -0,0 +1,83 @@
+import json
+import os
+import tempfile
+import unittest
+
+from src.checkpoint import RunCheckpoint
+from src.merge import find_group_runs, merge_runs, write_summary
+from tests.unit.test_checkpoint import make_note, make_result
+
+
+class TestMerge(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.root = os.path.join(self.tmp_dir.name, "runs")
+
+    def make_shard(self, index, count, note_ids, score, group="nightly"):
+        checkpoint = RunCheckpoint.create(
+            {
+                "limit": None,
+                "prompt_version": "v2",
+                "generation_model": "gpt-4.1",
+                "evaluation_model": "gpt-4.1",
+                "shard": [index, count],
+                "group": group,
+            },
+            root=self.root,
+        )
+        notes = [make_note(note_id) for note_id in note_ids]
+        checkpoint.append_notes(notes)
+        checkpoint.append_results(
+            make_result(note).model_copy(update={"overall_score": score})
+            for note in notes
+        )
+        return checkpoint
+
+    def test_merge_combines_shards_and_weights_aggregates_by_note(self):
+        # Arrange: shard 0 has three notes, shard 1 has one
+        shards = [
+            self.make_shard(0, 2, ["0", "2", "3"], score=1.0),
+            self.make_shard(1, 2, ["1"], score=0.0),
+        ]
+        shards[1].append_failure("4", "generation", "timeout")
+
+        # Act
+        merged = merge_runs(find_group_runs("nightly", self.root), root=self.root)
+        summary = write_summary(merged)
+
+        # Assert
+        self.assertEqual(
+            [r.note.note_id for r in merged.load_results()], ["0", "1", "2", "3"]
+        )
+        self.assertEqual(summary["count"], 4)
+        self.assertAlmostEqual(summary["overall_score"], 0.75)
+        self.assertEqual([f["note_id"] for f in merged.load_failures()], ["4"])
+        self.assertIsNone(merged.metadata["shard"])
+        self.assertEqual(
+            sorted(merged.metadata["merged_from"]), sorted(s.run_id for s in shards)
+        )
+        with open(os.path.join(merged.directory, "summary.json")) as f:
+            self.assertEqual(json.load(f), summary)
+
+    def test_merge_rejects_incomplete_or_mismatched_shards(self):
+        # Arrange
+        first = self.make_shard(0, 3, ["0"], score=1.0)
+        second = self.make_shard(1, 3, ["1"], score=1.0)
+        other_split = self.make_shard(2, 4, ["2"], score=1.0)
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            merge_runs([first, second], root=self.root)
+        with self.assertRaises(ValueError):
+            merge_runs([first, first], root=self.root, allow_partial=True)
+        with self.assertRaises(ValueError):
+            merge_runs([first, second, other_split], root=self.root)
+
+        merged = merge_runs([first, second], root=self.root, allow_partial=True)
+        self.assertEqual(len(merged.load_results()), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,155 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import openai
+
+from src.checkpoint import RunCheckpoint
+from src.pipeline import (
+    run_evaluation_stage,
+    run_generation_stage,
+    run_pipelined_stages,
+)
+from src.schemas.models import ClinicalNote, EvaluationResult
+
+
+def fake_evaluation(notes, *args, **kwargs):
+    return [
+        EvaluationResult(
+            note=note,
+            hallucination_score=0.1,
+            clinical_accuracy_score=0.8,
+            soap_structure_score=1.0,
+            clinical_safety_score=0.7,
+            medical_terminology_score=0.85,
+            overall_score=0.69,
+        )
+        for note in notes
+    ]
+
+
+class TestPipeline(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.dataset_path = os.path.join(self.tmp_dir.name, "test.json")
+        with open(self.dataset_path, "w") as f:
+            json.dump(
+                [{"patient_convo": f"t{i}", "soap_notes": f"s{i}"} for i in range(3)],
+                f,
+            )
+        for target in ("src.pipeline.DATASET_PATH", "src.data_loader.DATASET_PATH"):
+            patcher = patch(target, self.dataset_path)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.checkpoint = RunCheckpoint.create(
+            {"limit": None, "prompt_version": "v2"},
+            root=os.path.join(self.tmp_dir.name, "runs"),
+        )
+
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_generation_stage_resumes_failed_notes(self, mock_agenerate_note):
+        # Arrange: the second transcript fails on the first attempt
+        def flaky(transcript, **kwargs):
+            if transcript == "t1" and mock_agenerate_note.call_count <= 3:
+                raise openai.BadRequestError("400", response=MagicMock(), body=None)
+            return f"note {transcript}"
+
+        mock_agenerate_note.side_effect = flaky
+
+        # Act
+        first_missing = run_generation_stage(self.checkpoint)
+        second_missing = run_generation_stage(self.checkpoint)
+
+        # Assert
+        self.assertEqual(first_missing, 1)
+        self.assertEqual(second_missing, 0)
+        self.assertEqual(mock_agenerate_note.call_count, 4)
+        notes = self.checkpoint.load_notes()
+        self.assertEqual([n.note_id for n in notes], ["0", "1", "2"])
+        self.assertEqual(notes[1].generated_note, "note t1")
+        self.assertEqual(
+            [(f["note_id"], f["stage"]) for f in self.checkpoint.load_failures()],
+            [("1", "generation")],
+        )
+
+    @patch("src.pipeline.run_evaluation", side_effect=fake_evaluation)
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_evaluation_stage_skips_evaluated_notes(
+        self, mock_agenerate_note, mock_run_evaluation
+    ):
+        # Arrange
+        mock_agenerate_note.return_value = "note"
+        run_generation_stage(self.checkpoint)
+        self.checkpoint.append_results(
+            fake_evaluation(self.checkpoint.load_notes()[:1])
+        )
+
+        # Act
+        results = run_evaluation_stage(self.checkpoint, batch_size=1)
+
+        # Assert
+        self.assertEqual(len(results), 3)
+        self.assertEqual(mock_run_evaluation.call_count, 2)
+        evaluated = [
+            call.args[0][0].note_id for call in mock_run_evaluation.call_args_list
+        ]
+        self.assertEqual(evaluated, ["1", "2"])
+        # The stage's metrics are built once and shared by its batches
+        first, second = mock_run_evaluation.call_args_list
+        self.assertIs(first.kwargs["metrics"], second.kwargs["metrics"])
+
+    @patch("src.pipeline.run_evaluation")
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_pipelined_stages_evaluate_while_generating(
+        self, mock_agenerate_note, mock_run_evaluation
+    ):
+        # Arrange: note 0 is left over from an earlier attempt, note 2 is slow
+        events = []
+
+        async def generate(transcript, **kwargs):
+            if transcript == "t2":
+                await asyncio.sleep(0.5)
+            events.append(f"generated {transcript}")
+            return f"note {transcript}"
+
+        def evaluate(notes, *args, **kwargs):
+            events.append(f"evaluated {[note.note_id for note in notes]}")
+            return fake_evaluation(notes)
+
+        mock_agenerate_note.side_effect = generate
+        mock_run_evaluation.side_effect = evaluate
+        self.checkpoint.append_notes(
+            [ClinicalNote(note_id="0", transcript="t0", note="s0", generated_note="n")]
+        )
+
+        # Act
+        results = run_pipelined_stages(self.checkpoint, batch_size=10)
+
+        # Assert: evaluation started before the slow note was generated
+        self.assertEqual(sorted(r.note.note_id for r in results), ["0", "1", "2"])
+        self.assertEqual(mock_agenerate_note.call_count, 2)
+        first_evaluation = next(i for i, e in enumerate(events) if "evaluated" in e)
+        self.assertLess(first_evaluation, events.index("generated t2"))
+        self.assertEqual(events[-1], "evaluated ['2']")
+
+    @patch("src.pipeline.run_evaluation", side_effect=ValueError("judge down"))
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_pipelined_stages_stop_when_evaluation_fails(
+        self, mock_agenerate_note, mock_run_evaluation
+    ):
+        # Arrange
+        mock_agenerate_note.return_value = "note"
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            run_pipelined_stages(self.checkpoint)
+        self.assertEqual(self.checkpoint.load_results(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
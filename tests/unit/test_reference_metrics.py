@@ -0,0 +1,135 @@
+import random
+import time
+import unittest
+
+import numpy as np
+
+from src.reference_metrics import (
+    add_reference_scores,
+    clinical_entities,
+    lcs_length,
+    reference_scores,
+)
+from src.schemas.models import ClinicalNote
+from tests.unit.test_checkpoint import make_result
+
+
+def make_note(generated_note, ground_truth_note):
+    return ClinicalNote(
+        transcript="t", note=ground_truth_note, generated_note=generated_note
+    )
+
+
+def dynamic_lcs(a, b):
+    previous = [0] * (len(b) + 1)
+    for x in a:
+        row = [0]
+        for j, y in enumerate(b):
+            row.append(previous[j] + 1 if x == y else max(previous[j + 1], row[j]))
+        previous = row
+    return previous[-1]
+
+
+class TestReferenceMetrics(unittest.TestCase):
+
+    def test_lcs_length_matches_dynamic_programming(self):
+        # Arrange
+        rng = random.Random(0)
+        pairs = [
+            (
+                [rng.choice("abcd") for _ in range(rng.randint(0, 80))],
+                [rng.choice("abcd") for _ in range(rng.randint(0, 80))],
+            )
+            for _ in range(200)
+        ]
+
+        # Act & Assert
+        for a, b in pairs:
+            self.assertEqual(lcs_length(a, b), dynamic_lcs(a, b))
+
+    def test_clinical_entities(self):
+        # Act
+        entities = clinical_entities(
+            "BP 120/80, HR 72 bpm, glucose 7.2 mg/dL. Start Lisinopril 20 mg daily "
+            "and 1,000 units of heparin; lives alone."
+        )
+
+        # Assert
+        self.assertEqual(
+            entities,
+            {
+                "120/80",
+                "72 bpm",
+                "7.2 mg/dl",
+                "20 mg",
+                "1000 units",
+                "lisinopril",
+                "heparin",
+            },
+        )
+
+    def test_reference_scores(self):
+        # Arrange
+        notes = [
+            make_note("patient denies chest pain", "patient denies chest pain"),
+            make_note("chest pain denies patient", "patient denies chest pain"),
+            make_note("Ibuprofen 800 mg", "Take ibuprofen 400 mg. Ibuprofen helps."),
+        ]
+
+        # Act
+        scores = reference_scores(notes, workers=1)
+
+        # Assert: columns are ROUGE-L, token F1 and entity overlap
+        np.testing.assert_allclose(scores[0], [1.0, 1.0, np.nan])
+        # The LCS of the reordered note is "chest pain"
+        np.testing.assert_allclose(scores[1], [0.5, 1.0, np.nan])
+        # 2 tokens of 3 and 6 in common, and 1 of 2 entities each
+        np.testing.assert_allclose(scores[2], [4 / 9, 4 / 9, 0.5])
+
+    def test_process_pool_gives_the_same_scores(self):
+        # Arrange
+        notes = [
+            make_note(f"note {i} with lisinopril {i} mg", f"lisinopril {i % 3} mg")
+            for i in range(30)
+        ]
+
+        # Act
+        pooled = reference_scores(notes, workers=2, chunk_size=7)
+        single = reference_scores(notes, workers=1)
+
+        # Assert
+        np.testing.assert_array_equal(pooled, single)
+
+    def test_add_reference_scores(self):
+        # Arrange
+        results = [make_result(make_note("a b", "a c"))]
+
+        # Act
+        (result,) = add_reference_scores(results)
+
+        # Assert
+        self.assertAlmostEqual(result.rouge_l_score, 0.5)
+        self.assertIsNone(result.entity_overlap_score)
+        self.assertIsNone(results[0].rouge_l_score)
+
+    def test_scoring_is_fast(self):
+        # Arrange: notes of about 300 tokens
+        rng = random.Random(0)
+        words = "patient reports chest pain for three days denies fever plan".split()
+        notes = [
+            make_note(
+                " ".join(rng.choices(words, k=300)), " ".join(rng.choices(words, k=300))
+            )
+            for _ in range(1000)
+        ]
+
+        # Act
+        start = time.perf_counter()
+        reference_scores(notes, workers=1)
+
+        # Assert
+        self.assertLess(time.perf_counter() - start, 2.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,168 @@
+import tracemalloc
+import unittest
+
+import numpy as np
+
+from src.aggregation import summarize
+from src.core.instrumentation import summarize_call_values, summarize_calls
+from src.result_table import ResultTable
+from src.schemas.models import LLMCallStats
+from tests.unit.test_checkpoint import make_note, make_result
+
+
+def sample_results():
+    return [
+        make_result(make_note(str(i))).model_copy(
+            update={
+                "clinical_safety_score": i / 10,
+                "rouge_l_score": 0.5 if i % 2 else None,
+                "score_tiers": {"hallucination_score": "local"},
+            }
+        )
+        for i in range(5)
+    ] + [
+        make_result(make_note("5")).model_copy(
+            update={
+                "score_tiers": {"soap_structure_score": "judge"},
+                "cheap_judge_scores": {"soap_structure_score": 0.4},
+                "judge_calls": [LLMCallStats(stage="judge", wall_time=1.0)],
+            }
+        )
+    ]
+
+
+class TestResultTable(unittest.TestCase):
+
+    def test_results_round_trip(self):
+        # Arrange
+        results = sample_results()
+
+        # Act
+        table = ResultTable.from_results(results)
+
+        # Assert
+        self.assertEqual(len(table), 6)
+        self.assertEqual(table, results)
+        self.assertEqual(list(table), results)
+        self.assertEqual(table[-1], results[-1])
+        self.assertEqual(table[1:3], results[1:3])
+        self.assertIsNone(table[0].rouge_l_score)
+        # Notes are referenced, not copied
+        self.assertIs(table[2].note, results[2].note)
+
+    def test_capacity_grows(self):
+        # Arrange
+        table = ResultTable(capacity=1)
+
+        # Act
+        for result in sample_results():
+            table.append(result)
+
+        # Assert
+        self.assertEqual(table, sample_results())
+
+    def test_columns_and_note_ids(self):
+        # Arrange
+        table = ResultTable.from_results(sample_results())
+
+        # Act
+        safety = table.column("clinical_safety_score")
+        matrix = table.score_matrix(["rouge_l_score", "overall_score"])
+
+        # Assert
+        np.testing.assert_allclose(safety, [0, 0.1, 0.2, 0.3, 0.4, 0.7])
+        self.assertFalse(safety.flags.writeable)
+        np.testing.assert_allclose(matrix[:2], [[np.nan, 0.69], [0.5, 0.69]])
+        self.assertEqual(table.row_of("3"), 3)
+        self.assertEqual(table.get("3").clinical_safety_score, 0.3)
+        self.assertIsNone(table.get("missing"))
+        self.assertEqual(summarize(table), summarize(sample_results()))
+
+    def test_required_scores(self):
+        # Arrange
+        table = ResultTable()
+
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            table.add(make_note("0"), {"hallucination_score": 0.1})
+        self.assertEqual(len(table), 0)
+
+    def test_extend_copies_the_rows_of_a_table(self):
+        # Arrange
+        results = sample_results()
+        table = ResultTable.from_results(results[:2])
+        table.row_of("0")
+
+        # Act
+        table.extend(ResultTable.from_results(results[2:]))
+        table.extend([results[0]])
+
+        # Assert
+        self.assertEqual(table, results + [results[0]])
+        self.assertEqual(table.row_of("5"), 5)
+        self.assertEqual(table.row_of("0"), 0)
+
+    def test_calls_are_stored_per_stage(self):
+        # Arrange
+        generation = [
+            LLMCallStats(stage="generation", model="gpt-4.1", wall_time=2.0, cost=0.1)
+        ]
+        judge = [
+            LLMCallStats(
+                stage="judge",
+                metric=name,
+                wall_time=1.5,
+                queue_wait=0.5,
+                prompt_tokens=100,
+                completion_tokens=20,
+                retries=1,
+            )
+            for name in ("Hallucination", "Clinical Safety")
+        ]
+        result = make_result(
+            make_note("0").model_copy(update={"generation_calls": generation})
+        ).model_copy(update={"judge_calls": judge})
+
+        # Act
+        table = ResultTable.from_results([result, sample_results()[0]])
+
+        # Assert
+        self.assertEqual(table[0], result)
+        self.assertEqual(table.notes[0].generation_calls, generation)
+        self.assertEqual(table[1].judge_calls, [])
+        self.assertEqual(
+            summarize_call_values(*table.call_columns()),
+            summarize_calls(generation + judge),
+        )
+
+    def test_memory_stays_columnar_at_scale(self):
+        # Arrange
+        calls = [
+            LLMCallStats(stage="judge", metric=str(i), wall_time=1.0, cost=0.01)
+            for i in range(3)
+        ]
+        block = ResultTable.from_results(
+            make_result(make_note(str(i))).model_copy(update={"judge_calls": calls})
+            for i in range(1000)
+        )
+        tracemalloc.start()
+        self.addCleanup(tracemalloc.stop)
+        before = tracemalloc.get_traced_memory()[0]
+
+        # Act
+        table = ResultTable(100_000)
+        for _ in range(100):
+            table.extend(block)
+        used = tracemalloc.get_traced_memory()[0] - before
+
+        # Assert: scores, tiers and three judge calls in well under 1 KB a row
+        self.assertEqual(len(table), 100_000)
+        self.assertLess(used / len(table), 512)
+        self.assertEqual(table[-1].judge_calls, calls)
+        self.assertEqual(
+            summarize_call_values(*table.call_columns())["judge"]["calls"], 300_000
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+import json
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch
+
+from src.checkpoint import RunCheckpoint
+from src.result_table import ResultTable
+from src.run_store import RunStore
+from src.schemas.models import LLMCallStats
+from tests.unit.test_checkpoint import make_note, make_result
+
+
+def scored_result(note_id, safety):
+    return make_result(make_note(note_id)).model_copy(
+        update={"clinical_safety_score": safety}
+    )
+
+
+class TestRunStore(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        self.store = RunStore(os.path.join(self.root, "runs.db"))
+
+    def test_results_round_trip(self):
+        # Arrange
+        results = [
+            scored_result("0", 0.4).model_copy(
+                update={
+                    "judge_calls": [
+                        LLMCallStats(stage="judge", metric="Safety", wall_time=1.0)
+                    ]
+                }
+            ),
+            scored_result("1", 0.9),
+        ]
+        hyperparameters = {"prompt_version": "v2", "generation_model": "gpt-4.1"}
+
+        # Act
+        created = self.store.create_run("run-1", hyperparameters, {"limit": 2})
+        recreated = self.store.create_run("run-1", {})
+        self.store.append_results("run-1", results[:1])
+        self.store.append_results("run-1", results[1:])
+
+        # Assert
+        self.assertEqual((created, recreated), (True, False))
+        loaded = self.store.load_results("run-1")
+        self.assertIsInstance(loaded, ResultTable)
+        self.assertEqual(loaded, results)
+        (run,) = self.store.runs()
+        self.assertEqual(run["hyperparameters"], hyperparameters)
+        self.assertEqual(run["metadata"], {"limit": 2})
+        self.assertEqual(run["results"], 2)
+        self.assertEqual(self.store.latest_run_id(), "run-1")
+
+    def test_query_scores_by_run_metric_and_range(self):
+        # Arrange
+        self.store.create_run("run-1", {})
+        self.store.create_run("run-2", {})
+        self.store.append_results(
+            "run-1", [scored_result(str(i), i / 10) for i in range(10)]
+        )
+        self.store.append_results("run-2", [scored_result("0", 0.1)])
+
+        # Act
+        low = self.store.query_scores(
+            "run-1", "clinical_safety_score", min_score=0.2, max_score=0.4
+        )
+        everywhere = self.store.query_scores(
+            metric="clinical_safety_score", max_score=0.1
+        )
+
+        # Assert
+        self.assertEqual(
+            [(row["note_id"], row["score"]) for row in low],
+            [("2", 0.2), ("3", 0.3), ("4", 0.4)],
+        )
+        self.assertEqual(
+            [(row["run_id"], row["note_id"]) for row in everywhere],
+            [("run-1", "0"), ("run-1", "1"), ("run-2", "0")],
+        )
+        # Optional scores that are not set are not stored
+        self.assertEqual(self.store.query_scores(metric="missing_info_score"), [])
+
+    def test_concurrent_batches_are_all_stored(self):
+        # Arrange
+        self.store.create_run("run-1", {})
+        batches = [
+            [scored_result(f"{i}-{j}", 0.5) for j in range(20)] for i in range(8)
+        ]
+
+        # Act
+        threads = [
+            threading.Thread(target=self.store.append_results, args=("run-1", batch))
+            for batch in batches
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Assert: every note has its own row and its own scores
+        self.assertEqual(len(self.store.load_results("run-1")), 160)
+        self.assertEqual(
+            len(self.store.query_scores(metric="clinical_safety_score")), 160
+        )
+
+    def test_import_json(self):
+        # Arrange
+        path = os.path.join(self.root, "evaluation_results.json")
+        results = [scored_result("0", 0.4)]
+        with open(path, "w") as f:
+            json.dump([result.model_dump() for result in results], f)
+
+        # Act
+        run_id = self.store.import_json(path)
+
+        # Assert
+        self.assertEqual(self.store.load_results(run_id), results)
+        self.assertEqual(self.store.runs()[0]["metadata"], {"imported_from": path})
+
+    def test_checkpoint_appends_to_the_store(self):
+        # Arrange
+        checkpoint = RunCheckpoint.create({}, root=self.root, store=self.store)
+        self.store.create_run(checkpoint.run_id, {})
+
+        # Act
+        checkpoint.append_results(result for result in [scored_result("0", 0.4)])
+
+        # Assert
+        self.assertEqual(
+            self.store.load_results(checkpoint.run_id), checkpoint.load_results()
+        )
+
+    def test_note_texts_are_stored_once_and_read_in_one_go(self):
+        # Arrange: two runs over the same transcripts and ground truth
+        for run_id in ("run-1", "run-2"):
+            self.store.create_run(run_id, {})
+            self.store.append_results(
+                run_id,
+                [
+                    make_result(
+                        make_note(str(i)).model_copy(
+                            update={"generated_note": f"{run_id} note {i}"}
+                        )
+                    )
+                    for i in range(5)
+                ],
+            )
+
+        # Act
+        with patch.object(
+            self.store.blobs, "get_many", wraps=self.store.blobs.get_many
+        ) as get_many:
+            results = self.store.load_results("run-2")
+
+        # Assert: 5 transcripts, 5 ground truths and 5 notes per run
+        with sqlite3.connect(self.store.path) as connection:
+            (blobs,) = connection.execute("SELECT COUNT(*) FROM blobs").fetchone()
+        self.assertEqual(blobs, 5 + 5 + 2 * 5)
+        get_many.assert_called_once()
+        self.assertEqual(results[3].note.generated_note, "run-2 note 3")
+        self.assertEqual(results[3].note.transcript, make_note("3").transcript)
+
+    def test_reading_a_missing_store_does_not_create_it(self):
+        # Act & Assert
+        self.assertEqual(self.store.runs(), [])
+        self.assertFalse(os.path.exists(self.store.path))
+
+
+if __name__ == "__main__":
+    unittest.main()
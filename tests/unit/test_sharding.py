@@ -0,0 +1,69 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+from src.checkpoint import RunCheckpoint
+from src.pipeline import pending_records
+from src.sharding import in_shard, parse_shard, shard_of
+
+
+class TestSharding(unittest.TestCase):
+
+    def test_parse_shard(self):
+        # Act & Assert
+        self.assertEqual(parse_shard("3/8"), (3, 8))
+        for spec in ("8/8", "-1/8", "1/0", "1", "a/b"):
+            with self.subTest(spec=spec), self.assertRaises(ValueError):
+                parse_shard(spec)
+
+    def test_shards_partition_the_records(self):
+        # Arrange
+        records = [{"patient_convo": f"transcript {i}"} for i in range(200)]
+
+        # Act
+        members = [
+            [r for r in records if in_shard(r, (index, 4))] for index in range(4)
+        ]
+
+        # Assert: every record is in exactly one shard, and shards are balanced
+        self.assertEqual(sum(len(m) for m in members), len(records))
+        self.assertTrue(all(25 <= len(m) <= 75 for m in members))
+
+    def test_shard_depends_only_on_the_record(self):
+        # Arrange
+        record = {"patient_convo": "Patient feels dizzy.", "soap_notes": "S: dizzy"}
+
+        # Act & Assert
+        self.assertEqual(shard_of(record, 8), shard_of(dict(record), 8))
+        self.assertEqual(shard_of(record, 8), shard_of({**record, "soap_notes": ""}, 8))
+
+    def test_pending_records_only_covers_the_shard(self):
+        # Arrange
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        records = [{"patient_convo": f"t{i}", "soap_notes": f"s{i}"} for i in range(20)]
+        path = os.path.join(tmp_dir.name, "test.json")
+        with open(path, "w") as f:
+            json.dump(records, f)
+        runs_root = os.path.join(tmp_dir.name, "runs")
+
+        # Act
+        with patch("src.data_loader.DATASET_PATH", path):
+            shards = [
+                pending_records(
+                    RunCheckpoint.create({"limit": None, "shard": [i, 3]}, runs_root)
+                )
+                for i in range(3)
+            ]
+
+        # Assert
+        note_ids = sorted(int(note_id) for shard in shards for note_id, _ in shard)
+        self.assertEqual(note_ids, list(range(20)))
+        for index, shard in enumerate(shards):
+            self.assertTrue(all(shard_of(r, 3) == index for _, r in shard))
+
+
+if __name__ == "__main__":
+    unittest.main()
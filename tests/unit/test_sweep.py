@@ -0,0 +1,188 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import AsyncMock, patch
+
+from src.checkpoint import RunCheckpoint
+from src.data_loader import iter_records
+from src.incremental import metric_versions
+from src.run_store import RunStore
+from src.schemas.models import ClinicalNote
+from src.sweep import create_sweep, load_sweep, run_sweep
+from tests.unit.test_pipeline import fake_evaluation
+
+
+class TestSweep(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        dataset_path = os.path.join(self.tmp_dir.name, "test.json")
+        with open(dataset_path, "w") as f:
+            json.dump(
+                [{"patient_convo": f"t{i}", "soap_notes": f"s{i}"} for i in range(3)],
+                f,
+            )
+        patcher = patch("src.data_loader.DATASET_PATH", dataset_path)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.root = os.path.join(self.tmp_dir.name, "sweeps")
+        self.runs_root = os.path.join(self.tmp_dir.name, "runs")
+
+    def test_create_sweep_starts_one_run_per_cell(self):
+        # Act
+        manifest = create_sweep(
+            ["v1", "v2"], ["gpt-4.1", "gpt-4o"], 2, self.root, self.runs_root
+        )
+
+        # Assert
+        self.assertEqual(
+            [cell["label"] for cell in manifest["cells"]],
+            [
+                "prompt-v1_gen-gpt-4-1",
+                "prompt-v1_gen-gpt-4o",
+                "prompt-v2_gen-gpt-4-1",
+                "prompt-v2_gen-gpt-4o",
+            ],
+        )
+        self.assertEqual(load_sweep(manifest["sweep_id"], self.root), manifest)
+        self.assertEqual(len(os.listdir(self.runs_root)), 4)
+
+    def test_create_sweep_rejects_unknown_prompt_versions(self):
+        # Act & Assert
+        with self.assertRaises(ValueError):
+            create_sweep(["v1", "v99"], ["gpt-4.1"], 2, self.root, self.runs_root)
+
+    @patch("src.pipeline.run_evaluation", side_effect=fake_evaluation)
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_run_sweep_writes_one_result_set_per_cell(
+        self, mock_agenerate_note, mock_run_evaluation
+    ):
+        # Arrange
+        async def fake_generate(transcript, prompt_version=None, model=None):
+            return f"{prompt_version}/{model}/{transcript}"
+
+        mock_agenerate_note.side_effect = fake_generate
+        manifest = create_sweep(
+            ["v1", "v2"], ["gpt-4.1", "gpt-4o"], 2, self.root, self.runs_root
+        )
+
+        # Act
+        with patch("src.sweep.iter_records", wraps=iter_records) as mock_iter:
+            results = run_sweep(manifest, self.root, self.runs_root, use_cache=False)
+
+        # Assert: the dataset is read once and every cell got its own notes
+        mock_iter.assert_called_once_with(limit=2)
+        self.assertEqual(mock_agenerate_note.call_count, 8)
+        self.assertEqual(
+            [r.note.generated_note for r in results["prompt-v2_gen-gpt-4o"]],
+            ["v2/gpt-4o/t0", "v2/gpt-4o/t1"],
+        )
+        self.assertEqual(
+            [r.note.note_id for r in results["prompt-v1_gen-gpt-4-1"]], ["0", "1"]
+        )
+        with open(
+            os.path.join(self.root, manifest["sweep_id"], "prompt-v1_gen-gpt-4o.json")
+        ) as f:
+            self.assertEqual(len(json.load(f)), 2)
+
+    @patch("src.pipeline.run_evaluation")
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_run_sweep_evaluates_while_generating(
+        self, mock_agenerate_note, mock_run_evaluation
+    ):
+        # Arrange: note 0 of each cell is left over from an earlier attempt, and
+        # note 1 of the second cell is slow
+        events = []
+
+        async def generate(transcript, prompt_version=None, model=None):
+            if (prompt_version, transcript) == ("v2", "t1"):
+                await asyncio.sleep(0.5)
+            events.append(f"generated {prompt_version}/{transcript}")
+            return "note"
+
+        def evaluate(notes, *args, **kwargs):
+            events.append(f"evaluated {[note.note_id for note in notes]}")
+            return fake_evaluation(notes)
+
+        mock_agenerate_note.side_effect = generate
+        mock_run_evaluation.side_effect = evaluate
+        manifest = create_sweep(["v1", "v2"], ["gpt-4.1"], 2, self.root, self.runs_root)
+        for cell in manifest["cells"]:
+            RunCheckpoint.resume(cell["run_id"], root=self.runs_root).append_notes(
+                [
+                    ClinicalNote(
+                        note_id="0", transcript="t0", note="s0", generated_note="n"
+                    )
+                ]
+            )
+
+        # Act
+        with patch("src.sweep.settings.EVALUATION_BATCH_SIZE", 25):
+            run_sweep(manifest, self.root, self.runs_root, use_cache=False)
+            resumed = run_sweep(manifest, self.root, self.runs_root, use_cache=False)
+
+        # Assert: the leftover notes of both cells share the first batch, which
+        # is evaluated before the slow note is generated; a resume redoes nothing
+        first_evaluation = next(i for i, e in enumerate(events) if "evaluated" in e)
+        self.assertEqual(events[first_evaluation], "evaluated ['0:0', '1:0']")
+        self.assertLess(first_evaluation, events.index("generated v2/t1"))
+        self.assertEqual(mock_agenerate_note.call_count, 2)
+        self.assertEqual(
+            sum(len(call.args[0]) for call in mock_run_evaluation.call_args_list), 4
+        )
+        self.assertEqual(
+            {label: len(r) for label, r in resumed.items()},
+            {"prompt-v1_gen-gpt-4-1": 2, "prompt-v2_gen-gpt-4-1": 2},
+        )
+
+    @patch("src.pipeline.run_tiered_evaluation", side_effect=fake_evaluation)
+    @patch("src.pipeline.settings.TIERED_JUDGE", True)
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_run_sweep_uses_the_tiered_judge(
+        self, mock_agenerate_note, mock_run_tiered_evaluation
+    ):
+        # Arrange
+        mock_agenerate_note.return_value = "note"
+        manifest = create_sweep(["v1", "v2"], ["gpt-4.1"], 2, self.root, self.runs_root)
+
+        # Act
+        results = run_sweep(manifest, self.root, self.runs_root, use_cache=False)
+
+        # Assert
+        self.assertEqual(
+            sum(
+                len(call.args[0]) for call in mock_run_tiered_evaluation.call_args_list
+            ),
+            4,
+        )
+        self.assertEqual([len(r) for r in results.values()], [2, 2])
+
+    @patch("src.pipeline.run_evaluation", side_effect=fake_evaluation)
+    @patch("src.data_loader.agenerate_note", new_callable=AsyncMock)
+    def test_run_sweep_stores_every_cell(
+        self, mock_agenerate_note, mock_run_evaluation
+    ):
+        # Arrange
+        mock_agenerate_note.return_value = "note"
+        store = RunStore(os.path.join(self.tmp_dir.name, "runs.db"))
+        manifest = create_sweep(
+            ["v1", "v2"], ["gpt-4.1"], 2, self.root, self.runs_root, store=store
+        )
+
+        # Act
+        run_sweep(manifest, self.root, self.runs_root, use_cache=False, store=store)
+
+        # Assert
+        runs = {run["run_id"]: run for run in store.runs()}
+        for cell in manifest["cells"]:
+            run = runs[cell["run_id"]]
+            self.assertEqual(run["identifier"], cell["label"])
+            self.assertEqual(run["metadata"]["metric_versions"], metric_versions())
+            self.assertEqual(len(store.load_results(cell["run_id"])), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
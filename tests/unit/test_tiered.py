@@ -0,0 +1,101 @@
+import unittest
+from unittest.mock import patch
+
+from src.core.executor import JudgeOutcome
+from src.schemas.models import ClinicalNote
+from src.tiered import needs_escalation, run_tiered_evaluation, tiering_report
+
+
+def fake_judge(jobs, test_cases, metrics, *args, **kwargs):
+    # The cheap judge finds clinical accuracy borderline, the strong judge passes it
+    outcomes = {}
+    for job in jobs:
+        metric = metrics[job.metric_index]
+        cheap = metric.model.get_model_name() == "cheap"
+        score = 0.9
+        if metric.__name__.startswith("Clinical Accuracy"):
+            score = 0.65 if cheap else 0.8
+        outcomes[job] = JudgeOutcome(job, score, "Because.", None)
+    return outcomes
+
+
+class TestTiered(unittest.TestCase):
+
+    def test_needs_escalation(self):
+        # Act & Assert
+        self.assertTrue(needs_escalation([0.75], 0.7, margin=0.1))
+        self.assertFalse(needs_escalation([0.9], 0.7, margin=0.1))
+        self.assertTrue(needs_escalation([1.0, 0.4], 0.7, margin=0.1, max_spread=0.2))
+
+    @patch("src.evaluation.run_judge_jobs", side_effect=fake_judge)
+    def test_only_close_calls_are_escalated(self, mock_run_judge_jobs):
+        # Arrange
+        notes = [
+            ClinicalNote(note_id=str(i), transcript="t", note="gt", generated_note="g")
+            for i in range(2)
+        ]
+
+        # Act
+        results = run_tiered_evaluation(notes, cheap_model="cheap", samples=1)
+
+        # Assert: the strong judge only sees clinical accuracy
+        self.assertEqual(mock_run_judge_jobs.call_count, 2)
+        jobs, _, metrics = mock_run_judge_jobs.call_args.args
+        self.assertEqual(
+            {metrics[job.metric_index].name for job in jobs},
+            {"Clinical Accuracy [GEval]"},
+        )
+        self.assertEqual(results[0].clinical_accuracy_score, 0.8)
+        self.assertEqual(results[0].score_tiers["clinical_accuracy_score"], "judge")
+        self.assertEqual(results[0].score_tiers["soap_structure_score"], "cheap_judge")
+        self.assertEqual(
+            results[0].cheap_judge_scores, {"clinical_accuracy_score": 0.65}
+        )
+
+        report = tiering_report(results)
+        self.assertEqual(report["pairs"], 10)
+        self.assertEqual(report["escalated"], 2)
+        self.assertAlmostEqual(report["escalated_fraction"], 0.2)
+        # 0.65 fails the 0.7 threshold and 0.8 passes it
+        self.assertEqual(report["agreement"], 0.0)
+
+    @patch("src.evaluation.run_judge_jobs", side_effect=fake_judge)
+    def test_only_metrics_limits_both_tiers(self, mock_run_judge_jobs):
+        # Arrange
+        note = ClinicalNote(note_id="0", transcript="t", note="gt", generated_note="g")
+
+        # Act
+        results = run_tiered_evaluation(
+            [note],
+            cheap_model="cheap",
+            samples=1,
+            only_metrics=["Clinical Accuracy [GEval]"],
+        )
+
+        # Assert
+        for call in mock_run_judge_jobs.call_args_list:
+            jobs, _, metrics = call.args
+            self.assertEqual(
+                {metrics[job.metric_index].name for job in jobs},
+                {"Clinical Accuracy [GEval]"},
+            )
+        self.assertEqual(results[0].score_tiers, {"clinical_accuracy_score": "judge"})
+
+    @patch("src.evaluation.run_judge_jobs", side_effect=fake_judge)
+    def test_cheap_samples_are_drawn_with_distinct_seeds(self, mock_run_judge_jobs):
+        # Arrange
+        note = ClinicalNote(note_id="0", transcript="t", note="gt", generated_note="g")
+
+        # Act
+        run_tiered_evaluation([note], cheap_model="cheap", samples=3)
+
+        # Assert: the samples are not answered from each other's cache entries
+        seeds = [
+            call.args[2][0].model.seed
+            for call in mock_run_judge_jobs.call_args_list[:3]
+        ]
+        self.assertEqual(seeds, [0, 1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()